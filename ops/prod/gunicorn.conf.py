@@ -11,3 +11,22 @@ accesslog = "-"
 limit_request_line = 0
 timeout = int(os.getenv("GUNICORN_TIMEOUT", 500))
 reload = os.getenv("DEVELOP", "").lower() == "true"
+
+# Load the app in the master process, so that resources and reference data are loaded once and
+# shared copy-on-write between the workers (see src/api/preload.py). Not compatible with reload.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true" and not reload
+
+
+def when_ready(server):
+    if preload_app:
+        from api.main import app
+        from api.preload import preload
+
+        preload(app)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from api.preload import after_fork
+
+        after_fork()
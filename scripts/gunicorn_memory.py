@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Prints memory usage of the gunicorn master and its workers.
+
+RSS counts pages shared with other processes in full for each process, so it does not show the
+saving from preloading the app (see ops/prod/gunicorn.conf.py). PSS divides shared pages between
+the processes sharing them, and USS is memory private to the process. Compare the total PSS with
+GUNICORN_PRELOAD=true and false, after having sent some requests to the workers.
+
+Usage: gunicorn_memory.py [master pid]
+"""
+
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROC = Path("/proc")
+
+
+def _is_gunicorn(pid: int) -> bool:
+    try:
+        argv = (PROC / str(pid) / "cmdline").read_bytes().decode().split("\0")
+    except OSError:
+        return False
+    # gunicorn is either the executable, or the script run by python
+    return any(Path(arg).name.startswith("gunicorn") for arg in argv[:2])
+
+
+def _ppid(pid: int) -> Optional[int]:
+    try:
+        stat = (PROC / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # Process name may contain spaces, so split after it
+    return int(stat.rsplit(")", 1)[1].split()[1])
+
+
+def _pids() -> List[int]:
+    return [int(p.name) for p in PROC.iterdir() if p.name.isdigit()]
+
+
+def find_master() -> int:
+    gunicorn_pids = {pid for pid in _pids() if _is_gunicorn(pid)}
+    masters = [pid for pid in gunicorn_pids if _ppid(pid) not in gunicorn_pids]
+    assert len(masters) == 1, f"Expected one gunicorn master process, found {masters}"
+    return masters[0]
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    "RSS, PSS and USS in kB"
+    rollup: Dict[str, int] = {}
+    for line in (PROC / str(pid) / "smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        rollup[key] = int(value.split()[0])
+    return {
+        "rss": rollup["Rss"],
+        "pss": rollup["Pss"],
+        "uss": rollup["Private_Clean"] + rollup["Private_Dirty"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pid", nargs="?", type=int, help="gunicorn master pid (default: find)")
+    args = parser.parse_args()
+
+    master = args.pid or find_master()
+    workers = sorted(pid for pid in _pids() if _ppid(pid) == master)
+
+    print(f"{'':>10} {'pid':>8} {'RSS MB':>10} {'PSS MB':>10} {'USS MB':>10}")
+    totals = {"rss": 0, "pss": 0, "uss": 0}
+    for name, pid in [("master", master)] + [("worker", pid) for pid in workers]:
+        usage = memory_usage(pid)
+        for key in totals:
+            totals[key] += usage[key]
+        print(
+            f"{name:>10} {pid:>8} {usage['rss'] / 1024:>10.1f} {usage['pss'] / 1024:>10.1f} "
+            f"{usage['uss'] / 1024:>10.1f}"
+        )
+    print(
+        f"{'total':>10} {'':>8} {totals['rss'] / 1024:>10.1f} {totals['pss'] / 1024:>10.1f} "
+        f"{totals['uss'] / 1024:>10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,9 +18,8 @@ app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app)  # type: ignore
 
 
-db = DB()
-engine_kwargs = {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30}
-db.connect(engine_kwargs=engine_kwargs)
+db = DB(role="api")
+db.connect()
 if DEVELOPMENT_MODE:
     print(f"Using database URL: {db.engine.url}", file=sys.stderr)
 
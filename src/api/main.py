@@ -36,6 +36,7 @@ log = app.logger
 @app.before_request
 def populate_request():
     g.request_start_time = time.time() * 1000.0
+    db.checkout_stats.reset_thread_wait()
     populate_g_logging()
     if request.path and request.path.split("/")[1] not in VALID_STATIC_FILES:
         populate_g_user()
@@ -43,6 +44,10 @@ def populate_request():
 
 @app.after_request
 def after_request(response: Response):
+    # Time spent waiting for database connections from the pool
+    response.headers.add(
+        "Server-Timing", f"db-checkout;dur={db.checkout_stats.thread_wait() * 1000:.1f}"
+    )
     if request.path and request.path.split("/")[1] not in VALID_STATIC_FILES:
         log_request(response.status_code, response)
         try:
@@ -1,13 +1,16 @@
+import argparse
 import binascii
 import datetime
 import json
 import logging
 import os
+import socket
 import subprocess
 import tempfile
 import time
 import traceback
-from typing import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Set, Tuple
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -15,8 +18,9 @@ from os.path import join
 from pathlib import Path
 from urllib.parse import urlencode
 
+import psycopg2
 import pytz
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
 from vardb.datamodel.annotationjob import AnnotationJob
 from vardb.deposit.analysis_config import AnalysisConfigData
@@ -92,6 +96,32 @@ def encode_multipart_formdata(fields, files):
 
 ANNOTATION_SERVICE_URL = config["app"]["annotation_service"]
 
+POLL_INTERVAL = 5
+# Concurrent calls to the annotation service
+SERVICE_WORKERS = int(os.environ.get("ELLA_POLLING_SERVICE_WORKERS", 8))
+# Concurrent deposits of annotated jobs
+DEPOSIT_WORKERS = int(os.environ.get("ELLA_POLLING_DEPOSIT_WORKERS", 2))
+# Timeout (seconds) for each call to the annotation service
+SERVICE_TIMEOUT = int(os.environ.get("ELLA_POLLING_SERVICE_TIMEOUT", 60))
+# Timeout (seconds) for each statement executed while depositing a job
+DEPOSIT_STATEMENT_TIMEOUT = int(os.environ.get("ELLA_POLLING_DEPOSIT_STATEMENT_TIMEOUT", 0))
+# Upper bound for the delay between retries of a job hitting transient errors
+MAX_BACKOFF = 300
+# Number of times a deposit conflicting with a concurrent deposit is retried before it fails
+MAX_DEPOSIT_RETRIES = 5
+# The engine's handle_error listener (see vardb.util.db) re-raises psycopg2 errors unwrapped
+CONFLICT_ERRORS = (IntegrityError, psycopg2.IntegrityError)
+
+
+def is_transient_error(e: Exception) -> bool:
+    """
+    Errors where the job should be retried: the annotation service is unreachable or slow, or the
+    deposit conflicted with a concurrent deposit of the same data
+    """
+    if isinstance(e, urllib.error.HTTPError):
+        return False
+    return isinstance(e, (urllib.error.URLError, socket.timeout, ConnectionError) + CONFLICT_ERRORS)
+
 
 def get_error_message(e):
     try:
@@ -207,9 +237,15 @@ class AnnotationJobsInterface:
 
 # NOTE: This is calling anno API
 class AnnotationServiceInterface:
-    def __init__(self, url: str, session: Session):
+    def __init__(self, url: str, session: Session, timeout: Optional[float] = None):
         self.base = join(url, "api/v1")
         self.session = session
+        self.timeout = timeout
+
+    def _urlopen(self, r):
+        if self.timeout is None:
+            return urllib.request.urlopen(r)
+        return urllib.request.urlopen(r, timeout=self.timeout)
 
     def annotate(self, job):
         r = urllib.request.Request(
@@ -217,7 +253,7 @@ class AnnotationServiceInterface:
             data=json.dumps({"input": job.data}).encode(),
             headers={"Content-type": "application/json"},
         )
-        k = urllib.request.urlopen(r)
+        k = self._urlopen(r)
         return json.loads(k.read().decode())
 
     def annotate_sample(self, job):
@@ -235,19 +271,19 @@ class AnnotationServiceInterface:
             data=body.encode(),
             headers={"Content-type": content_type},
         )
-        k = urllib.request.urlopen(r)
+        k = self._urlopen(r)
         return json.loads(k.read().decode())
 
     def process(self, task_id: str):
-        k = urllib.request.urlopen(join(self.base, "process", task_id))
+        k = self._urlopen(join(self.base, "process", task_id))
         return k.read().decode()
 
     def status(self, task_id: str = None):
         """Get status of task_id or all tasks"""
         if task_id:
-            k = urllib.request.urlopen(join(self.base, "status", task_id))
+            k = self._urlopen(join(self.base, "status", task_id))
         else:
-            k = urllib.request.urlopen(join(self.base, "status"))
+            k = self._urlopen(join(self.base, "status"))
         resp = json.loads(k.read().decode())
         return resp
 
@@ -258,7 +294,7 @@ class AnnotationServiceInterface:
             d["limit"] = str(limit)
         q = urlencode(d)
 
-        k = urllib.request.urlopen(join(self.base, "samples", "?" + q))
+        k = self._urlopen(join(self.base, "samples", "?" + q))
         resp = json.loads(k.read().decode())
         result = []
         for k, v in resp.items():
@@ -269,7 +305,7 @@ class AnnotationServiceInterface:
 
     def annotation_service_running(self):
         try:
-            urllib.request.urlopen(join(self.base, "status"))
+            self._urlopen(join(self.base, "status"))
             return True
         except (urllib.error.HTTPError, urllib.error.URLError):
             return False
@@ -310,6 +346,9 @@ def process_submitted(
             message = ""
             task_id = resp["task_id"]
         except Exception as e:
+            if is_transient_error(e):
+                # Annotation service is unavailable, leave job as SUBMITTED and retry later
+                raise
             status = "FAILED (SUBMISSION)"
             message = get_error_message(e)
             task_id = ""
@@ -318,35 +357,53 @@ def process_submitted(
         yield id, {"task_id": task_id, "status": status, "message": message}
 
 
+def fetch_annotated(
+    annotation_service: AnnotationServiceInterface, annotation_jobs, job
+) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+    """
+    Fetch the annotated vcf for an annotated job.
+
+    Returns the annotated vcf if it should be deposited, otherwise the final update for the job.
+    """
+    try:
+        annotated_vcf = annotation_service.process(job.task_id)
+        annotation_jobs.commit()
+    except urllib.error.HTTPError as e:
+        return None, {"status": "FAILED (PROCESSING)", "message": get_error_message(e)}
+    if job.sample_id is not None and not config["import"]["automatic_deposit_with_sample_id"]:
+        return None, {"status": "DONE", "message": "Analysis has not been automatically imported"}
+    return annotated_vcf, None
+
+
+def deposit_annotated(
+    annotation_jobs, id, annotated_vcf, retry_conflicts: bool = False
+) -> Dict[str, str]:
+    """
+    Deposit annotated data for job. With retry_conflicts, integrity errors (e.g. from a concurrent
+    deposit inserting the same data) are raised, so that the job can be retried later.
+    """
+    try:
+        annotation_jobs.deposit(id, annotated_vcf)
+        status = "DONE"
+        message = ""
+    except Exception as e:
+        annotation_jobs.rollback()
+        if retry_conflicts and isinstance(e, CONFLICT_ERRORS):
+            raise
+        status = "FAILED (DEPOSIT)"
+        message = e.__class__.__name__ + ": " + getattr(e, "message", str(e))
+    return {"status": status, "message": message}
+
+
 def process_annotated(
     annotation_service: AnnotationServiceInterface, annotation_jobs, annotated_jobs
 ):
     for job in annotated_jobs:
         id = job.id
-        task_id = job.task_id
-        try:
-            annotated_vcf = annotation_service.process(task_id)
-            annotation_jobs.commit()
-        except urllib.error.HTTPError as e:
-            status = "FAILED (PROCESSING)"
-            message = get_error_message(e)
-            yield id, {"status": status, "message": message}
-            continue
-        if job.sample_id is not None and not config["import"]["automatic_deposit_with_sample_id"]:
-            status = "DONE"
-            message = "Analysis has not been automatically imported"
-            yield id, {"status": status, "message": message}
-            continue
-        try:
-            annotation_jobs.deposit(id, annotated_vcf)
-            status = "DONE"
-            message = ""
-        except Exception as e:
-            annotation_jobs.rollback()
-            status = "FAILED (DEPOSIT)"
-            message = e.__class__.__name__ + ": " + getattr(e, "message", str(e))
-
-        yield id, {"status": status, "message": message}
+        annotated_vcf, update = fetch_annotated(annotation_service, annotation_jobs, job)
+        if update is None:
+            update = deposit_annotated(annotation_jobs, id, annotated_vcf)
+        yield id, update
 
 
 def patch_annotation_job(annotation_jobs, id, updates):
@@ -362,9 +419,187 @@ def patch_annotation_job(annotation_jobs, id, updates):
         annotation_jobs.rollback()
 
 
-def polling(session):
-    annotation_jobs = AnnotationJobsInterface(session)
-    annotation_service = AnnotationServiceInterface(ANNOTATION_SERVICE_URL, session)
+class ConcurrentPoller:
+    """
+    Polls annotation jobs, and processes them concurrently.
+
+    Calls to the annotation service (status, submission and fetching of annotated data) are run in
+    one bounded pool, while deposits are run in a separate bounded pool, so that a slow deposit
+    does not hold up status updates and submissions for other jobs.
+
+    A job is only handled by one task at a time. Jobs failing with transient errors (e.g. the
+    annotation service being unreachable or timing out, or a deposit conflicting with a concurrent
+    deposit) are left in their current status and retried with exponential backoff.
+
+    `session` must be a scoped_session, as every task uses its own thread-local session.
+    """
+
+    def __init__(
+        self,
+        session,
+        annotation_service_url: str = ANNOTATION_SERVICE_URL,
+        service_workers: int = SERVICE_WORKERS,
+        deposit_workers: int = DEPOSIT_WORKERS,
+        service_timeout: Optional[float] = SERVICE_TIMEOUT,
+        deposit_statement_timeout: int = DEPOSIT_STATEMENT_TIMEOUT,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.session = session
+        self.annotation_jobs = AnnotationJobsInterface(session)
+        self.annotation_service = AnnotationServiceInterface(
+            annotation_service_url, session, timeout=service_timeout
+        )
+        self.deposit_workers = deposit_workers
+        self.deposit_statement_timeout = deposit_statement_timeout
+        self.poll_interval = poll_interval
+        self.service_pool = ThreadPoolExecutor(
+            max_workers=service_workers, thread_name_prefix="annotation-service"
+        )
+        self.deposit_pool = ThreadPoolExecutor(
+            max_workers=deposit_workers, thread_name_prefix="annotation-deposit"
+        )
+        self.in_flight: Dict[int, Future] = {}
+        # Annotated jobs being fetched or deposited
+        self.depositing: Set[int] = set()
+        # job id -> (number of failed attempts, time of next attempt)
+        self.backoff: Dict[int, Tuple[int, float]] = {}
+        self.num_finished = 0
+
+    def _run(self, process: Callable, job_id: int):
+        "Run a processing step for a single job in a worker thread, using a thread-local session"
+        try:
+            return process(job_id)
+        finally:
+            self.session.remove()
+
+    def _patch(self, job_id: int, update: Dict[str, str]):
+        patch_annotation_job(self.annotation_jobs, job_id, update)
+        log.info("Processed job {} with data {}".format(job_id, str(update)))
+        if update["status"].startswith("FAILED") or update["status"] == "DONE":
+            self.num_finished += 1
+
+    def _get_job(self, job_id: int, status: str) -> Optional[AnnotationJob]:
+        job = self.annotation_jobs.get_with_id(job_id)
+        # Job might have been changed (e.g. cancelled) since it was dispatched
+        return job if job.status == status else None
+
+    def _process_running(self, job_id: int):
+        job = self._get_job(job_id, "RUNNING")
+        if job is None:
+            return
+        for id, update in process_running(self.annotation_service, [job]):
+            self._patch(id, update)
+
+    def _process_submitted(self, job_id: int):
+        job = self._get_job(job_id, "SUBMITTED")
+        if job is None:
+            return
+        for id, update in process_submitted(self.annotation_service, [job]):
+            self._patch(id, update)
+
+    def _process_annotated(self, job_id: int) -> Optional[Future]:
+        job = self._get_job(job_id, "ANNOTATED")
+        if job is None:
+            return None
+        annotated_vcf, update = fetch_annotated(self.annotation_service, self.annotation_jobs, job)
+        if update is not None:
+            self._patch(job_id, update)
+            return None
+        # Hand over to deposit pool, the returned future replaces this task as in flight
+        return self.deposit_pool.submit(self._run, self._deposit(annotated_vcf), job_id)
+
+    def _deposit(self, annotated_vcf: str) -> Callable:
+        def deposit(job_id: int):
+            if self.deposit_statement_timeout:
+                self.session.execute(
+                    "SET LOCAL statement_timeout = {:d}".format(
+                        self.deposit_statement_timeout * 1000
+                    )
+                )
+            retry_conflicts = self.backoff.get(job_id, (0, 0.0))[0] < MAX_DEPOSIT_RETRIES
+            self._patch(
+                job_id,
+                deposit_annotated(self.annotation_jobs, job_id, annotated_vcf, retry_conflicts),
+            )
+
+        return deposit
+
+    def _in_backoff(self, job_id: int, now: float) -> bool:
+        return job_id in self.backoff and self.backoff[job_id][1] > now
+
+    def collect(self):
+        "Collect finished tasks, and register jobs that failed for backoff"
+        now = time.time()
+        for job_id, future in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[job_id]
+            e = future.exception()
+            if e is None:
+                deposit_future = future.result()
+                if deposit_future is not None:
+                    # Keep the backoff until the deposit succeeds, to count conflicting deposits
+                    self.in_flight[job_id] = deposit_future
+                else:
+                    self.backoff.pop(job_id, None)
+                    self.depositing.discard(job_id)
+                continue
+
+            self.depositing.discard(job_id)
+
+            attempts = self.backoff.get(job_id, (0, now))[0] + 1
+            delay = min(MAX_BACKOFF, self.poll_interval * 2**attempts)
+            self.backoff[job_id] = (attempts, now + delay)
+            if is_transient_error(e):
+                log.warning(
+                    "Transient error for job {} ({}), retrying in {} seconds".format(
+                        job_id, e, delay
+                    )
+                )
+            else:
+                log.error(
+                    "Unexpected error for job {}, retrying in {} seconds".format(job_id, delay),
+                    exc_info=e,
+                )
+
+    def dispatch(self):
+        "Dispatch jobs that are not already in flight or waiting for a retry"
+        now = time.time()
+        steps = [
+            ("RUNNING", self._process_running),
+            ("SUBMITTED", self._process_submitted),
+            ("ANNOTATED", self._process_annotated),
+        ]
+        for status, process in steps:
+            job_ids = [
+                id
+                for (id,) in self.session.query(AnnotationJob.id)
+                .filter(AnnotationJob.status == status)
+                .order_by(AnnotationJob.id)
+            ]
+            for job_id in job_ids:
+                if job_id in self.in_flight or self._in_backoff(job_id, now):
+                    continue
+                if status == "ANNOTATED":
+                    # Avoid fetching more annotated data than the deposit workers can handle
+                    if len(self.depositing) >= self.deposit_workers:
+                        break
+                    self.depositing.add(job_id)
+                self.in_flight[job_id] = self.service_pool.submit(self._run, process, job_id)
+        # Remove session to avoid a hanging session
+        self.session.remove()
+
+    def run_once(self):
+        self.collect()
+        self.dispatch()
+
+    def shutdown(self):
+        self.service_pool.shutdown(wait=True)
+        self.deposit_pool.shutdown(wait=True)
+
+
+def polling(session, **kwargs):
+    poller = ConcurrentPoller(session, **kwargs)
 
     def loop(session):
         while True:
@@ -374,37 +609,16 @@ def polling(session):
                 if not session.bind.table_names():
                     # Database is not populated
                     session.remove()
-                    time.sleep(5)
+                    time.sleep(poller.poll_interval)
                     continue
 
-                # Process running
-                running_jobs = annotation_jobs.get_with_status("RUNNING")
-                for id, update in process_running(annotation_service, running_jobs):
-                    patch_annotation_job(annotation_jobs, id, update)
-                    log.info("Processed running job {} with data {}".format(id, str(update)))
-
-                # Process submitted
-                submitted_jobs = annotation_jobs.get_with_status("SUBMITTED")
-                for id, update in process_submitted(annotation_service, submitted_jobs):
-                    patch_annotation_job(annotation_jobs, id, update)
-                    log.info("Processed submitted job {} with data {}".format(id, str(update)))
-
-                # Process annotated
-                annotated_jobs = annotation_jobs.get_with_status("ANNOTATED")
-                for id, update in process_annotated(
-                    annotation_service, annotation_jobs, annotated_jobs
-                ):
-                    patch_annotation_job(annotation_jobs, id, update)
-                    log.info("Processed annotated job {} with data {}".format(id, str(update)))
-
-                # Remove session to avoid a hanging session
-                session.remove()
-                time.sleep(5)
+                poller.run_once()
+                time.sleep(poller.poll_interval)
             except OperationalError as e:
                 # Database is not alive
-                log.warning("Failed to poll annotation jobs (%s)" % e.message)
+                log.warning("Failed to poll annotation jobs (%s)" % e)
                 session.remove()
-                time.sleep(5)
+                time.sleep(poller.poll_interval)
                 continue
 
     try:
@@ -413,6 +627,8 @@ def polling(session):
         session.remove()
         traceback.print_exc()
         raise e
+    finally:
+        poller.shutdown()
 
 
 if __name__ == "__main__":
@@ -420,11 +636,33 @@ if __name__ == "__main__":
 
     setup_logger()
 
+    parser = argparse.ArgumentParser(description="Poll and process annotation jobs.")
+    parser.add_argument(
+        "--service-workers",
+        dest="service_workers",
+        type=int,
+        default=SERVICE_WORKERS,
+        help="Max concurrent calls to the annotation service (default: $ELLA_POLLING_SERVICE_WORKERS or 8)",
+    )
+    parser.add_argument(
+        "--deposit-workers",
+        dest="deposit_workers",
+        type=int,
+        default=DEPOSIT_WORKERS,
+        help="Max concurrent deposits (default: $ELLA_POLLING_DEPOSIT_WORKERS or 2)",
+    )
+    args = parser.parse_args()
+
     from vardb.datamodel import DB
 
-    db = DB()
+    db = DB(role="polling")
     db.connect()
 
     log.info("Starting polling worker")
     log.info("Using annotation service at: {}".format(ANNOTATION_SERVICE_URL))
-    polling(db.session)
+    log.info(
+        "Using {} annotation service workers and {} deposit workers".format(
+            args.service_workers, args.deposit_workers
+        )
+    )
+    polling(db.session, service_workers=args.service_workers, deposit_workers=args.deposit_workers)
@@ -0,0 +1,34 @@
+"""
+Preloading of the API in the gunicorn master process (see ops/prod/gunicorn.conf.py).
+
+Resource modules, with the datalayer, rule set and schemas they import, and the API docs are
+otherwise loaded on first use in each worker. Loading them before the workers are forked shares
+them copy-on-write between the workers.
+"""
+import gc
+
+from flask import Flask
+
+from api import db
+from api.v1.lazyresource import load_resources
+
+
+def preload(app: Flask):
+    load_resources(app)
+    with app.app_context():
+        # Builds and caches the API docs spec
+        app.view_functions["v1_spec"]()
+
+    # Connections must not be shared with the forked workers
+    db.engine.dispose()
+
+    # Move everything loaded so far out of reach of the garbage collector, which would otherwise
+    # touch (and copy) the shared memory pages in each worker
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork():
+    # The workers' pools should be empty, as the master disposed its engine before forking.
+    # Dispose again in case connections were opened by the master after preloading.
+    db.engine.dispose()
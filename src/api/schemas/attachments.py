@@ -16,6 +16,7 @@ class AttachmentSchema(Schema):
             "mimetype",
             "extension",
             "thumbnail",
+            "thumbnail_status",
             "user",
         )
 
@@ -26,6 +27,9 @@ class AttachmentSchema(Schema):
         return os.path.join(config["app"]["attachment_storage"], obj.sha256[:2], obj.sha256)
 
     def get_thumbnail(self, obj):
+        # Frontend shows a placeholder until the thumbnail worker has created the thumbnail
+        if obj.thumbnail_status == "PENDING":
+            return None
         path = self.get_path(obj) + ".thumbnail"
         if not os.path.isfile(path):
             return None
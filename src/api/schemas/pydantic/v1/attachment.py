@@ -4,6 +4,7 @@ from typing import Optional
 
 from api.schemas.pydantic.v1 import BaseModel
 from api.schemas.pydantic.v1.users import User
+from api.util.types import ThumbnailStatus
 
 
 class Attachment(BaseModel):
@@ -15,4 +16,5 @@ class Attachment(BaseModel):
     mimetype: Optional[str] = None
     extension: str
     thumbnail: Optional[str] = None
+    thumbnail_status: Optional[ThumbnailStatus] = None
     user: User
@@ -55,7 +55,7 @@ from api.schemas.pydantic.v1.workflow import (
     AnalysisInterpretation,
     AnalysisInterpretationSnapshot,
 )
-from api.util.types import CallerTypes, ResourceMethods
+from api.util.types import CallerTypes, ResourceMethods, ThumbnailStatus
 from api.util.util import from_camel
 
 WORKFLOWS_ALLELES = "/api/v1/workflows/alleles/<int:allele_id>"
@@ -323,6 +323,7 @@ class AttachmentListResponse(ResponseValidator):
 
 class AttachmentPostResponse(ResponseValidator):
     id: int
+    thumbnail_status: Optional[ThumbnailStatus] = None
 
     endpoints = {
         "/api/v1/attachments/<int:attachment_id>": ResourceMethods.POST,
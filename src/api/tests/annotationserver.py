@@ -3,9 +3,20 @@ import re
 import socket
 import os
 import json
+import time
 
 app = Flask(__name__)
 
+# Simulated response time (seconds) of the annotation service, used when measuring polling throughput
+LATENCY = float(os.environ.get("ANNOTATION_SERVER_LATENCY", 0))
+
+
+@app.before_request
+def simulate_latency():
+    if LATENCY:
+        time.sleep(LATENCY)
+
+
 JOBSTATUS = ["PENDING", "SUCCESS"]
 
 
@@ -0,0 +1,32 @@
+import re
+import subprocess
+import sys
+from typing import Set, Tuple
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_time(code: str) -> Tuple[float, Set[str]]:
+    """
+    Runs code in a new interpreter with -X importtime.
+
+    Returns total import time in seconds (sum over top level imports) and the imported modules.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        modules.add(module)
+        if not indent:
+            total_us += int(cumulative)
+    return total_us / 1e6, modules
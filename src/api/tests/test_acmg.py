@@ -0,0 +1,71 @@
+import time
+
+from datalayer.acmgdataloader import acmg_result_cache
+from vardb.datamodel import allele, annotation
+
+GP_NAME = "HBOCUTV"
+GP_VERSION = "v1.0.0"
+ACMG_PATH = "/api/v1/acmg/alleles/"
+
+# Number of alleles in the benchmark, like a typical analysis
+NUM_ALLELES = 300
+
+
+def _post(client, allele_ids, referenceassessments=None):
+    start = time.time()
+    r = client.post(
+        ACMG_PATH,
+        {
+            "allele_ids": allele_ids,
+            "gp_name": GP_NAME,
+            "gp_version": GP_VERSION,
+            "referenceassessments": referenceassessments or [],
+        },
+    )
+    elapsed = time.time() - start
+    assert r.status_code == 200
+    return r.get_json(), elapsed
+
+
+def _codes(result, allele_id):
+    return [c["code"] for c in result[str(allele_id)]["codes"]]
+
+
+def test_acmg_suggestions_cached(client, test_database, session):
+    test_database.refresh()
+    acmg_result_cache.clear()
+
+    allele_ids = (
+        session.query(allele.Allele.id)
+        .join(annotation.Annotation)
+        .filter(annotation.Annotation.date_superceeded.is_(None))
+        .order_by(allele.Allele.id)
+        .limit(NUM_ALLELES)
+        .scalar_all()
+    )
+    allele_id = allele_ids[0]
+    segregation = [
+        {
+            "allele_id": allele_id,
+            "reference_id": 1,
+            "evaluation": {"ref_segregation": "segr", "ref_segregation_quality": "segr_HQ"},
+        }
+    ]
+
+    uncached, uncached_elapsed = _post(client, allele_ids)
+    cached, cached_elapsed = _post(client, allele_ids)
+    assert cached == uncached
+
+    # Only the allele with the new reference assessment is evaluated again
+    changed, changed_elapsed = _post(client, allele_ids, segregation)
+    assert {"REQ_segregation", "REQ_segregation_HQ"} <= set(_codes(changed, allele_id))
+    assert {k: v for k, v in changed.items() if k != str(allele_id)} == {
+        k: v for k, v in uncached.items() if k != str(allele_id)
+    }
+
+    # Same results when computed from scratch
+    acmg_result_cache.clear()
+    assert _post(client, allele_ids, segregation)[0] == changed
+
+    assert cached_elapsed < uncached_elapsed
+    assert changed_elapsed < uncached_elapsed
@@ -0,0 +1,123 @@
+import logging
+import time
+
+from sqlalchemy import text
+
+from vardb.datamodel import genotype, sample
+
+log = logging.getLogger(__name__)
+
+NUM_ANALYSES = 10000
+ALLELES_PER_ANALYSIS = 20
+
+
+def _genotype_analysis_alleles(session):
+    analysis_alleles = set()
+    for analysis_id, allele_id, secondallele_id, sample_id in session.query(
+        sample.Sample.analysis_id,
+        genotype.Genotype.allele_id,
+        genotype.Genotype.secondallele_id,
+        genotype.Genotype.sample_id,
+    ).join(genotype.Genotype.sample):
+        analysis_alleles.add((analysis_id, allele_id, sample_id))
+        if secondallele_id is not None:
+            analysis_alleles.add((analysis_id, secondallele_id, sample_id))
+    return analysis_alleles
+
+
+def test_analysis_allele_deposited(test_database, session):
+    test_database.refresh()
+    analysis_alleles = set(session.query(sample.analysis_allele))
+    assert analysis_alleles
+    assert analysis_alleles == _genotype_analysis_alleles(session)
+
+
+def _create_synthetic_analyses(session):
+    """
+    Creates NUM_ANALYSES analyses, each with a proband sample having genotypes
+    for ALLELES_PER_ANALYSIS of the existing alleles.
+    """
+    session.execute(
+        text(
+            """
+            INSERT INTO analysis (name, genepanel_name, genepanel_version, date_deposited)
+            SELECT 'synthetic' || n, a.genepanel_name, a.genepanel_version, now()
+            FROM generate_series(1, :num_analyses) AS n,
+                (SELECT genepanel_name, genepanel_version FROM analysis LIMIT 1) AS a
+            """
+        ),
+        {"num_analyses": NUM_ANALYSES},
+    )
+    session.execute(
+        text(
+            """
+            INSERT INTO sample (identifier, analysis_id, sample_type, proband, affected, date_deposited)
+            SELECT name, id, 'HTS', true, true, now() FROM analysis WHERE name LIKE 'synthetic%'
+            """
+        )
+    )
+    session.execute(
+        text(
+            """
+            INSERT INTO genotype (allele_id, sample_id)
+            SELECT allele.id, sample.id
+            FROM sample
+            JOIN LATERAL (
+                SELECT id FROM allele
+                ORDER BY (id + sample.id) % :num_alleles
+                LIMIT :num_alleles
+            ) AS allele ON true
+            WHERE sample.identifier LIKE 'synthetic%'
+            """
+        ),
+        {"num_alleles": ALLELES_PER_ANALYSIS},
+    )
+    session.execute(
+        text(
+            """
+            INSERT INTO analysis_allele (analysis_id, allele_id, sample_id)
+            SELECT sample.analysis_id, genotype.allele_id, genotype.sample_id
+            FROM genotype JOIN sample ON sample.id = genotype.sample_id
+            WHERE sample.identifier LIKE 'synthetic%'
+            """
+        )
+    )
+    session.commit()
+
+
+def test_analysis_allele_lookups(test_database, session, client):
+    test_database.refresh()
+    _create_synthetic_analyses(session)
+    assert set(session.query(sample.analysis_allele)) == _genotype_analysis_alleles(session)
+
+    analysis_id = session.query(sample.Analysis.id).order_by(sample.Analysis.id).first()[0]
+    allele_id = (
+        session.query(sample.analysis_allele.c.allele_id)
+        .filter(sample.analysis_allele.c.analysis_id == analysis_id)
+        .first()[0]
+    )
+    expected_analysis_ids = {
+        a_id
+        for a_id, a_allele_id, _ in _genotype_analysis_alleles(session)
+        if a_allele_id == allele_id
+    }
+    assert len(expected_analysis_ids) > 1
+
+    start = time.time()
+    r = client.get(f"/api/v1/workflows/analyses/{analysis_id}/stats/")
+    stats_elapsed = time.time() - start
+    assert r.status_code == 200
+    assert r.get_json()["allele_count"] == len(
+        [a for a in _genotype_analysis_alleles(session) if a[0] == analysis_id]
+    )
+
+    start = time.time()
+    r = client.get(f"/api/v1/alleles/{allele_id}/analyses/")
+    analyses_elapsed = time.time() - start
+    assert r.status_code == 200
+    assert {a["id"] for a in r.get_json()} == expected_analysis_ids
+
+    log.info(
+        f"With {NUM_ANALYSES} analyses: stats in {stats_elapsed * 1000:.1f} ms, "
+        f"analyses for allele in {analyses_elapsed * 1000:.1f} ms"
+    )
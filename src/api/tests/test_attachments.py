@@ -1,5 +1,9 @@
 import base64
 import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from api import thumbnails
 from vardb.datamodel import attachment
 
 # Base 64 representation of a png with the ella logo
@@ -28,3 +32,43 @@ def test_attachments(session, client):
 
     assert r.status_code == 200
     assert r.get_data() == base64.b64decode(B64_DATA)
+
+
+def test_thumbnail_worker(session, client, monkeypatch):
+    # Make content unique, so no thumbnail exists from an earlier upload
+    f = tempfile.NamedTemporaryFile("wb", delete=False)
+    f.write(base64.b64decode(B64_DATA) + uuid.uuid4().bytes)
+    f.close()
+
+    with client.app.test_client() as c:
+        client.ensure_logged_in(c, "testuser1")
+        r = c.post("/api/v1/attachments/upload/", data={"file": (open(f.name, "rb"), "ella.png")})
+
+    assert r.status_code == 200
+    assert r.get_json()["thumbnail_status"] == "PENDING"
+    attachment_id = r.get_json()["id"]
+
+    # Placeholder (None) is returned until thumbnail is created
+    r = client.get("/api/v1/attachments/")
+    listed = next(a for a in r.get_json() if a["id"] == attachment_id)
+    assert listed["thumbnail_status"] == "PENDING"
+    assert listed["thumbnail"] is None
+
+    # Don't depend on imagemagick in test
+    def fake_create_thumbnail(sha256):
+        thumbnails.get_thumbnail_path(sha256).write_bytes(b"thumbnail")
+        return True
+
+    monkeypatch.setattr(thumbnails, "create_thumbnail", fake_create_thumbnail)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert thumbnails.process_pending(session, executor, 10) >= 1
+        assert thumbnails.process_pending(session, executor, 10) == 0
+
+    attachment_obj = session.query(attachment.Attachment).get(attachment_id)
+    session.refresh(attachment_obj)
+    assert attachment_obj.thumbnail_status == "DONE"
+
+    r = client.get("/api/v1/attachments/")
+    listed = next(a for a in r.get_json() if a["id"] == attachment_id)
+    assert listed["thumbnail_status"] == "DONE"
+    assert base64.b64decode(listed["thumbnail"]) == b"thumbnail"
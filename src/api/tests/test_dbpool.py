@@ -0,0 +1,87 @@
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from psycopg2.extensions import QueryCanceledError
+
+from vardb.util.db import DB, role_settings
+
+log = logging.getLogger(__name__)
+
+NUM_THREADS = 20
+QUERIES_PER_THREAD = 50
+
+
+@pytest.fixture
+def api_db(monkeypatch):
+    monkeypatch.setenv("DB_API_POOL_SIZE", "4")
+    monkeypatch.setenv("DB_API_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_API_STATEMENT_TIMEOUT", "500")
+    db = DB(role="api")
+    db.connect()
+    yield db
+    db.disconnect()
+
+
+def test_role_settings(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_CLI_POOL_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    assert role_settings("cli")["pool_size"] == 2
+    assert role_settings("api")["pool_size"] == 3
+    assert role_settings("api")["pool_pre_ping"] is False
+    assert role_settings("default")["statement_timeout"] == 0
+    with pytest.raises(AssertionError):
+        DB(role="nonexisting")
+
+
+def test_timeouts(api_db):
+    session = api_db.session()
+    assert session.execute("SHOW statement_timeout").scalar() == "500ms"
+    assert session.execute("SHOW idle_in_transaction_session_timeout").scalar() == "1min"
+    # Database errors are re-raised unwrapped by the handle_error listener
+    with pytest.raises(QueryCanceledError, match="statement timeout"):
+        session.execute("SELECT pg_sleep(2)")
+    session.close()
+
+
+def test_pool_under_load(api_db):
+    """
+    Runs more concurrent threads than there are connections in the pool,
+    and checks that all queries succeed, with wait times recorded.
+    """
+
+    def run_queries():
+        latencies = []
+        for _ in range(QUERIES_PER_THREAD):
+            start = time.monotonic()
+            api_db.session.execute("SELECT count(*) FROM allele").scalar()
+            api_db.session.remove()
+            latencies.append(time.monotonic() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+        futures = [executor.submit(run_queries) for _ in range(NUM_THREADS)]
+        latencies = sorted(l for f in futures for l in f.result())
+
+    assert len(latencies) == NUM_THREADS * QUERIES_PER_THREAD
+    status = api_db.pool_status()
+    assert status["checkouts"] >= NUM_THREADS * QUERIES_PER_THREAD
+    assert status["max_wait"] > 0
+
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    log.info(
+        f"{NUM_THREADS} threads, {len(latencies)} queries: p50 {p50 * 1000:.1f} ms, "
+        f"p99 {p99 * 1000:.1f} ms, mean checkout wait {status['mean_wait'] * 1000:.1f} ms, "
+        f"max checkout wait {status['max_wait'] * 1000:.1f} ms"
+    )
+
+
+def test_server_timing_header(client, test_database):
+    test_database.refresh()
+    r = client.get("/api/v1/config/")
+    assert r.status_code == 200
+    assert r.headers["Server-Timing"].startswith("db-checkout;dur=")
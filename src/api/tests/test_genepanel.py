@@ -76,6 +76,24 @@ class TestGenepanel(object):
 
         assert set(created_usergroups) == set(genepanel_to_copy["usergroups"])
 
+        # Check that gene set is stored for similarity comparison
+        signature = (
+            session.query(gene.GenepanelSignature)
+            .filter(
+                gene.GenepanelSignature.genepanel_name == genepanel_to_copy["name"],
+                gene.GenepanelSignature.genepanel_version == genepanel_to_copy["version"],
+            )
+            .one()
+        )
+        assert signature.gene_ids == sorted(set(t.gene_id for t in original.transcripts))
+
+        r = client.get("/api/v1/genepanels/{name}/{version}/stats/".format(**genepanel_to_copy))
+        assert r.status_code == 200
+        assert all(
+            (p["name"], p["version"]) != (genepanel_to_copy["name"], genepanel_to_copy["version"])
+            for p in r.get_json()["overlap"]
+        )
+
         # Check testgroup01 not allowed to import to testgroup03
         genepanel_to_copy["name"] = "NewPanel2"
         genepanel_to_copy["version"] = "NewVersion2"
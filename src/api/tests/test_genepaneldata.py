@@ -0,0 +1,92 @@
+from sqlalchemy import event
+
+from api.v1.resources.workflow.helpers import load_genepanel_for_allele_ids
+from datalayer import queries
+from datalayer.genepaneldata import genepanel_data_cache
+from datalayer.genepanelsimilarity import update_genepanel_signature
+from vardb.datamodel import allele, annotationshadow, gene
+
+GP_NAME = "HBOC"
+GP_VERSION = "v1.0.0"
+
+
+class StatementCounter:
+    def __init__(self, session):
+        self.engine = session.get_bind()
+        self.count = 0
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def test_load_genepanel_for_allele_ids(test_database, session):
+    test_database.refresh()
+    genepanel_data_cache.clear()
+
+    allele_ids = session.query(allele.Allele.id).order_by(allele.Allele.id).limit(20).scalar_all()
+
+    with StatementCounter(session) as first_load:
+        data = load_genepanel_for_allele_ids(session, allele_ids, GP_NAME, GP_VERSION)
+    with StatementCounter(session) as repeated_load:
+        repeated = load_genepanel_for_allele_ids(session, allele_ids, GP_NAME, GP_VERSION)
+    assert repeated == data
+    assert repeated_load.count < first_load.count
+
+    assert (data["name"], data["version"]) == (GP_NAME, GP_VERSION)
+
+    expected_transcripts = set(
+        r.genepanel_transcript
+        for r in queries.annotation_transcripts_genepanel(
+            session, [(GP_NAME, GP_VERSION)], allele_ids=allele_ids
+        )
+    )
+    assert expected_transcripts
+    assert set(t["transcript_name"] for t in data["transcripts"]) == expected_transcripts
+
+    hgnc_ids = set(
+        session.query(annotationshadow.AnnotationShadowTranscript.hgnc_id)
+        .filter(annotationshadow.AnnotationShadowTranscript.allele_id.in_(allele_ids))
+        .scalar_all()
+    )
+    expected_phenotype_ids = set(
+        session.query(gene.Phenotype.id)
+        .join(gene.genepanel_phenotype)
+        .filter(
+            gene.genepanel_phenotype.c.genepanel_name == GP_NAME,
+            gene.genepanel_phenotype.c.genepanel_version == GP_VERSION,
+            gene.Phenotype.gene_id.in_(hgnc_ids),
+        )
+        .scalar_all()
+    )
+    assert set(p["id"] for p in data["phenotypes"]) == expected_phenotype_ids
+    assert set(i["hgnc_id"] for i in data["inheritances"]) <= hgnc_ids
+    assert set(t["gene"]["hgnc_id"] for t in data["transcripts"]) <= set(
+        i["hgnc_id"] for i in data["inheritances"]
+    )
+
+    # Cached data is reloaded when the genepanel is updated
+    genepanel = (
+        session.query(gene.Genepanel)
+        .filter(gene.Genepanel.name == GP_NAME, gene.Genepanel.version == GP_VERSION)
+        .one()
+    )
+    removed = next(
+        t
+        for t in genepanel.transcripts
+        if t.transcript_name == data["transcripts"][0]["transcript_name"]
+    )
+    genepanel.transcripts = [t for t in genepanel.transcripts if t.id != removed.id]
+    session.flush()
+    update_genepanel_signature(session, GP_NAME, GP_VERSION)
+
+    updated = load_genepanel_for_allele_ids(session, allele_ids, GP_NAME, GP_VERSION)
+    assert set(t["transcript_name"] for t in updated["transcripts"]) == expected_transcripts - {
+        removed.transcript_name
+    }
@@ -0,0 +1,39 @@
+import json
+import sys
+
+from api.main import app
+from api.tests.importtime_helper import import_time
+from api.v1.lazyresource import LazyResourceView, load_resources
+
+# Ceiling for importing the app, well above the expected time to avoid flaky tests
+APP_IMPORT_CEILING = 2.0
+
+
+def test_app_import_time():
+    elapsed, modules = import_time("import api.main")
+
+    # Resources, and the datalayer and rule engine they use, are imported on first request
+    assert not any(m.startswith("api.v1.resources") for m in modules)
+    assert not any(m.startswith("datalayer") for m in modules)
+    assert elapsed < APP_IMPORT_CEILING
+
+
+def test_resources_loaded_on_request(client):
+    # Unsupported methods are rejected after loading the resource
+    response = client.delete("/api/v1/config/", {})
+    assert response.status_code == 405
+
+    response = client.get("/api/v1/specs/")
+    assert response.status_code == 200
+    # The spec is served as text/html
+    paths = json.loads(response.get_data())["paths"]
+    assert "/api/v1/workflows/analyses/{analysis_id}/stats/" in paths
+
+
+def test_load_resources():
+    # Used when preloading the app before forking gunicorn workers (see api/preload.py)
+    load_resources(app)
+    views = [v for v in app.view_functions.values() if isinstance(v, LazyResourceView)]
+    assert views
+    assert all(v._view is not None for v in views)
+    assert "rule_engine.mapping_rules" in sys.modules
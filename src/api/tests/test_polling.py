@@ -1,27 +1,36 @@
 """Testing is done by using a dummy annotation server.
 This server is specified in ./annotationserver.py
 and started in fixture"""
+import logging
 import multiprocessing
 import re
 import socket
 import time
 import urllib
 
+import psycopg2
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 from api.polling import (
     ANNOTATION_SERVICE_URL,
     AnnotationJobsInterface,
     AnnotationServiceInterface,
+    ConcurrentPoller,
+    deposit_annotated,
     process_annotated,
     process_running,
     process_submitted,
 )
+from vardb.datamodel import DB
+from vardb.datamodel.annotationjob import AnnotationJob
 
 from .annotationserver import app
 
 ANNOTATION_JOBS_PATH = "/api/v1/import/service/jobs/"
 
+log = logging.getLogger(__name__)
+
 
 @pytest.yield_fixture(scope="module", autouse=True)
 def annotationserver():
@@ -169,3 +178,122 @@ def test_polling(session, client, test_database):
 
     id, update = updates_annotated[0]
     assert re.match("OSError: /tmp/.*? is not valid bcf or vcf .*", update["message"])
+
+
+def test_concurrent_polling(session, client, test_database):
+    test_database.refresh()
+    num_jobs = 20
+    for i in range(num_jobs):
+        data = dict(
+            mode="Analysis",
+            user_id=1,
+            data="Dummy vcf data for testing",
+            genepanel_name="HBOC",
+            genepanel_version="v1.0.0",
+            properties=dict(
+                analysis_name=f"concurrent{i}", create_or_append="Create", sample_type="HTS"
+            ),
+        )
+        response = client.post(ANNOTATION_JOBS_PATH, data=data)
+        assert response.status_code == 200
+
+    db = DB()
+    db.connect()
+    poller = ConcurrentPoller(
+        db.session,
+        ANNOTATION_SERVICE_URL,
+        service_workers=4,
+        deposit_workers=2,
+        service_timeout=10,
+        poll_interval=0.1,
+    )
+    try:
+        start = time.time()
+        while poller.num_finished < num_jobs:
+            assert time.time() - start < 120, "Timed out waiting for jobs to finish"
+            poller.run_once()
+            # Never more annotated jobs in flight than there are deposit workers
+            assert len(poller.depositing) <= 2
+            time.sleep(poller.poll_interval)
+        elapsed = time.time() - start
+    finally:
+        poller.shutdown()
+        db.disconnect()
+
+    log.info(
+        f"Polled {num_jobs} jobs in {elapsed:.2f}s ({num_jobs / elapsed * 60:.0f} jobs/minute)"
+    )
+
+    # The dummy annotation server returns data that fails deposit
+    session.expire_all()
+    statuses = [
+        s for (s,) in session.query(AnnotationJob.status).filter(AnnotationJob.data.isnot(None))
+    ]
+    assert len(statuses) == num_jobs
+    assert set(statuses) == {"FAILED (DEPOSIT)"}
+
+
+def test_concurrent_polling_backoff(session, test_database):
+    "Jobs are left untouched and retried later when the annotation service is unreachable"
+    test_database.refresh()
+    session.add(
+        AnnotationJob(
+            mode="Analysis",
+            user_id=1,
+            data="Dummy vcf data for testing",
+            genepanel_name="HBOC",
+            genepanel_version="v1.0.0",
+            properties=dict(analysis_name="backoff", create_or_append="Create", sample_type="HTS"),
+        )
+    )
+    session.commit()
+
+    db = DB()
+    db.connect()
+    # Nothing listens on port 1
+    poller = ConcurrentPoller(
+        db.session, "http://localhost:1", service_workers=1, deposit_workers=1, poll_interval=0.1
+    )
+    try:
+        poller.run_once()
+        while poller.in_flight:
+            time.sleep(0.1)
+            poller.collect()
+        assert len(poller.backoff) == 1
+        attempts, next_attempt = next(iter(poller.backoff.values()))
+        assert attempts == 1
+        assert next_attempt > time.time()
+
+        # Not dispatched again while in backoff
+        poller.dispatch()
+        assert not poller.in_flight
+    finally:
+        poller.shutdown()
+        db.disconnect()
+
+    session.expire_all()
+    assert session.query(AnnotationJob.status).scalar() == "SUBMITTED"
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        IntegrityError("INSERT INTO allele ...", {}, Exception("duplicate key")),
+        psycopg2.IntegrityError("duplicate key"),
+    ],
+)
+def test_deposit_annotated_conflict(session, test_database, error):
+    "Deposits conflicting with a concurrent deposit are left to be retried"
+    test_database.refresh()
+
+    class ConflictingAnnotationJobs(AnnotationJobsInterface):
+        def deposit(self, id, annotated_vcf):
+            raise error
+
+    annotation_jobs = ConflictingAnnotationJobs(session)
+    with pytest.raises(type(error)):
+        deposit_annotated(annotation_jobs, 1, "", retry_conflicts=True)
+
+    update = deposit_annotated(annotation_jobs, 1, "")
+    assert update["status"] == "FAILED (DEPOSIT)"
+    assert update["message"].startswith("IntegrityError")
@@ -2,7 +2,7 @@ from sqlalchemy import tuple_
 
 from conftest import mock_allele_with_annotation
 from datalayer import queries
-from vardb.datamodel import gene
+from vardb.datamodel import annotationshadow, gene
 
 
 def test_distinct_inheritance_hgnc_ids_for_genepanel(session):
@@ -210,3 +210,36 @@ def test_annotation_transcripts_genepanel(session, test_database):
     assert set(result) == set(passes)
 
     session.rollback()
+
+
+def test_transcript_base_and_version(session, test_database):
+    test_database.refresh()
+
+    transcripts = ["NM_1.2", "NM_1", "NM_1.3_sometext", "ENST00000530893", "NM_1.x"]
+    a, _ = mock_allele_with_annotation(
+        session, annotations={"transcripts": [{"transcript": t, "hgnc_id": 1} for t in transcripts]}
+    )
+    session.flush()
+
+    shadow_transcripts = {
+        t.transcript: (t.transcript_base, t.transcript_version)
+        for t in session.query(annotationshadow.AnnotationShadowTranscript).filter(
+            annotationshadow.AnnotationShadowTranscript.allele_id == a.id
+        )
+    }
+    assert shadow_transcripts == {
+        "NM_1.2": ("NM_1", 2),
+        "NM_1": ("NM_1", None),
+        "NM_1.3_sometext": ("NM_1", 2.5),
+        "ENST00000530893": ("ENST00000530893", None),
+        "NM_1.x": ("NM_1", None),
+    }
+
+    # Genepanel transcripts have the same columns
+    tx = (
+        session.query(gene.Transcript)
+        .filter(gene.Transcript.transcript_name.op("~")(r"^NM_[0-9]+\.[0-9]+$"))
+        .first()
+    )
+    assert tx.transcript_base == tx.transcript_name.split(".")[0]
+    assert tx.transcript_version == int(tx.transcript_name.split(".")[1])
@@ -1,5 +1,8 @@
 import pytest
 import json
+import time
+
+from api.v1.resources.search import SearchResultCache, escape_like
 from .util import FlaskClientProxy
 
 
@@ -35,3 +38,58 @@ def test_search(client, query, expected_analysis_ids, expected_allele_ids):
 
     assert set(allele_ids) == set(expected_allele_ids)
     assert set(analysis_ids) == set(expected_analysis_ids)
+
+
+def test_search_paging(client):
+    query = {"type": "alleles", "gene": {"hgnc_id": 1101}, "freetext": "p.glu"}
+    response = client.get("/api/v1/search/?q={}".format(json.dumps(query)))
+    all_allele_ids = [a["allele"]["id"] for a in response.json["alleles"]]
+
+    paged_allele_ids = []
+    for page in [1, 2, 3]:
+        response = client.get(
+            "/api/v1/search/?q={}&page={}&per_page=2".format(json.dumps(query), page)
+        )
+        assert response.headers["Total-Count"] == str(len(all_allele_ids))
+        paged_allele_ids.extend(a["allele"]["id"] for a in response.json["alleles"])
+    assert paged_allele_ids == all_allele_ids
+
+    # Limit caps the total count and results, which are any of the matches
+    response = client.get("/api/v1/search/?q={}&limit=3".format(json.dumps(query)))
+    assert response.headers["Total-Count"] == "3"
+    limited_allele_ids = [a["allele"]["id"] for a in response.json["alleles"]]
+    assert len(limited_allele_ids) == 3
+    assert set(limited_allele_ids) < set(all_allele_ids)
+
+    # Pages past the limit are empty
+    response = client.get(
+        "/api/v1/search/?q={}&limit=3&page=3&per_page=2".format(json.dumps(query))
+    )
+    assert response.headers["Total-Count"] == "3"
+    assert response.json["alleles"] == []
+
+
+def test_escape_like():
+    assert escape_like("c.123_124del") == "c.123\\_124del"
+    assert escape_like("100%") == "100\\%"
+    assert escape_like("a\\b") == "a\\\\b"
+
+
+def test_search_result_cache(monkeypatch):
+    cache = SearchResultCache(max_entries_per_user=2, max_age=60)
+    cache.put(1, "a", ([1], 1))
+    cache.put(1, "b", ([2], 1))
+    cache.put(2, "a", ([3], 1))
+    assert cache.get(1, "a") == ([1], 1)
+    assert cache.get(2, "a") == ([3], 1)
+
+    # Least recently used entry is evicted per user
+    cache.put(1, "c", ([4], 1))
+    assert cache.get(1, "b") is None
+    assert cache.get(1, "a") == ([1], 1)
+    assert cache.get(2, "a") == ([3], 1)
+
+    # Entries expire
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(1, "a") is None
@@ -1,10 +1,15 @@
+import time
 from typing import List
 
 from api.config import config
 from api.v1.resources.workflow.similaralleles import get_nearby_allele_ids
 from conftest import mock_allele
+from sqlalchemy import text
 from vardb.datamodel import allele, assessment
 
+# Number of synthetic alleles after each step of test_nearbyalleles_scaling
+NUM_ALLELES_STEPS = [10000, 100000, 1000000]
+
 
 def test_nearbyalleles(session, test_database, client):
     genepanel_name = "HBOC"
@@ -122,3 +127,87 @@ def test_similaralleles(session, test_database, client):
     assert list(map(lambda x: x["id"], similar_alleles["4"])) == [2, 1]
     assert list(map(lambda x: x["id"], similar_alleles["5"])) == [2, 1]
     assert list(map(lambda x: x["id"], similar_alleles["6"])) == []
+
+
+def _insert_synthetic_alleles(session, first: int, last: int):
+    """
+    Inserts SNVs on chromosome BENCH at positions first*10, ..., last*10, and assesses every
+    tenth of them.
+    """
+    session.execute(
+        text(
+            """
+            INSERT INTO allele (
+                genome_reference, chromosome, start_position, open_end_position, change_from,
+                change_to, change_type, caller_type, vcf_pos, vcf_ref, vcf_alt, length
+            )
+            SELECT 'GRCh37', 'BENCH', n * 10, n * 10 + 1, 'A', 'C', 'SNP', 'snv', n * 10 + 1,
+                'A', 'C', 1
+            FROM generate_series(:first, :last) AS n
+            """
+        ),
+        {"first": first, "last": last},
+    )
+    session.execute(
+        text(
+            """
+            INSERT INTO alleleassessment (
+                classification, evaluation, user_id, date_created, allele_id, genepanel_name,
+                genepanel_version
+            )
+            SELECT '3', '{}', 1, now(), id, 'HBOC', 'v1.0.0'
+            FROM allele
+            WHERE chromosome = 'BENCH' AND start_position BETWEEN :first * 10 AND :last * 10
+                AND start_position % 100 = 0
+            """
+        ),
+        {"first": first, "last": last},
+    )
+    session.execute(text("ANALYZE allele"))
+    session.execute(text("ANALYZE alleleassessment"))
+
+
+def test_nearbyalleles_scaling(session, test_database):
+    test_database.refresh()
+    config["similar_alleles"]["max_genomic_distance"] = 50
+    config["similar_alleles"]["max_variants"] = 100
+
+    num_inserted = 0
+    timings = []
+    for num_alleles in NUM_ALLELES_STEPS:
+        _insert_synthetic_alleles(session, num_inserted + 1, num_alleles)
+        num_inserted = num_alleles
+
+        query_allele_ids = [
+            a_id
+            for (a_id,) in session.query(allele.Allele.id)
+            .filter(
+                allele.Allele.chromosome == "BENCH",
+                allele.Allele.start_position >= num_alleles * 5,
+                allele.Allele.start_position % 100 == 50,
+            )
+            .order_by(allele.Allele.start_position)
+            .limit(10)
+        ]
+
+        start = time.time()
+        nearby = get_nearby_allele_ids(session, query_allele_ids)
+        timings.append(time.time() - start)
+
+        # Assessed alleles at the two closest multiples of 100 lie within 50 bp of the query allele
+        for a_id in query_allele_ids:
+            assert len(nearby[a_id]) == 2
+
+    # Lookup time does not grow with the number of alleles (100x from first to last step)
+    assert timings[-1] < 10 * timings[0]
+
+    # Overlap is resolved using the GiST index, not by scanning all alleles on the chromosome
+    plan = session.execute(
+        text(
+            """
+            EXPLAIN SELECT id FROM allele
+            WHERE chromosome = 'BENCH' AND region && int4range(1000, 2000)
+            """
+        )
+    )
+    assert any("ix_allele_chromosome_region" in line for (line,) in plan)
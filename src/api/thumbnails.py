@@ -0,0 +1,184 @@
+"""
+Thumbnail worker
+
+Creates thumbnails for uploaded attachments. The attachment table doubles as the job queue:
+AttachmentResource.post stores new attachments with thumbnail_status "PENDING", and this worker
+claims pending rows (using SELECT ... FOR UPDATE SKIP LOCKED, so several workers can run side
+by side), runs imagemagick on them and stores the result as "DONE" or "FAILED".
+"""
+import argparse
+import logging
+import os
+import pathlib
+import subprocess
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from vardb.datamodel import attachment
+
+from api.config import config
+
+log = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2
+NUM_WORKERS = int(os.environ.get("ELLA_THUMBNAIL_WORKERS", 2))
+BATCH_SIZE = int(os.environ.get("ELLA_THUMBNAIL_BATCH_SIZE", 10))
+CONVERT_TIMEOUT = 120
+
+
+def get_attachment_path(sha256: str) -> pathlib.Path:
+    return pathlib.Path(config["app"]["attachment_storage"], sha256[:2], sha256)
+
+
+def get_thumbnail_path(sha256: str) -> pathlib.Path:
+    return get_attachment_path(sha256).with_suffix(".thumbnail")
+
+
+def create_thumbnail(sha256: str) -> bool:
+    """
+    Use imagemagick to convert first page/frame of attachment to a jpeg thumbnail with a width of 300.
+
+    Returns True if the thumbnail exists after conversion.
+    """
+    path = get_attachment_path(sha256)
+    thumbnail_path = get_thumbnail_path(sha256)
+    if thumbnail_path.is_file():
+        return True
+
+    # Write to temporary file first, to avoid serving partially written thumbnails
+    tmp_thumbnail_path = thumbnail_path.with_name(thumbnail_path.name + ".tmp")
+    cmd = [
+        "convert",
+        f"{path}[0]",
+        "-thumbnail",
+        "300",
+        "-gravity",
+        "center",
+        "-background",
+        "white",
+        "-quality",
+        "90",
+        "-extent",
+        "300x300",
+        f"jpeg:{tmp_thumbnail_path}",
+    ]
+    try:
+        subprocess.run(
+            cmd,
+            check=True,
+            timeout=CONVERT_TIMEOUT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        tmp_thumbnail_path.rename(thumbnail_path)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        if tmp_thumbnail_path.exists():
+            tmp_thumbnail_path.unlink()
+    return thumbnail_path.is_file()
+
+
+def claim_pending(session: Session, limit: int) -> List[Tuple[int, str]]:
+    """
+    Lock up to `limit` attachments with pending thumbnails.
+
+    Rows are locked until the session commits, and rows locked by other workers are skipped.
+    """
+    return (
+        session.query(attachment.Attachment.id, attachment.Attachment.sha256)
+        .filter(attachment.Attachment.thumbnail_status == "PENDING")
+        .order_by(attachment.Attachment.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def process_pending(session: Session, executor: ThreadPoolExecutor, batch_size: int) -> int:
+    """
+    Create thumbnails for one batch of pending attachments.
+
+    Returns number of attachments processed.
+    """
+    pending = claim_pending(session, batch_size)
+    if not pending:
+        session.commit()
+        return 0
+
+    results = executor.map(create_thumbnail, [sha256 for _, sha256 in pending])
+    for (attachment_id, sha256), created in zip(pending, results):
+        status = "DONE" if created else "FAILED"
+        session.query(attachment.Attachment).filter(
+            attachment.Attachment.id == attachment_id
+        ).update({"thumbnail_status": status}, synchronize_session=False)
+        log.info(f"Thumbnail for attachment {attachment_id} ({sha256}): {status}")
+
+    session.commit()
+    return len(pending)
+
+
+def thumbnail_worker(session, num_workers: int = NUM_WORKERS, batch_size: int = BATCH_SIZE):
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        while True:
+            try:
+                session.connection()
+
+                if "attachment" not in session.bind.table_names():
+                    # Database is not populated
+                    session.remove()
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                # Keep going while there is a backlog, only sleep when the queue is drained
+                processed = process_pending(session, executor, batch_size)
+                session.remove()
+                if processed < batch_size:
+                    time.sleep(POLL_INTERVAL)
+            except OperationalError as e:
+                # Database is not alive
+                log.warning("Failed to process thumbnails (%s)" % e)
+                session.remove()
+                time.sleep(POLL_INTERVAL)
+                continue
+            except Exception:
+                session.remove()
+                traceback.print_exc()
+                raise
+
+
+if __name__ == "__main__":
+    from applogger import setup_logger
+
+    setup_logger()
+
+    parser = argparse.ArgumentParser(description="Create thumbnails for uploaded attachments.")
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=NUM_WORKERS,
+        help="Number of concurrent thumbnail conversions (default: $ELLA_THUMBNAIL_WORKERS or 2)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        default=BATCH_SIZE,
+        help="Number of attachments claimed per batch (default: $ELLA_THUMBNAIL_BATCH_SIZE or 10)",
+    )
+    args = parser.parse_args()
+
+    from vardb.datamodel import DB
+
+    db = DB(role="polling")
+    db.connect()
+
+    log.info(
+        "Starting thumbnail worker ({} workers, batch size {})".format(
+            args.workers, args.batch_size
+        )
+    )
+    thumbnail_worker(db.session, num_workers=args.workers, batch_size=args.batch_size)
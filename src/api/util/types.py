@@ -279,6 +279,12 @@ class AnnotationMode(StrEnum):
     SINGLE_VARIANT = "Single variant"
 
 
+class ThumbnailStatus(StrEnum):
+    PENDING = "PENDING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
 ###
 
 
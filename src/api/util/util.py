@@ -5,7 +5,6 @@ import json
 import os
 import time
 from functools import wraps
-from pathlib import Path
 from typing import Any, Callable, Dict, List, Mapping, Optional, Type
 
 import pytz
@@ -18,10 +17,10 @@ from api.util.types import StrDict
 from api.util.useradmin import get_usersession_by_token
 from flask import Response, g, request
 import flask
-from jsonschema import Draft7Validator, RefResolver, validate
 from pydantic.error_wrappers import ValidationError
 from pydantic.json import pydantic_encoder
 from vardb.datamodel.log import ResourceLog
+from vardb.util import jsonschemavalidator
 
 log = app.logger
 
@@ -37,31 +36,10 @@ def jsonschema_validate(schema_path, data, base_schema_path=None):
     If base_schema_path is provided, it supports referencing relative schemas
     by using { "$ref": "file://anotherSchema.json" }
     which will be relative to base_schema_path
-    """
-
-    with open(schema_path) as f:
-        schema = json.load(f)
-
-    if not base_schema_path:
-        validate(instance=data, schema=schema)
-    else:
 
-        def jsonschema_handler(uri):
-            """
-            Handles resolving relative file:// paths, prepending
-            the local base_schema_path
-            """
-            resolve_schema_path = Path(uri.replace("file://", ""))
-            if resolve_schema_path.is_absolute():
-                return json.loads(resolve_schema_path.read_text())
-            else:
-                local_path = Path(base_schema_path) / resolve_schema_path
-                return json.loads(local_path.read_text())
-
-        resolver = RefResolver.from_schema(schema, handlers={"file": jsonschema_handler})
-        validator = Draft7Validator(schema, resolver=resolver)
-        validator.check_schema(schema)
-        validator.validate(data)
+    The compiled validator is cached, see vardb/util/jsonschemavalidator.py.
+    """
+    jsonschemavalidator.validate(schema_path, data, base_schema_path=base_schema_path)
 
 
 # https://gist.github.com/angstwad/bf22d1822c38a92ec0a9
@@ -1,3 +1 @@
 from .apiv1 import ApiV1
-from . import resources
-from datalayer import queries
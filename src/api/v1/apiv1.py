@@ -1,10 +1,11 @@
-from api import schemas
-from api.v1 import resources as r
 from api.v1.docs import ApiV1Docs
-from api.v1.resource import Resource
+from api.v1.lazyresource import LAZY_RESOURCE_METHODS, LazyResource, LazyResourceView
 from flask import Flask
 from flask_restful import Api
 
+# Resources are referenced by import path (e.g. r.user.UserResource), and imported on first use
+r = LazyResource("api.v1.resources")
+
 
 class ApiV1(object):
     def __init__(self, app: Flask, api: Api):
@@ -16,6 +17,8 @@ class ApiV1(object):
         """
         Loads our marshmallow schemas into docs.
         """
+        from api import schemas
+
         self.api_v1_docs.add_schema("Analysis", schemas.AnalysisSchema())
         self.api_v1_docs.add_schema(
             "AnalysisInterpretation", schemas.AnalysisInterpretationSchema()
@@ -36,19 +39,26 @@ class ApiV1(object):
         self.api_v1_docs.add_schema("CustomAnnotation", schemas.CustomAnnotationSchema())
         self.api_v1_docs.add_schema("Genotype", schemas.GenotypeSchema())
 
-    def _add_resource(self, resource: Resource, *paths: str):
+    def _add_resource(self, resource: LazyResource, *paths: str):
         """
         Add resource to both restful api and to docs.
         """
-        self.api.add_resource(resource, *paths)
-        self.api_v1_docs.add_resource(paths[0], resource)
+        endpoint = resource.name.lower()
+        assert endpoint not in self.api.endpoints, f"Endpoint {endpoint} is already registered"
+        self.api.endpoints.add(endpoint)
+        view = LazyResourceView(self.api, resource, endpoint)
+        for path in paths:
+            self.app.add_url_rule(
+                path, endpoint=endpoint, view_func=view, methods=LAZY_RESOURCE_METHODS
+            )
+        self.api_v1_docs.add_resource(paths[0], view)
 
     def setup_api(self):
         # Expose swagger UI at /api/v1/docs
         # and expose the api spec at /api/v1/specs/
         self.api_v1_docs.init_api_docs("/api/v1/docs", "/api/v1/specs/")
 
-        self._add_schemas()
+        self.api_v1_docs.defer(self._add_schemas)
 
         # ---------------------------------------------------------------------------------------------------------
         # Rule engine
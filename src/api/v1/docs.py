@@ -1,6 +1,8 @@
 import json
+import threading
+from typing import Callable, List
 
-from api.v1.resource import Resource
+from api.v1.lazyresource import LazyResourceView
 from apispec import APISpec
 from flask import Flask
 from flask_restful import Api
@@ -50,6 +52,10 @@ class ApiV1Docs:
         self.app = app
         self.api = api
         self.specs = self._create_spec()
+        # Adding resources to the spec requires loading them, so it is deferred until the spec
+        # is requested
+        self._deferred: List[Callable[[], None]] = []
+        self._deferred_lock = threading.Lock()
 
     def _create_spec(self):
         """
@@ -74,23 +80,35 @@ class ApiV1Docs:
         # Create closure so the inner function can access the specs object
         # without it needing to be passed to it
         def serve_spec_closure():
-            specs = self.specs
+            get_specs = self.get_specs
 
             def serve_spec():
-                return json.dumps(specs.to_dict())
+                return json.dumps(get_specs().to_dict())
 
             return serve_spec
 
         self.app.add_url_rule(specs_url, "v1_spec", serve_spec_closure())
 
+    def defer(self, f: Callable[[], None]):
+        """
+        Defers f (adding schemas or resources to spec) until spec is requested.
+        """
+        self._deferred.append(f)
+
+    def get_specs(self) -> APISpec:
+        with self._deferred_lock:
+            while self._deferred:
+                self._deferred.pop(0)()
+        return self.specs
+
     def add_schema(self, schema_name: str, schema: Schema):
         """
         Adds Marshmallow schema to specs.
         """
         self.specs.definition(schema_name, schema=schema)
 
-    def add_resource(self, path: str, resource: Resource):
+    def add_resource(self, path: str, view: LazyResourceView):
         """
         Adds 'flask restful' resource to paths in spec.
         """
-        self.specs.add_path(path, api=self.api, resource=resource)
+        self.defer(lambda: self.specs.add_path(path, api=self.api, resource=view.view_class))
@@ -0,0 +1,99 @@
+"""
+Lazy registration of flask_restful resources.
+
+Importing all resource modules (and through them the datalayer, rule engine and pydantic schemas)
+dominates the startup time of the API. Resources are therefore registered by import path, and the
+resource module is first imported when one of its urls is requested.
+"""
+import threading
+from importlib import import_module
+from typing import Callable, Optional, Type
+
+from flask import Flask, request
+from flask_restful import Api
+from werkzeug.exceptions import MethodNotAllowed
+
+from api.v1.resource import Resource
+
+# Methods are unknown until the resource is loaded, so the url rules accept all methods and
+# unsupported methods are rejected by the lazy view.
+LAZY_RESOURCE_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+
+class LazyResource:
+    """
+    Reference to a resource class by import path, built by attribute access:
+
+        r = LazyResource("api.v1.resources")
+        r.user.UserResource  # LazyResource("api.v1.resources.user.UserResource")
+    """
+
+    def __init__(self, import_path: str):
+        self.import_path = import_path
+
+    def __getattr__(self, name: str) -> "LazyResource":
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyResource(f"{self.import_path}.{name}")
+
+    def __repr__(self):
+        return f"<LazyResource('{self.import_path}')>"
+
+    @property
+    def name(self) -> str:
+        return self.import_path.rsplit(".", 1)[1]
+
+    def load(self) -> Type[Resource]:
+        module_path, class_name = self.import_path.rsplit(".", 1)
+        return getattr(import_module(module_path), class_name)
+
+
+class LazyResourceView:
+    """
+    View function for a LazyResource. Loads the resource and creates the flask_restful view
+    (as Api.add_resource would) on first call.
+    """
+
+    def __init__(self, api: Api, resource: LazyResource, endpoint: str):
+        self.api = api
+        self.resource = resource
+        self.endpoint = endpoint
+        self._view: Optional[Callable] = None
+        self._view_class: Optional[Type[Resource]] = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._view is None:
+                resource_class = self.resource.load()
+                resource_class.mediatypes = self.api.mediatypes_method()
+                resource_class.endpoint = self.endpoint
+                view = self.api.output(resource_class.as_view(self.endpoint))
+                for decorator in self.api.decorators:
+                    view = decorator(view)
+                self._view_class = resource_class
+                self._view = view
+
+    def load(self):
+        if self._view is None:
+            self._load()
+
+    @property
+    def view_class(self) -> Type[Resource]:
+        "The resource class, as for views created by flask_restful (used by api docs)"
+        self.load()
+        return self._view_class
+
+    def __call__(self, *args, **kwargs):
+        self.load()
+        methods = self._view_class.methods
+        if request.method not in methods and not (request.method == "HEAD" and "GET" in methods):
+            raise MethodNotAllowed(valid_methods=sorted(methods))
+        return self._view(*args, **kwargs)
+
+
+def load_resources(app: Flask):
+    "Loads all lazy resources registered with app"
+    for view in app.view_functions.values():
+        if isinstance(view, LazyResourceView):
+            view.load()
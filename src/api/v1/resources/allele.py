@@ -16,7 +16,7 @@ from sqlalchemy import cast, func, text
 from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
 from sqlalchemy.orm import Session
 from sqlalchemy.types import Integer
-from vardb.datamodel import allele, annotationshadow, gene, genotype, sample
+from vardb.datamodel import allele, annotationshadow, gene, sample
 
 
 class AlleleListResource(LogRequestResource):
@@ -130,8 +130,14 @@ class AlleleGenepanelListResource(LogRequestResource):
         """
         genepanels = (
             session.query(gene.Genepanel)
-            .join(genotype.Genotype.alleles, sample.Sample, sample.Analysis, gene.Genepanel)
-            .filter(allele.Allele.id == allele_id)
+            .join(sample.Analysis)
+            .filter(
+                sample.Analysis.id.in_(
+                    session.query(sample.analysis_allele.c.analysis_id).filter(
+                        sample.analysis_allele.c.allele_id == allele_id
+                    )
+                )
+            )
             .all()
         )
 
@@ -242,8 +248,13 @@ class AlleleAnalysisListResource(LogRequestResource):
         """
         analyses = (
             session.query(sample.Analysis)
-            .join(genotype.Genotype.alleles, sample.Sample, sample.Analysis)
-            .filter(allele.Allele.id == allele_id)
+            .filter(
+                sample.Analysis.id.in_(
+                    session.query(sample.analysis_allele.c.analysis_id).filter(
+                        sample.analysis_allele.c.allele_id == allele_id
+                    )
+                )
+            )
             .all()
         )
 
@@ -1,5 +1,4 @@
 import pathlib
-import subprocess
 import uuid
 from hashlib import sha256
 from typing import Dict, Optional
@@ -12,6 +11,7 @@ from api.schemas.pydantic.v1.resources import (
     AttachmentPostResponse,
     SendFileResponse,
 )
+from api.thumbnails import get_thumbnail_path
 from api.util.analysis_attachments import get_attachments
 from api.util.util import authenticate, paginate, rest_filter
 from api.v1.resource import LogRequestResource
@@ -68,15 +68,9 @@ class AttachmentResource(LogRequestResource):
         path = folder.joinpath(sha_val)
         tmp_path.rename(path)
 
-        # Try to create thumbnail
-        thumbnail_path = path.with_suffix(".thumbnail")
-        if not thumbnail_path.is_file():
-            try:
-                # Use imagemagick to convert image. Request a thumbnail with a width of 300.
-                cmd = "convert {ifile}[0] -thumbnail 300 -gravity center -background white -quality 90 -extent 300x300 jpeg:{ofile}"
-                subprocess.check_call(cmd.format(ifile=path, ofile=thumbnail_path), shell=True)
-            except subprocess.CalledProcessError:
-                pass
+        # Thumbnail is created asynchronously by the thumbnail worker (api/thumbnails.py),
+        # unless it already exists from an earlier upload of the same file
+        thumbnail_status = "DONE" if get_thumbnail_path(sha_val).is_file() else "PENDING"
 
         # Create database object
         data = {
@@ -86,13 +80,14 @@ class AttachmentResource(LogRequestResource):
             "extension": file_obj.filename.rsplit(".", 1)[-1] if "." in file_obj.filename else "",
             "mimetype": file_obj.content_type,
             "user_id": user.id,
+            "thumbnail_status": thumbnail_status,
         }
 
         atchmt = attachment.Attachment(**data)
         session.add(atchmt)
         session.commit()
 
-        return {"id": atchmt.id}
+        return {"id": atchmt.id, "thumbnail_status": atchmt.thumbnail_status}
 
     @authenticate()
     @validate_output(SendFileResponse)
@@ -1,11 +1,11 @@
 from itertools import groupby
 from typing import Any, Dict, List, Optional
 from datalayer import queries
+from datalayer.genepanelsimilarity import similar_genepanels, update_genepanel_signature
 
-from sqlalchemy import Float, and_, cast, desc, func, literal, tuple_
+from sqlalchemy import cast, func, tuple_
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import case
 from sqlalchemy.types import Integer
 
 from api import ApiError, schemas
@@ -188,6 +188,7 @@ class GenepanelListResource(LogRequestResource):
                 )
             )
 
+        update_genepanel_signature(session, data["name"], data["version"])
         session.commit()
 
 
@@ -324,102 +325,4 @@ class GenepanelStatsResource(LogRequestResource):
             )
         ]
 
-        genepanel_gene_ids = (
-            session.query(gene.Transcript.gene_id, gene.Genepanel.name, gene.Genepanel.version)
-            .join(gene.genepanel_transcript)
-            .join(gene.Genepanel)
-            .filter(tuple_(gene.Genepanel.name, gene.Genepanel.version).in_(latest_genepanels))
-            .distinct()
-        )
-
-        input_genepanel_gene_ids = (
-            session.query(gene.Transcript.gene_id, gene.Genepanel.name, gene.Genepanel.version)
-            .join(gene.genepanel_transcript)
-            .join(gene.Genepanel)
-            .filter(gene.Genepanel.name == name, gene.Genepanel.version == version)
-            .distinct()
-        ).subquery()
-
-        input_gene_count = session.query(input_genepanel_gene_ids.c.gene_id).distinct().count()
-
-        # Only include official gene panels in comparison
-        genepanel_gene_ids = genepanel_gene_ids.filter(gene.Genepanel.official.is_(True)).subquery()
-
-        # outerjoin example:
-        # -------------------------------------------------------------------
-        # | name       | version | gene_id | name       | version | gene_id |
-        # -------------------------------------------------------------------
-        # | Mendeliome | v01     | 8124    | None       | None    | None    |
-        # | Ciliopati  | v05     | 4221    | Ciliopati  | v05     | 4221    |
-        # | Mendeliome | v01     | 16404   | None       | None    | None    |
-        # | Mendeliome | v01     | 966     | Ciliopati  | v05     | 966     |
-        # | Mendeliome | v01     | 4887    | None       | None    | None    |
-        # input.gene_id is null -> missing from our gene panel
-        # input.gene_id is not null -> overlaps our gene panel
-
-        # Missing = total gene count (in our panel) - overlapping
-        missing_expr = literal(input_gene_count) - func.count(
-            # COUNT only counts non-null, so CASE acts as an filter for the count
-            case([(~input_genepanel_gene_ids.c.gene_id.is_(None), True)])
-        )
-        # Overlap = all gene ids that joined on gene_id
-        overlap_expr = func.count(case([(~input_genepanel_gene_ids.c.gene_id.is_(None), True)]))
-        # Additional = all gene ids that did not join (i.e. missing in our panel)
-        additional_expr = func.count(case([(input_genepanel_gene_ids.c.gene_id.is_(None), True)]))
-
-        # Similarity score:
-        # We weigh distance w.r.t. missing + addition count the most, as long as their
-        # sum is small compared to panel size.
-        # When the distance is large, the overlap similarity kicks in.
-        # The following formula has been tested among >50 official panels,
-        # on different custom panels and yields good results
-        # (keep in mind that missing + addition + overlap are always greater
-        # than input count unless the panels are identical):
-        #
-        # (Overlapping count / input total count) * 2 +
-        # input total count / (missing count + addition count)
-        #
-        stats = (
-            session.query(
-                genepanel_gene_ids.c.name,
-                genepanel_gene_ids.c.version,
-                missing_expr.label("missing"),
-                overlap_expr.label("overlap"),
-                additional_expr.label("additional"),
-            )
-            .outerjoin(
-                input_genepanel_gene_ids,
-                and_(input_genepanel_gene_ids.c.gene_id == genepanel_gene_ids.c.gene_id),
-            )
-            .filter(
-                # Exclude input panel from results
-                tuple_(genepanel_gene_ids.c.name, genepanel_gene_ids.c.version)
-                != (name, version)
-            )
-            .having(overlap_expr > 0)  # Exclude panels with no overlap
-            .order_by(
-                desc(
-                    (cast(overlap_expr, Float) * 2 / literal(input_gene_count))
-                    + (
-                        cast(literal(input_gene_count), Float)
-                        / (missing_expr + additional_expr + 1)
-                    )
-                )
-            )
-            .group_by(genepanel_gene_ids.c.name, genepanel_gene_ids.c.version)
-            .limit(5)
-        )
-
-        result: Dict[str, List[Dict[str, Any]]] = {"overlap": []}
-
-        for c in stats:
-            result["overlap"].append(
-                {
-                    "name": c.name,
-                    "version": c.version,
-                    "addition_cnt": c.additional,
-                    "overlap_cnt": c.overlap,
-                    "missing_cnt": c.missing,
-                }
-            )
-        return result
+        return {"overlap": similar_genepanels(session, (name, version), latest_genepanels)}
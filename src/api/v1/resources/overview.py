@@ -1,6 +1,6 @@
 from collections import defaultdict
 import json
-from typing import Any, DefaultDict, Dict, List, Set, Tuple
+from typing import DefaultDict, Dict, List, Optional, Set, Tuple
 
 from sqlalchemy.orm.query import Query
 
@@ -14,22 +14,28 @@ from api.schemas.pydantic.v1.resources import (
     UserStatsResponse,
 )
 from api.schemas.pydantic.v1.alleles import AlleleOverview
-from api.util.types import GenepanelVersion, AlleleIDGenePanel
+from api.util.types import (
+    AlleleCategories,
+    AlleleIDGenePanel,
+    AnalysisCategories,
+    GenepanelVersion,
+)
 from api.util.util import authenticate, paginate, log
 from api.v1.resource import LogRequestResource
 from datalayer import AlleleDataLoader, queries
-from datalayer.workflowcategorization import (
-    get_categorized_alleles,
-    get_categorized_analyses,
-    get_finalized_analysis_ids,
-)
+from datalayer.workflowcategorization import get_finalized_analysis_ids
+from datalayer.worklist import get_worklist
 from pydantic import ValidationError
 from sqlalchemy import and_, func, tuple_
 from sqlalchemy.orm import Session, defer, joinedload
-from vardb.datamodel import allele, gene, genotype, sample, user, workflow
+from vardb.datamodel import allele, gene, sample, user, workflow
 
 
-def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel]):
+def load_alleles(
+    session: Session,
+    allele_id_genepanel: List[AlleleIDGenePanel],
+    worklist_entries: Optional[Dict[int, workflow.WorklistEntry]] = None,
+):
     """
     Loads in allele data from AlleleDataLoader for all allele ids given by input structure:
 
@@ -38,6 +44,9 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
         ...
     ]
 
+    If worklist_entries ({allele_id: WorklistEntry}) is given, priority and review comment
+    are taken from the worklist instead of being queried.
+
     Returns [
         {
             'genepanel': {...genepanel data...},
@@ -51,6 +60,9 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
     ]
     """
 
+    if not allele_id_genepanel:
+        return []
+
     # Preload all alleles
     all_allele_ids = [a.allele_id for a in allele_id_genepanel]
     alleles_by_id: Dict[int, allele.Allele] = dict(
@@ -67,20 +79,36 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
         .order_by(workflow.AlleleInterpretation.date_last_update)
         .all()
     )
+    interpretations_by_allele_id: DefaultDict[
+        int, List[workflow.AlleleInterpretation]
+    ] = defaultdict(list)
+    for i in interpretations:
+        interpretations_by_allele_id[i.allele_id].append(i)
 
     # Preload genepanels
     gp_keys = set([a[1] for a in allele_id_genepanel])
-    genepanels = (
-        session.query(gene.Genepanel)
-        .filter(tuple_(gene.Genepanel.name, gene.Genepanel.version).in_(gp_keys))
-        .all()
-    )
+    genepanels_by_key: Dict[Tuple[str, str], gene.Genepanel] = {
+        (g.name, g.version): g
+        for g in session.query(gene.Genepanel).filter(
+            tuple_(gene.Genepanel.name, gene.Genepanel.version).in_(gp_keys)
+        )
+    }
 
-    # Load highest priority for each allele.
-    priority_by_allele_id = dict(queries.workflow_allele_priority(session).all())
+    if worklist_entries is not None:
+        priority_by_allele_id = {a_id: e.priority for a_id, e in worklist_entries.items()}
+        review_comment_by_allele_id = {
+            a_id: e.review_comment for a_id, e in worklist_entries.items()
+        }
+    else:
+        # Load highest priority for each allele.
+        priority_by_allele_id = dict(
+            queries.workflow_allele_priority(session, all_allele_ids).all()
+        )
 
-    # Load review comments
-    review_comment_by_allele_id = dict(queries.workflow_allele_review_comment(session).all())
+        # Load review comments
+        review_comment_by_allele_id = dict(
+            queries.workflow_allele_review_comment(session, all_allele_ids).all()
+        )
 
     # Set structures/loaders
     final_alleles: List[AlleleOverview] = list()
@@ -96,11 +124,12 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
     # for gp_key, allele_ids in sorted(gp_allele_ids.items(), key=lambda x: x[0]):
     for gp_key in sorted(gp_allele_ids):
         allele_ids = gp_allele_ids[gp_key]
-        genepanel = next(
-            g for g in genepanels if g.name == gp_key.name and g.version == gp_key.version
-        )
+        genepanel = genepanels_by_key[(gp_key.name, gp_key.version)]
         gp_alleles = [alleles_by_id[a_id] for a_id in allele_ids]
 
+        # TODO: Materialise the display data (allele, annotation and existing classification) in
+        # the worklist as well. This needs the worklist to follow annotation and assessment
+        # changes, including those inserted in bulk by deposits, which bypass the session events.
         loaded_genepanel_alleles = adl.from_objs(
             gp_alleles,
             genepanel=genepanel,
@@ -113,7 +142,7 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
         )
 
         for a in loaded_genepanel_alleles:
-            allele_interpretations = [i for i in interpretations if i.allele_id == a["id"]]
+            allele_interpretations = interpretations_by_allele_id[a["id"]]
             dumped_interpretations = [
                 alleleinterpretation_schema.dump(i).data for i in allele_interpretations
             ]
@@ -136,11 +165,20 @@ def load_alleles(session: Session, allele_id_genepanel: List[AlleleIDGenePanel])
     return final_alleles
 
 
-def load_analyses(session: Session, analysis_ids, user: user.User, keep_input_order: bool = False):
+def load_analyses(
+    session: Session,
+    analysis_ids,
+    user: user.User,
+    keep_input_order: bool = False,
+    worklist_entries: Optional[Dict[int, workflow.WorklistEntry]] = None,
+):
     """
     Loads in analysis data for all analysis ids given in input.
     Analyses are further restricted to the access for the provided user.
 
+    If worklist_entries ({analysis_id: WorklistEntry}) is given, priority, review comment and
+    warning_cleared are taken from the worklist instead of being queried.
+
 
     Returns [
         {
@@ -173,23 +211,26 @@ def load_analyses(session: Session, analysis_ids, user: user.User, keep_input_or
         loaded_analyses.sort(key=lambda x: analysis_ids.index(x["id"]))
 
     # Load in priority, warning_cleared and review_comment
-    analysis_ids = [a.id for a in analyses]
-    priorities = queries.workflow_analyses_priority(session, analysis_ids).all()
-    review_comments = queries.workflow_analyses_review_comment(session, analysis_ids).all()
-    warnings_cleared = queries.workflow_analyses_warning_cleared(session, analysis_ids).all()
+    if worklist_entries is not None:
+        priorities = {a_id: e.priority for a_id, e in worklist_entries.items()}
+        review_comments = {a_id: e.review_comment for a_id, e in worklist_entries.items()}
+        warnings_cleared = {a_id: e.warning_cleared for a_id, e in worklist_entries.items()}
+    else:
+        analysis_ids = [a["id"] for a in loaded_analyses]
+        priorities = dict(queries.workflow_analyses_priority(session, analysis_ids).all())
+        review_comments = dict(
+            queries.workflow_analyses_review_comment(session, analysis_ids).all()
+        )
+        warnings_cleared = dict(
+            queries.workflow_analyses_warning_cleared(session, analysis_ids).all()
+        )
 
     for analysis in loaded_analyses:
-        priority = next((p.priority for p in priorities if p.analysis_id == analysis["id"]), 1)
-        analysis["priority"] = priority
-        review_comment = next(
-            (rc.review_comment for rc in review_comments if rc.analysis_id == analysis["id"]), None
-        )
+        analysis["priority"] = priorities.get(analysis["id"], 1)
+        review_comment = review_comments.get(analysis["id"])
         if review_comment:
             analysis["review_comment"] = review_comment
-        warning_cleared = next(
-            (wc.warning_cleared for wc in warnings_cleared if wc.analysis_id == analysis["id"]),
-            None,
-        )
+        warning_cleared = warnings_cleared.get(analysis["id"])
         if warning_cleared:
             analysis["warning_cleared"] = warning_cleared
 
@@ -222,14 +263,16 @@ def get_analysis_gp_allele_ids(
         session.query(
             workflow.AnalysisInterpretation.genepanel_name,
             workflow.AnalysisInterpretation.genepanel_version,
-            allele.Allele.id,
+            sample.analysis_allele.c.allele_id,
+        )
+        .join(
+            sample.analysis_allele,
+            sample.analysis_allele.c.analysis_id == workflow.AnalysisInterpretation.analysis_id,
         )
-        .join(genotype.Genotype.alleles, sample.Sample, sample.Analysis)
         .filter(
-            workflow.AnalysisInterpretation.analysis_id == sample.Analysis.id,
             workflow.AnalysisInterpretation.analysis_id.in_(analysis_ids),
             workflow.AnalysisInterpretation.status == "Not started",
-            allele.Allele.id.in_(analysis_allele_ids),
+            sample.analysis_allele.c.allele_id.in_(analysis_allele_ids),
         )
         .distinct()
         .all()
@@ -321,14 +364,18 @@ class OverviewAlleleResource(LogRequestResource):
     @authenticate()
     @validate_output(OverviewAlleleResponse)
     def get(self, session: Session, user: user.User):
-        categorized_allele_ids = get_categorized_alleles(session, user=user)
+        worklist_entries = {
+            e.allele_id: e for e in get_worklist(session, "allele_id", user=user).all()
+        }
+        allele_id_genepanels = [
+            AlleleIDGenePanel(e.allele_id, GenepanelVersion(e.genepanel_name, e.genepanel_version))
+            for e in worklist_entries.values()
+        ]
+        loaded_alleles = load_alleles(session, allele_id_genepanels, worklist_entries)
 
-        result: Dict[str, Any] = dict()
-        for key, allele_ids in categorized_allele_ids.items():
-            allele_id_genepanels = get_alleleinterpretation_allele_ids_genepanel(
-                session, allele_ids
-            )
-            result[key] = load_alleles(session, allele_id_genepanels)
+        result: Dict[str, List[AlleleOverview]] = {key: [] for key in AlleleCategories}
+        for a in loaded_alleles:
+            result[AlleleCategories(worklist_entries[a.allele.id].category)].append(a)
 
         return result
 
@@ -381,11 +428,16 @@ class OverviewAnalysisResource(LogRequestResource):
     @authenticate()
     @validate_output(OverviewAnalysisResponse)
     def get(self, session: Session, user: user.User):
-        categorized_analysis_ids = get_categorized_analyses(session, user=user)
+        worklist_entries = {
+            e.analysis_id: e for e in get_worklist(session, "analysis_id", user=user).all()
+        }
+        loaded_analyses = load_analyses(
+            session, list(worklist_entries), user, worklist_entries=worklist_entries
+        )
 
-        result = {}
-        for key, analysis_ids in categorized_analysis_ids.items():
-            result[key] = load_analyses(session, analysis_ids, user)
+        result: Dict[str, List[Dict]] = {key: [] for key in AnalysisCategories}
+        for a in loaded_analyses:
+            result[AnalysisCategories(worklist_entries[a["id"]].category)].append(a)
 
         return result
 
@@ -1,6 +1,9 @@
 import json
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
 
 from api import schemas
 from api.config import config
@@ -13,7 +16,7 @@ from api.v1.resources.overview import load_analyses
 from datalayer import AlleleDataLoader
 from datalayer.queries import annotation_transcripts_genepanel
 from flask import request
-from sqlalchemy import func, or_, select, text, tuple_
+from sqlalchemy import func, or_, select, tuple_
 from sqlalchemy.dialects.postgresql.array import Any
 from sqlalchemy.orm import Session
 from vardb.datamodel import allele, annotationshadow, assessment, gene, sample
@@ -22,6 +25,52 @@ from vardb.datamodel import workflow
 from vardb.util.extended_query import ExtendedQuery
 
 
+def escape_like(value: str) -> str:
+    "Escape wildcards in value, for use in LIKE patterns"
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SearchResultCache:
+    """
+    Per user LRU cache of matching ids for recent search queries.
+
+    Typing in the search box repeats queries (e.g. when deleting characters or paging),
+    so we keep the ids and total count of the last few queries for each user.
+    Only ids are cached, data for the results is always loaded fresh.
+    Entries expire after max_age seconds, so that newly deposited data shows up in searches.
+    """
+
+    def __init__(self, max_entries_per_user: int = 20, max_age: float = 60.0):
+        self.max_entries_per_user = max_entries_per_user
+        self.max_age = max_age
+        self._entries: Dict[int, OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: Hashable) -> Optional[Tuple[List[int], int]]:
+        with self._lock:
+            user_entries = self._entries.get(user_id)
+            if user_entries is None or key not in user_entries:
+                return None
+            timestamp, value = user_entries[key]
+            if time.monotonic() - timestamp > self.max_age:
+                del user_entries[key]
+                return None
+            user_entries.move_to_end(key)
+            return value
+
+    def put(self, user_id: int, key: Hashable, value: Tuple[List[int], int]):
+        with self._lock:
+            user_entries = self._entries.setdefault(user_id, OrderedDict())
+            user_entries[key] = (time.monotonic(), value)
+            user_entries.move_to_end(key)
+            while len(user_entries) > self.max_entries_per_user:
+                user_entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 class SearchQuery:
     RE_POSITION_WITH_CHR = re.compile(
         r"^(chr)?((?P<chr>[1-9]{1,2}|[XY]{1}|MT):)(?P<pos1>[0-9]+)(-(?P<pos2>[0-9]+))?$"
@@ -141,8 +190,6 @@ class SearchResource(LogRequestResource):
     # 123456
     RE_CHR_POS = re.compile(r"^(chr)?((?P<chr>[0-9XYM]*):)?(?P<pos1>[0-9]+)(-(?P<pos2>[0-9]+))?")
 
-    TSQUERY_ESCAPE = ["&", ":", "(", ")", "*", "!", "|"]
-
     @authenticate()
     @validate_output(SearchResponse, paginated=True)
     @paginate
@@ -217,12 +264,20 @@ class SearchResource(LogRequestResource):
 
         if not search_query.check():
             return matches, 0
-        elif search_query.is_analyses_search():
+
+        # Matching ids are cached, as the same queries are repeated while typing
+        cache_key = (json.dumps(query, sort_keys=True), page, per_page, limit)
+        cached = search_result_cache.get(user.id, cache_key)
+
+        if search_query.is_analyses_search():
             # Search analysis
-            analyses, count = self._search_analysis(
-                session, search_query, user, page=page, per_page=per_page, limit=limit
-            )
-            analysis_ids = [a["id"] for a in analyses]
+            if cached is None:
+                cached = self._search_analysis_ids(
+                    session, search_query, user, page=page, per_page=per_page, limit=limit
+                )
+                search_result_cache.put(user.id, cache_key, cached)
+            analysis_ids, count = cached
+            analyses = load_analyses(session, analysis_ids, user)
             analysis_interpretations = self._get_analysis_interpretations(session, analysis_ids)
             for analysis in analyses:
                 analysis["interpretations"] = [
@@ -232,22 +287,24 @@ class SearchResource(LogRequestResource):
         elif search_query.is_alleles_search():
             # Use offical usergroup genepanels (unofficial genepanels are subsets of the official genepanels)
             genepanels: List[Genepanel] = [gp for gp in user.group.genepanels if gp.official]
-            if search_query.check():
-                # Search allele
-                alleles, count = self._search_allele(
-                    session, search_query, genepanels, page=page, per_page=per_page, limit=limit
+            # Search allele
+            if cached is None:
+                cached = self._search_allele_ids(
+                    session, search_query, page=page, per_page=per_page, limit=limit
+                )
+                search_result_cache.put(user.id, cache_key, cached)
+            allele_ids, count = cached
+            alleles = self._load_alleles(session, allele_ids, search_query, genepanels)
+            allele_interpretations = self._get_allele_interpretations(session, allele_ids)
+            for al in alleles:
+                matches["alleles"].append(
+                    {
+                        "allele": al,
+                        "interpretations": [
+                            ai for ai in allele_interpretations if ai["allele_id"] == al["id"]
+                        ],
+                    }
                 )
-                allele_ids = [a["id"] for a in alleles]
-                allele_interpretations = self._get_allele_interpretations(session, allele_ids)
-                for al in alleles:
-                    matches["alleles"].append(
-                        {
-                            "allele": al,
-                            "interpretations": [
-                                ai for ai in allele_interpretations if ai["allele_id"] == al["id"]
-                            ],
-                        }
-                    )
         return matches, count
 
     def _get_analysis_interpretations(self, session: Session, analysis_ids: List[int]):
@@ -268,6 +325,45 @@ class SearchResource(LogRequestResource):
         )
         return schemas.AlleleInterpretationOverviewSchema().dump(interpretations, many=True).data
 
+    def _page_ids(
+        self,
+        id_query: ExtendedQuery,
+        order_by: List,
+        page: int,
+        per_page: int,
+        limit: Optional[int],
+    ) -> Tuple[List[int], int]:
+        """
+        Returns ids for given page of id_query, sorted by order_by and id, and the total count.
+
+        With a limit, only the first limit matches found (in no particular order) are sorted and
+        counted, so that broad queries stop early. The count is included as a window function,
+        to avoid a separate count query.
+        """
+        results = id_query.add_columns(*order_by)
+        if limit:
+            results = results.limit(limit)
+        results = results.subquery()
+        id_column, *sort_columns = results.c
+
+        offset = per_page * (page - 1)
+        rows = (
+            id_query.session.query(id_column, func.count().over())
+            .order_by(*sort_columns, id_column)
+            .limit(per_page)
+            .offset(offset)
+            .all()
+        )
+
+        if rows:
+            count = rows[0][1]
+        elif offset:
+            # Page is past the end of the results, count separately
+            count = id_query.session.query(func.count()).select_from(results).scalar()
+        else:
+            count = 0
+        return [r[0] for r in rows], count
+
     def _get_analyses_filters(
         self, session: Session, search_query: SearchQuery, genepanels: List[Genepanel]
     ):
@@ -284,23 +380,21 @@ class SearchResource(LogRequestResource):
         )
 
         if search_query.freetext:
-            re_freetext = re.escape(search_query.freetext)
-            # Escape special characters before sending to tsquery
-            for t in SearchResource.TSQUERY_ESCAPE:
-                re_freetext = re_freetext.replace(t, "\\" + t)
-            filters.append(sample.Analysis.name.op("~*")(".*{}.*".format(re_freetext)))
+            # Substring match, using trigram index on analysis name
+            filters.append(
+                sample.Analysis.name.ilike("%{}%".format(escape_like(search_query.freetext)))
+            )
 
         if search_query.username is not None:
-            user_ids = (
-                session.query(user_model.User.id)
-                .filter(user_model.User.username == search_query.username)
-                .subquery()
+            user_ids = session.query(user_model.User.id).filter(
+                user_model.User.username == search_query.username
             )
-            filters.extend(
-                [
-                    sample.Analysis.id == workflow.AnalysisInterpretation.analysis_id,
-                    workflow.AnalysisInterpretation.user_id.in_(user_ids),
-                ]
+            filters.append(
+                sample.Analysis.id.in_(
+                    session.query(workflow.AnalysisInterpretation.analysis_id).filter(
+                        workflow.AnalysisInterpretation.user_id.in_(user_ids)
+                    )
+                )
             )
 
         return filters
@@ -354,6 +448,18 @@ class SearchResource(LogRequestResource):
             allele_ids = allele_ids.filter(False)
         return allele_ids
 
+    @staticmethod
+    def _hgvs_pattern(hgvs: str) -> str:
+        """
+        LIKE pattern for HGVS search: Prefix match when the query starts with c./p.,
+        otherwise substring match (e.g. 'Ser309' or '1312A>').
+        Both are supported by the trigram indexes on lower(hgvsc) and lower(hgvsp).
+        """
+        hgvs = hgvs.strip().lower()
+        if hgvs.startswith(("c.", "p.")):
+            return escape_like(hgvs) + "%"
+        return "%" + escape_like(hgvs) + "%"
+
     def _search_allele_hgvs(self, session: Session, search_query: SearchQuery):
         """
         Performs a search in the database using the
@@ -366,19 +472,20 @@ class SearchResource(LogRequestResource):
         allele_ids = session.query(annotationshadow.AnnotationShadowTranscript.allele_id)
         inclusion_regex = config.get("transcripts", {}).get("inclusion_regex")
         if inclusion_regex:
-            allele_ids = allele_ids.filter(text("transcript ~ :reg").params(reg=inclusion_regex))
+            allele_ids = allele_ids.filter(
+                annotationshadow.AnnotationShadowTranscript.transcript.op("~")(inclusion_regex)
+            )
 
         if search_query.hgvsp:
             allele_ids = allele_ids.filter(
                 func.lower(annotationshadow.AnnotationShadowTranscript.hgvsp).like(
-                    search_query.hgvsp.lower() + "%"
+                    self._hgvs_pattern(search_query.hgvsp)
                 )
             )
-        # Our btree indexes are set as "lower(column) text_pattern_ops" and only support rightside wildcard.
         elif search_query.hgvsc:
             allele_ids = allele_ids.filter(
                 func.lower(annotationshadow.AnnotationShadowTranscript.hgvsc).like(
-                    search_query.hgvsc.lower() + "%"
+                    self._hgvs_pattern(search_query.hgvsc)
                 )
             )
         else:
@@ -387,9 +494,8 @@ class SearchResource(LogRequestResource):
         if search_query.transcript:
             allele_ids = allele_ids.filter(
                 # Split out version number, as this might not match VEP annotation
-                text("split_part(transcript, '.', 1) = split_part(:transcript, '.', 1)").bindparams(
-                    transcript=search_query.transcript
-                )
+                annotationshadow.AnnotationShadowTranscript.transcript_base
+                == search_query.transcript.split(".", 1)[0]
             )
 
         if search_query.hgnc_id:
@@ -444,15 +550,12 @@ class SearchResource(LogRequestResource):
             session, [(gp.name, gp.version) for gp in genepanels], allele_ids=allele_ids
         ).subquery()
 
-        allele_ids_transcripts = (
+        allele_ids_transcripts = set(
             session.query(
                 genepanel_transcripts.c.allele_id, genepanel_transcripts.c.annotation_transcript
-            )
-            .distinct()
-            .all()
+            ).distinct()
         )
 
-        # TODO: this is never called except by itself. Safe to just remove?
         def annotation_transcripts_hgvs(
             transcripts: List[Dict[str, str]], search_query: SearchQuery
         ):
@@ -465,19 +568,12 @@ class SearchResource(LogRequestResource):
             return results
 
         for al in alleles:
-            filtered_transcripts = list()
-
             # Filter transcripts on genepanel
-            for transcript in al["annotation"]["transcripts"]:
-                if next(
-                    (
-                        at
-                        for at in allele_ids_transcripts
-                        if at[0] == al["id"] and at[1] == transcript["transcript"]
-                    ),
-                    None,
-                ):
-                    filtered_transcripts.append(transcript)
+            filtered_transcripts = [
+                transcript
+                for transcript in al["annotation"]["transcripts"]
+                if (al["id"], transcript["transcript"]) in allele_ids_transcripts
+            ]
             if search_query.is_hgvs():
                 genepanel_has_hgvs = annotation_transcripts_hgvs(filtered_transcripts, search_query)
                 if not genepanel_has_hgvs:
@@ -488,31 +584,37 @@ class SearchResource(LogRequestResource):
                 list(set([t["transcript"] for t in filtered_transcripts]))
             )
 
-    def _search_allele(
+    def _search_allele_ids(
         self,
         session: Session,
         search_query: SearchQuery,
-        genepanels: List[Genepanel],
         page: int = 1,
         per_page: int = 10,
         limit: int = None,
-    ):
-        # CTE for performance
-        allele_results_ids = self._get_allele_results_ids(session, search_query)
-        if limit:
-            allele_results_ids = allele_results_ids.limit(limit)
-
-        count = allele_results_ids.count()
-        allele_results_ids = allele_results_ids.cte()
-
-        alleles = (
-            session.query(allele.Allele)
-            .filter(allele.Allele.id.in_(select([allele_results_ids])))
-            .order_by(allele.Allele.chromosome, allele.Allele.start_position)
-            .limit(per_page)
-            .offset(per_page * (page - 1))
+    ) -> Tuple[List[int], int]:
+        return self._page_ids(
+            self._get_allele_results_ids(session, search_query),
+            [allele.Allele.chromosome, allele.Allele.start_position],
+            page,
+            per_page,
+            limit,
         )
-        alleles = alleles.all()
+
+    def _load_alleles(
+        self,
+        session: Session,
+        allele_ids: List[int],
+        search_query: SearchQuery,
+        genepanels: List[Genepanel],
+    ):
+        alleles_by_id = {
+            a.id: a
+            for a in session.query(allele.Allele).filter(allele.Allele.id.in_(allele_ids)).all()
+        }
+        # Alleles might have been deleted since ids were cached
+        alleles = [
+            alleles_by_id[allele_id] for allele_id in allele_ids if allele_id in alleles_by_id
+        ]
 
         allele_data = AlleleDataLoader(session).from_objs(
             alleles,
@@ -525,9 +627,9 @@ class SearchResource(LogRequestResource):
         )
 
         self._filter_transcripts_query(session, allele_data, genepanels, search_query)
-        return allele_data, count
+        return allele_data
 
-    def _search_analysis(
+    def _search_analysis_ids(
         self,
         session: Session,
         query: SearchQuery,
@@ -535,20 +637,14 @@ class SearchResource(LogRequestResource):
         page: int = 1,
         per_page: int = 10,
         limit: int = None,
-    ):
-        analysis_id_query: ExtendedQuery = (
-            session.query(sample.Analysis.id)
-            .filter(*self._get_analyses_filters(session, query, user.group.genepanels))
-            .distinct()
+    ) -> Tuple[List[int], int]:
+        analysis_id_query: ExtendedQuery = session.query(sample.Analysis.id).filter(
+            *self._get_analyses_filters(session, query, user.group.genepanels)
         )
+        return self._page_ids(analysis_id_query, [], page, per_page, limit)
 
-        if limit:
-            analysis_id_query = analysis_id_query.limit(limit)
-        count = analysis_id_query.count()
-
-        analysis_ids = analysis_id_query.limit(per_page).offset(per_page * (page - 1)).scalar_all()
 
-        return load_analyses(session, analysis_ids, user), count
+search_result_cache = SearchResultCache()
 
 
 class SearchOptionsResource(LogRequestResource):
@@ -560,8 +656,11 @@ class SearchOptionsResource(LogRequestResource):
         query = json.loads(request.args["q"])
         result = dict()
         if query.get("gene"):
+            gene_query = escape_like(query["gene"].lower())
+            # Substring match (using trigram index), listing prefix matches first
+            is_prefix = func.lower(gene.Gene.hgnc_symbol).like(gene_query + "%")
             gene_results: ExtendedQuery = (
-                session.query(gene.Gene.hgnc_symbol, gene.Gene.hgnc_id)
+                session.query(gene.Gene.hgnc_symbol, gene.Gene.hgnc_id, is_prefix)
                 .join(gene.Transcript, gene.Genepanel.transcripts)
                 .filter(
                     # was a bit hard to get the join correct, had to put join condition here
@@ -569,11 +668,10 @@ class SearchOptionsResource(LogRequestResource):
                     tuple_(gene.Genepanel.name, gene.Genepanel.version).in_(
                         [(g.name, g.version) for g in user.group.genepanels]
                     ),
-                    # Our btree indexes are set as "lower(column) text_pattern_ops" and only support rightside wildcard.
-                    func.lower(gene.Gene.hgnc_symbol).like(query["gene"].lower() + "%"),
+                    func.lower(gene.Gene.hgnc_symbol).like("%" + gene_query + "%"),
                 )
                 .distinct()
-                .order_by(gene.Gene.hgnc_symbol)
+                .order_by(is_prefix.desc(), gene.Gene.hgnc_symbol)
                 .limit(SearchOptionsResource.RESULT_LIMIT)
             )
 
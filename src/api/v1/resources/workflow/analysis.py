@@ -30,7 +30,7 @@ from datalayer import queries
 from flask import request
 from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from vardb.datamodel import allele, genotype, sample, user
+from vardb.datamodel import sample, user
 from vardb.datamodel.sample import Analysis
 from vardb.datamodel.workflow import AnalysisInterpretation, AnalysisInterpretationSnapshot
 
@@ -43,9 +43,8 @@ class AnalysisStatsResource(LogRequestResource):
     def get(self, session: Session, analysis_id: int, user: user.User):
         # Number of alleles
         allele_count = (
-            session.query(allele.Allele.id)
-            .join(genotype.Genotype.alleles, sample.Sample)
-            .filter(sample.Sample.analysis_id == analysis_id)
+            session.query(sample.analysis_allele)
+            .filter(sample.analysis_allele.c.analysis_id == analysis_id)
             .count()
         )
 
@@ -4,9 +4,8 @@ from dataclasses import dataclass
 from typing import DefaultDict, Dict, List, Optional, Sequence, Set, Tuple, Type, Union, overload
 
 import pytz
-from sqlalchemy import and_, func, literal
+from sqlalchemy import and_, func
 from sqlalchemy.dialects.postgresql.array import Any
-from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.schema import Column
 from typing_extensions import Literal
@@ -34,15 +33,17 @@ from datalayer import (
     AssessmentCreator,
     SnapshotCreator,
     filters,
+    openworkflows,
     queries,
 )
+from datalayer.genepaneldata import genepanel_data_cache
+from datalayer.statehistory import add_state_history
 from vardb.datamodel import (
     allele,
     annotation,
     annotationshadow,
     assessment,
     gene,
-    genotype,
     sample,
     user,
     workflow,
@@ -172,53 +173,6 @@ def _get_interpretation_meta(
         raise ValueError("This should never happen")
 
 
-def _get_uncommitted_interpretation_ids(session: Session, meta: InterpretationMetadata) -> Set[int]:
-    """
-    Get all analysis/allele ids for workflows that have an interpretation that may contain
-    work that is not commited.
-    Criteria:
-    1. Include if more than one interpretation and latest is not finalized.
-    The first criterion (more than one) is due to single interpretations
-    may be in 'Not started' status and we don't want to include those.
-    2. In addition, include all Ongoing interpretations. These will naturally
-    contain uncommited work. This case is partly covered in 1. above, but not
-    for single interpretations.
-    """
-
-    more_than_one = (
-        session.query(meta.model_id)
-        .group_by(meta.model_id)
-        .having(func.count(meta.model_id) > 1)
-        .subquery()
-    )
-
-    ongoing = set(
-        queries.workflow_by_status(
-            session,
-            meta.model,
-            meta.model_id_field,
-            status="Ongoing",
-        ).scalar_all()
-    )
-
-    not_finalized = queries.workflow_by_status(
-        session, meta.model, meta.model_id_field, finalized=False
-    ).subquery()
-
-    more_than_one_not_finalized = set(
-        session.query(getattr(more_than_one.c, meta.model_id_field))
-        .join(
-            not_finalized,
-            getattr(not_finalized.c, meta.model_id_field)
-            == getattr(more_than_one.c, meta.model_id_field),
-        )
-        .distinct()
-        .scalar_all()
-    )
-
-    return ongoing | more_than_one_not_finalized
-
-
 def get_alleles(
     session: Session,
     allele_ids: Sequence[int],
@@ -305,81 +259,47 @@ def load_genepanel_for_allele_ids(
     """
     Loads genepanel data using input allele_ids as filter
     for what transcripts and phenotypes to include.
+
+    The genepanel data is read from a process-wide cache, only the genes and transcripts
+    of the alleles and the current gene assessments are queried for each call.
     """
-    genepanel = (
-        session.query(gene.Genepanel)
-        .filter(gene.Genepanel.name == gp_name, gene.Genepanel.version == gp_version)
-        .one()
-    )
+    genepanel_data = genepanel_data_cache.get(session, gp_name, gp_version)
 
-    hgnc_ids = (
-        session.query(annotationshadow.AnnotationShadowTranscript.hgnc_id)
-        .filter(
-            filters.in_(session, annotationshadow.AnnotationShadowTranscript.allele_id, allele_ids)
+    annotation_transcripts = (
+        session.query(
+            annotationshadow.AnnotationShadowTranscript.hgnc_id,
+            annotationshadow.AnnotationShadowTranscript.transcript_base,
         )
-        .scalar_all()
-    )
-
-    annotation_transcripts_genepanel = queries.annotation_transcripts_genepanel(
-        session, [(gp_name, gp_version)], allele_ids=allele_ids
-    ).subquery()
-
-    transcripts = (
-        session.query(gene.Transcript)
-        .options(joinedload(gene.Transcript.gene))
-        .join(gene.Genepanel.transcripts)
         .filter(
-            gene.Transcript.transcript_name
-            == annotation_transcripts_genepanel.c.genepanel_transcript,
+            filters.in_(session, annotationshadow.AnnotationShadowTranscript.allele_id, allele_ids),
+            annotationshadow.AnnotationShadowTranscript.hgnc_id.isnot(None),
         )
+        .distinct()
         .all()
     )
+    hgnc_ids = sorted(set(hgnc_id for hgnc_id, _ in annotation_transcripts))
 
-    phenotypes = (
-        session.query(gene.Phenotype)
-        .options(joinedload(gene.Phenotype.gene))
-        .join(gene.genepanel_phenotype)
-        .filter(
-            filters.in_(session, gene.Phenotype.gene_id, hgnc_ids),
-            gene.genepanel_phenotype.c.genepanel_name == gp_name,
-            gene.genepanel_phenotype.c.genepanel_version == gp_version,
+    geneassessments = []
+    if hgnc_ids:
+        geneassessments = (
+            session.query(assessment.GeneAssessment)
+            .filter(
+                filters.in_(session, assessment.GeneAssessment.gene_id, hgnc_ids),
+                assessment.GeneAssessment.date_superceeded.is_(None),
+            )
+            .all()
         )
-    )
 
-    geneassessments = (
-        session.query(assessment.GeneAssessment)
-        .filter(
-            filters.in_(session, gene.Phenotype.gene_id, hgnc_ids),
-            assessment.GeneAssessment.date_superceeded.is_(None),
-        )
-        .all()
-    )
-
-    inheritances = (
-        session.query(
-            gene.genepanel_transcript.c.inheritance,
-            gene.Transcript.gene_id.label("hgnc_id"),
-            gene.Transcript.transcript_name,
-        )
-        .join(
-            gene.Transcript,
-            gene.Transcript.id == gene.genepanel_transcript.c.transcript_id,
-        )
-        .filter(
-            filters.in_(session, gene.Transcript.gene_id, hgnc_ids),
-            gene.genepanel_transcript.c.genepanel_name == gp_name,
-            gene.genepanel_transcript.c.genepanel_version == gp_version,
-        )
-    ).all()
-
-    genepanel_data = schemas.GenepanelSchema().dump(genepanel).data
-    genepanel_data["transcripts"] = schemas.TranscriptFullSchema().dump(transcripts, many=True).data
-    genepanel_data["inheritances"] = schemas.InheritanceSchema().dump(inheritances, many=True).data
-    genepanel_data["phenotypes"] = schemas.PhenotypeFullSchema().dump(phenotypes, many=True).data
-    genepanel_data["geneassessments"] = (
-        schemas.GeneAssessmentSchema().dump(geneassessments, many=True).data
-    )
-    return genepanel_data
+    result = dict(genepanel_data.genepanel)
+    result["transcripts"] = [
+        t
+        for k in sorted(set(annotation_transcripts), key=lambda k: (k[0], k[1] or ""))
+        for t in genepanel_data.transcripts.get(k, [])
+    ]
+    result["inheritances"] = [i for h in hgnc_ids for i in genepanel_data.inheritances.get(h, [])]
+    result["phenotypes"] = [p for h in hgnc_ids for p in genepanel_data.phenotypes.get(h, [])]
+    result["geneassessments"] = schemas.GeneAssessmentSchema().dump(geneassessments, many=True).data
+    return result
 
 
 def update_interpretation(
@@ -426,14 +346,7 @@ def update_interpretation(
 
     # Add current state to history if new state is different:
     if data.state != interpretation.state:
-        session.add(
-            workflow.InterpretationStateHistory(
-                alleleinterpretation_id=alleleinterpretation_id,
-                analysisinterpretation_id=analysisinterpretation_id,
-                state=interpretation.state,
-                user_id=user_id,
-            )
-        )
+        add_state_history(session, interpretation, data.state, user_id)
     # Overwrite state fields with new values
     interpretation.state = data.state
     interpretation.user_state = data.user_state
@@ -720,21 +633,14 @@ def finalize_allele(
     if meta.name is WorkflowTypes.ALLELE:
         assert data.allele_id == workflow_allele_id
     elif meta.name is WorkflowTypes.ANALYSIS:
-        assert (
-            session.query(allele.Allele)
-            .join(
-                allele.Allele.genotypes,
-                sample.Sample,
-                sample.Analysis,
-            )
+        assert session.query(
+            session.query(sample.analysis_allele)
             .filter(
-                sample.Analysis.id == workflow_analysis_id,
-                allele.Allele.id == data.allele_id,
+                sample.analysis_allele.c.analysis_id == workflow_analysis_id,
+                sample.analysis_allele.c.allele_id == data.allele_id,
             )
-            .distinct()
-            .count()
-            == 1
-        )
+            .exists()
+        ).scalar()
 
     # Check annotation data
     latest_annotation_id: int = (
@@ -1007,69 +913,15 @@ def get_workflow_allele_collisions(
 
     :note: Alleles with valid alleleassessments are excluded from causing collision.
     """
-    workflow_analysis_ids = _get_uncommitted_interpretation_ids(session, AnalysisInterpretationMeta)
-
-    # Exclude "ourself" if applicable
-    if analysis_id in workflow_analysis_ids:
-        workflow_analysis_ids.remove(analysis_id)
-
-    ongoing: Dict[WorkflowTypes, List[OngoingWorkflow]] = {}
-    # Get all ongoing analyses connected to provided allele ids
-    # For analyses we exclude alleles with valid alleleassessments
-    ongoing[WorkflowTypes.ANALYSIS] = [
-        OngoingWorkflow.from_orm(row)  # type: ignore
-        for row in session.query(
-            workflow.AnalysisInterpretation.user_id,
-            workflow.AnalysisInterpretation.workflow_status,
-            allele.Allele.id.label("allele_id"),
-            workflow.AnalysisInterpretation.analysis_id,
-        )
-        .join(
-            genotype.Genotype.alleles,
-            sample.Sample,
-            sample.Analysis,
-            workflow.AnalysisInterpretation,
-        )
-        .filter(
-            sample.Analysis.id.in_(workflow_analysis_ids),
-            allele.Allele.id.in_(allele_ids),
-            ~allele.Allele.id.in_(queries.allele_ids_with_valid_alleleassessments(session)),
-        )
-        .distinct(workflow.AnalysisInterpretation.analysis_id, allele.Allele.id)
-        .order_by(
-            workflow.AnalysisInterpretation.analysis_id,
-            allele.Allele.id,
-            workflow.AnalysisInterpretation.date_created.desc(),
-        )
-        .all()
-    ]
-
-    # Allele workflow
-    workflow_allele_ids = _get_uncommitted_interpretation_ids(session, AlleleInterpretationMeta)
-
-    # Exclude "ourself" if applicable
-    if allele_id in workflow_allele_ids:
-        workflow_allele_ids.remove(allele_id)
-
-    ongoing[WorkflowTypes.ALLELE] = [
-        OngoingWorkflow.from_orm(row)  # type: ignore
-        for row in session.query(
-            workflow.AlleleInterpretation.user_id,
-            workflow.AlleleInterpretation.workflow_status,
-            workflow.AlleleInterpretation.allele_id,
-            literal(None).label("analysis_id"),
-        )
-        .filter(
-            workflow.AlleleInterpretation.allele_id.in_(workflow_allele_ids),
-            workflow.AlleleInterpretation.allele_id.in_(allele_ids),
-        )
-        .distinct(workflow.AlleleInterpretation.allele_id)
-        .order_by(
-            workflow.AlleleInterpretation.allele_id,
-            workflow.AlleleInterpretation.date_created.desc(),
-        )
-        .all()
-    ]
+    ongoing: Dict[WorkflowTypes, List[OngoingWorkflow]] = {
+        WorkflowTypes.ANALYSIS: [],
+        WorkflowTypes.ALLELE: [],
+    }
+    for row in openworkflows.get_open_workflow_alleles(
+        session, allele_ids, exclude_analysis_id=analysis_id, exclude_allele_id=allele_id
+    ):
+        wf_type = WorkflowTypes.ALLELE if row.analysis_id is None else WorkflowTypes.ANALYSIS
+        ongoing[wf_type].append(OngoingWorkflow.from_orm(row))  # type: ignore
 
     # Preload users, analysis names
     user_ids: Set[int] = set()
@@ -1409,9 +1261,11 @@ def get_filtered_alleles(
 
             if not interpretation.snapshots:
                 # snapshots will be empty if there are no variants
-                has_alleles = any(
-                    [s.genotypes for s in interpretation.analysis.samples if s.proband]
-                )
+                has_alleles = session.query(
+                    session.query(sample.analysis_allele)
+                    .filter(sample.analysis_allele.c.analysis_id == interpretation.analysis_id)
+                    .exists()
+                ).scalar()
 
                 if has_alleles:
                     raise RuntimeError("Missing snapshots for interpretation.")
@@ -1433,9 +1287,8 @@ def get_filtered_alleles(
         else:
             analysis_id = interpretation.analysis_id
             analysis_allele_ids: List[int] = (
-                session.query(allele.Allele.id)
-                .join(genotype.Genotype.alleles, sample.Sample, sample.Analysis)
-                .filter(sample.Analysis.id == analysis_id)
+                session.query(sample.analysis_allele.c.allele_id)
+                .filter(sample.analysis_allele.c.analysis_id == analysis_id)
                 .scalar_all()
             )
 
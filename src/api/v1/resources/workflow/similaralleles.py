@@ -9,6 +9,7 @@ from api.v1.resource import LogRequestResource
 from datalayer.alleledataloader.alleledataloader import AlleleDataLoader
 from flask import request
 from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm.session import Session
 from vardb.datamodel import allele, assessment, gene, user
 
@@ -16,19 +17,22 @@ from vardb.datamodel import allele, assessment, gene, user
 def get_nearby_allele_ids(session: Session, allele_ids: List[int]):
     max_dist = config["similar_alleles"]["max_genomic_distance"]
 
-    # Create temporary table with regions to check assessed alles against
-    regions = (
+    # Assessed alleles overlapping the query allele region, padded by max_dist on both sides.
+    # Overlap of half-open ranges on Allele.region uses the GiST index ix_allele_chromosome_region.
+    # The padded regions are also given as constants, as the planner can't estimate the overlap
+    # with ranges from the joined query alleles, and would scan all assessed alleles instead.
+    query_regions = (
         session.query(
-            allele.Allele.id.label("allele_id"),
-            allele.Allele.chromosome,
-            allele.Allele.start_position,
-            allele.Allele.open_end_position,
-            (allele.Allele.start_position - max_dist).label("padded_start_position"),
-            (allele.Allele.open_end_position + max_dist).label("padded_open_end_position"),
+            allele.Allele.chromosome, allele.Allele.start_position, allele.Allele.open_end_position
         )
         .filter(allele.Allele.id.in_(allele_ids))
-        .temp_table("similaralleles_region")
+        .distinct()
+        .all()
     )
+    if not query_regions:
+        return {a_id: [] for a_id in allele_ids}
+
+    query_allele = aliased(allele.Allele)
 
     assessed_allele_ids = session.query(assessment.AlleleAssessment.allele_id).filter(
         assessment.AlleleAssessment.date_superceeded.is_(None)
@@ -41,46 +45,42 @@ def get_nearby_allele_ids(session: Session, allele_ids: List[int]):
     #         6 |                  8 |
     nearby_alleles = (
         session.query(
-            regions.c.allele_id,
+            query_allele.id.label("allele_id"),
             allele.Allele.id.label("assessed_allele_id"),
         )
-        .select_from(allele.Allele)
+        .select_from(query_allele)
         .join(
-            regions,
+            allele.Allele,
             and_(
-                allele.Allele.chromosome == regions.c.chromosome,
-                allele.Allele.id != regions.c.allele_id,
-                or_(
-                    # query region contained
-                    and_(
-                        allele.Allele.start_position <= regions.c.start_position,
-                        allele.Allele.open_end_position >= regions.c.open_end_position,
-                    ),
-                    # allele region contained within query region
-                    and_(
-                        allele.Allele.start_position >= regions.c.start_position,
-                        allele.Allele.open_end_position <= regions.c.open_end_position,
-                    ),
-                    # overlapping regions
-                    and_(
-                        allele.Allele.start_position >= regions.c.padded_start_position,
-                        allele.Allele.start_position < regions.c.padded_open_end_position,
-                    ),
-                    # overlapping regions
-                    and_(
-                        allele.Allele.open_end_position > regions.c.padded_start_position,
-                        allele.Allele.open_end_position < regions.c.padded_open_end_position,
-                    ),
+                allele.Allele.chromosome == query_allele.chromosome,
+                allele.Allele.region.op("&&")(
+                    func.int4range(
+                        query_allele.start_position - max_dist,
+                        query_allele.open_end_position + max_dist,
+                    )
                 ),
+                allele.Allele.id != query_allele.id,
             ),
         )
         .filter(
+            query_allele.id.in_(allele_ids),
             allele.Allele.id.in_(assessed_allele_ids),
+            or_(
+                *[
+                    and_(
+                        allele.Allele.chromosome == chromosome,
+                        allele.Allele.region.op("&&")(
+                            func.int4range(start_position - max_dist, open_end_position + max_dist)
+                        ),
+                    )
+                    for chromosome, start_position, open_end_position in query_regions
+                ]
+            ),
         )
         .order_by(
             func.abs(
                 (allele.Allele.start_position + allele.Allele.open_end_position) / 2
-                - (regions.c.start_position + regions.c.open_end_position) / 2
+                - (query_allele.start_position + query_allele.open_end_position) / 2
             )
         )
     ).all()
@@ -11,7 +11,7 @@ from .migration_db import migration_downgrade, migration_upgrade
 
 
 def ci_migration_db_remake():
-    db = DB()
+    db = DB(role="cli")
     db.connect()
 
     # Drop all tables, including alembic one...
@@ -31,6 +31,6 @@ def ci_migration_head():
 
 
 def make_migration_base_db():
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     Base.metadata.create_all(db.engine)  # noqa: F405
@@ -3,12 +3,20 @@
 Script for dropping all tables in a vardb database.
 """
 import os
+import sys
 from contextlib import contextmanager
 
 import click
 import psycopg2
 
-from cli.decorators import cli_logger
+from cli.decorators import cli_logger, session
+from datalayer.assessmentvalidity import check_valid_until, update_valid_until
+from datalayer.latestinterpretation import (
+    check_latest_interpretations,
+    rebuild_latest_interpretations,
+)
+from datalayer.openworkflows import check_open_workflows, rebuild_open_workflows
+from datalayer.worklist import check_worklist, rebuild_worklist
 from vardb.datamodel import DB
 
 from .ci_migration_db import (
@@ -57,7 +65,7 @@ def database():
 @click.option("-f", is_flag=True, help="Do not ask for confirmation.")
 def cmd_drop_db(f=None):
     with confirm(click.echo, "Database dropped!", force=f):
-        db = DB()
+        db = DB(role="cli")
         db.connect()
         drop_db(db)
 
@@ -66,7 +74,7 @@ def cmd_drop_db(f=None):
 @click.option("-f", is_flag=True, help="Do not ask for confirmation.")
 def cmd_make_db(f=None):
     with confirm(click.echo, "Tables should now have been created.", force=f):
-        db = DB()
+        db = DB(role="cli")
         db.connect()
         make_db(db)
         db.session.commit()
@@ -76,7 +84,7 @@ def cmd_make_db(f=None):
 @click.option("-f", is_flag=True, help="Do not ask for confirmation.")
 @cli_logger()
 def cmd_refresh(logger, f=None):
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     logger.echo(
         "Creating temporary shadow tables and (re)creating triggers. This can take some time..."
@@ -199,6 +207,100 @@ def cmd_migration_compare():
     migration_compare()
 
 
+@database.command(
+    "worklist",
+    help="Compares the materialised overview worklist with the live workflow queries. "
+    "Error on mismatch, unless --rebuild is given.",
+    short_help="Check overview worklist",
+)
+@click.option("--rebuild", is_flag=True, help="Rebuild worklist if inconsistencies are found.")
+@session
+def cmd_worklist(session, rebuild=False):
+    inconsistencies = check_worklist(session)
+    for inconsistency in inconsistencies:
+        click.echo(inconsistency)
+    if not inconsistencies:
+        click.echo("Worklist is consistent")
+    elif rebuild:
+        rebuild_worklist(session)
+        session.commit()
+        click.echo(f"Worklist rebuilt ({len(inconsistencies)} inconsistencies fixed)")
+    else:
+        click.echo(f"Found {len(inconsistencies)} inconsistencies in worklist")
+        sys.exit(1)
+
+
+@database.command(
+    "assessment-validity",
+    help="Compares the time each allele assessment is valid until with the outdated_after_days "
+    "of the classification options in the config. Error on mismatch, unless --update is given.",
+    short_help="Check allele assessment validity",
+)
+@click.option(
+    "--update", is_flag=True, help="Update allele assessments if inconsistencies are found."
+)
+@session
+def cmd_assessment_validity(session, update=False):
+    inconsistencies = check_valid_until(session)
+    for inconsistency in inconsistencies:
+        click.echo(inconsistency)
+    if not inconsistencies:
+        click.echo("Allele assessment validity is consistent with config")
+    elif update:
+        num_updated = update_valid_until(session)
+        session.commit()
+        click.echo(f"Updated validity of {num_updated} allele assessments")
+    else:
+        click.echo(f"Found {len(inconsistencies)} allele assessments with outdated validity")
+        sys.exit(1)
+
+
+@database.command(
+    "latest-interpretations",
+    help="Compares the latest interpretation of each workflow (used by the workflow queries) with "
+    "the interpretations. Error on mismatch, unless --rebuild is given.",
+    short_help="Check latest interpretations",
+)
+@click.option("--rebuild", is_flag=True, help="Rebuild table if inconsistencies are found.")
+@session
+def cmd_latest_interpretations(session, rebuild=False):
+    inconsistencies = check_latest_interpretations(session)
+    for inconsistency in inconsistencies:
+        click.echo(inconsistency)
+    if not inconsistencies:
+        click.echo("Latest interpretations are consistent")
+    elif rebuild:
+        rebuild_latest_interpretations(session)
+        session.commit()
+        click.echo(f"Latest interpretations rebuilt ({len(inconsistencies)} inconsistencies fixed)")
+    else:
+        click.echo(f"Found {len(inconsistencies)} inconsistencies in latest interpretations")
+        sys.exit(1)
+
+
+@database.command(
+    "open-workflows",
+    help="Compares the alleles of open workflows (used for collision detection) with the live "
+    "workflow queries. Error on mismatch, unless --rebuild is given.",
+    short_help="Check open workflow alleles",
+)
+@click.option("--rebuild", is_flag=True, help="Rebuild table if inconsistencies are found.")
+@session
+def cmd_open_workflows(session, rebuild=False):
+    inconsistencies = check_open_workflows(session)
+    for inconsistency in inconsistencies:
+        click.echo(inconsistency)
+    if not inconsistencies:
+        click.echo("Open workflow alleles are consistent")
+    elif rebuild:
+        rebuild_open_workflows(session)
+        session.commit()
+        click.echo(f"Open workflow alleles rebuilt ({len(inconsistencies)} inconsistencies fixed)")
+    else:
+        click.echo(f"Found {len(inconsistencies)} inconsistencies in open workflow alleles")
+        sys.exit(1)
+
+
 @database.command(
     "make-production",
     help="Initializes an empty database for production.",
@@ -207,7 +309,7 @@ def cmd_migration_compare():
 @click.option("-f", is_flag=True, help="Do not ask for confirmation.")
 def cmd_make_production(f=None):
     with confirm(click.echo, "Tables should now have been created.", force=f):
-        db = DB()
+        db = DB(role="cli")
         db.connect()
         table_count = list(
             db.session.execute(
@@ -23,7 +23,7 @@ def _get_alembic_config():
 
 def migration_upgrade(rev):
     alembic_cfg = _get_alembic_config()
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         alembic_cfg.attributes["connection"] = connection
@@ -32,7 +32,7 @@ def migration_upgrade(rev):
 
 def migration_downgrade(rev):
     alembic_cfg = _get_alembic_config()
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         alembic_cfg.attributes["connection"] = connection
@@ -41,7 +41,7 @@ def migration_downgrade(rev):
 
 def migration_current():
     alembic_cfg = _get_alembic_config()
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         alembic_cfg.attributes["connection"] = connection
@@ -50,7 +50,7 @@ def migration_current():
 
 def migration_history(range=None, verbose=False):
     alembic_cfg = _get_alembic_config()
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         alembic_cfg.attributes["connection"] = connection
@@ -59,7 +59,7 @@ def migration_history(range=None, verbose=False):
 
 def migration_compare():
     alembic_cfg = _get_alembic_config()
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         context = MigrationContext.configure(connection)
@@ -79,7 +79,7 @@ def migration_compare():
 
 
 def mock_revision(revision):
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     with db.engine.begin() as connection:
         connection.execute(
@@ -4,13 +4,31 @@ from vardb.datamodel import sample, workflow, allele
 from datalayer.queries import annotation_transcripts_genepanel
 from api.schemas.alleleinterpretations import AlleleInterpretationOverviewSchema
 from cli.decorators import cli_logger, session
+from cli.commands.delete.purge import (
+    DEFAULT_CHUNK_SIZE,
+    PurgeStats,
+    analyses_to_purge,
+    collect_orphans,
+    orphaned_alleles,
+    purge_analysis,
+)
 
 from datetime import datetime
 
 
-def delete_analysis(session, analysis_id):
+def delete_analysis(session, analysis_id, chunk_size=DEFAULT_CHUNK_SIZE):
     with session.no_autoflush:
-        session.query(sample.Analysis).filter(sample.Analysis.id == analysis_id).delete()
+        return purge_analysis(session, analysis_id, chunk_size=chunk_size)
+
+
+def _echo_stats(logger, stats):
+    for table_name, table_stats in sorted(stats.as_dict().items()):
+        logger.echo(
+            "{}: {deleted} rows deleted in {transactions} transactions, "
+            "longest {max_duration:.3f}s, total {total_duration:.1f}s".format(
+                table_name, **table_stats
+            )
+        )
 
 
 @click.group(help="Delete actions")
@@ -79,6 +97,95 @@ def cmd_analysis_delete(logger, session, analysis_id):
         logger.echo("Lacking confirmation, aborting...")
 
 
+@delete.command("purge-analyses")
+@click.option(
+    "--older-than", type=int, help="Purge analyses deposited more than this many days ago"
+)
+@click.option(
+    "--name", "name_pattern", help="Purge analyses with name matching this regular expression"
+)
+@click.option(
+    "--include-ongoing", is_flag=True, help="Also purge analyses with an ongoing interpretation"
+)
+@click.option(
+    "--gc-orphans",
+    is_flag=True,
+    help="Delete alleles no longer referenced by any analysis, interpretation or assessment",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Maximum number of rows deleted per transaction",
+)
+@click.option("--dry-run", is_flag=True, help="List analyses to purge, without deleting them")
+@click.option("-y", "--yes", is_flag=True, help="Do not ask for confirmation")
+@session
+@cli_logger(prompt_reason=True)
+def cmd_purge_analyses(
+    logger,
+    session,
+    older_than,
+    name_pattern,
+    include_ongoing,
+    gc_orphans,
+    chunk_size,
+    dry_run,
+    yes,
+):
+    """
+    Purges analyses by age and/or name, in chunks of at most --chunk-size rows per table and
+    transaction, to keep locks short. An interrupted purge is continued by running the same
+    command again.
+
+    Does not delete any allele assessments. Alleles are only deleted with --gc-orphans, if they
+    are not referenced by anything else.
+    """
+    if older_than is None and not name_pattern and not gc_orphans:
+        raise click.UsageError("Give --older-than and/or --name, or --gc-orphans")
+
+    analyses = []
+    if older_than is not None or name_pattern:
+        analyses = analyses_to_purge(
+            session,
+            older_than_days=older_than,
+            name_pattern=name_pattern,
+            include_ongoing=include_ongoing,
+        )
+        for analysis in analyses:
+            logger.echo(
+                "{} {} (deposited {})".format(analysis.id, analysis.name, analysis.date_deposited)
+            )
+        logger.echo("{} analyses to purge".format(len(analyses)))
+
+    if dry_run:
+        if gc_orphans:
+            logger.echo(
+                "{} orphaned alleles before purge".format(orphaned_alleles(session).count())
+            )
+        return
+
+    if not yes and input("Type 'y' to confirm.\n") != "y":
+        logger.echo("Lacking confirmation, aborting...")
+        return
+
+    stats = PurgeStats()
+    analysis_ids = [(a.id, a.name) for a in analyses]
+    session.expunge_all()
+    for i, (analysis_id, name) in enumerate(analysis_ids, 1):
+        with session.no_autoflush:
+            purge_analysis(session, analysis_id, chunk_size=chunk_size, stats=stats)
+        logger.echo(
+            "[{}/{}] Purged analysis {} ({})".format(i, len(analysis_ids), analysis_id, name)
+        )
+
+    if gc_orphans:
+        collect_orphans(session, chunk_size=chunk_size, stats=stats, progress=logger.echo)
+
+    _echo_stats(logger, stats)
+
+
 @delete.command("alleleinterpretation")
 @click.argument("allele_id", type=int)
 @click.option(
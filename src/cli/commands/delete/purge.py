@@ -0,0 +1,243 @@
+"""
+Purging of analyses in bounded chunks, and garbage collection of orphaned alleles.
+
+Deleting an analysis row cascades through samples, genotypes, genotype sample data,
+interpretations, state history, logs and snapshots in one transaction, which holds locks on all
+of them for as long as it takes. Here, the largest of these are deleted in chunks, each committed
+in its own transaction, before the analysis row itself is deleted. Deletion is idempotent, so an
+interrupted purge is resumed by running it again.
+
+The analysis' interpretations are deleted first, so that a partially purged analysis is no longer
+part of any workflow.
+"""
+import datetime
+import re
+import time
+from collections import defaultdict
+from typing import Callable, DefaultDict, Dict, List, Optional
+
+import pytz
+from sqlalchemy import and_, exists, select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Table
+
+from datalayer.latestinterpretation import refresh_latest_interpretations
+from datalayer.openworkflows import refresh_open_workflows
+from datalayer.worklist import refresh_worklist
+from vardb.datamodel import Base, allele, annotation, genotype, sample, workflow
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Tables with rows belonging to an allele, which are deleted along with orphaned alleles.
+# The annotation shadow tables are cleared by trigger when annotations are deleted.
+ALLELE_OWNED_TABLES = ["annotation", "customannotation"]
+
+
+class PurgeStats(object):
+    """
+    Number of deleted rows and duration of each transaction (for which locks are held), by table.
+    """
+
+    def __init__(self):
+        self.deleted: DefaultDict[str, int] = defaultdict(int)
+        self.durations: DefaultDict[str, List[float]] = defaultdict(list)
+
+    def record(self, table_name: str, deleted: int, duration: float):
+        self.deleted[table_name] += deleted
+        self.durations[table_name].append(duration)
+
+    @property
+    def max_duration(self) -> float:
+        return max((max(d) for d in self.durations.values()), default=0.0)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {
+            table_name: {
+                "deleted": self.deleted[table_name],
+                "transactions": len(durations),
+                "max_duration": max(durations),
+                "total_duration": sum(durations),
+            }
+            for table_name, durations in self.durations.items()
+        }
+
+
+def _delete_in_chunks(
+    session: Session,
+    table: Table,
+    where,
+    chunk_size: int,
+    stats: PurgeStats,
+    progress: Optional[Callable[[str], None]] = None,
+):
+    """
+    Delete rows of table matching where, chunk_size rows per transaction.
+    """
+    key_columns = list(table.primary_key.columns)
+    keys = select(key_columns).where(where).limit(chunk_size)
+    if len(key_columns) == 1:
+        in_chunk = key_columns[0].in_(keys)
+    else:
+        in_chunk = tuple_(*key_columns).in_(keys)
+
+    while True:
+        start = time.monotonic()
+        deleted = session.execute(table.delete().where(in_chunk)).rowcount
+        session.commit()
+        stats.record(table.name, deleted, time.monotonic() - start)
+        if deleted and progress:
+            progress(f"Deleted {stats.deleted[table.name]} rows from {table.name}")
+        if deleted < chunk_size:
+            break
+
+
+def purge_analysis(
+    session: Session,
+    analysis_id: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    stats: Optional[PurgeStats] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> PurgeStats:
+    """
+    Delete an analysis with its samples, genotypes and interpretations, in chunks.
+
+    Allele assessments, reports and gene assessments are kept (their analysis_id is set to null).
+    """
+    if stats is None:
+        stats = PurgeStats()
+
+    def delete(table, where):
+        _delete_in_chunks(session, table, where, chunk_size, stats, progress)
+
+    interpretation_ids = select([workflow.AnalysisInterpretation.id]).where(
+        workflow.AnalysisInterpretation.analysis_id == analysis_id
+    )
+    for model in [
+        workflow.AnalysisInterpretationSnapshot,
+        workflow.InterpretationStateHistory,
+        workflow.InterpretationLog,
+    ]:
+        delete(model.__table__, model.analysisinterpretation_id.in_(interpretation_ids))
+    delete(
+        workflow.AnalysisInterpretation.__table__,
+        workflow.AnalysisInterpretation.analysis_id == analysis_id,
+    )
+    # Derived tables are otherwise only kept up to date by ORM changes to interpretations
+    refresh_latest_interpretations(session, analysis_ids=[analysis_id])
+    refresh_worklist(session, analysis_ids=[analysis_id])
+    refresh_open_workflows(session, analysis_ids=[analysis_id])
+    session.commit()
+
+    sample_ids = select([sample.Sample.id]).where(sample.Sample.analysis_id == analysis_id)
+    delete(
+        genotype.GenotypeSampleData.__table__,
+        genotype.GenotypeSampleData.sample_id.in_(sample_ids),
+    )
+    delete(genotype.Genotype.__table__, genotype.Genotype.sample_id.in_(sample_ids))
+    delete(sample.analysis_allele, sample.analysis_allele.c.analysis_id == analysis_id)
+
+    # Remaining rows (samples etc.) are few, and deleted by cascade
+    delete(sample.Analysis.__table__, sample.Analysis.id == analysis_id)
+    return stats
+
+
+def analyses_to_purge(
+    session: Session,
+    older_than_days: Optional[int] = None,
+    name_pattern: Optional[str] = None,
+    include_ongoing: bool = False,
+) -> List[sample.Analysis]:
+    """
+    Analyses deposited more than older_than_days ago, with name matching the regular expression
+    name_pattern. Analyses with an Ongoing interpretation are excluded, unless include_ongoing.
+    """
+    assert older_than_days is not None or name_pattern, "No selection given"
+    analyses = session.query(sample.Analysis)
+    if older_than_days is not None:
+        deposited_before = datetime.datetime.now(pytz.utc) - datetime.timedelta(
+            days=older_than_days
+        )
+        analyses = analyses.filter(sample.Analysis.date_deposited < deposited_before)
+    if name_pattern:
+        re.compile(name_pattern)  # Fail early on invalid patterns
+        analyses = analyses.filter(sample.Analysis.name.op("~")(name_pattern))
+    if not include_ongoing:
+        analyses = analyses.filter(
+            ~exists().where(
+                and_(
+                    workflow.LatestInterpretation.analysis_id == sample.Analysis.id,
+                    workflow.LatestInterpretation.status == "Ongoing",
+                )
+            )
+        )
+    return analyses.order_by(sample.Analysis.id).all()
+
+
+def _allele_references() -> List:
+    "Columns referencing allele.id, other than from tables owned by the allele"
+    references = []
+    for table in Base.metadata.tables.values():
+        if table.name in ALLELE_OWNED_TABLES or table.name.startswith("annotationshadow"):
+            continue
+        for fk in table.foreign_keys:
+            if fk.column is allele.Allele.__table__.c.id:
+                references.append(fk.parent)
+    return references
+
+
+def orphaned_alleles(session: Session, after_id: int = 0, limit: Optional[int] = None):
+    """
+    Query for ids of alleles not referenced by any analysis, genotype, interpretation,
+    assessment etc., ordered by id.
+    """
+    is_referenced = [exists().where(column == allele.Allele.id) for column in _allele_references()]
+    orphans = (
+        session.query(allele.Allele.id)
+        .filter(allele.Allele.id > after_id, *[~r for r in is_referenced])
+        .order_by(allele.Allele.id)
+    )
+    if limit is not None:
+        orphans = orphans.limit(limit)
+    return orphans
+
+
+def collect_orphans(
+    session: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    stats: Optional[PurgeStats] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> PurgeStats:
+    """
+    Delete orphaned alleles with their annotations and custom annotations, chunk_size alleles
+    per transaction.
+    """
+    if stats is None:
+        stats = PurgeStats()
+
+    last_id = 0
+    while True:
+        start = time.monotonic()
+        allele_ids = [
+            a[0] for a in orphaned_alleles(session, after_id=last_id, limit=chunk_size).all()
+        ]
+        if not allele_ids:
+            session.commit()
+            break
+        deleted = {}
+        for table, allele_id_column in [
+            (annotation.Annotation.__table__, annotation.Annotation.allele_id),
+            (annotation.CustomAnnotation.__table__, annotation.CustomAnnotation.allele_id),
+            (allele.Allele.__table__, allele.Allele.id),
+        ]:
+            deleted[table.name] = session.execute(
+                table.delete().where(allele_id_column.in_(allele_ids))
+            ).rowcount
+        session.commit()
+        # All tables are deleted from in the same transaction
+        duration = time.monotonic() - start
+        for table_name, n in deleted.items():
+            stats.record(table_name, n, duration)
+        last_id = allele_ids[-1]
+        if progress:
+            progress(f"Deleted {stats.deleted['allele']} orphaned alleles")
+    return stats
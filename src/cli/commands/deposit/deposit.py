@@ -11,7 +11,7 @@ from vardb.deposit.deposit_alleles import DepositAlleles
 from vardb.deposit.deposit_analysis import DepositAnalysis
 from vardb.deposit.deposit_custom_annotations import import_custom_annotations
 from vardb.deposit.deposit_genepanel import DepositGenepanel
-from vardb.deposit.deposit_references import import_references
+from vardb.deposit.deposit_references import import_references, import_references_bulk
 
 VCF_FIELDS_RE = re.compile(
     r"(?P<analysis_name>.+[.-](?P<genepanel_name>.+)[-_](?P<genepanel_version>.+))\.vcf"
@@ -98,16 +98,24 @@ def cmd_deposit_annotation(logger, session, vcf):
 
 @deposit.command("references")
 @click.argument("references_json", type=click.Path(exists=True))
+@click.option(
+    "--bulk",
+    is_flag=True,
+    help="Stage the file with COPY and upsert in large chunks. Use for large reference files.",
+)
 @session
 @cli_logger()
-def cmd_deposit_references(logger, session, references_json):
+def cmd_deposit_references(logger, session, references_json, bulk=False):
     """
     Deposit/update a set of references into database given by DB_URL.
 
     Input is a line separated JSON file, with one reference object per line.
     """
-    import_references(session, references_json)
-    logger.echo("References imported successfully")
+    if bulk:
+        created, updated = import_references_bulk(session, references_json)
+    else:
+        created, updated = import_references(session, references_json)
+    logger.echo(f"References imported successfully (created: {created}, updated: {updated})")
 
 
 @deposit.command("custom_annotation")
@@ -1,6 +1,7 @@
 import click
 import datetime
 from pathlib import Path
+from pubmed.pubmed_baseline import get_references_from_files
 from pubmed.pubmed_fetcher import PubMedFetcher
 
 
@@ -11,9 +12,59 @@ def references():
 
 @references.command("fetch")
 @click.argument("pubmed_ids", type=click.Path(exists=True, path_type=Path), required=True)
-def cmd_references_fetch(pubmed_ids):
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Cache fetched articles here. References already cached are not fetched again.",
+)
+@click.option(
+    "--requests-per-second",
+    type=float,
+    default=PubMedFetcher.REQUESTS_PER_SECOND,
+    show_default=True,
+    help="Maximum rate of queries to Entrez (max 10 with an API key)",
+)
+@click.option(
+    "--max-concurrent",
+    type=int,
+    default=PubMedFetcher.MAX_CONCURRENT,
+    show_default=True,
+    help="Maximum number of queries in flight",
+)
+@click.option("--api-key", envvar="NCBI_API_KEY", help="NCBI API key [env: NCBI_API_KEY]")
+def cmd_references_fetch(
+    pubmed_ids, cache_dir=None, requests_per_second=None, max_concurrent=None, api_key=None
+):
     d = datetime.datetime.now()
 
     output = "references-" + d.strftime("%y%m%d") + ".txt"
-    pm = PubMedFetcher()
+    pm = PubMedFetcher(
+        requests_per_second=requests_per_second,
+        max_concurrent=max_concurrent,
+        cache_dir=cache_dir,
+        api_key=api_key,
+    )
     pm.get_references_from_file(pubmed_ids, Path(output))
+
+
+@references.command("parse-baseline")
+@click.argument("xml_files", type=click.Path(exists=True, path_type=Path), nargs=-1, required=True)
+@click.option(
+    "--output",
+    type=click.Path(path_type=Path),
+    help="Output file (default references-<date>.txt)",
+)
+@click.option(
+    "--processes", type=int, help="Number of files to parse in parallel (default: number of CPUs)"
+)
+def cmd_references_parse_baseline(xml_files, output=None, processes=None):
+    """
+    Parse offline PubMed baseline/update files (PubmedArticleSet XML, optionally gzipped).
+
+    Files are parsed in parallel, and the references are written in the order of the files.
+    The output can be imported with 'deposit references --bulk'.
+    """
+    if output is None:
+        output = Path("references-" + datetime.datetime.now().strftime("%y%m%d") + ".txt")
+    n_refs = get_references_from_files(list(xml_files), output, processes=processes)
+    click.echo(f"Wrote {n_refs} references to {output}")
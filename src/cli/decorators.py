@@ -41,7 +41,7 @@ class CliLogger(object):
         self.log.command = " ".join(sys.argv[1:])
         self.log.reason = self.reason
 
-        db = DB()
+        db = DB(role="cli")
         db.connect()
         session = db.session
         session.add(self.log)
@@ -81,7 +81,7 @@ def session(f):
     def new_func(*args, **kwargs):
         ctx = click.get_current_context()
         if not getattr(ctx, "session", None):
-            db = DB()
+            db = DB(role="cli")
             db.connect()
             ctx.db = db
             ctx.session = db.session
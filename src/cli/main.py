@@ -3,19 +3,43 @@
 Ella command line interface
 """
 import os
+from importlib import import_module
 import click
-from cli.commands.broadcast.broadcast import broadcast
-from cli.commands.database.database import database
-from cli.commands.deposit.deposit import deposit
-from cli.commands.references.references import references
-from cli.commands.users.users import users
-from cli.commands.filterconfigs.filterconfigs import filterconfigs
-from cli.commands.annotationconfig.annotationconfig import annotationconfig
-from cli.commands.delete.delete import delete
 
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 
+# Command groups are imported when used, so that e.g. 'users list' doesn't import the deposit code
+LAZY_COMMANDS = {
+    "annotationconfig": "cli.commands.annotationconfig.annotationconfig:annotationconfig",
+    "broadcast": "cli.commands.broadcast.broadcast:broadcast",
+    "database": "cli.commands.database.database:database",
+    "delete": "cli.commands.delete.delete:delete",
+    "deposit": "cli.commands.deposit.deposit:deposit",
+    "filterconfigs": "cli.commands.filterconfigs.filterconfigs:filterconfigs",
+    "references": "cli.commands.references.references:references",
+    "users": "cli.commands.users.users:users",
+}
+
+
+class LazyGroup(click.Group):
+    """
+    Group with subcommands given as 'module:attribute' import paths, imported on first use.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_path, attribute = self.lazy_commands[cmd_name].split(":")
+            self.add_command(getattr(import_module(module_path), attribute), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
 
 @click.command("igv-download", help="Download IGV.js data")
 @click.argument("target")
@@ -23,20 +47,12 @@ def download_igv(target):
     os.system(os.path.join(SCRIPT_DIR, "commands", "fetch-igv-data.sh") + " " + target)
 
 
-@click.group()
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
 def cli_group():
     pass
 
 
-cli_group.add_command(broadcast)
-cli_group.add_command(database)
-cli_group.add_command(deposit)
-cli_group.add_command(delete)
 cli_group.add_command(download_igv)
-cli_group.add_command(references)
-cli_group.add_command(users)
-cli_group.add_command(filterconfigs)
-cli_group.add_command(annotationconfig)
 
 if __name__ == "__main__":
     from applogger import setup_logger
@@ -0,0 +1,39 @@
+import pytest
+
+from api.tests.importtime_helper import import_time
+from cli.main import LAZY_COMMANDS
+
+# Ceilings for loading each command group, well above the expected times to avoid flaky tests
+GROUP_IMPORT_CEILINGS = {
+    "annotationconfig": 1.5,
+    "broadcast": 1.5,
+    "database": 2.0,
+    "delete": 1.5,
+    "deposit": 2.0,
+    "filterconfigs": 1.5,
+    "references": 1.5,
+    "users": 1.5,
+}
+
+
+def test_main_import():
+    _, modules = import_time("import cli.main")
+    assert not any(m.startswith("cli.commands.") for m in modules)
+
+
+@pytest.mark.parametrize("group", sorted(LAZY_COMMANDS))
+def test_group_import_time(group):
+    module_path = LAZY_COMMANDS[group].split(":")[0]
+    elapsed, modules = import_time(
+        f"from cli.main import cli_group; import {module_path}; "
+        f"assert cli_group.get_command(None, '{group}') is not None"
+    )
+
+    # Other command groups are not imported
+    assert module_path in modules
+    assert not any(
+        m.startswith("cli.commands.") and not m.startswith(f"cli.commands.{group}") for m in modules
+    )
+    if group not in ("database", "deposit"):
+        assert "vardb.deposit.deposit_alleles" not in modules
+    assert elapsed < GROUP_IMPORT_CEILINGS[group]
@@ -0,0 +1,145 @@
+import re
+import time
+
+from cli.commands.delete.purge import PurgeStats, orphaned_alleles, purge_analysis
+from vardb.datamodel import allele, annotation, assessment, genotype, sample, workflow
+
+
+def _analysis_counts(session, analysis_id):
+    sample_ids = session.query(sample.Sample.id).filter(sample.Sample.analysis_id == analysis_id)
+    return {
+        "analysis": session.query(sample.Analysis)
+        .filter(sample.Analysis.id == analysis_id)
+        .count(),
+        "sample": sample_ids.count(),
+        "genotype": session.query(genotype.Genotype)
+        .filter(genotype.Genotype.sample_id.in_(sample_ids.subquery()))
+        .count(),
+        "analysisinterpretation": session.query(workflow.AnalysisInterpretation)
+        .filter(workflow.AnalysisInterpretation.analysis_id == analysis_id)
+        .count(),
+        "worklist": session.query(workflow.WorklistEntry)
+        .filter(workflow.WorklistEntry.analysis_id == analysis_id)
+        .count(),
+    }
+
+
+def test_purge_analyses_by_name(session, test_database, run_command):
+    test_database.refresh()
+    analysis_id, name = (
+        session.query(sample.Analysis.id, sample.Analysis.name).order_by(sample.Analysis.id).first()
+    )
+    other_ids = [
+        a[0] for a in session.query(sample.Analysis.id).filter(sample.Analysis.id != analysis_id)
+    ]
+    n_assessments = session.query(assessment.AlleleAssessment).count()
+    assert _analysis_counts(session, analysis_id)["genotype"] > 3
+    session.rollback()
+
+    result = run_command(
+        [
+            "delete",
+            "purge-analyses",
+            "--name",
+            f"^{re.escape(name)}$",
+            "--include-ongoing",
+            "--chunk-size",
+            "3",
+            "-y",
+        ],
+        input="Some reason\n",
+    )
+    assert result.exit_code == 0, result.output
+    assert "1 analyses to purge" in result.output
+
+    session.rollback()
+    assert set(_analysis_counts(session, analysis_id).values()) == {0}
+    assert sorted(a[0] for a in session.query(sample.Analysis.id)) == sorted(other_ids)
+    assert session.query(assessment.AlleleAssessment).count() == n_assessments
+
+
+def test_purge_analyses_dry_run(session, test_database, run_command):
+    test_database.refresh()
+    n_analyses = session.query(sample.Analysis).count()
+    session.rollback()
+
+    result = run_command(
+        ["delete", "purge-analyses", "--older-than", "0", "--include-ongoing", "--dry-run"],
+        input="Some reason\n",
+    )
+    assert result.exit_code == 0, result.output
+    assert f"{n_analyses} analyses to purge" in result.output
+    session.rollback()
+    assert session.query(sample.Analysis).count() == n_analyses
+
+
+def test_purge_resumes(session, test_database):
+    "A partially purged analysis is purged completely on the next run"
+    test_database.refresh()
+    analysis_id = session.query(sample.Analysis.id).order_by(sample.Analysis.id).first()[0]
+
+    # Simulate a purge interrupted after deleting the interpretations
+    session.query(workflow.AnalysisInterpretation).filter(
+        workflow.AnalysisInterpretation.analysis_id == analysis_id
+    ).delete(synchronize_session=False)
+    session.commit()
+
+    purge_analysis(session, analysis_id, chunk_size=2)
+    assert set(_analysis_counts(session, analysis_id).values()) == {0}
+
+
+def test_gc_orphans(session, test_database, run_command):
+    test_database.refresh()
+    assessed_allele_ids = {
+        a[0] for a in session.query(assessment.AlleleAssessment.allele_id).distinct()
+    }
+    session.rollback()
+
+    result = run_command(
+        [
+            "delete",
+            "purge-analyses",
+            "--name",
+            ".*",
+            "--include-ongoing",
+            "--gc-orphans",
+            "--chunk-size",
+            "5",
+            "-y",
+        ],
+        input="Some reason\n",
+    )
+    assert result.exit_code == 0, result.output
+
+    session.rollback()
+    assert session.query(sample.Analysis).count() == 0
+    assert orphaned_alleles(session).count() == 0
+    remaining_allele_ids = {a[0] for a in session.query(allele.Allele.id)}
+    assert assessed_allele_ids <= remaining_allele_ids
+    # Annotations of collected alleles are deleted with them
+    assert {
+        a[0] for a in session.query(annotation.Annotation.allele_id).distinct()
+    } <= remaining_allele_ids
+
+
+def test_purge_lock_duration(session, test_database):
+    "Compare the longest transaction of a chunked purge with deleting the analysis directly"
+    test_database.refresh()
+    analysis_ids = [a[0] for a in session.query(sample.Analysis.id).order_by(sample.Analysis.id)]
+    chunked, direct = analysis_ids[0::2], analysis_ids[1::2]
+
+    stats = PurgeStats()
+    for analysis_id in chunked:
+        purge_analysis(session, analysis_id, chunk_size=10, stats=stats)
+
+    direct_durations = []
+    for analysis_id in direct:
+        start = time.monotonic()
+        session.query(sample.Analysis).filter(sample.Analysis.id == analysis_id).delete(
+            synchronize_session=False
+        )
+        session.commit()
+        direct_durations.append(time.monotonic() - start)
+
+    assert session.query(sample.Analysis).count() == 0
+    assert stats.max_duration < max(direct_durations)
@@ -1,6 +1,9 @@
+import hashlib
+import json
 import logging
-from collections import defaultdict
-from typing import Any, Dict, List
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, List, Optional
 
 from api import schemas
 from api.config import config
@@ -8,12 +11,59 @@ from api.schemas.pydantic.v1.references import OptReferenceAssessment
 from rule_engine.grc import ACMGClassifier2015
 from rule_engine.gre import GRE
 from rule_engine.mapping_rules import rules
-from vardb.datamodel import allele, gene
+from vardb.datamodel import allele, annotation, gene
 
+from . import queries
 from .acmgconfig import AcmgConfig
-from .alleledataloader.alleledataloader import AlleleDataLoader
+from .alleledataloader.annotationprocessor import AnnotationProcessor
 from .allelefilter.frequencyfilter import FrequencyFilter
 
+# Annotation data needed for the rule engine input. The rules read 'external' and 'prediction'
+# (merged with custom annotation), and the transcript selected from 'transcripts'.
+ANNOTATION_KEYS = ["transcripts", "external", "prediction"]
+CUSTOM_ANNOTATION_KEYS = ["external", "prediction"]
+RULE_DATA_KEYS = ["external", "prediction"]
+
+
+def _checksum(data: Any) -> str:
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ACMGResultCache:
+    """
+    LRU cache of ACMG codes per allele.
+
+    Keyed by everything the codes are computed from: the annotation and custom annotation ids,
+    the genepanel and its revision, and checksums of the reference assessments and the ACMG config.
+    Cached codes are shared between requests, treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        with self._lock:
+            codes = self._entries.get(key)
+            if codes is not None:
+                self._entries.move_to_end(key)
+            return codes
+
+    def set(self, key: Hashable, codes: List[Dict]):
+        with self._lock:
+            self._entries[key] = codes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+acmg_result_cache = ACMGResultCache()
+
 
 class ACMGDataLoader(object):
     def __init__(self, session):
@@ -72,71 +122,112 @@ class ACMGDataLoader(object):
         passed_data = schemas.RuleSchema().dump(passed, many=True).data
         return passed_data
 
-    def _from_data(
+    def _load_annotation_data(
         self,
-        alleles: List[Dict[str, Any]],
-        reference_assessments: List[OptReferenceAssessment],
+        annotation_ids: Dict[int, int],
+        custom_annotation_ids: Dict[int, int],
         genepanel: gene.Genepanel,
-        acmgconfig: Dict[str, Any],
-    ):
+    ) -> Dict[int, Dict[str, Any]]:
         """
-        Calculates ACMG codes for a list of alleles already preloaded using the AlleleDataLoader.
-        They must have been loaded with include_annotation and include_custom_annotation.
-        A dictionary with the final data is returned, with allele id as keys.
+        Loads the annotation data needed by the rules, processed like in AlleleDataLoader, with
+        'filtered_transcripts' set to the allele's transcripts in the genepanel.
 
-        :param alleles: List of allele data from AlleleDataLoader.
-        :param reference_assessments: List of referenceassessments (dicts) to use.
-        :param genepanel: Genepanel to be used in annotationprocessor.
-        :type genepanel: vardb.datamodel.gene.Genepanel
-        :returns: dict with converted data using schema data.
+        :param annotation_ids: Annotation id per allele id
+        :param custom_annotation_ids: Custom annotation id per allele id
         """
 
-        resolver = AcmgConfig(self.session, acmgconfig, genepanel)
-        allele_ids = [a["id"] for a in alleles]
-        allele_classifications = dict()
-        ra_per_allele = defaultdict(list)
-        for ra in reference_assessments:
-            ra_per_allele[ra.allele_id].append(ra)
+        def load_annotations(model, ids, keys):
+            if not ids:
+                return {}
+            rows = (
+                self.session.query(model.allele_id, *[model.annotations[k] for k in keys])
+                .filter(model.id.in_(ids))
+                .all()
+            )
+            return {r[0]: {k: v for k, v in zip(keys, r[1:]) if v is not None} for r in rows}
+
+        annotations = load_annotations(
+            annotation.Annotation, list(annotation_ids.values()), ANNOTATION_KEYS
+        )
+        custom_annotations = load_annotations(
+            annotation.CustomAnnotation,
+            list(custom_annotation_ids.values()),
+            CUSTOM_ANNOTATION_KEYS,
+        )
+
+        filtered_transcripts = defaultdict(set)
+        if annotation_ids:
+            annotation_transcripts_genepanel = queries.annotation_transcripts_genepanel(
+                self.session,
+                [(genepanel.name, genepanel.version)],
+                annotation_ids=list(annotation_ids.values()),
+            ).subquery()
+            for allele_id, transcript in self.session.query(
+                annotation_transcripts_genepanel.c.allele_id,
+                annotation_transcripts_genepanel.c.annotation_transcript,
+            ):
+                filtered_transcripts[allele_id].add(transcript)
+
+        annotation_data = dict()
+        for allele_id in annotation_ids:
+            processed = AnnotationProcessor.process(
+                annotations.get(allele_id, {}),
+                custom_annotation=custom_annotations.get(allele_id),
+                genepanel=genepanel,
+            )
+            if "transcripts" in processed:
+                processed["filtered_transcripts"] = sorted(filtered_transcripts[allele_id])
+            annotation_data[allele_id] = processed
+        return annotation_data
 
+    def _get_codes(
+        self,
+        allele_ids: List[int],
+        annotation_data: Dict[int, Dict[str, Any]],
+        refassessments: Dict[int, Dict[str, Dict]],
+        genepanel: gene.Genepanel,
+        acmgconfig: Dict[str, Any],
+    ) -> Dict[int, List[Dict]]:
+        """
+        Runs the rule engine for the given alleles.
+
+        :param annotation_data: Annotation data per allele id, from _load_annotation_data()
+        :param refassessments: Reference assessment evaluations per allele id, keyed by
+            '{allele_id}_{reference_id}'
+        :returns: ACMG codes (dicts) per allele id
+        """
+        resolver = AcmgConfig(self.session, acmgconfig, genepanel)
         frequency_filter = FrequencyFilter(self.session, config)
         gp_key = (genepanel.name, genepanel.version)
-
-        acmg_frequency_config = resolver.get_commoness_config()
         commonness_groups = frequency_filter.get_commonness_groups(
-            {gp_key: allele_ids}, acmg_frequency_config
+            {gp_key: allele_ids}, resolver.get_commoness_config()
         )[gp_key]
 
-        for a in alleles:
-            # Add extra data/keys that the rule engine expects to be there
-            annotation_data = a["annotation"]
-            annotation_data["frequencies"] = {}
-            annotation_data["frequencies"]["commonness"] = next(
-                k for k, v in commonness_groups.items() if a["id"] in v
-            )
+        resolved_genepanel_config = dict()
+        allele_codes = dict()
+        for allele_id in allele_ids:
+            allele_annotation = annotation_data.get(allele_id, {})
+            # Only pass the data read by the rules, everything passed is flattened by the engine
+            rule_data = {k: allele_annotation[k] for k in RULE_DATA_KEYS if k in allele_annotation}
+            rule_data["frequencies"] = {
+                "commonness": next(k for k, v in commonness_groups.items() if allele_id in v)
+            }
+            if allele_id in refassessments:
+                rule_data["refassessment"] = refassessments[allele_id]
+
+            transcript = ACMGDataLoader._find_single_transcript(allele_annotation)
+            rule_data["transcript"] = transcript
+            if not transcript:
+                logging.warning(
+                    f"No single transcript found for allele {allele_id} with {genepanel}"
+                )
+            hgnc_id = transcript["hgnc_id"] if transcript else None
+            if hgnc_id not in resolved_genepanel_config:
+                resolved_genepanel_config[hgnc_id] = resolver.resolve(hgnc_id)
+            rule_data["genepanel"] = resolved_genepanel_config[hgnc_id]
 
-            if a["id"] in ra_per_allele:
-                annotation_data["refassessment"] = {
-                    str("_".join([str(r.allele_id), str(r.reference_id)])): r.evaluation
-                    for r in ra_per_allele[a["id"]]
-                }
-
-            transcript = ACMGDataLoader._find_single_transcript(annotation_data)
-            annotation_data["transcript"] = transcript
-            if transcript:
-                annotation_data["genepanel"] = resolver.resolve(transcript["hgnc_id"])
-            else:
-                if "transcript" in annotation_data:
-                    logging.warning(
-                        f"No filtered_transcripts found for allele {a['id']} with {genepanel}"
-                    )
-                    # breakpoint()
-                else:
-                    logging.warning(f"No transcript found for allele {a['id']}")
-                annotation_data["genepanel"] = resolver.resolve(None)
-
-            passed_data = self.get_acmg_codes(annotation_data)
-            allele_classifications[a["id"]] = {"codes": passed_data}
-        return allele_classifications
+            allele_codes[allele_id] = self.get_acmg_codes(rule_data)
+        return allele_codes
 
     def from_objs(
         self,
@@ -149,8 +240,10 @@ class ACMGDataLoader(object):
         Calculates ACMG codes for a list of alleles model objects.
         A dictionary with the final data is returned, with allele.id as keys.
 
-        Annotation data will be loaded automatically, using the AlleleDataLoader. If you already
-        have alleles loaded with the AlleleDataLoader, see from_data().
+        Only the annotation data read by the rules is loaded, for the current annotation and
+        custom annotation of each allele. Codes are cached per allele (see ACMGResultCache), so
+        that only alleles with changed input are evaluated again, e.g. when suggestions are
+        requested after a reference assessment changed.
 
         :param alleles: List
         :type alleles: vardb.datamodel.allele.Allele
@@ -159,14 +252,74 @@ class ACMGDataLoader(object):
         :type genepanel: vardb.datamodel.gene.Genepanel
         :returns: dict with converted data using schema data.
         """
-        id_str = ", ".join(str(a.id) for a in alleles)
-        logging.info(
-            f"generating ACMG data for {len(alleles)} ({id_str}) alleles in {genepanel} genepanel"
+        allele_ids = [a.id for a in alleles]
+        if not allele_ids:
+            return {}
+
+        def current_ids(model):
+            return dict(
+                self.session.query(model.allele_id, model.id).filter(
+                    model.allele_id.in_(allele_ids), model.date_superceeded.is_(None)
+                )
+            )
+
+        annotation_ids = current_ids(annotation.Annotation)
+        custom_annotation_ids = current_ids(annotation.CustomAnnotation)
+        genepanel_revision = (
+            self.session.query(gene.GenepanelSignature.revision)
+            .filter(
+                gene.GenepanelSignature.genepanel_name == genepanel.name,
+                gene.GenepanelSignature.genepanel_version == genepanel.version,
+            )
+            .scalar()
         )
-        loaded_alleles = AlleleDataLoader(self.session).from_objs(
-            alleles,
-            genepanel=genepanel,
-            include_allele_assessment=False,
-            include_reference_assessments=False,
+
+        refassessments: Dict[int, Dict[str, Dict]] = defaultdict(dict)
+        for ra in reference_assessments:
+            refassessments[ra.allele_id][f"{ra.allele_id}_{ra.reference_id}"] = ra.evaluation.dict(
+                exclude_none=True
+            )
+
+        acmgconfig_checksum = _checksum(acmgconfig)
+        cache_keys = {
+            allele_id: (
+                annotation_ids.get(allele_id),
+                custom_annotation_ids.get(allele_id),
+                genepanel.name,
+                genepanel.version,
+                genepanel_revision,
+                _checksum(refassessments.get(allele_id, {})),
+                acmgconfig_checksum,
+            )
+            for allele_id in allele_ids
+        }
+
+        allele_codes = dict()
+        # Genepanels without signature (should not happen) are not cached, as we can't tell
+        # when they change
+        if genepanel_revision is not None:
+            for allele_id in allele_ids:
+                codes = acmg_result_cache.get(cache_keys[allele_id])
+                if codes is not None:
+                    allele_codes[allele_id] = codes
+
+        missing_ids = [a for a in allele_ids if a not in allele_codes]
+        logging.info(
+            f"generating ACMG data for {len(missing_ids)} of {len(allele_ids)} alleles "
+            f"({', '.join(str(a) for a in missing_ids)}) in {genepanel} genepanel"
         )
-        return self._from_data(loaded_alleles, reference_assessments, genepanel, acmgconfig)
+        if missing_ids:
+            annotation_data = self._load_annotation_data(
+                {a: annotation_ids[a] for a in missing_ids if a in annotation_ids},
+                {a: custom_annotation_ids[a] for a in missing_ids if a in custom_annotation_ids},
+                genepanel,
+            )
+            computed = self._get_codes(
+                missing_ids, annotation_data, refassessments, genepanel, acmgconfig
+            )
+            for allele_id, codes in computed.items():
+                if genepanel_revision is not None:
+                    acmg_result_cache.set(cache_keys[allele_id], codes)
+                allele_codes[allele_id] = codes
+
+        return {allele_id: {"codes": allele_codes[allele_id]} for allele_id in allele_ids}
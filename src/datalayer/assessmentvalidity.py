@@ -0,0 +1,128 @@
+"""
+Validity of allele assessment classifications.
+
+A classification becomes outdated `outdated_after_days` after the assessment was created, as given
+by the classification options in the config. Comparing date_created against this for each
+classification can not use an index, so the time each assessment is valid until is stored in
+AlleleAssessment.valid_until instead (null if the classification never becomes outdated), and
+queries.valid_alleleassessments_filter() is a range predicate on it.
+
+valid_until is set on flush for new assessments, and for assessments with changed classification
+or date_created, using the config in force at that time. If outdated_after_days is changed in the
+config later, check_valid_until() reports the assessments with stale values, and
+update_valid_until() recomputes them.
+"""
+import datetime
+import itertools
+from typing import Dict, List, Optional
+
+import pytz
+from sqlalchemy import case, inspect, null
+from sqlalchemy.orm import Session
+
+from api.config import config
+from vardb.datamodel import assessment
+
+# Attributes that valid_until is computed from
+TRACKED_ATTRIBUTES = ["classification", "date_created"]
+
+
+def _outdated_after_days(options: Optional[List[Dict]] = None) -> Dict[str, Optional[int]]:
+    "Returns {classification: outdated_after_days (None if never outdated)}"
+    if options is None:
+        options = config["classification"]["options"]
+    return {option["value"]: option.get("outdated_after_days") for option in options}
+
+
+def valid_until(
+    classification: str, date_created: datetime.datetime, options: Optional[List[Dict]] = None
+) -> Optional[datetime.datetime]:
+    """
+    Time an assessment with given classification and date_created is valid until.
+
+    Classifications missing from the config options are never valid.
+    """
+    outdated_after_days = _outdated_after_days(options)
+    if classification not in outdated_after_days:
+        return date_created
+    if outdated_after_days[classification] is None:
+        return None
+    return date_created + datetime.timedelta(days=outdated_after_days[classification])
+
+
+def valid_until_expression(options: Optional[List[Dict]] = None):
+    "SQL expression computing valid_until of AlleleAssessment, like valid_until()"
+    AlleleAssessment = assessment.AlleleAssessment
+    whens = [
+        (
+            AlleleAssessment.classification == classification,
+            null()
+            if days is None
+            else AlleleAssessment.date_created + datetime.timedelta(days=days),
+        )
+        for classification, days in _outdated_after_days(options).items()
+        # Options that can not be stored (e.g. 'T') can not be compared with the column either
+        if classification in AlleleAssessment.classification.type.enums
+    ]
+    if not whens:
+        return AlleleAssessment.date_created
+    return case(whens, else_=AlleleAssessment.date_created)
+
+
+def _stale_valid_until(session: Session, options: Optional[List[Dict]] = None):
+    return session.query(assessment.AlleleAssessment).filter(
+        assessment.AlleleAssessment.valid_until.is_distinct_from(valid_until_expression(options))
+    )
+
+
+def check_valid_until(session: Session, options: Optional[List[Dict]] = None) -> List[str]:
+    """
+    Compare valid_until of all allele assessments with the config.
+
+    Returns a list of descriptions of inconsistencies (empty if all are up to date).
+    """
+    stale = (
+        _stale_valid_until(session, options)
+        .with_entities(
+            assessment.AlleleAssessment.id,
+            assessment.AlleleAssessment.classification,
+            assessment.AlleleAssessment.valid_until,
+            valid_until_expression(options),
+        )
+        .order_by(assessment.AlleleAssessment.id)
+    )
+    return [
+        f"Allele assessment {id} (class {classification}) has valid_until {stored!s}, "
+        f"expected {expected!s}"
+        for id, classification, stored, expected in stale
+    ]
+
+
+def update_valid_until(session: Session, options: Optional[List[Dict]] = None) -> int:
+    """
+    Recompute valid_until of all allele assessments from the config.
+
+    Objects already loaded in the session are not updated. Returns the number of updated
+    assessments.
+    """
+    return _stale_valid_until(session, options).update(
+        {assessment.AlleleAssessment.valid_until: valid_until_expression(options)},
+        synchronize_session=False,
+    )
+
+
+def set_valid_until(session: Session):
+    "Set valid_until of new and changed allele assessments. Called from the before_flush event."
+    for obj in itertools.chain(session.new, session.dirty):
+        if not isinstance(obj, assessment.AlleleAssessment):
+            continue
+        state = inspect(obj)
+        if state.attrs.valid_until.history.has_changes():
+            # Set explicitly
+            continue
+        if obj in session.new or any(
+            state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRIBUTES
+        ):
+            if obj.date_created is None:
+                obj.date_created = datetime.datetime.now(pytz.utc)
+            obj.valid_until = valid_until(obj.classification, obj.date_created)
@@ -0,0 +1,157 @@
+"""
+Process-wide cache of serialized genepanel data.
+
+Transcripts, phenotypes and inheritances of a genepanel only change when the genepanel is
+(re)deposited, which bumps GenepanelSignature.revision (see datalayer/genepanelsimilarity.py).
+The serialized data is cached per genepanel and revision, grouped by gene, so that callers only
+need to pick the genes they are interested in.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from api import schemas
+from vardb.datamodel import gene
+
+GenepanelKey = Tuple[str, str]
+
+
+class GenepanelData:
+    """
+    Serialized data for one genepanel revision. Treat as read-only, it is shared between requests.
+    """
+
+    def __init__(
+        self,
+        genepanel: Dict,
+        transcripts: Dict[Tuple[int, str], List[Dict]],
+        phenotypes: Dict[int, List[Dict]],
+        inheritances: Dict[int, List[Dict]],
+    ):
+        self.genepanel = genepanel
+        # (hgnc_id, transcript_base) -> transcripts
+        self.transcripts = transcripts
+        # hgnc_id -> phenotypes
+        self.phenotypes = phenotypes
+        # hgnc_id -> inheritances
+        self.inheritances = inheritances
+
+
+def _load_genepanel_data(session: Session, name: str, version: str) -> GenepanelData:
+    genepanel = (
+        session.query(gene.Genepanel)
+        .filter(gene.Genepanel.name == name, gene.Genepanel.version == version)
+        .one()
+    )
+
+    transcripts: Dict[Tuple[int, str], List[Dict]] = defaultdict(list)
+    transcript_objs = (
+        session.query(gene.Transcript)
+        .options(joinedload(gene.Transcript.gene))
+        .join(gene.genepanel_transcript)
+        .filter(
+            gene.genepanel_transcript.c.genepanel_name == name,
+            gene.genepanel_transcript.c.genepanel_version == version,
+        )
+        .order_by(gene.Transcript.id)
+        .all()
+    )
+    for transcript_obj, transcript_data in zip(
+        transcript_objs, schemas.TranscriptFullSchema().dump(transcript_objs, many=True).data
+    ):
+        transcripts[(transcript_obj.gene_id, transcript_obj.transcript_base)].append(
+            transcript_data
+        )
+
+    phenotypes: Dict[int, List[Dict]] = defaultdict(list)
+    phenotype_objs = (
+        session.query(gene.Phenotype)
+        .options(joinedload(gene.Phenotype.gene))
+        .join(gene.genepanel_phenotype)
+        .filter(
+            gene.genepanel_phenotype.c.genepanel_name == name,
+            gene.genepanel_phenotype.c.genepanel_version == version,
+        )
+        .order_by(gene.Phenotype.id)
+        .all()
+    )
+    for phenotype_obj, phenotype_data in zip(
+        phenotype_objs, schemas.PhenotypeFullSchema().dump(phenotype_objs, many=True).data
+    ):
+        phenotypes[phenotype_obj.gene_id].append(phenotype_data)
+
+    inheritances: Dict[int, List[Dict]] = defaultdict(list)
+    inheritance_rows = (
+        session.query(
+            gene.genepanel_transcript.c.inheritance,
+            gene.Transcript.gene_id.label("hgnc_id"),
+            gene.Transcript.transcript_name,
+        )
+        .join(
+            gene.Transcript,
+            gene.Transcript.id == gene.genepanel_transcript.c.transcript_id,
+        )
+        .filter(
+            gene.genepanel_transcript.c.genepanel_name == name,
+            gene.genepanel_transcript.c.genepanel_version == version,
+        )
+        .order_by(gene.Transcript.id)
+        .all()
+    )
+    for inheritance_data in schemas.InheritanceSchema().dump(inheritance_rows, many=True).data:
+        inheritances[inheritance_data["hgnc_id"]].append(inheritance_data)
+
+    return GenepanelData(
+        schemas.GenepanelSchema().dump(genepanel).data,
+        dict(transcripts),
+        dict(phenotypes),
+        dict(inheritances),
+    )
+
+
+class GenepanelDataCache:
+    """
+    LRU cache of GenepanelData, keyed by genepanel and validated against the genepanel revision.
+    """
+
+    def __init__(self, max_entries: int = 50):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[GenepanelKey, Tuple[int, GenepanelData]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: Session, name: str, version: str) -> GenepanelData:
+        key = (name, version)
+        revision: Optional[int] = (
+            session.query(gene.GenepanelSignature.revision)
+            .filter(
+                gene.GenepanelSignature.genepanel_name == name,
+                gene.GenepanelSignature.genepanel_version == version,
+            )
+            .scalar()
+        )
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if revision is not None and cached is not None and cached[0] == revision:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        data = _load_genepanel_data(session, name, version)
+        # Genepanels without signature (should not happen) are not cached, as we can't tell
+        # when they change
+        if revision is not None:
+            with self._lock:
+                self._entries[key] = (revision, data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+genepanel_data_cache = GenepanelDataCache()
@@ -0,0 +1,198 @@
+"""
+Gene set similarity between genepanels.
+
+The gene set of each genepanel is stored in GenepanelSignature when the genepanel is deposited or
+created. Gene sets are cached in-process (validated by checksum), so comparing a panel against all
+other panels only reads the checksums from the database and compares sets in memory.
+"""
+import hashlib
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from vardb.datamodel import gene
+
+GenepanelKey = Tuple[str, str]
+
+# (name, version) -> (checksum, gene ids)
+_gene_set_cache: Dict[GenepanelKey, Tuple[str, FrozenSet[int]]] = {}
+_gene_set_cache_lock = threading.Lock()
+
+
+def _checksum(gene_ids: Sequence[int]) -> str:
+    return hashlib.md5(",".join(str(g) for g in gene_ids).encode()).hexdigest()
+
+
+def _query_gene_ids(session: Session, keys: Iterable[GenepanelKey]) -> Dict[GenepanelKey, List]:
+    gene_ids: Dict[GenepanelKey, List[int]] = {k: [] for k in keys}
+    if not gene_ids:
+        return gene_ids
+    rows = (
+        session.query(
+            gene.genepanel_transcript.c.genepanel_name,
+            gene.genepanel_transcript.c.genepanel_version,
+            gene.Transcript.gene_id,
+        )
+        .join(gene.Transcript, gene.Transcript.id == gene.genepanel_transcript.c.transcript_id)
+        .filter(
+            tuple_(
+                gene.genepanel_transcript.c.genepanel_name,
+                gene.genepanel_transcript.c.genepanel_version,
+            ).in_(list(gene_ids))
+        )
+        .distinct()
+        .order_by(gene.Transcript.gene_id)
+    )
+    for name, version, gene_id in rows:
+        gene_ids[(name, version)].append(gene_id)
+    return gene_ids
+
+
+def update_genepanel_signature(session: Session, name: str, version: str):
+    """
+    Store the gene set of a genepanel, and increase its revision.
+    Call whenever the transcripts or phenotypes of a genepanel are set.
+    """
+    gene_ids = _query_gene_ids(session, [(name, version)])[(name, version)]
+    values = {"gene_ids": gene_ids, "checksum": _checksum(gene_ids)}
+    session.execute(
+        insert(gene.GenepanelSignature)
+        .values(genepanel_name=name, genepanel_version=version, **values)
+        .on_conflict_do_update(
+            index_elements=[
+                gene.GenepanelSignature.genepanel_name,
+                gene.GenepanelSignature.genepanel_version,
+            ],
+            set_=dict(values, revision=gene.GenepanelSignature.revision + 1),
+        )
+    )
+
+
+def load_gene_sets(
+    session: Session, keys: Iterable[GenepanelKey]
+) -> Dict[GenepanelKey, FrozenSet[int]]:
+    """
+    Load gene sets for given genepanels, using the in-process cache where it is up to date.
+    """
+    keys = list(set(keys))
+    if not keys:
+        return {}
+
+    checksums = {
+        (name, version): checksum
+        for name, version, checksum in session.query(
+            gene.GenepanelSignature.genepanel_name,
+            gene.GenepanelSignature.genepanel_version,
+            gene.GenepanelSignature.checksum,
+        ).filter(
+            tuple_(
+                gene.GenepanelSignature.genepanel_name, gene.GenepanelSignature.genepanel_version
+            ).in_(keys)
+        )
+    }
+
+    gene_sets: Dict[GenepanelKey, FrozenSet[int]] = {}
+    stale = []
+    for key in keys:
+        cached = _gene_set_cache.get(key)
+        if key in checksums and cached is not None and cached[0] == checksums[key]:
+            gene_sets[key] = cached[1]
+        else:
+            stale.append(key)
+
+    stale_with_signature = [k for k in stale if k in checksums]
+    if stale_with_signature:
+        for name, version, checksum, gene_ids in session.query(
+            gene.GenepanelSignature.genepanel_name,
+            gene.GenepanelSignature.genepanel_version,
+            gene.GenepanelSignature.checksum,
+            gene.GenepanelSignature.gene_ids,
+        ).filter(
+            tuple_(
+                gene.GenepanelSignature.genepanel_name, gene.GenepanelSignature.genepanel_version
+            ).in_(stale_with_signature)
+        ):
+            gene_set = frozenset(gene_ids)
+            with _gene_set_cache_lock:
+                _gene_set_cache[(name, version)] = (checksum, gene_set)
+            gene_sets[(name, version)] = gene_set
+
+    # Genepanels without signature (should not happen): fall back to querying the transcripts
+    missing = [k for k in stale if k not in checksums]
+    for key, gene_ids in _query_gene_ids(session, missing).items():
+        gene_sets[key] = frozenset(gene_ids)
+
+    return gene_sets
+
+
+def similarity_score(input_count: int, overlap: int, missing: int, additional: int) -> float:
+    """
+    Similarity score:
+    We weigh distance w.r.t. missing + addition count the most, as long as their
+    sum is small compared to panel size.
+    When the distance is large, the overlap similarity kicks in.
+    The following formula has been tested among >50 official panels,
+    on different custom panels and yields good results
+    (keep in mind that missing + addition + overlap are always greater
+    than input count unless the panels are identical):
+
+    (Overlapping count / input total count) * 2 +
+    input total count / (missing count + addition count)
+    """
+    return overlap * 2.0 / input_count + float(input_count) / (missing + additional + 1)
+
+
+def most_similar(
+    input_genes: FrozenSet[int],
+    candidates: Dict[GenepanelKey, FrozenSet[int]],
+    limit: int = 5,
+) -> List[Dict]:
+    """
+    Compare input gene set to candidate gene sets, and return the `limit` most similar candidates
+    having any overlap.
+
+    Counts are relative to input, i.e. addition_cnt means that the candidate has N extra genes
+    compared to the input. Similar for missing, the candidate is missing N genes present in input.
+    """
+    input_count = len(input_genes)
+    if not input_count:
+        return []
+
+    stats = []
+    for (name, version), genes in candidates.items():
+        overlap = len(input_genes & genes)
+        if not overlap:
+            continue
+        missing = input_count - overlap
+        additional = len(genes) - overlap
+        score = similarity_score(input_count, overlap, missing, additional)
+        stats.append((-score, name, version, missing, overlap, additional))
+
+    stats.sort()
+    return [
+        {
+            "name": name,
+            "version": version,
+            "addition_cnt": additional,
+            "overlap_cnt": overlap,
+            "missing_cnt": missing,
+        }
+        for _, name, version, missing, overlap, additional in stats[:limit]
+    ]
+
+
+def similar_genepanels(
+    session: Session,
+    genepanel: GenepanelKey,
+    candidates: Iterable[GenepanelKey],
+    limit: int = 5,
+) -> List[Dict]:
+    """
+    Returns the `limit` candidate genepanels most similar to genepanel (excluding itself).
+    """
+    candidates = [c for c in candidates if c != genepanel]
+    gene_sets = load_gene_sets(session, candidates + [genepanel])
+    input_genes = gene_sets.pop(genepanel)
+    return most_similar(input_genes, gene_sets, limit=limit)
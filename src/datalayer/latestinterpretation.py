@@ -0,0 +1,175 @@
+"""
+Latest interpretation of each allele and analysis workflow.
+
+The workflow queries (see queries.workflow_by_status) filter on the status of the latest created
+interpretation of each workflow. Finding these with DISTINCT ON over all interpretations on every
+query is expensive, so they are kept in the latest_interpretation table instead.
+
+The rows of workflows with interpretations changed in a flush are recomputed right after the
+flush (unlike the worklist, which is refreshed on commit), so that the workflow queries see the
+same state as the interpretations within a transaction. check_latest_interpretations() compares
+the table with the interpretations, and rebuild_latest_interpretations() recreates it from scratch.
+"""
+import itertools
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from vardb.datamodel import workflow
+
+from datalayer import filters
+
+# Interpretation attributes that affect which interpretation is the latest, or its status
+TRACKED_ATTRIBUTES = ["status", "workflow_status", "finalized", "date_created"]
+
+# (interpretation model, workflow id attribute, interpretation id attribute in table)
+WORKFLOWS = [
+    (workflow.AlleleInterpretation, "allele_id", "alleleinterpretation_id"),
+    (workflow.AnalysisInterpretation, "analysis_id", "analysisinterpretation_id"),
+]
+
+
+def _entries(
+    session: Session,
+    model,
+    model_id_attr: str,
+    interpretation_id_attr: str,
+    ids: Optional[List[int]] = None,
+) -> List[Dict]:
+    """
+    Computes rows for given workflow ids (or all workflows, if ids is None).
+    """
+    model_id = getattr(model, model_id_attr)
+    latest = (
+        session.query(model_id, model.id, model.workflow_status, model.status, model.finalized)
+        .order_by(model_id, model.date_created.desc())
+        .distinct(model_id)  # DISTINCT ON
+    )
+    if ids is not None:
+        latest = latest.filter(filters.in_(session, model_id, ids))
+    return [
+        {
+            "allele_id": None,
+            "analysis_id": None,
+            "alleleinterpretation_id": None,
+            "analysisinterpretation_id": None,
+            model_id_attr: workflow_id,
+            interpretation_id_attr: interpretation_id,
+            "workflow_status": workflow_status,
+            "status": status,
+            "finalized": finalized,
+        }
+        for workflow_id, interpretation_id, workflow_status, status, finalized in latest
+    ]
+
+
+def _replace_entries(session: Session, id_column, ids: Optional[List[int]], entries: List[Dict]):
+    table = workflow.LatestInterpretation.__table__
+    delete = table.delete()
+    if ids is not None:
+        delete = delete.where(id_column.in_(ids))
+    else:
+        delete = delete.where(id_column.isnot(None))
+    session.execute(delete)
+    if entries:
+        session.execute(table.insert(), entries)
+
+
+def refresh_latest_interpretations(
+    session: Session,
+    allele_ids: Optional[Iterable[int]] = None,
+    analysis_ids: Optional[Iterable[int]] = None,
+):
+    """
+    Recompute the latest interpretation of the given allele and analysis workflows.
+    """
+    for (model, model_id_attr, interpretation_id_attr), ids in zip(
+        WORKFLOWS, [allele_ids, analysis_ids]
+    ):
+        if ids:
+            ids = sorted(set(ids))
+            _replace_entries(
+                session,
+                getattr(workflow.LatestInterpretation, model_id_attr),
+                ids,
+                _entries(session, model, model_id_attr, interpretation_id_attr, ids),
+            )
+
+
+def rebuild_latest_interpretations(session: Session):
+    """
+    Recreate the whole latest_interpretation table from the interpretations.
+    """
+    for model, model_id_attr, interpretation_id_attr in WORKFLOWS:
+        _replace_entries(
+            session,
+            getattr(workflow.LatestInterpretation, model_id_attr),
+            None,
+            _entries(session, model, model_id_attr, interpretation_id_attr),
+        )
+
+
+def check_latest_interpretations(session: Session) -> List[str]:
+    """
+    Compare the latest_interpretation table with the interpretations.
+
+    Returns a list of descriptions of inconsistencies (empty if the table is up to date).
+    """
+    fields = [
+        "alleleinterpretation_id",
+        "analysisinterpretation_id",
+        "workflow_status",
+        "status",
+        "finalized",
+    ]
+    stored = {
+        (e.allele_id, e.analysis_id): {f: getattr(e, f) for f in fields}
+        for e in session.query(workflow.LatestInterpretation).all()
+    }
+    expected = {
+        (e["allele_id"], e["analysis_id"]): {f: e[f] for f in fields}
+        for e in itertools.chain.from_iterable(
+            _entries(session, *workflow_args) for workflow_args in WORKFLOWS
+        )
+    }
+
+    def describe(key):
+        allele_id, analysis_id = key
+        return f"allele {allele_id}" if allele_id is not None else f"analysis {analysis_id}"
+
+    inconsistencies = []
+    for key in sorted(set(expected) - set(stored), key=str):
+        inconsistencies.append(f"Missing latest interpretation for {describe(key)}")
+    for key in sorted(set(stored) - set(expected), key=str):
+        inconsistencies.append(f"Superfluous latest interpretation for {describe(key)}")
+    for key in sorted(set(stored) & set(expected), key=str):
+        for field in fields:
+            stored_value = stored[key][field]
+            expected_value = expected[key][field]
+            if stored_value != expected_value:
+                inconsistencies.append(
+                    f"Latest interpretation for {describe(key)} has {field} {stored_value!r}, "
+                    f"expected {expected_value!r}"
+                )
+    return inconsistencies
+
+
+def _is_modified(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRIBUTES)
+
+
+def refresh_flushed(session: Session):
+    "Refresh rows for workflows affected by a flush. Called from the after_flush event."
+    allele_ids: Set[int] = set()
+    analysis_ids: Set[int] = set()
+    # Collections still reflect the state before the flush, but new objects have been assigned ids
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, workflow.AlleleInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                allele_ids.add(obj.allele_id)
+        elif isinstance(obj, workflow.AnalysisInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                analysis_ids.add(obj.analysis_id)
+
+    refresh_latest_interpretations(session, allele_ids=allele_ids, analysis_ids=analysis_ids)
@@ -0,0 +1,331 @@
+"""
+Alleles in open workflows, used for collision detection.
+
+A workflow (allele or analysis) is open when it has an interpretation that may contain work that
+is not committed:
+1. It has more than one interpretation, and the latest is not finalized. Single interpretations
+   may be in 'Not started' status, and we don't want to include those.
+2. Its latest interpretation is Ongoing. This is partly covered by 1., but not for single
+   interpretations.
+
+Finding these with the live queries means scanning all interpretations, so the alleles of open
+workflows are kept in the open_workflow_allele table instead. As for the worklist (see
+datalayer/worklist.py), interpretations changed in a session are tracked on flush, and the rows
+of the affected workflows are recomputed right before the session commits. check_open_workflows()
+compares the table with the live queries, and rebuild_open_workflows() recreates it from scratch.
+"""
+import itertools
+from collections import Counter, defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, inspect, or_
+from sqlalchemy.orm import Session
+from vardb.datamodel import assessment, sample, workflow
+
+from datalayer import filters, queries
+
+# Interpretation attributes that affect whether a workflow is open, or its collision data
+TRACKED_ATTRIBUTES = ["status", "finalized", "workflow_status", "user_id"]
+
+PENDING_KEY = "open_workflows_pending"
+
+
+def _latest_open_interpretations(
+    session: Session, model, model_id_attr: str, ids: Optional[List[int]] = None
+) -> Dict:
+    """
+    Returns {<allele_id/analysis_id>: <latest interpretation>} for open workflows among the
+    given ids (or all workflows, if ids is None).
+    """
+    model_id = getattr(model, model_id_attr)
+    interpretations = session.query(
+        model_id.label("id"),
+        model.status,
+        model.finalized,
+        model.workflow_status,
+        model.user_id,
+    ).order_by(model_id, model.date_created.desc())
+    if ids is not None:
+        interpretations = interpretations.filter(filters.in_(session, model_id, ids))
+
+    # Rows are ordered with the latest created interpretation first for each workflow
+    latest_open = {}
+    for workflow_id, workflow_interpretations in itertools.groupby(
+        interpretations, key=lambda i: i.id
+    ):
+        latest = next(workflow_interpretations)
+        more_than_one = next(workflow_interpretations, None) is not None
+        if latest.status == "Ongoing" or (more_than_one and not latest.finalized):
+            latest_open[workflow_id] = latest
+    return latest_open
+
+
+def _allele_entries(session: Session, allele_ids: Optional[List[int]] = None) -> List[Dict]:
+    return [
+        {
+            "allele_id": allele_id,
+            "analysis_id": None,
+            "user_id": latest.user_id,
+            "workflow_status": latest.workflow_status,
+        }
+        for allele_id, latest in _latest_open_interpretations(
+            session, workflow.AlleleInterpretation, "allele_id", allele_ids
+        ).items()
+    ]
+
+
+def _analysis_entries(session: Session, analysis_ids: Optional[List[int]] = None) -> List[Dict]:
+    latest_open = _latest_open_interpretations(
+        session, workflow.AnalysisInterpretation, "analysis_id", analysis_ids
+    )
+    if not latest_open:
+        return []
+
+    analysis_alleles = (
+        session.query(sample.analysis_allele.c.analysis_id, sample.analysis_allele.c.allele_id)
+        .filter(filters.in_(session, sample.analysis_allele.c.analysis_id, list(latest_open)))
+        .distinct()
+    )
+    return [
+        {
+            "allele_id": allele_id,
+            "analysis_id": analysis_id,
+            "user_id": latest_open[analysis_id].user_id,
+            "workflow_status": latest_open[analysis_id].workflow_status,
+        }
+        for analysis_id, allele_id in analysis_alleles
+    ]
+
+
+def _replace_entries(session: Session, where, entries: List[Dict]):
+    table = workflow.OpenWorkflowAllele.__table__
+    session.execute(table.delete().where(where))
+    if entries:
+        session.execute(table.insert(), entries)
+
+
+def refresh_open_workflows(
+    session: Session,
+    allele_ids: Optional[Iterable[int]] = None,
+    analysis_ids: Optional[Iterable[int]] = None,
+):
+    """
+    Recompute the open_workflow_allele rows of the given allele and analysis workflows.
+    """
+    if allele_ids:
+        allele_ids = sorted(set(allele_ids))
+        _replace_entries(
+            session,
+            workflow.OpenWorkflowAllele.analysis_id.is_(None)
+            & workflow.OpenWorkflowAllele.allele_id.in_(allele_ids),
+            _allele_entries(session, allele_ids),
+        )
+    if analysis_ids:
+        analysis_ids = sorted(set(analysis_ids))
+        _replace_entries(
+            session,
+            workflow.OpenWorkflowAllele.analysis_id.in_(analysis_ids),
+            _analysis_entries(session, analysis_ids),
+        )
+
+
+def rebuild_open_workflows(session: Session):
+    """
+    Recreate the whole open_workflow_allele table from the interpretations.
+    """
+    _replace_entries(
+        session, workflow.OpenWorkflowAllele.analysis_id.is_(None), _allele_entries(session)
+    )
+    _replace_entries(
+        session, workflow.OpenWorkflowAllele.analysis_id.isnot(None), _analysis_entries(session)
+    )
+
+
+def _uncommitted_workflow_ids(session: Session, model, model_id_attr: str) -> Set[int]:
+    """
+    Open workflows, using the live workflow queries.
+    """
+    model_id = getattr(model, model_id_attr)
+    more_than_one = (
+        session.query(model_id).group_by(model_id).having(func.count(model_id) > 1).subquery()
+    )
+
+    ongoing = set(
+        queries.workflow_by_status(session, model, model_id_attr, status="Ongoing").scalar_all()
+    )
+
+    not_finalized = queries.workflow_by_status(
+        session, model, model_id_attr, finalized=False
+    ).subquery()
+
+    more_than_one_not_finalized = set(
+        session.query(getattr(more_than_one.c, model_id_attr))
+        .join(
+            not_finalized,
+            getattr(not_finalized.c, model_id_attr) == getattr(more_than_one.c, model_id_attr),
+        )
+        .distinct()
+        .scalar_all()
+    )
+
+    return ongoing | more_than_one_not_finalized
+
+
+def check_open_workflows(session: Session) -> List[str]:
+    """
+    Compare the open_workflow_allele table with the live workflow queries.
+
+    Returns a list of descriptions of inconsistencies (empty if the table is up to date).
+    """
+    stored = {}
+    # Counted separately, as duplicates collapse in stored
+    num_stored: Counter = Counter()
+    for e in session.query(workflow.OpenWorkflowAllele).all():
+        stored[(e.analysis_id, e.allele_id)] = (e.user_id, e.workflow_status)
+        num_stored[(e.analysis_id, e.allele_id)] += 1
+
+    expected = {}
+    allele_ids = _uncommitted_workflow_ids(session, workflow.AlleleInterpretation, "allele_id")
+    for allele_id, user_id, workflow_status in (
+        session.query(
+            workflow.AlleleInterpretation.allele_id,
+            workflow.AlleleInterpretation.user_id,
+            workflow.AlleleInterpretation.workflow_status,
+        )
+        .filter(workflow.AlleleInterpretation.allele_id.in_(allele_ids))
+        .distinct(workflow.AlleleInterpretation.allele_id)
+        .order_by(
+            workflow.AlleleInterpretation.allele_id,
+            workflow.AlleleInterpretation.date_created.desc(),
+        )
+    ):
+        expected[(None, allele_id)] = (user_id, workflow_status)
+
+    analysis_ids = _uncommitted_workflow_ids(
+        session, workflow.AnalysisInterpretation, "analysis_id"
+    )
+    for analysis_id, allele_id, user_id, workflow_status in (
+        session.query(
+            workflow.AnalysisInterpretation.analysis_id,
+            sample.analysis_allele.c.allele_id,
+            workflow.AnalysisInterpretation.user_id,
+            workflow.AnalysisInterpretation.workflow_status,
+        )
+        .join(
+            sample.analysis_allele,
+            sample.analysis_allele.c.analysis_id == workflow.AnalysisInterpretation.analysis_id,
+        )
+        .filter(workflow.AnalysisInterpretation.analysis_id.in_(analysis_ids))
+        .distinct(workflow.AnalysisInterpretation.analysis_id, sample.analysis_allele.c.allele_id)
+        .order_by(
+            workflow.AnalysisInterpretation.analysis_id,
+            sample.analysis_allele.c.allele_id,
+            workflow.AnalysisInterpretation.date_created.desc(),
+        )
+    ):
+        expected[(analysis_id, allele_id)] = (user_id, workflow_status)
+
+    def describe(key):
+        analysis_id, allele_id = key
+        if analysis_id is None:
+            return f"allele {allele_id}"
+        return f"allele {allele_id} in analysis {analysis_id}"
+
+    inconsistencies = []
+    for key in sorted((k for k, n in num_stored.items() if n > 1), key=str):
+        inconsistencies.append(
+            f"{num_stored[key]} open workflow entries for {describe(key)}, expected at most 1"
+        )
+    for key in sorted(set(expected) - set(stored), key=str):
+        inconsistencies.append(f"Missing open workflow entry for {describe(key)}")
+    for key in sorted(set(stored) - set(expected), key=str):
+        inconsistencies.append(f"Superfluous open workflow entry for {describe(key)}")
+    for key in sorted(set(stored) & set(expected), key=str):
+        if stored[key] != expected[key]:
+            inconsistencies.append(
+                f"Open workflow entry for {describe(key)} has (user_id, workflow_status) "
+                f"{stored[key]!r}, expected {expected[key]!r}"
+            )
+    return inconsistencies
+
+
+def get_open_workflow_alleles(
+    session: Session,
+    allele_ids: Iterable[int],
+    exclude_analysis_id: Optional[int] = None,
+    exclude_allele_id: Optional[int] = None,
+):
+    """
+    Query for open workflow rows of given alleles, excluding the given analysis or allele
+    workflow. Alleles with valid alleleassessments are excluded for analysis workflows.
+    """
+    allele_ids = list(allele_ids)
+    valid_assessment_allele_ids = session.query(assessment.AlleleAssessment.allele_id).filter(
+        filters.in_(session, assessment.AlleleAssessment.allele_id, allele_ids),
+        *queries.valid_alleleassessments_filter(session),
+    )
+
+    open_workflow_alleles = session.query(workflow.OpenWorkflowAllele).filter(
+        filters.in_(session, workflow.OpenWorkflowAllele.allele_id, allele_ids),
+        or_(
+            workflow.OpenWorkflowAllele.analysis_id.is_(None),
+            ~workflow.OpenWorkflowAllele.allele_id.in_(valid_assessment_allele_ids),
+        ),
+    )
+    if exclude_analysis_id is not None:
+        open_workflow_alleles = open_workflow_alleles.filter(
+            or_(
+                workflow.OpenWorkflowAllele.analysis_id.is_(None),
+                workflow.OpenWorkflowAllele.analysis_id != exclude_analysis_id,
+            )
+        )
+    if exclude_allele_id is not None:
+        open_workflow_alleles = open_workflow_alleles.filter(
+            or_(
+                workflow.OpenWorkflowAllele.analysis_id.isnot(None),
+                workflow.OpenWorkflowAllele.allele_id != exclude_allele_id,
+            )
+        )
+    return open_workflow_alleles.order_by(
+        workflow.OpenWorkflowAllele.analysis_id, workflow.OpenWorkflowAllele.allele_id
+    )
+
+
+def _is_modified(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRIBUTES)
+
+
+def track_changes(session: Session):
+    "Collect workflows affected by a flush. Called from the after_flush event."
+    pending: DefaultDict[str, Set[int]] = defaultdict(set)
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, workflow.AlleleInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                pending["allele_ids"].add(obj.allele_id)
+        elif isinstance(obj, workflow.AnalysisInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                pending["analysis_ids"].add(obj.analysis_id)
+
+    if pending:
+        session_pending = session.info.setdefault(PENDING_KEY, defaultdict(set))
+        for key, ids in pending.items():
+            session_pending[key].update(ids)
+
+
+def refresh_pending(session: Session):
+    "Refresh rows for collected workflows. Called from the before_commit event."
+    # before_commit fires before the commit's own flush. Flush remaining changes here, so that
+    # they are tracked and visible to the queries below.
+    session.flush()
+    if PENDING_KEY not in session.info:
+        return
+    pending = session.info.pop(PENDING_KEY)
+    refresh_open_workflows(
+        session, allele_ids=pending["allele_ids"], analysis_ids=pending["analysis_ids"]
+    )
+
+
+def discard_pending(session: Session):
+    "Forget collected workflows, as their changes were rolled back."
+    session.info.pop(PENDING_KEY, None)
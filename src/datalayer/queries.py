@@ -2,12 +2,11 @@ import datetime
 from typing import Optional, Sequence, Tuple
 
 import pytz
-from sqlalchemy import Text, and_, cast, func, literal_column, or_, text
+from sqlalchemy import Text, and_, cast, func, or_
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
 from sqlalchemy.sql.sqltypes import Integer
 
-from api.config import config
 from api.util import filterconfig_requirements
 from datalayer import filters
 from vardb.datamodel import (
@@ -26,19 +25,17 @@ from vardb.util.extended_query import ExtendedQuery
 def valid_alleleassessments_filter(session: Session):
     """
     Filter for including alleleassessments that have valid (not outdated) classifications.
+
+    valid_until is set from the classification options in the config,
+    see datalayer/assessmentvalidity.py.
     """
-    classification_filters = list()
-    # Create classification filters, filtering on classification and optionally outdated threshold
-    for option in config["classification"]["options"]:
-        internal_filters = [assessment.AlleleAssessment.classification == option["value"]]
-        if "outdated_after_days" in option:
-            outdated_time = datetime.datetime.now(pytz.utc) - datetime.timedelta(
-                days=option["outdated_after_days"]
-            )
-            internal_filters.append(assessment.AlleleAssessment.date_created > outdated_time)
-        # Add our filter using and_
-        classification_filters.append(and_(*internal_filters))
-    return [or_(*classification_filters), assessment.AlleleAssessment.date_superceeded.is_(None)]
+    return [
+        assessment.AlleleAssessment.date_superceeded.is_(None),
+        or_(
+            assessment.AlleleAssessment.valid_until.is_(None),
+            assessment.AlleleAssessment.valid_until > datetime.datetime.now(pytz.utc),
+        ),
+    ]
 
 
 def allele_ids_with_valid_alleleassessments(session: Session):
@@ -74,13 +71,10 @@ def workflow_by_status(
     :param model: AlleleInterpretation or AnalysisInterpretation
     :param model_id_attr: 'allele_id' or 'analysis_id'
 
-    Query resembles something like this:
-     SELECT s.id FROM (select DISTINCT ON (analysis_id) id, workflow_status, status
-     from analysisinterpretation order by analysis_id, date_last_update desc) AS
-     s where s.workflow_status = :status;
-
-    Using DISTINCT ON and ORDER BY will select one row, giving us the latest interpretation workflow status.
-    See https://www.postgresql.org/docs/10.0/static/sql-select.html#SQL-DISTINCT
+    The latest interpretation (by date created) of each workflow is kept in the
+    latest_interpretation table (see datalayer/latestinterpretation.py), so the query resembles:
+     SELECT analysis_id FROM latest_interpretation
+     WHERE analysis_id IS NOT NULL AND workflow_status = :workflow_status;
     """
 
     if workflow_status is None and status is None and finalized is None:
@@ -89,34 +83,29 @@ def workflow_by_status(
         )
 
     assert model_id_attr in ["allele_id", "analysis_id"]
-
-    latest_interpretation = (
-        session.query(
-            getattr(model, model_id_attr), model.workflow_status, model.status, model.finalized
-        )
-        .order_by(getattr(model, model_id_attr), model.date_created.desc())
-        .distinct(getattr(model, model_id_attr))  # DISTINCT ON
-        .subquery()
+    assert model is (
+        workflow.AlleleInterpretation
+        if model_id_attr == "allele_id"
+        else workflow.AnalysisInterpretation
     )
 
-    workflow_filters = []
+    model_id = getattr(workflow.LatestInterpretation, model_id_attr)
+    workflow_filters = [model_id.isnot(None)]
     if workflow_status:
-        workflow_filters.append(latest_interpretation.c.workflow_status == workflow_status)
+        workflow_filters.append(workflow.LatestInterpretation.workflow_status == workflow_status)
     if status:
-        workflow_filters.append(latest_interpretation.c.status == status)
+        workflow_filters.append(workflow.LatestInterpretation.status == status)
     if finalized is not None:
         if finalized:
-            workflow_filters.append(latest_interpretation.c.finalized.is_(True))
+            workflow_filters.append(workflow.LatestInterpretation.finalized.is_(True))
         else:
             workflow_filters.append(
                 or_(
-                    latest_interpretation.c.finalized.is_(None),
-                    latest_interpretation.c.finalized.is_(False),
+                    workflow.LatestInterpretation.finalized.is_(None),
+                    workflow.LatestInterpretation.finalized.is_(False),
                 )
             )
-    return session.query(
-        getattr(latest_interpretation.c, model_id_attr).label(model_id_attr)
-    ).filter(*workflow_filters)
+    return session.query(model_id.label(model_id_attr)).filter(*workflow_filters)
 
 
 def workflow_analyses_finalized(session):
@@ -437,15 +426,18 @@ def annotation_transcripts_genepanel(
     # with the annotations requested
     if annotation_ids:
         tx = func.jsonb_array_elements(annotation.Annotation.annotations.op("->")("transcripts"))
+        tx_name = tx.op("->>")("transcript").cast(Text)
         annotation_shadow_transcript_table = (
             session.query(
                 annotation.Annotation.allele_id,
                 tx.op("->>")("hgnc_id").cast(Integer).label("hgnc_id"),
                 tx.op("->>")("symbol").cast(Text).label("symbol"),
-                tx.op("->>")("transcript").cast(Text).label("transcript"),
+                tx_name.label("transcript"),
                 tx.op("->>")("HGVSc").cast(Text).label("hgvsc"),
                 tx.op("->>")("protein").cast(Text).label("protein"),
                 tx.op("->>")("HGVSp").cast(Text).label("hgvsp"),
+                gene.get_transcript_base(tx_name).label("transcript_base"),
+                gene.get_transcript_version(tx_name).label("transcript_version"),
             )
             .filter(annotation.Annotation.id.in_(annotation_ids))
             .temp_table("annotationshadowtranscript")
@@ -458,6 +450,7 @@ def annotation_transcripts_genepanel(
             gene.Genepanel.name,
             gene.Genepanel.version,
             gene.Transcript.transcript_name,
+            gene.Transcript.transcript_base,
             gene.Transcript.gene_id,
         )
         .join(gene.Genepanel.transcripts)
@@ -465,14 +458,8 @@ def annotation_transcripts_genepanel(
         .subquery()
     )
 
-    # Column for version difference between annotation transcript and genepanel transcript
-    tx_version = literal_column(
-        "substring(split_part(transcript, '.', 2) FROM '^[0-9]+')::int"  # Fetch annotation transcript version: NM_00111.2 -> 2
-        + "- 0.5*(split_part(transcript, '.', 2) !~ '^[0-9]+$')::int"  # Reduce version by 0.5 if version is not an integer, e.g. NM_00111.2_dupl18
-    )
-
-    # Join genepanel and annotation tables together, using transcript as key
-    # and splitting out the version number of the transcript (if it has one)
+    # Join genepanel and annotation tables together, using gene and transcript name without version
+    # as key (e.g. NM_12345.1 matches NM_12345.2). Both are precomputed, indexed columns.
     result = session.query(
         annotation_shadow_transcript_table.allele_id.label("allele_id"),
         genepanel_transcripts.c.name.label("name"),
@@ -485,9 +472,9 @@ def annotation_transcripts_genepanel(
         annotation_shadow_transcript_table.hgvsc.label("annotation_hgvsc"),
         annotation_shadow_transcript_table.hgvsp.label("annotation_hgvsp"),
     ).filter(
-        # Matches e.g. NM_12345dabla.1 with NM_12345.2
-        text("transcript_name like split_part(transcript, '.', 1) || '%'"),
         genepanel_transcripts.c.gene_id == annotation_shadow_transcript_table.hgnc_id,
+        genepanel_transcripts.c.transcript_base
+        == annotation_shadow_transcript_table.transcript_base,
     )
 
     if allele_ids is not None:
@@ -512,7 +499,7 @@ def annotation_transcripts_genepanel(
         (
             genepanel_transcripts.c.transcript_name == annotation_shadow_transcript_table.transcript
         ).desc(),
-        tx_version.desc().nullslast(),
+        annotation_shadow_transcript_table.transcript_version.desc().nullslast(),
     )
 
     result = result.distinct(
@@ -1,10 +1,12 @@
-import itertools
 from typing import Dict, Sequence, Tuple, Union
 
 from api.util.types import FilteredAlleleCategories
 from sqlalchemy.orm.session import Session
 from vardb.datamodel import Base, annotation, assessment, workflow
 
+# Rows per INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
 
 class SnapshotCreator(object):
     def __init__(self, session: Session):
@@ -20,6 +22,13 @@ class SnapshotCreator(object):
 
         return {a[0]: a[1] for a in allele_ids_model_ids}
 
+    def _insert(self, model: Base, snapshot_items: Sequence[Dict]):
+        # Multi-row INSERTs, instead of one statement per row
+        for i in range(0, len(snapshot_items), INSERT_CHUNK_SIZE):
+            self.session.execute(
+                model.__table__.insert().values(snapshot_items[i : i + INSERT_CHUNK_SIZE])
+            )
+
     def insert_from_data(
         self,
         allele_ids: Sequence[int],
@@ -31,15 +40,18 @@ class SnapshotCreator(object):
         allelereport_ids: Sequence[int],
         excluded_allele_ids: Dict = None,
     ) -> Sequence[Dict]:
-        excluded: Dict = {}
+        # Filtered category per allele id
+        allele_id_category: Dict[int, str] = {}
 
         if interpretation_snapshot_model == "analysis":
             assert excluded_allele_ids is not None
-            excluded = excluded_allele_ids
+            for category, category_allele_ids in excluded_allele_ids.items():
+                name = FilteredAlleleCategories(category).name
+                for allele_id in category_allele_ids:
+                    # First category wins if an allele is excluded by several
+                    allele_id_category.setdefault(allele_id, name)
 
-            all_allele_ids = list(
-                set(allele_ids).union(set(itertools.chain(*list(excluded.values()))))
-            )
+            all_allele_ids = list(set(allele_ids) | allele_id_category.keys())
 
         # 'excluded' is not a concept for alleleinterpretation
         elif interpretation_snapshot_model == "allele":
@@ -58,9 +70,6 @@ class SnapshotCreator(object):
 
         snapshot_items = list()
         for allele_id in all_allele_ids:
-            # Check if allele_id is in any of the excluded categories
-            excluded_category = next((k for k, v in excluded.items() if allele_id in v), None)
-
             snapshot_item = {
                 "allele_id": allele_id,
                 "annotation_id": allele_ids_annotation_ids.get(allele_id),
@@ -71,21 +80,15 @@ class SnapshotCreator(object):
 
             if interpretation_snapshot_model == "analysis":
                 snapshot_item["analysisinterpretation_id"] = interpretation.id
-                snapshot_item["filtered"] = (
-                    FilteredAlleleCategories(excluded_category).name
-                    if excluded_category is not None
-                    else None
-                )
+                snapshot_item["filtered"] = allele_id_category.get(allele_id)
             elif interpretation_snapshot_model == "allele":
                 snapshot_item["alleleinterpretation_id"] = interpretation.id
 
             snapshot_items.append(snapshot_item)
 
         if interpretation_snapshot_model == "analysis":
-            self.session.bulk_insert_mappings(
-                workflow.AnalysisInterpretationSnapshot, snapshot_items
-            )
+            self._insert(workflow.AnalysisInterpretationSnapshot, snapshot_items)
         elif interpretation_snapshot_model == "allele":
-            self.session.bulk_insert_mappings(workflow.AlleleInterpretationSnapshot, snapshot_items)
+            self._insert(workflow.AlleleInterpretationSnapshot, snapshot_items)
 
         return snapshot_items
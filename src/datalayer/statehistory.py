@@ -0,0 +1,147 @@
+"""
+Delta-encoded storage of interpretation state history.
+
+Versions of an interpretation's state are stored as rows in InterpretationStateHistory, ordered by
+id. Each row stores either the full state (a checkpoint), or a reverse JSON patch that transforms
+the state of the next version into the state of this version. The version after the last row is
+the interpretation's current state.
+
+Since the interpretation's state is already available when saving, adding a version only writes
+the (usually small) difference between the old and new state.
+"""
+import itertools
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy.orm import Session
+from vardb.datamodel import workflow
+from vardb.util.jsonpatch import apply_patch, make_patch
+
+# Store full state for every N-th version, limiting the number of patches applied when rebuilding
+STATE_HISTORY_CHECKPOINT_INTERVAL = 20
+
+Interpretation = Union[workflow.AlleleInterpretation, workflow.AnalysisInterpretation]
+
+
+def _history_filter(interpretation: Interpretation):
+    if isinstance(interpretation, workflow.AlleleInterpretation):
+        return workflow.InterpretationStateHistory.alleleinterpretation_id == interpretation.id
+    return workflow.InterpretationStateHistory.analysisinterpretation_id == interpretation.id
+
+
+def add_state_history(
+    session: Session,
+    interpretation: Interpretation,
+    new_state: Dict[str, Any],
+    user_id: int,
+) -> workflow.InterpretationStateHistory:
+    """
+    Store the interpretation's current state in the history, before it is replaced by new_state.
+    """
+    num_versions = (
+        session.query(workflow.InterpretationStateHistory.id)
+        .filter(_history_filter(interpretation))
+        .count()
+    )
+
+    history_kwargs: Dict[str, Any] = {
+        "alleleinterpretation_id": None,
+        "analysisinterpretation_id": None,
+        "user_id": user_id,
+    }
+    if isinstance(interpretation, workflow.AlleleInterpretation):
+        history_kwargs["alleleinterpretation_id"] = interpretation.id
+    else:
+        history_kwargs["analysisinterpretation_id"] = interpretation.id
+
+    if num_versions % STATE_HISTORY_CHECKPOINT_INTERVAL == 0:
+        history_kwargs["state"] = interpretation.state
+    else:
+        history_kwargs["state_delta"] = make_patch(new_state, interpretation.state)
+
+    history = workflow.InterpretationStateHistory(**history_kwargs)
+    session.add(history)
+    return history
+
+
+def rebuild_state(
+    session: Session,
+    interpretation: Interpretation,
+    history_id: int,
+) -> Dict[str, Any]:
+    """
+    Rebuild the state stored in InterpretationStateHistory with id history_id.
+
+    Patches are applied starting from the first checkpoint after the requested version, or from
+    the interpretation's current state if there is no later checkpoint.
+    """
+    rows = (
+        session.query(
+            workflow.InterpretationStateHistory.id,
+            workflow.InterpretationStateHistory.state,
+            workflow.InterpretationStateHistory.state_delta,
+        )
+        .filter(
+            _history_filter(interpretation),
+            workflow.InterpretationStateHistory.id >= history_id,
+        )
+        .order_by(workflow.InterpretationStateHistory.id)
+        .yield_per(100)
+    )
+
+    rows_iter = iter(rows)
+    first = next(rows_iter, None)
+    if first is None or first.id != history_id:
+        raise ValueError(
+            f"No state history with id {history_id} for interpretation {interpretation.id}"
+        )
+
+    # Collect patches until the first checkpoint at or after the requested version
+    patches: List[List[Dict[str, Any]]] = []
+    state: Optional[Dict[str, Any]] = None
+    for row in itertools.chain([first], rows_iter):
+        if row.state is not None:
+            state = row.state
+            break
+        patches.append(row.state_delta)
+
+    if state is None:
+        state = interpretation.state
+
+    for patch in reversed(patches):
+        state = apply_patch(state, patch)
+    return dict(state)
+
+
+def get_state_history(
+    session: Session,
+    interpretation: Interpretation,
+) -> List[Dict[str, Any]]:
+    """
+    Rebuild all versions of the interpretation's state, oldest first.
+
+    Each item contains id, user_id, date_created and the full state of that version.
+    """
+    rows = (
+        session.query(workflow.InterpretationStateHistory)
+        .filter(_history_filter(interpretation))
+        .order_by(workflow.InterpretationStateHistory.id.desc())
+        .all()
+    )
+
+    # Walk backwards from the current state, resetting at each checkpoint
+    versions = []
+    state = interpretation.state
+    for row in rows:
+        if row.state is not None:
+            state = row.state
+        else:
+            state = apply_patch(state, row.state_delta)
+        versions.append(
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "date_created": row.date_created,
+                "state": dict(state),
+            }
+        )
+    return list(reversed(versions))
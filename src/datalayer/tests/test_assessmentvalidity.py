@@ -0,0 +1,122 @@
+import copy
+import datetime
+
+import pytest
+import pytz
+
+from api.config import config
+from conftest import MockVcfWriter
+from datalayer import queries
+from datalayer.assessmentvalidity import check_valid_until, update_valid_until, valid_until
+from vardb.datamodel import allele, assessment
+from vardb.deposit.deposit_assessments import DepositAssessments
+
+
+@pytest.fixture
+def options_with_outdated(monkeypatch):
+    "Classification options with the first option outdated after 100 days"
+    options = copy.deepcopy(config["classification"]["options"])
+    options[0]["outdated_after_days"] = 100
+    monkeypatch.setitem(config["classification"], "options", options)
+    return options
+
+
+def _valid_allele_ids(session, allele_ids):
+    return set(
+        queries.allele_ids_with_valid_alleleassessments(session)
+        .filter(assessment.AlleleAssessment.allele_id.in_(allele_ids))
+        .scalar_all()
+    )
+
+
+def _add_assessment(session, allele_id, classification, days_ago):
+    assm = assessment.AlleleAssessment(
+        user_id=1,
+        allele_id=allele_id,
+        classification=classification,
+        genepanel_name="HBOC",
+        genepanel_version="v1.0.0",
+        date_created=datetime.datetime.now(pytz.utc) - datetime.timedelta(days=days_ago),
+    )
+    session.add(assm)
+    return assm
+
+
+def test_valid_until():
+    date_created = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+    options = [{"value": "1", "outdated_after_days": 10}, {"value": "5"}]
+    assert valid_until("1", date_created, options) == datetime.datetime(
+        2020, 1, 11, tzinfo=pytz.utc
+    )
+    assert valid_until("5", date_created, options) is None
+    # Not in config
+    assert valid_until("3", date_created, options) == date_created
+
+
+def test_valid_until_set_on_flush(session, options_with_outdated):
+    classification = options_with_outdated[0]["value"]
+    recent = _add_assessment(session, 1, classification, 10)
+    old = _add_assessment(session, 2, classification, 200)
+    session.flush()
+
+    assert recent.valid_until == recent.date_created + datetime.timedelta(days=100)
+    assert _valid_allele_ids(session, [1, 2]) == {1}
+
+    # Recomputed when date_created changes
+    old.date_created = datetime.datetime.now(pytz.utc)
+    session.flush()
+    assert _valid_allele_ids(session, [1, 2]) == {1, 2}
+    assert check_valid_until(session) == []
+
+
+def test_config_change(session, options_with_outdated):
+    classification = options_with_outdated[0]["value"]
+    _add_assessment(session, 1, classification, 10)
+    _add_assessment(session, 2, classification, 50)
+    session.flush()
+    assert _valid_allele_ids(session, [1, 2]) == {1, 2}
+
+    # Shorter outdated_after_days only applies after updating existing assessments
+    options_with_outdated[0]["outdated_after_days"] = 30
+    assert _valid_allele_ids(session, [1, 2]) == {1, 2}
+    inconsistencies = check_valid_until(session)
+    assert len(inconsistencies) >= 2
+
+    assert update_valid_until(session) == len(inconsistencies)
+    assert check_valid_until(session) == []
+    assert _valid_allele_ids(session, [1, 2]) == {1}
+
+    # Never outdated
+    del options_with_outdated[0]["outdated_after_days"]
+    update_valid_until(session)
+    assert _valid_allele_ids(session, [1, 2]) == {1, 2}
+    assert check_valid_until(session) == []
+
+
+def test_valid_until_set_on_deposit(session, options_with_outdated):
+    classification = options_with_outdated[0]["value"]
+    # Existing assessments were created with the unchanged config
+    stale = check_valid_until(session)
+    with MockVcfWriter() as writer:
+        # Recent, without date (epoch) and with a classification missing from the config
+        for pos, info in [
+            (1001, {"CLASS": classification, "DATE": datetime.date.today().isoformat()}),
+            (1002, {"CLASS": classification}),
+            (1003, {"CLASS": "DR", "DATE": datetime.date.today().isoformat()}),
+        ]:
+            writer.add_variant(
+                {"CHROM": "ASSESSMENTS", "POS": pos, "INFO": {**info, "USERNAME": "testuser1"}},
+                None,
+            )
+        writer.close()
+        DepositAssessments(session).import_vcf(writer.filename, "HBOC", "v1.0.0")
+
+    allele_ids = (
+        session.query(allele.Allele.id)
+        .filter(allele.Allele.chromosome == "ASSESSMENTS")
+        .order_by(allele.Allele.vcf_pos)
+        .scalar_all()
+    )
+    assert len(allele_ids) == 3
+    assert _valid_allele_ids(session, allele_ids) == {allele_ids[0]}
+    assert check_valid_until(session) == stale
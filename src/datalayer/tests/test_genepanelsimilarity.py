@@ -0,0 +1,92 @@
+import random
+import time
+
+from datalayer.genepanelsimilarity import (
+    load_gene_sets,
+    most_similar,
+    similar_genepanels,
+    update_genepanel_signature,
+)
+from vardb.datamodel import gene
+
+
+def _reference(input_genes, candidates, limit=5):
+    # Straightforward implementation of the original SQL query
+    input_count = len(input_genes)
+    stats = []
+    for (name, version), genes in candidates.items():
+        overlap = len([g for g in genes if g in input_genes])
+        if overlap == 0:
+            continue
+        missing = input_count - overlap
+        additional = len(genes) - overlap
+        score = float(overlap) * 2 / input_count + float(input_count) / (missing + additional + 1)
+        stats.append((score, name, version, missing, overlap, additional))
+    stats.sort(key=lambda x: (-x[0], x[1], x[2]))
+    return [
+        {
+            "name": name,
+            "version": version,
+            "addition_cnt": additional,
+            "overlap_cnt": overlap,
+            "missing_cnt": missing,
+        }
+        for _, name, version, missing, overlap, additional in stats[:limit]
+    ]
+
+
+def test_most_similar_synthetic_store():
+    rng = random.Random(1)
+    all_genes = list(range(1, 20001))
+
+    candidates = {}
+    for i in range(500):
+        size = rng.choice([10, 50, 200, 1000, 5000])
+        candidates[(f"Panel{i:03}", "v01")] = frozenset(rng.sample(all_genes, size))
+
+    for input_key in [("Panel000", "v01"), ("Panel250", "v01"), ("Panel499", "v01")]:
+        # Custom panel derived from an official panel, with some genes added and removed
+        input_genes = set(candidates[input_key])
+        input_genes -= set(rng.sample(sorted(input_genes), len(input_genes) // 10))
+        input_genes |= set(rng.sample(all_genes, 5))
+        input_genes = frozenset(input_genes)
+
+        start = time.perf_counter()
+        result = most_similar(input_genes, candidates)
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = _reference(input_genes, candidates)
+        reference_elapsed = time.perf_counter() - start
+
+        assert result == expected
+        assert result[0]["name"] == input_key[0]
+        assert elapsed < reference_elapsed
+
+    assert most_similar(frozenset(), candidates) == []
+    assert most_similar(frozenset([-1]), candidates) == []
+
+
+def test_similar_genepanels(test_database, session):
+    test_database.refresh()
+
+    genepanels = session.query(gene.Genepanel).all()
+    gene_sets = {
+        (gp.name, gp.version): frozenset(t.gene_id for t in gp.transcripts) for gp in genepanels
+    }
+    assert load_gene_sets(session, gene_sets.keys()) == gene_sets
+
+    for key in gene_sets:
+        candidates = {k: v for k, v in gene_sets.items() if k != key}
+        assert similar_genepanels(session, key, gene_sets.keys()) == _reference(
+            gene_sets[key], candidates
+        )
+
+    # Cached gene sets are invalidated when the signature is updated
+    genepanel = genepanels[0]
+    removed = genepanel.transcripts[0]
+    genepanel.transcripts = [t for t in genepanel.transcripts if t.gene_id != removed.gene_id]
+    session.flush()
+    update_genepanel_signature(session, genepanel.name, genepanel.version)
+    key = (genepanel.name, genepanel.version)
+    assert load_gene_sets(session, [key])[key] == gene_sets[key] - {removed.gene_id}
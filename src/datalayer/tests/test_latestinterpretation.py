@@ -0,0 +1,94 @@
+from datalayer import queries
+from datalayer.latestinterpretation import (
+    check_latest_interpretations,
+    rebuild_latest_interpretations,
+)
+from vardb.datamodel import workflow
+
+
+def _latest(session, analysis_id):
+    return (
+        session.query(workflow.LatestInterpretation)
+        .filter(workflow.LatestInterpretation.analysis_id == analysis_id)
+        .one()
+    )
+
+
+def _analysis_ids_by_status(session, **kwargs):
+    return set(
+        queries.workflow_by_status(
+            session, workflow.AnalysisInterpretation, "analysis_id", **kwargs
+        ).scalar_all()
+    )
+
+
+def test_latest_interpretations_consistent(test_database, session):
+    test_database.refresh()
+    assert check_latest_interpretations(session) == []
+    assert session.query(workflow.LatestInterpretation).count() == (
+        session.query(workflow.AlleleInterpretation.allele_id).distinct().count()
+        + session.query(workflow.AnalysisInterpretation.analysis_id).distinct().count()
+    )
+
+
+def test_latest_interpretations_updated_on_flush(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AnalysisInterpretation)
+        .filter(workflow.AnalysisInterpretation.status == "Not started")
+        .first()
+    )
+    analysis_id = interpretation.analysis_id
+    assert analysis_id in _analysis_ids_by_status(session, status="Not started")
+
+    # Visible to the workflow queries within the transaction, before commit
+    interpretation.status = "Ongoing"
+    session.flush()
+    assert _latest(session, analysis_id).status == "Ongoing"
+    assert analysis_id in _analysis_ids_by_status(session, status="Ongoing")
+    assert analysis_id not in _analysis_ids_by_status(session, status="Not started")
+
+    # Finalize, and start a new round
+    interpretation.status = "Done"
+    interpretation.finalized = True
+    session.commit()
+    assert analysis_id in _analysis_ids_by_status(session, finalized=True)
+
+    new_interpretation = workflow.AnalysisInterpretation(
+        analysis_id=analysis_id,
+        workflow_status="Review",
+        status="Not started",
+        genepanel_name=interpretation.genepanel_name,
+        genepanel_version=interpretation.genepanel_version,
+    )
+    session.add(new_interpretation)
+    session.commit()
+
+    latest = _latest(session, analysis_id)
+    assert latest.analysisinterpretation_id == new_interpretation.id
+    assert latest.workflow_status == "Review"
+    assert not latest.finalized
+    assert analysis_id in _analysis_ids_by_status(
+        session, workflow_status="Review", status="Not started", finalized=False
+    )
+    assert analysis_id not in _analysis_ids_by_status(session, finalized=True)
+    assert check_latest_interpretations(session) == []
+
+
+def test_latest_interpretations_rebuild(test_database, session):
+    test_database.refresh()
+
+    num_entries = session.query(workflow.LatestInterpretation).count()
+    assert num_entries > 0
+    session.query(workflow.LatestInterpretation).delete()
+    session.commit()
+
+    inconsistencies = check_latest_interpretations(session)
+    assert len(inconsistencies) == num_entries
+    assert all(i.startswith("Missing latest interpretation") for i in inconsistencies)
+
+    rebuild_latest_interpretations(session)
+    session.commit()
+    assert session.query(workflow.LatestInterpretation).count() == num_entries
+    assert check_latest_interpretations(session) == []
@@ -0,0 +1,189 @@
+import psycopg2
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from api.v1.resources.workflow import helpers
+from api.v1.resources.workflow.helpers import get_workflow_allele_collisions
+from api.util.types import WorkflowTypes
+from datalayer import queries
+from datalayer.openworkflows import PENDING_KEY, check_open_workflows, rebuild_open_workflows
+from vardb.datamodel import sample, user, workflow
+
+
+def _open_analysis_allele_ids(session, analysis_id):
+    return set(
+        session.query(workflow.OpenWorkflowAllele.allele_id)
+        .filter(workflow.OpenWorkflowAllele.analysis_id == analysis_id)
+        .scalar_all()
+    )
+
+
+def test_open_workflows_consistent(test_database, session):
+    test_database.refresh()
+    assert check_open_workflows(session) == []
+
+
+def test_open_workflows_updated_on_commit(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AnalysisInterpretation)
+        .filter(workflow.AnalysisInterpretation.status == "Not started")
+        .first()
+    )
+    analysis_id = interpretation.analysis_id
+    assert _open_analysis_allele_ids(session, analysis_id) == set()
+
+    testuser = session.query(user.User).filter(user.User.username == "testuser1").one()
+    interpretation.status = "Ongoing"
+    interpretation.user_id = testuser.id
+    session.commit()
+
+    analysis_allele_ids = set(
+        session.query(sample.analysis_allele.c.allele_id)
+        .filter(sample.analysis_allele.c.analysis_id == analysis_id)
+        .scalar_all()
+    )
+    assert _open_analysis_allele_ids(session, analysis_id) == analysis_allele_ids
+    assert check_open_workflows(session) == []
+
+    # Alleles with valid assessments don't collide
+    assessed_allele_ids = set(queries.allele_ids_with_valid_alleleassessments(session).scalar_all())
+    collisions = get_workflow_allele_collisions(session, list(analysis_allele_ids))
+    collision_allele_ids = set(
+        c.allele_id
+        for c in collisions
+        if c.type is WorkflowTypes.ANALYSIS and c.analysis_id == analysis_id
+    )
+    assert collision_allele_ids
+    assert collision_allele_ids <= analysis_allele_ids - assessed_allele_ids
+    assert all(c.user.id == testuser.id for c in collisions if c.analysis_id == analysis_id)
+
+    # The workflow itself is excluded
+    collisions = get_workflow_allele_collisions(
+        session, list(analysis_allele_ids), analysis_id=analysis_id
+    )
+    assert not any(c.analysis_id == analysis_id for c in collisions)
+
+    # Finalized workflows are no longer open
+    interpretation.status = "Done"
+    interpretation.finalized = True
+    session.commit()
+    assert _open_analysis_allele_ids(session, analysis_id) == set()
+    assert check_open_workflows(session) == []
+
+
+def test_open_workflows_updated_by_workflow_actions(test_database, session):
+    "The workflow actions commit changes that have not been flushed yet"
+    test_database.refresh()
+    testuser = session.query(user.User).filter(user.User.username == "testuser1").one()
+    analysis_id = (
+        session.query(workflow.AnalysisInterpretation.analysis_id)
+        .filter(workflow.AnalysisInterpretation.status == "Not started")
+        .first()
+        .analysis_id
+    )
+
+    interpretation = helpers.start_interpretation(
+        session, testuser.id, None, workflow_analysis_id=analysis_id
+    )
+    session.commit()
+    assert _open_analysis_allele_ids(session, analysis_id)
+
+    interpretation.status = "Done"
+    interpretation.finalized = True
+    session.commit()
+    assert _open_analysis_allele_ids(session, analysis_id) == set()
+
+    helpers.reopen_interpretation(session, workflow_analysis_id=analysis_id)
+    session.commit()
+    assert _open_analysis_allele_ids(session, analysis_id)
+    assert check_open_workflows(session) == []
+
+
+def test_open_workflows_rollback(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AlleleInterpretation)
+        .filter(workflow.AlleleInterpretation.status == "Not started")
+        .first()
+    )
+    interpretation.status = "Ongoing"
+    session.flush()
+    assert PENDING_KEY in session.info
+    session.rollback()
+    assert PENDING_KEY not in session.info
+    assert check_open_workflows(session) == []
+
+
+def test_open_workflows_rebuild(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AlleleInterpretation)
+        .filter(workflow.AlleleInterpretation.status == "Not started")
+        .first()
+    )
+    interpretation.status = "Ongoing"
+    session.commit()
+
+    num_entries = session.query(workflow.OpenWorkflowAllele).count()
+    assert num_entries > 0
+    session.query(workflow.OpenWorkflowAllele).delete()
+    session.commit()
+
+    inconsistencies = check_open_workflows(session)
+    assert len(inconsistencies) == num_entries
+    assert all(i.startswith("Missing open workflow entry") for i in inconsistencies)
+
+    rebuild_open_workflows(session)
+    session.commit()
+    assert session.query(workflow.OpenWorkflowAllele).count() == num_entries
+    assert check_open_workflows(session) == []
+
+
+def test_open_workflows_duplicate_allele_workflow(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AlleleInterpretation)
+        .filter(workflow.AlleleInterpretation.status == "Not started")
+        .first()
+    )
+    interpretation.status = "Ongoing"
+    session.commit()
+
+    entry = (
+        session.query(workflow.OpenWorkflowAllele)
+        .filter(
+            workflow.OpenWorkflowAllele.allele_id == interpretation.allele_id,
+            workflow.OpenWorkflowAllele.analysis_id.is_(None),
+        )
+        .one()
+    )
+
+    def duplicate():
+        return workflow.OpenWorkflowAllele(
+            allele_id=entry.allele_id,
+            analysis_id=None,
+            user_id=entry.user_id,
+            workflow_status=entry.workflow_status,
+        )
+
+    # Null analysis_ids are distinct in the (analysis_id, allele_id) constraint,
+    # so duplicates are rejected by the partial index
+    session.add(duplicate())
+    with pytest.raises((IntegrityError, psycopg2.IntegrityError)):
+        session.flush()
+    session.rollback()
+
+    # Duplicates are reported by the checker (the index drop is rolled back)
+    session.execute("DROP INDEX ix_open_workflow_allele_allele_workflow_unique")
+    session.add(duplicate())
+    session.flush()
+    assert check_open_workflows(session) == [
+        f"2 open workflow entries for allele {entry.allele_id}, expected at most 1"
+    ]
+    session.rollback()
+    assert check_open_workflows(session) == []
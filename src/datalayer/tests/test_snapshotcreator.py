@@ -0,0 +1,158 @@
+import logging
+import os
+import time
+
+from datalayer.snapshotcreator import SnapshotCreator
+from vardb.datamodel import allele, annotation, workflow
+
+# Alleles in the benchmark analysis
+NUM_ALLELES = int(os.environ.get("SNAPSHOT_BENCHMARK_ALLELES", 10000))
+
+log = logging.getLogger(__name__)
+
+
+def _new_round(session, analysis_interpretation):
+    interpretation = workflow.AnalysisInterpretation(
+        analysis_id=analysis_interpretation.analysis_id,
+        genepanel_name=analysis_interpretation.genepanel_name,
+        genepanel_version=analysis_interpretation.genepanel_version,
+        status="Done",
+    )
+    session.add(interpretation)
+    session.flush()
+    return interpretation
+
+
+def _snapshots(session, interpretation):
+    return {
+        s.allele_id: (s.filtered, s.annotation_id)
+        for s in session.query(workflow.AnalysisInterpretationSnapshot).filter(
+            workflow.AnalysisInterpretationSnapshot.analysisinterpretation_id == interpretation.id
+        )
+    }
+
+
+def test_snapshot_filtered_categories(test_database, session):
+    test_database.refresh()
+    first = session.query(workflow.AnalysisInterpretation).first()
+    (a1, an1), (a2, _), (a3, _) = (
+        session.query(annotation.Annotation.allele_id, annotation.Annotation.id)
+        .filter(annotation.Annotation.date_superceeded.is_(None))
+        .order_by(annotation.Annotation.allele_id)
+        .limit(3)
+        .all()
+    )
+
+    interpretation = _new_round(session, first)
+    SnapshotCreator(session).insert_from_data(
+        [a1],
+        "analysis",
+        interpretation,
+        [an1],
+        [],
+        [],
+        [],
+        excluded_allele_ids={"frequency": [a2], "region": [a2, a3]},
+    )
+
+    # One snapshot per allele, with the first category excluding it
+    assert _snapshots(session, interpretation) == {
+        a1: (None, an1),
+        a2: ("FREQUENCY", None),
+        a3: ("REGION", None),
+    }
+
+
+def _create_alleles(session, num_alleles):
+    "Inserts alleles with one annotation each, returning {allele_id: annotation_id}"
+    session.execute(
+        allele.Allele.__table__.insert(),
+        [
+            {
+                "genome_reference": "GRCh37",
+                "chromosome": "BENCHMARK",
+                "start_position": i,
+                "open_end_position": i + 1,
+                "change_from": "A",
+                "change_to": "T",
+                "change_type": "SNP",
+                "caller_type": "snv",
+                "vcf_pos": i + 1,
+                "vcf_ref": "A",
+                "vcf_alt": "T",
+                "length": 1,
+            }
+            for i in range(num_alleles)
+        ],
+    )
+    allele_ids = (
+        session.query(allele.Allele.id).filter(allele.Allele.chromosome == "BENCHMARK").scalar_all()
+    )
+    # Reuse the data of an existing annotation
+    annotation_config_id, annotations = (
+        session.query(annotation.Annotation.annotation_config_id, annotation.Annotation.annotations)
+        .filter(annotation.Annotation.date_superceeded.is_(None))
+        .first()
+    )
+    session.execute(
+        annotation.Annotation.__table__.insert(),
+        [
+            {
+                "allele_id": a,
+                "annotations": annotations,
+                "annotation_config_id": annotation_config_id,
+            }
+            for a in allele_ids
+        ],
+    )
+    return dict(
+        session.query(annotation.Annotation.allele_id, annotation.Annotation.id)
+        .filter(annotation.Annotation.allele_id.in_(allele_ids))
+        .all()
+    )
+
+
+def test_snapshot_benchmark(test_database, session):
+    "Finalize time for a large analysis, with multi-row INSERTs and with bulk_insert_mappings"
+    test_database.refresh()
+    first = session.query(workflow.AnalysisInterpretation).first()
+    allele_ids_annotation_ids = _create_alleles(session, NUM_ALLELES)
+    allele_ids = sorted(allele_ids_annotation_ids)
+    # Most alleles are filtered
+    excluded = {"frequency": allele_ids[: NUM_ALLELES // 2], "region": allele_ids[::3]}
+    session.commit()
+
+    def finalize(creator):
+        interpretation = _new_round(session, first)
+        start = time.time()
+        creator.insert_from_data(
+            allele_ids,
+            "analysis",
+            interpretation,
+            list(allele_ids_annotation_ids.values()),
+            [],
+            [],
+            [],
+            excluded_allele_ids=excluded,
+        )
+        session.flush()
+        elapsed = time.time() - start
+        session.commit()
+        return interpretation, elapsed
+
+    multirow, multirow_elapsed = finalize(SnapshotCreator(session))
+
+    # As before multi-row INSERTs
+    creator = SnapshotCreator(session)
+    creator._insert = lambda model, snapshot_items: session.bulk_insert_mappings(
+        model, snapshot_items
+    )
+    mappings, mappings_elapsed = finalize(creator)
+
+    snapshots = _snapshots(session, multirow)
+    assert len(snapshots) == NUM_ALLELES
+    assert snapshots == _snapshots(session, mappings)
+    log.info(
+        f"Snapshots of {NUM_ALLELES} alleles: {multirow_elapsed:.2f}s with multi-row INSERTs, "
+        f"{mappings_elapsed:.2f}s with bulk_insert_mappings"
+    )
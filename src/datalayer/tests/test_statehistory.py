@@ -0,0 +1,59 @@
+import copy
+
+from datalayer import statehistory
+from vardb.datamodel import workflow
+
+
+def _make_states(num_versions):
+    states = []
+    state = {"allele": {}, "report": {"included_allele_ids": []}, "filterconfigId": 1}
+    for i in range(num_versions):
+        state = copy.deepcopy(state)
+        state["allele"][str(i)] = {"allele_id": i, "verification": None, "comment": "x" * 100}
+        if i % 3 == 0:
+            state["report"]["included_allele_ids"].append(i)
+        if i % 4 == 0 and str(i - 1) in state["allele"]:
+            state["allele"][str(i - 1)]["verification"] = "verified"
+        states.append(state)
+    return states
+
+
+def test_state_history_roundtrip(test_database, session, monkeypatch):
+    test_database.refresh()
+    monkeypatch.setattr(statehistory, "STATE_HISTORY_CHECKPOINT_INTERVAL", 4)
+
+    interpretation = session.query(workflow.AnalysisInterpretation).first()
+    session.query(workflow.InterpretationStateHistory).filter(
+        workflow.InterpretationStateHistory.analysisinterpretation_id == interpretation.id
+    ).delete()
+    states = _make_states(10)
+
+    # Simulate user saving a new state for each version
+    interpretation.state = states[0]
+    history_ids = []
+    for new_state in states[1:]:
+        history = statehistory.add_state_history(session, interpretation, new_state, 1)
+        session.flush()
+        history_ids.append(history.id)
+        interpretation.state = new_state
+    session.flush()
+
+    rows = (
+        session.query(workflow.InterpretationStateHistory)
+        .filter(workflow.InterpretationStateHistory.analysisinterpretation_id == interpretation.id)
+        .order_by(workflow.InterpretationStateHistory.id)
+        .all()
+    )
+    assert len(rows) == 9
+    # Checkpoint every 4th version, deltas in between
+    assert [r.state is not None for r in rows] == [True, False, False, False] * 2 + [True]
+    assert all(r.state_delta is None for r in rows if r.state is not None)
+    # Deltas only contain the change
+    assert all(len(r.state_delta) <= 3 for r in rows if r.state is None)
+
+    for history_id, expected in zip(history_ids, states[:-1]):
+        assert statehistory.rebuild_state(session, interpretation, history_id) == expected
+
+    versions = statehistory.get_state_history(session, interpretation)
+    assert [v["id"] for v in versions] == history_ids
+    assert [v["state"] for v in versions] == states[:-1]
@@ -0,0 +1,102 @@
+from api.v1.resources.workflow import helpers
+from datalayer.worklist import PENDING_KEY, check_worklist, rebuild_worklist
+from vardb.datamodel import user, workflow
+
+
+def _analysis_entry(session, analysis_id):
+    return (
+        session.query(workflow.WorklistEntry)
+        .filter(workflow.WorklistEntry.analysis_id == analysis_id)
+        .one_or_none()
+    )
+
+
+def test_worklist_consistent(test_database, session):
+    test_database.refresh()
+    assert session.query(workflow.WorklistEntry).count() > 0
+    assert check_worklist(session) == []
+
+
+def test_worklist_updated_on_commit(test_database, session):
+    test_database.refresh()
+
+    interpretation = (
+        session.query(workflow.AnalysisInterpretation)
+        .filter(workflow.AnalysisInterpretation.status == "Not started")
+        .first()
+    )
+    assert _analysis_entry(session, interpretation.analysis_id).category == "not_started"
+
+    interpretation.status = "Ongoing"
+    session.add(
+        workflow.InterpretationLog(
+            analysisinterpretation_id=interpretation.id, priority=3, review_comment="Check CNVs"
+        )
+    )
+    session.commit()
+
+    entry = _analysis_entry(session, interpretation.analysis_id)
+    assert entry.category == "ongoing"
+    assert entry.priority == 3
+    assert entry.review_comment == "Check CNVs"
+    assert check_worklist(session) == []
+
+    # Changes that are rolled back are not reflected
+    interpretation.workflow_status = "Review"
+    interpretation.status = "Not started"
+    session.flush()
+    session.rollback()
+    assert PENDING_KEY not in session.info
+    assert _analysis_entry(session, interpretation.analysis_id).category == "ongoing"
+
+    # Finalized analyses are removed from the worklist
+    interpretation.status = "Done"
+    interpretation.finalized = True
+    session.commit()
+    assert _analysis_entry(session, interpretation.analysis_id) is None
+    assert check_worklist(session) == []
+
+
+def test_worklist_updated_by_workflow_actions(test_database, session):
+    "The workflow actions commit changes that have not been flushed yet"
+    test_database.refresh()
+    testuser = session.query(user.User).filter(user.User.username == "testuser1").one()
+    analysis_id = (
+        session.query(workflow.AnalysisInterpretation.analysis_id)
+        .filter(workflow.AnalysisInterpretation.status == "Not started")
+        .first()
+        .analysis_id
+    )
+
+    interpretation = helpers.start_interpretation(
+        session, testuser.id, None, workflow_analysis_id=analysis_id
+    )
+    session.commit()
+    assert _analysis_entry(session, analysis_id).category == "ongoing"
+
+    interpretation.status = "Done"
+    interpretation.finalized = True
+    session.commit()
+    assert _analysis_entry(session, analysis_id) is None
+
+    helpers.reopen_interpretation(session, workflow_analysis_id=analysis_id)
+    session.commit()
+    assert _analysis_entry(session, analysis_id).category == "not_started"
+    assert check_worklist(session) == []
+
+
+def test_worklist_rebuild(test_database, session):
+    test_database.refresh()
+
+    num_entries = session.query(workflow.WorklistEntry).count()
+    session.query(workflow.WorklistEntry).delete()
+    session.commit()
+
+    inconsistencies = check_worklist(session)
+    assert len(inconsistencies) == num_entries
+    assert all(i.startswith("Missing worklist entry") for i in inconsistencies)
+
+    rebuild_worklist(session)
+    session.commit()
+    assert session.query(workflow.WorklistEntry).count() == num_entries
+    assert check_worklist(session) == []
@@ -0,0 +1,383 @@
+"""
+Materialised overview worklist.
+
+The overview endpoints need the category, priority, review comment and warning status of every
+allele and analysis in the workflow. Computing these from the live queries (DISTINCT ON over all
+interpretations and interpretation logs) on every request is expensive, so they are kept in the
+worklist table instead.
+
+The table is updated from session events (registered in vardb.util.db.DB): interpretations and
+interpretation logs changed in a session are tracked on flush, and the worklist rows for the
+affected alleles and analyses are recomputed right before the session commits. check_worklist()
+compares the table with the live queries, and rebuild_worklist() recreates it from scratch.
+
+Allele display data (annotation, existing classification) is not part of the worklist, and is still
+loaded by AlleleDataLoader for each overview request. Assessment and annotation changes are
+therefore not tracked.
+"""
+import itertools
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Set
+
+from api.util.types import AlleleCategories, AnalysisCategories
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+from vardb.datamodel import sample, user, workflow
+
+from datalayer import filters, queries
+from datalayer.workflowcategorization import get_categorized_alleles, get_categorized_analyses
+
+ALLELE_CATEGORIES = {
+    ("Interpretation", "Not started"): AlleleCategories.NOT_STARTED,
+    ("Review", "Not started"): AlleleCategories.MARKED_REVIEW,
+}
+
+ANALYSIS_CATEGORIES = {
+    ("Not ready", "Not started"): AnalysisCategories.NOT_READY,
+    ("Interpretation", "Not started"): AnalysisCategories.NOT_STARTED,
+    ("Review", "Not started"): AnalysisCategories.MARKED_REVIEW,
+    ("Medical review", "Not started"): AnalysisCategories.MARKED_MEDICALREVIEW,
+}
+
+# Interpretation attributes that affect the worklist
+TRACKED_ATTRIBUTES = ["status", "workflow_status", "genepanel_name", "genepanel_version"]
+
+PENDING_KEY = "worklist_pending"
+
+
+def _category(categories, ongoing, workflow_status: str, status: str) -> Optional[str]:
+    if status == "Ongoing":
+        return ongoing
+    return categories.get((workflow_status, status))
+
+
+def _latest_log_fields(session: Session, query_functions, ids: Optional[List[int]]):
+    "Returns {<id>: {<field>: <value>}} for the latest non-null value of each field"
+    fields: DefaultDict = defaultdict(dict)
+    for field, query_function in query_functions.items():
+        for model_id, value in query_function(session, ids).all():
+            fields[model_id][field] = value
+    return fields
+
+
+def _allele_entries(session: Session, allele_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Computes worklist rows for given alleles (or all alleles, if allele_ids is None).
+    """
+    interpretations = session.query(
+        workflow.AlleleInterpretation.allele_id,
+        workflow.AlleleInterpretation.workflow_status,
+        workflow.AlleleInterpretation.status,
+        workflow.AlleleInterpretation.genepanel_name,
+        workflow.AlleleInterpretation.genepanel_version,
+        workflow.AlleleInterpretation.date_created,
+        workflow.AlleleInterpretation.date_last_update,
+    )
+    if allele_ids is not None:
+        interpretations = interpretations.filter(
+            filters.in_(session, workflow.AlleleInterpretation.allele_id, allele_ids)
+        )
+
+    interpretations_by_allele_id: DefaultDict[int, List] = defaultdict(list)
+    for interpretation in interpretations:
+        interpretations_by_allele_id[interpretation.allele_id].append(interpretation)
+
+    entries = []
+    for allele_id, allele_interpretations in interpretations_by_allele_id.items():
+        # Category is given by the latest created interpretation, while the genepanel is
+        # taken from the latest updated one (as shown in the overview)
+        latest = max(allele_interpretations, key=lambda i: i.date_created)
+        category = _category(
+            ALLELE_CATEGORIES, AlleleCategories.ONGOING, latest.workflow_status, latest.status
+        )
+        if category is None:
+            continue
+        last_updated = max(allele_interpretations, key=lambda i: i.date_last_update)
+        entries.append(
+            {
+                "allele_id": allele_id,
+                "analysis_id": None,
+                "category": str(category),
+                "genepanel_name": last_updated.genepanel_name,
+                "genepanel_version": last_updated.genepanel_version,
+                "date_created": min(i.date_created for i in allele_interpretations),
+            }
+        )
+
+    if not entries:
+        return []
+
+    log_fields = _latest_log_fields(
+        session,
+        {
+            "priority": queries.workflow_allele_priority,
+            "review_comment": queries.workflow_allele_review_comment,
+        },
+        [e["allele_id"] for e in entries] if allele_ids is not None else None,
+    )
+    for entry in entries:
+        fields = log_fields.get(entry["allele_id"], {})
+        entry["priority"] = fields.get("priority", 1)
+        entry["review_comment"] = fields.get("review_comment")
+        entry["warning_cleared"] = None
+    return entries
+
+
+def _analysis_entries(session: Session, analysis_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Computes worklist rows for given analyses (or all analyses, if analysis_ids is None).
+    """
+    interpretations = session.query(
+        workflow.AnalysisInterpretation.analysis_id,
+        workflow.AnalysisInterpretation.workflow_status,
+        workflow.AnalysisInterpretation.status,
+    ).order_by(
+        workflow.AnalysisInterpretation.analysis_id,
+        workflow.AnalysisInterpretation.date_created.desc(),
+    )
+    analyses = session.query(
+        sample.Analysis.id,
+        sample.Analysis.genepanel_name,
+        sample.Analysis.genepanel_version,
+        func.coalesce(sample.Analysis.date_requested, sample.Analysis.date_deposited),
+    )
+    if analysis_ids is not None:
+        interpretations = interpretations.filter(
+            filters.in_(session, workflow.AnalysisInterpretation.analysis_id, analysis_ids)
+        )
+        analyses = analyses.filter(filters.in_(session, sample.Analysis.id, analysis_ids))
+
+    # Rows are ordered with the latest created interpretation first for each analysis
+    category_by_analysis_id: Dict[int, str] = {}
+    for analysis_id, analysis_interpretations in itertools.groupby(
+        interpretations, key=lambda i: i.analysis_id
+    ):
+        latest = next(analysis_interpretations)
+        category = _category(
+            ANALYSIS_CATEGORIES, AnalysisCategories.ONGOING, latest.workflow_status, latest.status
+        )
+        if category is not None:
+            category_by_analysis_id[analysis_id] = str(category)
+
+    if not category_by_analysis_id:
+        return []
+
+    log_fields = _latest_log_fields(
+        session,
+        {
+            "priority": queries.workflow_analyses_priority,
+            "review_comment": queries.workflow_analyses_review_comment,
+            "warning_cleared": queries.workflow_analyses_warning_cleared,
+        },
+        list(category_by_analysis_id) if analysis_ids is not None else None,
+    )
+
+    entries = []
+    for analysis_id, genepanel_name, genepanel_version, date_created in analyses:
+        if analysis_id not in category_by_analysis_id:
+            continue
+        fields = log_fields.get(analysis_id, {})
+        entries.append(
+            {
+                "allele_id": None,
+                "analysis_id": analysis_id,
+                "category": category_by_analysis_id[analysis_id],
+                "genepanel_name": genepanel_name,
+                "genepanel_version": genepanel_version,
+                "date_created": date_created,
+                "priority": fields.get("priority", 1),
+                "review_comment": fields.get("review_comment"),
+                "warning_cleared": fields.get("warning_cleared"),
+            }
+        )
+    return entries
+
+
+def _replace_entries(session: Session, id_column, ids: Optional[List[int]], entries: List[Dict]):
+    table = workflow.WorklistEntry.__table__
+    delete = table.delete()
+    if ids is not None:
+        delete = delete.where(id_column.in_(ids))
+    else:
+        delete = delete.where(id_column.isnot(None))
+    session.execute(delete)
+    if entries:
+        session.execute(table.insert(), entries)
+
+
+def refresh_worklist(
+    session: Session,
+    allele_ids: Optional[Iterable[int]] = None,
+    analysis_ids: Optional[Iterable[int]] = None,
+):
+    """
+    Recompute the worklist rows of the given alleles and analyses.
+    """
+    if allele_ids:
+        allele_ids = sorted(set(allele_ids))
+        _replace_entries(
+            session,
+            workflow.WorklistEntry.allele_id,
+            allele_ids,
+            _allele_entries(session, allele_ids),
+        )
+    if analysis_ids:
+        analysis_ids = sorted(set(analysis_ids))
+        _replace_entries(
+            session,
+            workflow.WorklistEntry.analysis_id,
+            analysis_ids,
+            _analysis_entries(session, analysis_ids),
+        )
+
+
+def rebuild_worklist(session: Session):
+    """
+    Recreate the whole worklist from the interpretations and interpretation logs.
+    """
+    _replace_entries(session, workflow.WorklistEntry.allele_id, None, _allele_entries(session))
+    _replace_entries(session, workflow.WorklistEntry.analysis_id, None, _analysis_entries(session))
+
+
+def get_worklist(session: Session, id_attr: str, user: Optional[user.User] = None):
+    """
+    Query for worklist rows of alleles (id_attr='allele_id') or analyses (id_attr='analysis_id'),
+    optionally restricted to those accessible for user.
+    """
+    assert id_attr in ["allele_id", "analysis_id"]
+    id_column = getattr(workflow.WorklistEntry, id_attr)
+    worklist = session.query(workflow.WorklistEntry).filter(id_column.isnot(None))
+    if user is not None:
+        if id_attr == "allele_id":
+            # Alleles are accessible if any of their interpretations is for one of the genepanels
+            worklist = worklist.filter(
+                id_column.in_(
+                    queries.workflow_alleles_for_genepanels(session, user.group.genepanels)
+                )
+            )
+        else:
+            worklist = worklist.filter(
+                filters.in_(
+                    session,
+                    (
+                        workflow.WorklistEntry.genepanel_name,
+                        workflow.WorklistEntry.genepanel_version,
+                    ),
+                    [(gp.name, gp.version) for gp in user.group.genepanels],
+                )
+            )
+    return worklist
+
+
+def check_worklist(session: Session) -> List[str]:
+    """
+    Compare the worklist with the live workflow queries.
+
+    Returns a list of descriptions of inconsistencies (empty if the worklist is up to date).
+    """
+    stored = {(e.allele_id, e.analysis_id): e for e in session.query(workflow.WorklistEntry).all()}
+
+    expected: Dict[Any, Dict[str, Any]] = {}
+    for category, allele_ids in get_categorized_alleles(session).items():
+        for (allele_id,) in allele_ids:
+            expected[(allele_id, None)] = {"category": str(category), "priority": 1}
+    for category, analysis_ids in get_categorized_analyses(session).items():
+        for (analysis_id,) in analysis_ids:
+            expected[(None, analysis_id)] = {"category": str(category), "priority": 1}
+
+    for field, query_function in [
+        ("priority", queries.workflow_allele_priority),
+        ("review_comment", queries.workflow_allele_review_comment),
+    ]:
+        for allele_id, value in query_function(session).all():
+            if (allele_id, None) in expected:
+                expected[(allele_id, None)][field] = value
+    for field, query_function in [
+        ("priority", queries.workflow_analyses_priority),
+        ("review_comment", queries.workflow_analyses_review_comment),
+        ("warning_cleared", queries.workflow_analyses_warning_cleared),
+    ]:
+        for analysis_id, value in query_function(session).all():
+            if (None, analysis_id) in expected:
+                expected[(None, analysis_id)][field] = value
+
+    def describe(key):
+        allele_id, analysis_id = key
+        return f"allele {allele_id}" if allele_id is not None else f"analysis {analysis_id}"
+
+    inconsistencies = []
+    for key in sorted(set(expected) - set(stored), key=str):
+        inconsistencies.append(f"Missing worklist entry for {describe(key)}")
+    for key in sorted(set(stored) - set(expected), key=str):
+        inconsistencies.append(f"Superfluous worklist entry for {describe(key)}")
+    for key in sorted(set(stored) & set(expected), key=str):
+        for field in ["category", "priority", "review_comment", "warning_cleared"]:
+            stored_value = getattr(stored[key], field)
+            expected_value = expected[key].get(field)
+            if stored_value != expected_value:
+                inconsistencies.append(
+                    f"Worklist entry for {describe(key)} has {field} {stored_value!r}, "
+                    f"expected {expected_value!r}"
+                )
+    return inconsistencies
+
+
+def _is_modified(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRIBUTES)
+
+
+def track_changes(session: Session):
+    "Collect alleles and analyses affected by a flush. Called from the after_flush event."
+    # Collections still reflect the state before the flush, but new objects have been assigned ids
+    pending: DefaultDict[str, Set[int]] = defaultdict(set)
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, workflow.AlleleInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                pending["allele_ids"].add(obj.allele_id)
+        elif isinstance(obj, workflow.AnalysisInterpretation):
+            if obj in session.new or obj in session.deleted or _is_modified(obj):
+                pending["analysis_ids"].add(obj.analysis_id)
+        elif isinstance(obj, workflow.InterpretationLog):
+            if obj.alleleinterpretation_id is not None:
+                pending["alleleinterpretation_ids"].add(obj.alleleinterpretation_id)
+            if obj.analysisinterpretation_id is not None:
+                pending["analysisinterpretation_ids"].add(obj.analysisinterpretation_id)
+
+    if pending:
+        session_pending = session.info.setdefault(PENDING_KEY, defaultdict(set))
+        for key, ids in pending.items():
+            session_pending[key].update(ids)
+
+
+def refresh_pending(session: Session):
+    "Refresh worklist for collected alleles and analyses. Called from the before_commit event."
+    # before_commit fires before the commit's own flush. Flush remaining changes here, so that
+    # they are tracked and visible to the queries below.
+    session.flush()
+    if PENDING_KEY not in session.info:
+        return
+    pending = session.info.pop(PENDING_KEY)
+
+    allele_ids = set(pending["allele_ids"])
+    if pending["alleleinterpretation_ids"]:
+        allele_ids.update(
+            a_id
+            for (a_id,) in session.query(workflow.AlleleInterpretation.allele_id).filter(
+                workflow.AlleleInterpretation.id.in_(pending["alleleinterpretation_ids"])
+            )
+        )
+    analysis_ids = set(pending["analysis_ids"])
+    if pending["analysisinterpretation_ids"]:
+        analysis_ids.update(
+            a_id
+            for (a_id,) in session.query(workflow.AnalysisInterpretation.analysis_id).filter(
+                workflow.AnalysisInterpretation.id.in_(pending["analysisinterpretation_ids"])
+            )
+        )
+    refresh_worklist(session, allele_ids=allele_ids, analysis_ids=analysis_ids)
+
+
+def discard_pending(session: Session):
+    "Forget collected alleles and analyses, as their changes were rolled back."
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,91 @@
+import gzip
+import logging
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .pubmed_parser import NewReference, PubMedParser
+
+"""
+This module parses the offline PubMed baseline and update files, which are PubmedArticleSet XML
+files (usually gzipped) of several hundred MB each.
+The references are dumped to a file in the same format as PubMedFetcher, that can be imported
+into ELLA using the CLI.
+"""
+log = logging.getLogger(__name__)
+
+ARTICLE_TAGS = ["PubmedArticle", "PubmedBookArticle"]
+
+
+def iter_references(xml_file: Path) -> Iterator[NewReference]:
+    """
+    :param xml_file: PubmedArticleSet XML file, gzipped if suffix is .gz
+    :yield : references, in file order
+
+    The file is parsed incrementally. Each article is converted when its end tag is reached,
+    and cleared from the tree afterwards, so memory usage does not grow with the file size.
+    Articles that can not be parsed are logged and skipped.
+    """
+    pmparser = PubMedParser()
+    opener = gzip.open if xml_file.suffix == ".gz" else open
+    with opener(xml_file, "rb") as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        depth = 0
+        for event, element in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 0:
+                # Not a child of the PubmedArticleSet (or the end of it)
+                continue
+
+            if element.tag in ARTICLE_TAGS:
+                try:
+                    # Reuse the string parser, as it strips formatting tags before parsing
+                    yield pmparser.from_xml_string(ET.tostring(element, encoding="unicode"))
+                except (AttributeError, TypeError, ValueError) as e:
+                    pmid = element.findtext(".//PMID")
+                    log.warning(f"Skipping PubMed ID {pmid} in {xml_file}: {e}")
+            # Processed children (including e.g. DeleteCitation) are no longer needed
+            root.clear()
+
+
+def _write_references(files: Tuple[Path, Path]) -> int:
+    xml_file, outfile = files
+    n_refs = 0
+    with outfile.open("w") as out:
+        for reference in iter_references(xml_file):
+            out.write(reference.json(indent=None, exclude_none=True) + "\n")
+            n_refs += 1
+    log.info(f"Parsed {n_refs} references from {xml_file}")
+    return n_refs
+
+
+def get_references_from_files(
+    xml_files: List[Path], outfile: Path, processes: Optional[int] = None
+) -> int:
+    """
+    :param xml_files: PubmedArticleSet XML files
+    :param outfile: Save references file
+    :param processes: Number of files to parse in parallel (defaults to number of CPUs)
+    :return : Number of references written
+
+    References are written in the order of the files, so that a reference in an update file
+    given after the baseline files replaces the baseline version when imported.
+    """
+    with tempfile.TemporaryDirectory(dir=outfile.parent) as tmpdir:
+        part_files = [Path(tmpdir) / f"{i}.txt" for i in range(len(xml_files))]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            n_refs = sum(executor.map(_write_references, zip(xml_files, part_files)))
+
+        with outfile.open("w") as out:
+            for part_file in part_files:
+                with part_file.open() as f:
+                    shutil.copyfileobj(f, out)
+
+    return n_refs
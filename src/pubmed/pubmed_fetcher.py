@@ -2,13 +2,17 @@
 
 import http.client
 import logging
+import os
 import sys
+import threading
 import time
+import urllib.parse
 import urllib.request
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing, contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 
 from .pubmed_parser import NewReference, PubMedParser
 
@@ -33,30 +37,61 @@ def output(filename: Optional[Path]):
         f.close()
 
 
+class RateLimiter:
+    """
+    Spaces out calls to wait() to at most `rate` per second, across threads.
+    Callers are not blocked by each other beyond that, so several requests may be in flight.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, delay: float = 0):
+        """
+        :param delay: Additionally hold back all callers for delay seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next) + delay
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
 class PubMedFetcher:
     BASE_URL_ENTREZ = "http://eutils.ncbi.nlm.nih.gov/entrez/eutils"
     BASE_DB = "pubmed"
     MAX_QUERY = 200  # Entrez can process so many IDs per query
-    MIN_TIME_BETWEEN_QUERY = 0.1  # To avoid Entrez blacklisting
+    REQUESTS_PER_SECOND = 3  # Entrez limit without API key (10 with)
+    MAX_CONCURRENT = 4  # Number of queries in flight
+    MAX_ATTEMPTS = 10
     WAIT_TIME = 30  # When Entrez gives faulty string, wait some seconds
 
-    def control_query_frequency(self, time_previous_query: float, wait_time: float = 0):
+    def __init__(
+        self,
+        base_url: str = BASE_URL_ENTREZ,
+        requests_per_second: float = REQUESTS_PER_SECOND,
+        max_concurrent: int = MAX_CONCURRENT,
+        cache_dir: Optional[Path] = None,
+        api_key: Optional[str] = None,
+    ):
         """
-        :param time_previous_query: Time of previous call to the function
-        :param wait_time: Pause program wait_time seconds
-        :return : Ensure that there are less than 3 queries per second
+        :param base_url: Entrez E-utilities URL
+        :param requests_per_second: Maximum rate of queries to Entrez
+        :param max_concurrent: Maximum number of queries in flight
+        :param cache_dir: Directory to cache PubmedArticle XML in, one file per PubMed ID.
+                          Cached PubMed IDs are not queried again.
+        :param api_key: NCBI API key, allows for a higher rate of queries
         """
-        # When Entrez returns fawlty xml string, we manually request long pause
-        if wait_time <= 0:
-            time_diff = time.time() - time_previous_query
-            if time_diff < self.MIN_TIME_BETWEEN_QUERY:
-                wait_time = self.MIN_TIME_BETWEEN_QUERY - time_diff
-
-        if wait_time > 0:
-            log.info(f"Entrez may be blocking us. Waiting {wait_time}s")
-            time.sleep(wait_time)
-
-        return time.time()
+        self.base_url = base_url
+        self.max_concurrent = max_concurrent
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.api_key = api_key
 
     def query_entrez(self, pmid: List[str]):
         """
@@ -69,10 +104,13 @@ class PubMedFetcher:
                 f"Max number of pmids in query is {self.MAX_QUERY}, but received {len(pmid)}"
             )
 
-        pmid_parsed = ",".join(pmid)
-        q_url = f"{self.BASE_URL_ENTREZ}/efetch.fcgi?db={self.BASE_DB}&id={pmid_parsed}&retmode=xml"
+        params = {"db": self.BASE_DB, "id": ",".join(pmid), "retmode": "xml"}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        q_url = f"{self.base_url}/efetch.fcgi?{urllib.parse.urlencode(params, safe=',')}"
         log.debug(f"Query {q_url}")
 
+        self.rate_limiter.wait()
         try:
             with closing(urllib.request.urlopen(q_url)) as q:
                 xml_raw = q.read()
@@ -81,6 +119,27 @@ class PubMedFetcher:
 
         return xml_raw
 
+    def _cache_file(self, pmid: str) -> Path:
+        assert self.cache_dir
+        return self.cache_dir / f"{pmid}.xml"
+
+    def _read_cache(self, pmid: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        try:
+            return self._cache_file(pmid).read_text()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, pmid: str, pubmed_xml: str):
+        if not self.cache_dir:
+            return
+        # Write to temporary file first, so that an interrupted run leaves no partial files
+        cache_file = self._cache_file(pmid)
+        tmp_file = cache_file.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_file.write_text(pubmed_xml)
+        os.replace(tmp_file, cache_file)
+
     def get_references_from_file(self, pmid_file: Path, outfile: Optional[Path] = None):
         """
         :param pmid_file: File with tab or line separated PubMed IDs
@@ -95,64 +154,74 @@ class PubMedFetcher:
         :param pmids: PubMed IDs (list of one or more pmids)
         :param outfile: Save references to file (default stdout)
         """
-
-        # Ensure that only MAX_QUERY ids are included per query
-        n_refs = len(pmids)
-        n_queries, leftover = divmod(n_refs, self.MAX_QUERY)
-        if leftover:
-            n_queries += 1
-
-        # Initialize time of previous query
-        t_prev_query = time.time()
-        time.sleep(self.MIN_TIME_BETWEEN_QUERY)
-
+        pmparser = PubMedParser()
         with output(outfile) as out:
-            for i_query in range(n_queries):
-                log.info(f"Processing query number {i_query+1} of {n_queries}")
-                # Query sub-set of all pmids
-                pmid_start = i_query * self.MAX_QUERY
-                pmid_end = min(pmid_start + self.MAX_QUERY, n_refs)
-                pmid_selection = pmids[pmid_start:pmid_end]
-                t_prev_query = self.control_query_frequency(t_prev_query)
-
-                references: List[NewReference] = []
-                for count in range(10):
-                    try:
-                        references = self.get_references_core(pmid_selection)
-                    except RuntimeError as e1:
-                        # Entrez occationally returns unparsable string
-                        # due to too many queries. Wait, and try again
-                        r_err = "Attempt %s: Bad string from Entrez %s"
-                        log.error(r_err % (count + 1, e1))
-                        t_prev_query = self.control_query_frequency(
-                            t_prev_query, wait_time=self.WAIT_TIME
-                        )
-                    except IOError as e2:
-                        # Entrez occationally has some problems with SSL
-                        # Try again
-                        r_err = "Attempt %s: IOError from Entrez %s"
-                        log.error(r_err % (count + 1, e2))
-                        t_prev_query = self.control_query_frequency(
-                            t_prev_query, wait_time=self.WAIT_TIME
-                        )
-                    except http.client.IncompleteRead as e3:
-                        # Entrez occationally has some problems with incomplete reads
-                        # Try again
-                        r_err = "Attempt %s: IncompleteRead from Entrez %s"
-                        log.error(r_err % (count + 1, e3))
-                        t_prev_query = self.control_query_frequency(
-                            t_prev_query, wait_time=self.WAIT_TIME
-                        )
-                    else:
-                        break
-
-                for ref in references:
-                    out.write(ref.json(indent=None, exclude_none=True) + "\n")
+            for pubmed_xml in self.get_articles(pmids):
+                ref = pmparser.from_xml_string(pubmed_xml)
+                out.write(ref.json(indent=None, exclude_none=True) + "\n")
 
-    def get_references_core(self, pmids: List[str]) -> List[NewReference]:
+    def get_articles(self, pmids: List[str]) -> Iterator[str]:
+        """
+        :param pmids: PubMed IDs
+        :yield : PubmedArticle XML of each PubMed ID found, cached first
+
+        Uncached PubMed IDs are queried MAX_QUERY at a time, with up to max_concurrent queries
+        in flight. Articles are yielded in the order of the queries.
+        """
+        pmids = list(dict.fromkeys(str(pmid) for pmid in pmids))  # Unique, in order
+
+        uncached = []
+        for pmid in pmids:
+            pubmed_xml = self._read_cache(pmid)
+            if pubmed_xml is None:
+                uncached.append(pmid)
+            else:
+                yield pubmed_xml
+        log.info(f"{len(pmids) - len(uncached)} of {len(pmids)} references found in cache")
+
+        queries = [
+            uncached[start : start + self.MAX_QUERY]
+            for start in range(0, len(uncached), self.MAX_QUERY)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            for i_query, articles in enumerate(executor.map(self._fetch_articles, queries)):
+                log.info(f"Processed query number {i_query + 1} of {len(queries)}")
+                yield from articles.values()
+
+    def _fetch_articles(self, pmids: List[str]) -> Dict[str, str]:
+        "Query with retries, caching results. Run in a worker thread."
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                articles = self.fetch_articles(pmids)
+            except RuntimeError as e1:
+                # Entrez occationally returns unparsable string
+                # due to too many queries. Wait, and try again
+                log.error(f"Attempt {attempt}: Bad string from Entrez {e1}")
+            except IOError as e2:
+                # Entrez occationally has some problems with SSL
+                # Try again
+                log.error(f"Attempt {attempt}: IOError from Entrez {e2}")
+            except http.client.IncompleteRead as e3:
+                # Entrez occationally has some problems with incomplete reads
+                # Try again
+                log.error(f"Attempt {attempt}: IncompleteRead from Entrez {e3}")
+            else:
+                for pmid, pubmed_xml in articles.items():
+                    self._write_cache(pmid, pubmed_xml)
+                return articles
+
+            if attempt < self.MAX_ATTEMPTS:
+                # Entrez may be blocking us, hold back all queries
+                log.info(f"Entrez may be blocking us. Waiting {self.WAIT_TIME}s")
+                self.rate_limiter.wait(delay=self.WAIT_TIME)
+
+        log.error(f"Giving up on Pubmed IDs after {self.MAX_ATTEMPTS} attempts: {pmids}")
+        return {}
+
+    def fetch_articles(self, pmids: List[str]) -> Dict[str, str]:
         """
         :param pmids: Pubmed IDs (Either one or a list)
-        :return : List of references as dictionaries
+        :return : PubmedArticle (or PubmedBookArticle) XML by PubMed ID
         """
         try:
             xml_raw = self.query_entrez(pmids)
@@ -167,14 +236,22 @@ class PubMedFetcher:
         # Log a warning for non-existing Pubmed entries
         self.check_for_non_existence_of_pmids(pubmed_article_set, pmids)
 
-        references = []
-        pmparser = PubMedParser()
-        for pubmed_article in pubmed_article_set.findall("./*"):
-            pubmed_xml = ET.tostring(pubmed_article).decode()
-            reference = pmparser.from_xml_string(pubmed_xml)
-            references.append(reference)
+        return {
+            # PMID of MedlineCitation or BookDocument
+            pubmed_article.findtext("./*/PMID"): ET.tostring(pubmed_article).decode()
+            for pubmed_article in pubmed_article_set.findall("./*")
+        }
 
-        return references
+    def get_references_core(self, pmids: List[str]) -> List[NewReference]:
+        """
+        :param pmids: Pubmed IDs (Either one or a list)
+        :return : List of references as dictionaries
+        """
+        pmparser = PubMedParser()
+        return [
+            pmparser.from_xml_string(pubmed_xml)
+            for pubmed_xml in self.fetch_articles(pmids).values()
+        ]
 
     def check_for_non_existence_of_pmids(self, xml_tree, pmids):
         """
@@ -0,0 +1,116 @@
+import gzip
+import logging
+import os
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from .. import pubmed_baseline, pubmed_parser
+from .test_pubmed_parser import TEST_PMIDS, TESTDATA
+
+"""
+This module tests pubmed_baseline.py on PubmedArticleSet files generated from test_data,
+with each test article repeated under new PubMed IDs
+"""
+
+# Number of articles in the file for the memory test (about 10 kB each). A baseline file has
+# about 30000 articles, use e.g. 200000 for a file of 2 GB uncompressed.
+MEMORY_TEST_ARTICLES = int(os.environ.get("PUBMED_BASELINE_TEST_ARTICLES", 2000))
+
+PMID_OFFSET = 100000000
+
+
+def _articles():
+    articles = []
+    for pmid in TEST_PMIDS:
+        with open(f"{TESTDATA}/{pmid}.xml", "r") as f:
+            articles.append((pmid, f.read().strip()))
+    return articles
+
+
+def _write_article_set(path: Path, n_articles: int, start: int = 0, extra: str = ""):
+    """
+    Writes n_articles to a PubmedArticleSet file, cycling through the test articles with
+    PubMed IDs PMID_OFFSET + i. Returns the generated PubMed IDs, by test PubMed ID.
+    """
+    articles = _articles()
+    generated = {}
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "wt") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<PubmedArticleSet>\n')
+        for i in range(start, start + n_articles):
+            pmid, article = articles[i % len(articles)]
+            new_pmid = PMID_OFFSET + i
+            generated[new_pmid] = pmid
+            f.write(article.replace(f">{pmid}</PMID>", f">{new_pmid}</PMID>", 1) + "\n")
+        f.write(extra)
+        f.write("</PubmedArticleSet>\n")
+    return generated
+
+
+def _expected(pmid):
+    with open(f"{TESTDATA}/{pmid}.xml", "r") as f:
+        return pubmed_parser.PubMedParser().from_xml_string(f.read())
+
+
+def test_iter_references(tmp_path):
+    path = tmp_path / "pubmed.xml.gz"
+    broken = "<PubmedArticle><MedlineCitation><PMID>1</PMID></MedlineCitation></PubmedArticle>"
+    deleted = "<DeleteCitation><PMID>2</PMID></DeleteCitation>"
+    generated = _write_article_set(path, 2 * len(TEST_PMIDS), extra=broken + deleted)
+
+    references = list(pubmed_baseline.iter_references(path))
+    assert [r.pubmed_id for r in references] == list(generated)
+    for reference in references:
+        expected = _expected(generated[reference.pubmed_id])
+        expected.pubmed_id = reference.pubmed_id
+        assert reference == expected
+
+
+def test_iter_references_memory(tmp_path, caplog):
+    "Memory usage should not depend on the number of articles in the file"
+    # Don't keep captured debug logs for each article
+    caplog.set_level(logging.INFO, logger=pubmed_parser.__name__)
+
+    def peak_memory(n_articles):
+        path = tmp_path / f"pubmed_{n_articles}.xml"
+        _write_article_set(path, n_articles)
+        tracemalloc.start()
+        n_references = sum(1 for _ in pubmed_baseline.iter_references(path))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert n_references == n_articles
+        return peak
+
+    small = peak_memory(MEMORY_TEST_ARTICLES // 10)
+    large = peak_memory(MEMORY_TEST_ARTICLES)
+    assert large < 2 * small
+
+
+def test_get_references_from_files(tmp_path):
+    xml_files = []
+    generated = {}
+    for i in range(4):
+        path = tmp_path / f"pubmed{i}.xml.gz"
+        generated.update(_write_article_set(path, 25, start=i * 25))
+        xml_files.append(path)
+
+    outfile = tmp_path / "references.txt"
+    assert pubmed_baseline.get_references_from_files(xml_files, outfile, processes=2) == 100
+
+    # Written in file order
+    pmids = [pubmed_parser.NewReference.parse_raw(line).pubmed_id for line in outfile.open()]
+    assert pmids == list(generated)
+    # Part files are removed
+    assert set(tmp_path.iterdir()) == set(xml_files + [outfile])
+
+
+def test_iter_references_matches_fetcher_parsing(tmp_path):
+    "Streamed references should equal those from parsing the whole article set"
+    path = tmp_path / "pubmed.xml"
+    _write_article_set(path, len(TEST_PMIDS))
+
+    pmparser = pubmed_parser.PubMedParser()
+    article_set = ET.parse(path).getroot()
+    expected = [pmparser.from_xml_string(ET.tostring(article).decode()) for article in article_set]
+    assert list(pubmed_baseline.iter_references(path)) == expected
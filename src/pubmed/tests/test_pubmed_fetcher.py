@@ -0,0 +1,154 @@
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from .. import pubmed_fetcher, pubmed_parser
+from .test_pubmed_parser import TEST_PMIDS, TESTDATA
+
+"""
+This module tests pubmed_fetcher.py against a local fake Entrez server, which returns the
+articles of test_data under any requested PubMed ID
+"""
+
+LATENCY = 0.2  # Response time of the fake server
+JITTER = 0.1  # Allowed variation in time from a request is sent until it is received
+PMID_OFFSET = 100000000
+
+
+class FakeEntrez(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeEntrezHandler)
+        self.articles = []
+        for pmid in TEST_PMIDS:
+            with open(f"{TESTDATA}/{pmid}.xml", "r") as f:
+                self.articles.append((pmid, f.read().strip()))
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_requests = 0  # Number of requests to return bad XML for
+        self.missing_pmids = set()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def article_set(self, pmids):
+        articles = []
+        for pmid in pmids:
+            if int(pmid) in self.missing_pmids:
+                continue
+            test_pmid, article = self.articles[int(pmid) % len(self.articles)]
+            articles.append(article.replace(f">{test_pmid}</PMID>", f">{pmid}</PMID>", 1))
+        return "<PubmedArticleSet>\n" + "\n".join(articles) + "\n</PubmedArticleSet>\n"
+
+
+class FakeEntrezHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_times.append(time.monotonic())
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            fail = server.fail_requests > 0
+            server.fail_requests -= 1
+        try:
+            time.sleep(LATENCY)
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            if fail:
+                body = "<PubmedArticleSet><Pubmed"
+            else:
+                body = server.article_set(query["id"][0].split(","))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml")
+            self.end_headers()
+            self.wfile.write(body.encode())
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def entrez():
+    server = FakeEntrez()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _pmids(n):
+    return [str(PMID_OFFSET + i) for i in range(n)]
+
+
+def _fetched_pmids(outfile):
+    return [pubmed_parser.NewReference.parse_raw(line).pubmed_id for line in outfile.open()]
+
+
+def test_rate_limit(entrez, tmp_path):
+    rate = 10
+    fetcher = pubmed_fetcher.PubMedFetcher(
+        base_url=entrez.url, requests_per_second=rate, max_concurrent=4
+    )
+    fetcher.MAX_QUERY = 5
+    pmids = _pmids(200)  # 40 queries
+
+    start = time.monotonic()
+    fetcher.get_references(pmids, tmp_path / "references.txt")
+    elapsed = time.monotonic() - start
+
+    assert _fetched_pmids(tmp_path / "references.txt") == [int(pmid) for pmid in pmids]
+
+    # No more than rate requests are received within any second
+    times = entrez.request_times
+    assert len(times) == 40
+    for i in range(len(times) - rate):
+        assert times[i + rate] - times[i] >= 1.0 - JITTER
+
+    # Several requests in flight, so that throughput is limited by rate, not latency
+    assert entrez.max_in_flight > 1
+    throughput = len(times) / elapsed
+    assert throughput > 0.8 * rate
+
+
+def test_cache(entrez, tmp_path):
+    cache_dir = tmp_path / "cache"
+    fetcher = pubmed_fetcher.PubMedFetcher(
+        base_url=entrez.url, requests_per_second=100, cache_dir=cache_dir
+    )
+    fetcher.MAX_QUERY = 10
+    entrez.missing_pmids = {PMID_OFFSET + 3}
+
+    pmids = _pmids(30)
+    fetcher.get_references(pmids[:20], tmp_path / "first.txt")
+    assert len(entrez.request_times) == 2
+    assert len(list(cache_dir.iterdir())) == 19
+
+    # Only the 11 uncached pmids are queried, including the one not found before
+    entrez.missing_pmids = set()
+    fetcher.get_references(pmids, tmp_path / "second.txt")
+    assert len(entrez.request_times) == 4
+    assert sorted(_fetched_pmids(tmp_path / "second.txt")) == [int(pmid) for pmid in pmids]
+
+    fetcher.get_references(pmids, tmp_path / "third.txt")
+    assert len(entrez.request_times) == 4
+    # Cached references are written first
+    assert _fetched_pmids(tmp_path / "third.txt") == [int(pmid) for pmid in pmids]
+    assert sorted((tmp_path / "third.txt").open()) == sorted((tmp_path / "second.txt").open())
+
+
+def test_retry(entrez, tmp_path):
+    fetcher = pubmed_fetcher.PubMedFetcher(base_url=entrez.url, requests_per_second=100)
+    fetcher.WAIT_TIME = 0.1
+    entrez.fail_requests = 2
+
+    fetcher.get_references(_pmids(10), tmp_path / "references.txt")
+    assert len(entrez.request_times) == 3
+    assert len(_fetched_pmids(tmp_path / "references.txt")) == 10
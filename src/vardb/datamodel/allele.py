@@ -1,9 +1,11 @@
 """vardb datamodel Allele class"""
-from sqlalchemy import Column, Integer, String, Enum
+from sqlalchemy import Column, Integer, String, Enum, func, literal_column
+from sqlalchemy.dialects.postgresql import INT4RANGE
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import Index, UniqueConstraint
 
 from vardb.datamodel import Base
+from vardb.util.generated_column import GeneratedColumn
 
 
 class Allele(Base):
@@ -44,9 +46,17 @@ class Allele(Base):
     vcf_ref = Column(String, nullable=False)
     vcf_alt = Column(String, nullable=False)
     length = Column(Integer, nullable=False)
+    # [start_position, open_end_position), for range queries (e.g. overlap: region && int4range(...))
+    region = GeneratedColumn(
+        INT4RANGE,
+        expression=func.int4range(
+            literal_column("start_position"), literal_column("open_end_position")
+        ),
+    )
 
     __table_args__ = (
         Index("ix_alleleloci", "chromosome", "start_position", "open_end_position"),
+        Index("ix_allele_chromosome_region", "chromosome", "region", postgresql_using="gist"),
         UniqueConstraint(
             "chromosome",
             "start_position",
@@ -1,6 +1,19 @@
 from vardb.datamodel import Base
 from vardb.datamodel import sample, user
-from sqlalchemy import Column, Integer, Text, Float, String, ForeignKey, Index, func, Table
+from vardb.datamodel.gene import get_transcript_base, get_transcript_version
+from vardb.util.generated_column import GeneratedColumn
+from sqlalchemy import (
+    Column,
+    Integer,
+    Text,
+    Float,
+    String,
+    ForeignKey,
+    Index,
+    func,
+    literal_column,
+    Table,
+)
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import mapper, class_mapper
 from sqlalchemy.orm.exc import UnmappedClassError
@@ -95,11 +108,34 @@ def get_annotationshadowtranscript_table(name="annotationshadowtranscript"):
         Column("consequences", ARRAY(Text)),
         Column("exon_distance", Integer),
         Column("coding_region_distance", Integer),
+        # Used for matching against genepanel transcripts, see queries.annotation_transcripts_genepanel
+        GeneratedColumn(
+            "transcript_base", String, expression=get_transcript_base(literal_column("transcript"))
+        ),
+        GeneratedColumn(
+            "transcript_version",
+            Float,
+            expression=get_transcript_version(literal_column("transcript")),
+        ),
         Index(
             "ix_{}_hgvsc".format(name),
             func.lower(Column("hgvsc", String)),
             postgresql_ops={"data": "text_pattern_ops"},
         ),
+        # Trigram indexes for prefix and substring search, see SearchResource
+        Index(
+            "ix_{}_hgvsc_trgm".format(name),
+            func.lower(Column("hgvsc", String)).label("hgvsc_lower"),
+            postgresql_using="gin",
+            postgresql_ops={"hgvsc_lower": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_{}_hgvsp_trgm".format(name),
+            func.lower(Column("hgvsp", String)).label("hgvsp_lower"),
+            postgresql_using="gin",
+            postgresql_ops={"hgvsp_lower": "gin_trgm_ops"},
+        ),
+        Index("ix_{}_hgnc_id_transcript_base".format(name), "hgnc_id", "transcript_base"),
     )
 
 
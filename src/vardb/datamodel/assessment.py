@@ -57,6 +57,9 @@ class AlleleAssessment(Base):
         DateTime(timezone=True), nullable=False, default=lambda: datetime.datetime.now(pytz.utc)
     )
     date_superceeded = Column(DateTime(timezone=True))
+    # Null if the classification never becomes outdated. Set from the config on flush,
+    # see datalayer/assessmentvalidity.py
+    valid_until = Column(DateTime(timezone=True))
     previous_assessment_id = Column(Integer, ForeignKey("alleleassessment.id"))
     previous_assessment = relationship("AlleleAssessment", uselist=False)
     allele_id = Column(Integer, ForeignKey("allele.id"), nullable=False)
@@ -99,6 +102,14 @@ Index(
     unique=True,
 )
 
+# Covers the filter for valid alleleassessments (see datalayer.queries), for index only lookups
+Index(
+    "ix_alleleassessment_valid_until",
+    AlleleAssessment.allele_id,
+    AlleleAssessment.valid_until,
+    postgresql_where=(AlleleAssessment.date_superceeded.is_(None)),
+)
+
 
 class ReferenceAssessment(Base):
     """Association object between assessments and references.
@@ -1,6 +1,6 @@
 import datetime
 import pytz
-from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from vardb.datamodel import Base
 
@@ -19,3 +19,13 @@ class Attachment(Base):
     extension = Column(String())
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     user = relationship("User", uselist=False)
+    # Thumbnails are created asynchronously by the thumbnail worker (api/thumbnails.py).
+    # Attachments uploaded before the worker was introduced have thumbnail_status NULL.
+    thumbnail_status = Column(Enum("PENDING", "DONE", "FAILED", name="thumbnail_status"))
+
+
+Index(
+    "ix_attachment_thumbnail_pending",
+    Attachment.id,
+    postgresql_where=(Attachment.thumbnail_status == "PENDING"),
+)
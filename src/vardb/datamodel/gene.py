@@ -8,18 +8,38 @@ from sqlalchemy import (
     Column,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
     Index,
     Integer,
     String,
     Table,
     func,
+    literal_column,
 )
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import ForeignKeyConstraint, UniqueConstraint
 
 from vardb.datamodel import Base
+from vardb.util.generated_column import GeneratedColumn
+
+
+def get_transcript_base(transcript):
+    "Transcript name without version: NM_000059.3 -> NM_000059"
+    return func.split_part(transcript, ".", 1)
+
+
+def get_transcript_version(transcript):
+    """
+    Transcript version, used for ranking transcripts: NM_000059.3 -> 3
+
+    The version is reduced by 0.5 if it is not an integer: NM_000059.3_dupl18 -> 2.5
+    """
+    version = func.split_part(transcript, ".", 2)
+    return func.substring(version, "^[0-9]+").cast(Integer) - 0.5 * version.op("!~")(
+        "^[0-9]+$"
+    ).cast(Integer)
 
 
 class Gene(Base):
@@ -37,6 +57,12 @@ class Gene(Base):
             unique=True,
             postgresql_ops={"data": "text_pattern_ops"},
         ),
+        Index(
+            "ix_gene_hgnc_symbol_trgm",
+            func.lower(hgnc_symbol).label("hgnc_symbol_lower"),
+            postgresql_using="gin",
+            postgresql_ops={"hgnc_symbol_lower": "gin_trgm_ops"},
+        ),
     )
 
     def __repr__(self):
@@ -63,6 +89,14 @@ class Transcript(Base):
     cds_end = Column(Integer)
     exon_starts = Column(ARRAY(Integer), nullable=False)
     exon_ends = Column(ARRAY(Integer), nullable=False)
+    transcript_base = GeneratedColumn(
+        String(), expression=get_transcript_base(literal_column("transcript_name"))
+    )
+    transcript_version = GeneratedColumn(
+        Float, expression=get_transcript_version(literal_column("transcript_name"))
+    )
+
+    __table_args__ = (Index("ix_transcript_gene_id_transcript_base", gene_id, transcript_base),)
 
     def __repr__(self):
         return "<Transcript('%s','%s', '%s', '%s', '%s', '%s')>" % (
@@ -157,3 +191,31 @@ class Genepanel(Base):
 
     def __str__(self):
         return "_".join((self.name, self.version, self.genome_reference))
+
+
+class GenepanelSignature(Base):
+    """
+    Precomputed gene set of a genepanel, used for comparing genepanels.
+    Updated whenever the genepanel's transcripts are set, see datalayer/genepanelsimilarity.py.
+    The revision is increased on every update, and is used to invalidate cached genepanel data
+    (see datalayer/genepaneldata.py).
+    """
+
+    __tablename__ = "genepanelsignature"
+
+    genepanel_name = Column(String(), primary_key=True)
+    genepanel_version = Column(String(), primary_key=True)
+    gene_ids = Column(ARRAY(Integer), nullable=False)  # Sorted and distinct
+    checksum = Column(String(), nullable=False)  # md5 of gene_ids, for cache invalidation
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["genepanel_name", "genepanel_version"],
+            ["genepanel.name", "genepanel.version"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    def __repr__(self):
+        return f"<GenepanelSignature('{self.genepanel_name}','{self.genepanel_version}')>"
@@ -27,8 +27,8 @@ class Genotype(Base):
         primaryjoin="or_(Allele.id==Genotype.allele_id, " "Allele.id==Genotype.secondallele_id)",
         uselist=True,
     )
-    allele_id = Column(Integer, ForeignKey("allele.id"), nullable=False)
-    secondallele_id = Column(Integer, ForeignKey("allele.id"))
+    allele_id = Column(Integer, ForeignKey("allele.id"), index=True, nullable=False)
+    secondallele_id = Column(Integer, ForeignKey("allele.id"), index=True)
     allele = relationship("Allele", primaryjoin=("genotype.c.allele_id==allele.c.id"))
     secondallele = relationship(
         "Allele", primaryjoin=("genotype.c.secondallele_id==allele.c.id")
@@ -1 +1 @@
-from .load_schema import load_schema
+from .load_schema import load_schema, schema_path
@@ -364,7 +364,7 @@ def create_schema_triggers(session):
 
 
 if __name__ == "__main__":
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     update_schemas(db.session)
     db.session.commit()
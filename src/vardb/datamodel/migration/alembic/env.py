@@ -30,7 +30,7 @@ def run_migrations_online():
     and associate a connection with the context.
 
     """
-    db = DB()
+    db = DB(role="cli")
     db.connect()
 
     with db.engine.connect() as connection:
@@ -0,0 +1,27 @@
+"""Genepanel signature revision
+
+Revision ID: 2c8d5e1f9a34
+Revises: 9b2e6d4f1a07
+Create Date: 2026-10-19 18:47:03.552190
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "2c8d5e1f9a34"
+down_revision = "9b2e6d4f1a07"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column(
+        "genepanelsignature",
+        sa.Column("revision", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade():
+    op.drop_column("genepanelsignature", "revision")
@@ -0,0 +1,48 @@
+"""Attachment thumbnail status
+
+Revision ID: 3f1a7c2e9b04
+Revises: 4c2844fef850
+Create Date: 2026-10-19 09:12:41.118503
+
+"""
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3f1a7c2e9b04"
+down_revision = "4c2844fef850"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    thumbnail_status = postgresql.ENUM("PENDING", "DONE", "FAILED", name="thumbnail_status")
+    thumbnail_status.create(conn)
+
+    # Existing attachments got their thumbnails (if any) created on upload, leave status as NULL
+    op.add_column(
+        "attachment",
+        sa.Column(
+            "thumbnail_status",
+            sa.Enum("PENDING", "DONE", "FAILED", name="thumbnail_status"),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_attachment_thumbnail_pending",
+        "attachment",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("thumbnail_status = 'PENDING'"),
+    )
+
+
+def downgrade():
+    conn = op.get_bind()
+    op.drop_index("ix_attachment_thumbnail_pending", table_name="attachment")
+    op.drop_column("attachment", "thumbnail_status")
+    conn.execute(sa.sql.text("DROP TYPE thumbnail_status"))
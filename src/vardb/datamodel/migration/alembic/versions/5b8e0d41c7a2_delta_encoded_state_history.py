@@ -0,0 +1,136 @@
+"""Delta-encoded interpretation state history
+
+Revision ID: 5b8e0d41c7a2
+Revises: 3f1a7c2e9b04
+Create Date: 2026-10-19 10:41:07.530112
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "5b8e0d41c7a2"
+down_revision = "3f1a7c2e9b04"
+branch_labels = None
+depends_on = None
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from vardb.util.jsonpatch import apply_patch, make_patch
+
+# Must match datalayer.statehistory.STATE_HISTORY_CHECKPOINT_INTERVAL at time of writing
+CHECKPOINT_INTERVAL = 20
+
+INTERPRETATION_TYPES = [
+    ("alleleinterpretation_id", "alleleinterpretation"),
+    ("analysisinterpretation_id", "analysisinterpretation"),
+]
+
+
+def _interpretations_with_history(conn, id_column):
+    return [
+        r[0]
+        for r in conn.execute(
+            sa.text(
+                f"SELECT DISTINCT {id_column} FROM interpretationstatehistory WHERE {id_column} IS NOT NULL"
+            )
+        )
+    ]
+
+
+def _history(conn, id_column, interpretation_table, interpretation_id):
+    current_state = conn.execute(
+        sa.text(f"SELECT state FROM {interpretation_table} WHERE id = :id"),
+        id=interpretation_id,
+    ).scalar()
+    rows = conn.execute(
+        sa.text(
+            f"SELECT id, state, state_delta FROM interpretationstatehistory WHERE {id_column} = :id ORDER BY id"
+        ),
+        id=interpretation_id,
+    ).fetchall()
+    return current_state or {}, rows
+
+
+def upgrade():
+    op.add_column(
+        "interpretationstatehistory",
+        sa.Column("state_delta", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+    op.alter_column("interpretationstatehistory", "state", nullable=True)
+    op.create_index(
+        op.f("ix_interpretationstatehistory_alleleinterpretation_id"),
+        "interpretationstatehistory",
+        ["alleleinterpretation_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_interpretationstatehistory_analysisinterpretation_id"),
+        "interpretationstatehistory",
+        ["analysisinterpretation_id"],
+        unique=False,
+    )
+
+    # Compact existing history: keep every CHECKPOINT_INTERVAL'th version as full state,
+    # replace the others with a patch from the next version
+    conn = op.get_bind()
+    for id_column, interpretation_table in INTERPRETATION_TYPES:
+        for interpretation_id in _interpretations_with_history(conn, id_column):
+            current_state, rows = _history(conn, id_column, interpretation_table, interpretation_id)
+            next_states = [r.state for r in rows[1:]] + [current_state]
+            for idx, (row, next_state) in enumerate(zip(rows, next_states)):
+                if idx % CHECKPOINT_INTERVAL == 0:
+                    continue
+                conn.execute(
+                    sa.text(
+                        "UPDATE interpretationstatehistory SET state = NULL, state_delta = :delta WHERE id = :id"
+                    ),
+                    delta=json.dumps(make_patch(next_state, row.state)),
+                    id=row.id,
+                )
+
+    conn.execute(
+        sa.text(
+            "ALTER TABLE interpretationstatehistory ADD CONSTRAINT interpretationstatehistory_check "
+            "CHECK ((state IS NULL) != (state_delta IS NULL))"
+        )
+    )
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            "ALTER TABLE interpretationstatehistory DROP CONSTRAINT interpretationstatehistory_check"
+        )
+    )
+
+    # Expand all versions to full state
+    for id_column, interpretation_table in INTERPRETATION_TYPES:
+        for interpretation_id in _interpretations_with_history(conn, id_column):
+            state, rows = _history(conn, id_column, interpretation_table, interpretation_id)
+            for row in reversed(rows):
+                if row.state is not None:
+                    state = row.state
+                    continue
+                state = apply_patch(state, row.state_delta)
+                conn.execute(
+                    sa.text(
+                        "UPDATE interpretationstatehistory SET state = :state, state_delta = NULL WHERE id = :id"
+                    ),
+                    state=json.dumps(state),
+                    id=row.id,
+                )
+
+    op.drop_index(
+        op.f("ix_interpretationstatehistory_analysisinterpretation_id"),
+        table_name="interpretationstatehistory",
+    )
+    op.drop_index(
+        op.f("ix_interpretationstatehistory_alleleinterpretation_id"),
+        table_name="interpretationstatehistory",
+    )
+    op.alter_column("interpretationstatehistory", "state", nullable=False)
+    op.drop_column("interpretationstatehistory", "state_delta")
@@ -0,0 +1,41 @@
+"""Trigram indexes for search
+
+Revision ID: 5f0d3b8a7c21
+Revises: e7a94c0b1f38
+Create Date: 2026-10-19 17:05:12.381544
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "5f0d3b8a7c21"
+down_revision = "e7a94c0b1f38"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+    print("Creating indexes, this can take a while...")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX ix_annotationshadowtranscript_hgvsc_trgm ON annotationshadowtranscript USING gin(lower(hgvsc) gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_annotationshadowtranscript_hgvsp_trgm ON annotationshadowtranscript USING gin(lower(hgvsp) gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_gene_hgnc_symbol_trgm ON gene USING gin(lower(hgnc_symbol) gin_trgm_ops)"
+    )
+    op.execute("CREATE INDEX ix_analysis_name_trgm ON analysis USING gin(name gin_trgm_ops)")
+
+
+def downgrade():
+    op.drop_index("ix_analysis_name_trgm", table_name="analysis")
+    op.drop_index("ix_gene_hgnc_symbol_trgm", table_name="gene")
+    op.drop_index(
+        "ix_annotationshadowtranscript_hgvsp_trgm", table_name="annotationshadowtranscript"
+    )
+    op.drop_index(
+        "ix_annotationshadowtranscript_hgvsc_trgm", table_name="annotationshadowtranscript"
+    )
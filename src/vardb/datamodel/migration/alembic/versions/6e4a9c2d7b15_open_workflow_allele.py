@@ -0,0 +1,114 @@
+"""Add open_workflow_allele table for collision detection
+
+Revision ID: 6e4a9c2d7b15
+Revises: 2c8d5e1f9a34
+Create Date: 2026-10-19 19:36:12.804417
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "6e4a9c2d7b15"
+down_revision = "2c8d5e1f9a34"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def _open_workflows(interpretation_table, id_column):
+    # Latest interpretation of open workflows, see datalayer/openworkflows.py
+    return f"""
+        SELECT latest.{id_column}, latest.user_id, latest.workflow_status
+        FROM (
+            SELECT DISTINCT ON ({id_column}) {id_column}, status, finalized, workflow_status, user_id
+            FROM {interpretation_table}
+            ORDER BY {id_column}, date_created DESC
+        ) AS latest
+        JOIN (
+            SELECT {id_column}, count(*) AS num_interpretations
+            FROM {interpretation_table}
+            GROUP BY {id_column}
+        ) AS counts USING ({id_column})
+        WHERE latest.status = 'Ongoing'
+            OR (counts.num_interpretations > 1 AND latest.finalized IS NOT TRUE)
+    """
+
+
+def upgrade():
+    op.create_table(
+        "open_workflow_allele",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("allele_id", sa.Integer(), nullable=False),
+        sa.Column("analysis_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("workflow_status", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["allele_id"],
+            ["allele.id"],
+            name=op.f("fk_open_workflow_allele_allele_id_allele"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["analysis_id"],
+            ["analysis.id"],
+            name=op.f("fk_open_workflow_allele_analysis_id_analysis"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["user.id"], name=op.f("fk_open_workflow_allele_user_id_user")
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_open_workflow_allele")),
+        sa.UniqueConstraint(
+            "analysis_id", "allele_id", name=op.f("uq_open_workflow_allele_analysis_id")
+        ),
+    )
+    op.create_index(
+        "ix_open_workflow_allele_allele_id", "open_workflow_allele", ["allele_id"], unique=False
+    )
+    op.create_index(
+        "ix_open_workflow_allele_allele_workflow_unique",
+        "open_workflow_allele",
+        ["allele_id"],
+        unique=True,
+        postgresql_where=sa.text("analysis_id IS NULL"),
+    )
+    op.create_index(
+        "ix_alleleassessment_current_classification",
+        "alleleassessment",
+        ["allele_id", "classification", "date_created"],
+        unique=False,
+        postgresql_where=sa.text("date_superceeded IS NULL"),
+    )
+
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            f"""
+            INSERT INTO open_workflow_allele (allele_id, analysis_id, user_id, workflow_status)
+            SELECT allele_id, NULL, user_id, workflow_status
+            FROM ({_open_workflows("alleleinterpretation", "allele_id")}) AS open_workflows
+            """
+        )
+    )
+    conn.execute(
+        sa.text(
+            f"""
+            INSERT INTO open_workflow_allele (allele_id, analysis_id, user_id, workflow_status)
+            SELECT analysis_alleles.allele_id, analysis_id, user_id, workflow_status
+            FROM ({_open_workflows("analysisinterpretation", "analysis_id")}) AS open_workflows
+            JOIN (
+                SELECT DISTINCT analysis_id, allele_id FROM analysis_allele
+            ) AS analysis_alleles USING (analysis_id)
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_index("ix_alleleassessment_current_classification", table_name="alleleassessment")
+    op.drop_index(
+        "ix_open_workflow_allele_allele_workflow_unique", table_name="open_workflow_allele"
+    )
+    op.drop_index("ix_open_workflow_allele_allele_id", table_name="open_workflow_allele")
+    op.drop_table("open_workflow_allele")
@@ -0,0 +1,70 @@
+"""Add alleleassessment.valid_until
+
+Revision ID: 8b3e6f0c4a27
+Revises: d1f7b3a85c62
+Create Date: 2026-10-19 21:02:37.118409
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "8b3e6f0c4a27"
+down_revision = "d1f7b3a85c62"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from api.config import config
+
+
+def upgrade():
+    op.add_column(
+        "alleleassessment", sa.Column("valid_until", sa.DateTime(timezone=True), nullable=True)
+    )
+
+    # Backfill from the current config. Classifications missing from the config are never valid.
+    whens = []
+    params = {}
+    for i, option in enumerate(config["classification"]["options"]):
+        params[f"classification_{i}"] = option["value"]
+        if option.get("outdated_after_days") is None:
+            whens.append(f"WHEN :classification_{i} THEN NULL")
+        else:
+            params[f"days_{i}"] = option["outdated_after_days"]
+            whens.append(
+                f"WHEN :classification_{i} THEN date_created + make_interval(days => :days_{i})"
+            )
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            f"""
+            UPDATE alleleassessment SET valid_until = CASE CAST(classification AS text)
+                {" ".join(whens)}
+                ELSE date_created
+            END
+            """
+        ),
+        **params,
+    )
+
+    op.drop_index("ix_alleleassessment_current_classification", table_name="alleleassessment")
+    op.create_index(
+        "ix_alleleassessment_valid_until",
+        "alleleassessment",
+        ["allele_id", "valid_until"],
+        unique=False,
+        postgresql_where=sa.text("date_superceeded IS NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_alleleassessment_valid_until", table_name="alleleassessment")
+    op.create_index(
+        "ix_alleleassessment_current_classification",
+        "alleleassessment",
+        ["allele_id", "classification", "date_created"],
+        unique=False,
+        postgresql_where=sa.text("date_superceeded IS NULL"),
+    )
+    op.drop_column("alleleassessment", "valid_until")
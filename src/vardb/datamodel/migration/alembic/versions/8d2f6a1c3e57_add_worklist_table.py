@@ -0,0 +1,162 @@
+"""Add materialised overview worklist
+
+Revision ID: 8d2f6a1c3e57
+Revises: 5b8e0d41c7a2
+Create Date: 2026-10-19 13:12:44.208316
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "8d2f6a1c3e57"
+down_revision = "5b8e0d41c7a2"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def _latest_log_field(interpretation_table, id_column, field):
+    # Latest non-null value of interpretation log field, per allele/analysis
+    return f"""
+        SELECT DISTINCT ON (i.{id_column}) i.{id_column}, il.{field}
+        FROM interpretationlog AS il
+        JOIN {interpretation_table} AS i ON i.id = il.{interpretation_table}_id
+        WHERE il.{field} IS NOT NULL
+        ORDER BY i.{id_column}, il.date_created DESC
+    """
+
+
+def upgrade():
+    op.create_table(
+        "worklist",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("allele_id", sa.Integer(), nullable=True),
+        sa.Column("analysis_id", sa.Integer(), nullable=True),
+        sa.Column("category", sa.String(), nullable=False),
+        sa.Column("genepanel_name", sa.String(), nullable=True),
+        sa.Column("genepanel_version", sa.String(), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("review_comment", sa.String(), nullable=True),
+        sa.Column("warning_cleared", sa.Boolean(), nullable=True),
+        sa.Column("date_created", sa.DateTime(timezone=True), nullable=False),
+        sa.CheckConstraint("(allele_id IS NULL) != (analysis_id IS NULL)", name="worklist_check"),
+        sa.ForeignKeyConstraint(
+            ["allele_id"],
+            ["allele.id"],
+            name=op.f("fk_worklist_allele_id_allele"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["analysis_id"],
+            ["analysis.id"],
+            name=op.f("fk_worklist_analysis_id_analysis"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["genepanel_name", "genepanel_version"],
+            ["genepanel.name", "genepanel.version"],
+            name=op.f("fk_worklist_genepanel_name_genepanel"),
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_worklist")),
+        sa.UniqueConstraint("allele_id", name=op.f("uq_worklist_allele_id")),
+        sa.UniqueConstraint("analysis_id", name=op.f("uq_worklist_analysis_id")),
+    )
+    op.create_index(
+        "ix_worklist_genepanel_category",
+        "worklist",
+        ["genepanel_name", "genepanel_version", "category"],
+        unique=False,
+    )
+
+    # Populate from existing interpretations, using the same rules as the overview categories
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            f"""
+            INSERT INTO worklist (
+                allele_id, category, genepanel_name, genepanel_version, priority,
+                review_comment, date_created
+            )
+            SELECT
+                latest.allele_id,
+                CASE
+                    WHEN latest.status = 'Ongoing' THEN 'ongoing'
+                    WHEN latest.workflow_status = 'Interpretation' THEN 'not_started'
+                    ELSE 'marked_review'
+                END,
+                last_updated.genepanel_name,
+                last_updated.genepanel_version,
+                coalesce(priority.priority, 1),
+                review_comment.review_comment,
+                first_created.date_created
+            FROM (
+                SELECT DISTINCT ON (allele_id) allele_id, workflow_status, status
+                FROM alleleinterpretation
+                ORDER BY allele_id, date_created DESC
+            ) AS latest
+            JOIN (
+                SELECT DISTINCT ON (allele_id) allele_id, genepanel_name, genepanel_version
+                FROM alleleinterpretation
+                ORDER BY allele_id, date_last_update DESC
+            ) AS last_updated USING (allele_id)
+            JOIN (
+                SELECT allele_id, min(date_created) AS date_created
+                FROM alleleinterpretation
+                GROUP BY allele_id
+            ) AS first_created USING (allele_id)
+            LEFT JOIN ({_latest_log_field("alleleinterpretation", "allele_id", "priority")})
+                AS priority USING (allele_id)
+            LEFT JOIN ({_latest_log_field("alleleinterpretation", "allele_id", "review_comment")})
+                AS review_comment USING (allele_id)
+            WHERE latest.status = 'Ongoing'
+                OR (
+                    latest.status = 'Not started'
+                    AND latest.workflow_status IN ('Interpretation', 'Review')
+                )
+            """
+        )
+    )
+    conn.execute(
+        sa.text(
+            f"""
+            INSERT INTO worklist (
+                analysis_id, category, genepanel_name, genepanel_version, priority,
+                review_comment, warning_cleared, date_created
+            )
+            SELECT
+                latest.analysis_id,
+                CASE
+                    WHEN latest.status = 'Ongoing' THEN 'ongoing'
+                    WHEN latest.workflow_status = 'Not ready' THEN 'not_ready'
+                    WHEN latest.workflow_status = 'Interpretation' THEN 'not_started'
+                    WHEN latest.workflow_status = 'Review' THEN 'marked_review'
+                    ELSE 'marked_medicalreview'
+                END,
+                analysis.genepanel_name,
+                analysis.genepanel_version,
+                coalesce(priority.priority, 1),
+                review_comment.review_comment,
+                warning_cleared.warning_cleared,
+                coalesce(analysis.date_requested, analysis.date_deposited)
+            FROM (
+                SELECT DISTINCT ON (analysis_id) analysis_id, workflow_status, status
+                FROM analysisinterpretation
+                ORDER BY analysis_id, date_created DESC
+            ) AS latest
+            JOIN analysis ON analysis.id = latest.analysis_id
+            LEFT JOIN ({_latest_log_field("analysisinterpretation", "analysis_id", "priority")})
+                AS priority USING (analysis_id)
+            LEFT JOIN ({_latest_log_field("analysisinterpretation", "analysis_id", "review_comment")})
+                AS review_comment USING (analysis_id)
+            LEFT JOIN ({_latest_log_field("analysisinterpretation", "analysis_id", "warning_cleared")})
+                AS warning_cleared USING (analysis_id)
+            WHERE latest.status = 'Ongoing' OR latest.status = 'Not started'
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_index("ix_worklist_genepanel_category", table_name="worklist")
+    op.drop_table("worklist")
@@ -0,0 +1,30 @@
+"""Allele region column with GiST index
+
+Revision ID: 9b2e6d4f1a07
+Revises: 5f0d3b8a7c21
+Create Date: 2026-10-19 18:12:40.219873
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "9b2e6d4f1a07"
+down_revision = "5f0d3b8a7c21"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute(
+        "ALTER TABLE allele ADD COLUMN region int4range "
+        "GENERATED ALWAYS AS (int4range(start_position, open_end_position)) STORED"
+    )
+    print("Creating indexes, this can take a while...")
+    op.execute("CREATE INDEX ix_allele_chromosome_region ON allele USING gist(chromosome, region)")
+
+
+def downgrade():
+    op.drop_index("ix_allele_chromosome_region", table_name="allele")
+    op.drop_column("allele", "region")
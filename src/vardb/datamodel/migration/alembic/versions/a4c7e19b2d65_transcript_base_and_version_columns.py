@@ -0,0 +1,55 @@
+"""Generated transcript base and version columns
+
+Revision ID: a4c7e19b2d65
+Revises: 8d2f6a1c3e57
+Create Date: 2026-10-19 16:51:30.118204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "a4c7e19b2d65"
+down_revision = "8d2f6a1c3e57"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+# Must match vardb.datamodel.gene.get_transcript_base/get_transcript_version at time of writing
+TRANSCRIPT_BASE = "split_part({column}, '.', 1)"
+TRANSCRIPT_VERSION = (
+    "CAST(substring(split_part({column}, '.', 2) FROM '^[0-9]+') AS INTEGER)"
+    " - 0.5 * CAST(split_part({column}, '.', 2) !~ '^[0-9]+$' AS INTEGER)"
+)
+
+TABLES = [
+    # table, transcript column, hgnc id column
+    ("transcript", "transcript_name", "gene_id"),
+    ("annotationshadowtranscript", "transcript", "hgnc_id"),
+]
+
+
+def upgrade():
+    # Note: Adding stored generated columns rewrites the tables
+    for table, column, hgnc_id_column in TABLES:
+        op.execute(
+            f"""
+            ALTER TABLE {table}
+                ADD COLUMN transcript_base VARCHAR
+                    GENERATED ALWAYS AS ({TRANSCRIPT_BASE.format(column=column)}) STORED,
+                ADD COLUMN transcript_version FLOAT
+                    GENERATED ALWAYS AS ({TRANSCRIPT_VERSION.format(column=column)}) STORED
+            """
+        )
+        op.create_index(
+            f"ix_{table}_{hgnc_id_column}_transcript_base",
+            table,
+            [hgnc_id_column, "transcript_base"],
+            unique=False,
+        )
+
+
+def downgrade():
+    for table, _, hgnc_id_column in TABLES:
+        op.drop_index(f"ix_{table}_{hgnc_id_column}_transcript_base", table_name=table)
+        op.drop_column(table, "transcript_version")
+        op.drop_column(table, "transcript_base")
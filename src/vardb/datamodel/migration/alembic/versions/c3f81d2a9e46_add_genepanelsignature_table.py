@@ -0,0 +1,67 @@
+"""Add precomputed genepanel gene sets
+
+Revision ID: c3f81d2a9e46
+Revises: a4c7e19b2d65
+Create Date: 2026-10-19 15:41:08.517203
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "c3f81d2a9e46"
+down_revision = "a4c7e19b2d65"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table(
+        "genepanelsignature",
+        sa.Column("genepanel_name", sa.String(), nullable=False),
+        sa.Column("genepanel_version", sa.String(), nullable=False),
+        sa.Column("gene_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("checksum", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["genepanel_name", "genepanel_version"],
+            ["genepanel.name", "genepanel.version"],
+            name=op.f("fk_genepanelsignature_genepanel_name_genepanel"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "genepanel_name", "genepanel_version", name=op.f("pk_genepanelsignature")
+        ),
+    )
+
+    # Checksum must match datalayer.genepanelsimilarity._checksum
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO genepanelsignature (genepanel_name, genepanel_version, gene_ids, checksum)
+            SELECT
+                genepanel.name,
+                genepanel.version,
+                coalesce(gene_ids.gene_ids, '{}'),
+                md5(coalesce(array_to_string(gene_ids.gene_ids, ','), ''))
+            FROM genepanel
+            LEFT JOIN (
+                SELECT
+                    gt.genepanel_name,
+                    gt.genepanel_version,
+                    array_agg(DISTINCT t.gene_id ORDER BY t.gene_id) AS gene_ids
+                FROM genepanel_transcript AS gt
+                JOIN transcript AS t ON t.id = gt.transcript_id
+                GROUP BY gt.genepanel_name, gt.genepanel_version
+            ) AS gene_ids
+                ON gene_ids.genepanel_name = genepanel.name
+                AND gene_ids.genepanel_version = genepanel.version
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_table("genepanelsignature")
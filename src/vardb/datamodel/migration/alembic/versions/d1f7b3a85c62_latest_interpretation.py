@@ -0,0 +1,105 @@
+"""Add latest_interpretation table
+
+Revision ID: d1f7b3a85c62
+Revises: 6e4a9c2d7b15
+Create Date: 2026-10-19 20:14:51.377260
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "d1f7b3a85c62"
+down_revision = "6e4a9c2d7b15"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        "latest_interpretation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("allele_id", sa.Integer(), nullable=True),
+        sa.Column("analysis_id", sa.Integer(), nullable=True),
+        sa.Column("alleleinterpretation_id", sa.Integer(), nullable=True),
+        sa.Column("analysisinterpretation_id", sa.Integer(), nullable=True),
+        sa.Column("workflow_status", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("finalized", sa.Boolean(), nullable=True),
+        sa.CheckConstraint(
+            "(allele_id IS NULL) != (analysis_id IS NULL)", name="latest_interpretation_check"
+        ),
+        sa.CheckConstraint(
+            "(alleleinterpretation_id IS NULL) = (allele_id IS NULL)",
+            name="latest_interpretation_check1",
+        ),
+        sa.CheckConstraint(
+            "(analysisinterpretation_id IS NULL) = (analysis_id IS NULL)",
+            name="latest_interpretation_check2",
+        ),
+        sa.ForeignKeyConstraint(
+            ["allele_id"],
+            ["allele.id"],
+            name=op.f("fk_latest_interpretation_allele_id_allele"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["analysis_id"],
+            ["analysis.id"],
+            name=op.f("fk_latest_interpretation_analysis_id_analysis"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["alleleinterpretation_id"],
+            ["alleleinterpretation.id"],
+            name=op.f("fk_latest_interpretation_alleleinterpretation_id_alleleinterpretation"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["analysisinterpretation_id"],
+            ["analysisinterpretation.id"],
+            name=op.f("fk_latest_interpretation_analysisinterpretation_id_analysisinterpretation"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_latest_interpretation")),
+        sa.UniqueConstraint("allele_id", name=op.f("uq_latest_interpretation_allele_id")),
+        sa.UniqueConstraint("analysis_id", name=op.f("uq_latest_interpretation_analysis_id")),
+    )
+    op.create_index(
+        "ix_latest_interpretation_allele_status",
+        "latest_interpretation",
+        ["status", "workflow_status", "finalized", "allele_id"],
+        unique=False,
+        postgresql_where=sa.text("allele_id IS NOT NULL"),
+    )
+    op.create_index(
+        "ix_latest_interpretation_analysis_status",
+        "latest_interpretation",
+        ["status", "workflow_status", "finalized", "analysis_id"],
+        unique=False,
+        postgresql_where=sa.text("analysis_id IS NOT NULL"),
+    )
+
+    conn = op.get_bind()
+    for id_column in ["allele_id", "analysis_id"]:
+        interpretation_table = id_column.replace("_id", "interpretation")
+        conn.execute(
+            sa.text(
+                f"""
+                INSERT INTO latest_interpretation (
+                    {id_column}, {interpretation_table}_id, workflow_status, status, finalized
+                )
+                SELECT DISTINCT ON ({id_column})
+                    {id_column}, id, workflow_status, status, finalized
+                FROM {interpretation_table}
+                ORDER BY {id_column}, date_created DESC
+                """
+            )
+        )
+
+
+def downgrade():
+    op.drop_index("ix_latest_interpretation_analysis_status", table_name="latest_interpretation")
+    op.drop_index("ix_latest_interpretation_allele_status", table_name="latest_interpretation")
+    op.drop_table("latest_interpretation")
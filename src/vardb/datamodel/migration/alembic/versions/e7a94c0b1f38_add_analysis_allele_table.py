@@ -0,0 +1,80 @@
+"""Add analysis_allele association table
+
+Revision ID: e7a94c0b1f38
+Revises: c3f81d2a9e46
+Create Date: 2026-10-19 16:27:51.934120
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "e7a94c0b1f38"
+down_revision = "c3f81d2a9e46"
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        "analysis_allele",
+        sa.Column("analysis_id", sa.Integer(), nullable=False),
+        sa.Column("allele_id", sa.Integer(), nullable=False),
+        sa.Column("sample_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["allele_id"],
+            ["allele.id"],
+            name=op.f("fk_analysis_allele_allele_id_allele"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["analysis_id"],
+            ["analysis.id"],
+            name=op.f("fk_analysis_allele_analysis_id_analysis"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["sample_id"],
+            ["sample.id"],
+            name=op.f("fk_analysis_allele_sample_id_sample"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "analysis_id", "allele_id", "sample_id", name=op.f("pk_analysis_allele")
+        ),
+    )
+    op.create_index(
+        "ix_analysis_allele_allele_id_analysis_id",
+        "analysis_allele",
+        ["allele_id", "analysis_id"],
+        unique=False,
+    )
+    op.create_index(op.f("ix_genotype_allele_id"), "genotype", ["allele_id"], unique=False)
+    op.create_index(
+        op.f("ix_genotype_secondallele_id"), "genotype", ["secondallele_id"], unique=False
+    )
+
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO analysis_allele (analysis_id, allele_id, sample_id)
+            SELECT sample.analysis_id, genotype.allele_id, genotype.sample_id
+            FROM genotype
+            JOIN sample ON sample.id = genotype.sample_id
+            UNION
+            SELECT sample.analysis_id, genotype.secondallele_id, genotype.sample_id
+            FROM genotype
+            JOIN sample ON sample.id = genotype.sample_id
+            WHERE genotype.secondallele_id IS NOT NULL
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_genotype_secondallele_id"), table_name="genotype")
+    op.drop_index(op.f("ix_genotype_allele_id"), table_name="genotype")
+    op.drop_index("ix_analysis_allele_allele_id_analysis_id", table_name="analysis_allele")
+    op.drop_table("analysis_allele")
@@ -4,7 +4,7 @@
 import datetime
 import pytz
 
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, FetchedValue
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, FetchedValue, Table
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import Index, ForeignKeyConstraint
@@ -76,6 +76,12 @@ class Analysis(Base):
         ForeignKeyConstraint(
             [genepanel_name, genepanel_version], ["genepanel.name", "genepanel.version"]
         ),
+        Index(
+            "ix_analysis_name_trgm",
+            name,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
     )
 
     def __repr__(self):
@@ -86,6 +92,19 @@ class Analysis(Base):
         )
 
 
+# Alleles of an analysis, as given by the genotypes of its proband sample(s).
+# Maintained on deposit, see DepositAnalysis.insert_analysis_alleles.
+# Avoids joining genotype and sample to find the alleles of an analysis, or the analyses of an allele.
+analysis_allele = Table(
+    "analysis_allele",
+    Base.metadata,
+    Column("analysis_id", Integer, ForeignKey("analysis.id", ondelete="CASCADE"), primary_key=True),
+    Column("allele_id", Integer, ForeignKey("allele.id", ondelete="CASCADE"), primary_key=True),
+    Column("sample_id", Integer, ForeignKey("sample.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_analysis_allele_allele_id_analysis_id", "allele_id", "analysis_id"),
+)
+
+
 class FilterConfig(Base):
 
     """
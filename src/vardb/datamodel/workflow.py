@@ -4,6 +4,7 @@ import datetime
 import pytz
 from sqlalchemy import Column, Integer, DateTime, Enum, String, Boolean
 from sqlalchemy import ForeignKey, ForeignKeyConstraint, UniqueConstraint, Index
+from sqlalchemy.schema import CheckConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declared_attr
@@ -221,23 +222,31 @@ class InterpretationStateHistory(Base):
     """
     Holds the history of the state for the interpretations.
     Every time the [allele|analysis]interpretation state is updated (i.e. when user saves),
-    it's copied into this table.
+    the previous state is stored in this table.
+
+    To keep the table small, most rows only store `state_delta`: a JSON patch that transforms the
+    state of the next version (the next row, or the interpretation's current state for the last
+    row) into the state of this version. Every STATE_HISTORY_CHECKPOINT_INTERVAL versions, the
+    full state is stored in `state` instead. See datalayer/statehistory.py.
     """
 
     __tablename__ = "interpretationstatehistory"
 
     id = Column(Integer, primary_key=True)
     alleleinterpretation_id = Column(
-        Integer, ForeignKey("alleleinterpretation.id", ondelete="CASCADE")
+        Integer, ForeignKey("alleleinterpretation.id", ondelete="CASCADE"), index=True
     )
     analysisinterpretation_id = Column(
-        Integer, ForeignKey("analysisinterpretation.id", ondelete="CASCADE")
+        Integer, ForeignKey("analysisinterpretation.id", ondelete="CASCADE"), index=True
     )
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     date_created = Column(
         DateTime(timezone=True), nullable=False, default=lambda: datetime.datetime.now(pytz.utc)
     )
-    state = Column(JSONMutableDict.as_mutable(JSONB), nullable=False)
+    state = Column(JSONMutableDict.as_mutable(JSONB))
+    state_delta = Column(JSONB)
+
+    __table_args__ = (CheckConstraint("(state IS NULL) != (state_delta IS NULL)"),)
 
 
 class InterpretationLog(Base):
@@ -261,3 +270,135 @@ class InterpretationLog(Base):
     warning_cleared = Column(Boolean)
     alleleassessment_id = Column(Integer, ForeignKey("alleleassessment.id"))
     allelereport_id = Column(Integer, ForeignKey("allelereport.id"))
+
+
+class LatestInterpretation(Base):
+    """
+    Latest created interpretation of each allele and analysis workflow, with its status.
+
+    The table is derived data, refreshed after each flush that changes interpretations, so
+    queries within the same transaction see it up to date. See datalayer/latestinterpretation.py.
+    """
+
+    __tablename__ = "latest_interpretation"
+
+    id = Column(Integer, primary_key=True)
+    allele_id = Column(Integer, ForeignKey("allele.id", ondelete="CASCADE"), unique=True)
+    analysis_id = Column(Integer, ForeignKey("analysis.id", ondelete="CASCADE"), unique=True)
+    alleleinterpretation_id = Column(
+        Integer, ForeignKey("alleleinterpretation.id", ondelete="CASCADE")
+    )
+    analysisinterpretation_id = Column(
+        Integer, ForeignKey("analysisinterpretation.id", ondelete="CASCADE")
+    )
+    workflow_status = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    finalized = Column(Boolean)
+
+    __table_args__ = (
+        CheckConstraint("(allele_id IS NULL) != (analysis_id IS NULL)"),
+        CheckConstraint("(alleleinterpretation_id IS NULL) = (allele_id IS NULL)"),
+        CheckConstraint("(analysisinterpretation_id IS NULL) = (analysis_id IS NULL)"),
+        Index(
+            "ix_latest_interpretation_allele_status",
+            "status",
+            "workflow_status",
+            "finalized",
+            "allele_id",
+            postgresql_where=(allele_id.isnot(None)),
+        ),
+        Index(
+            "ix_latest_interpretation_analysis_status",
+            "status",
+            "workflow_status",
+            "finalized",
+            "analysis_id",
+            postgresql_where=(analysis_id.isnot(None)),
+        ),
+    )
+
+    def __repr__(self):
+        return "<LatestInterpretation('{}', '{}', '{}', '{}')>".format(
+            self.allele_id, self.analysis_id, self.workflow_status, self.status
+        )
+
+
+class WorklistEntry(Base):
+    """
+    Materialised overview worklist: one row for each allele and analysis in one of the overview
+    categories (see AlleleCategories and AnalysisCategories), with the workflow data shown in the
+    overview. Alleles and analyses without a category (e.g. finalized) have no row. Allele display
+    data (annotation, existing classification) is not included, and is loaded per request.
+
+    The table is derived data, kept up to date on commit whenever interpretations or
+    interpretation logs change. See datalayer/worklist.py.
+    """
+
+    __tablename__ = "worklist"
+
+    id = Column(Integer, primary_key=True)
+    allele_id = Column(Integer, ForeignKey("allele.id", ondelete="CASCADE"), unique=True)
+    analysis_id = Column(Integer, ForeignKey("analysis.id", ondelete="CASCADE"), unique=True)
+    category = Column(String, nullable=False)
+    # Genepanel of latest interpretation (alleles) or of the analysis (analyses)
+    genepanel_name = Column(String)
+    genepanel_version = Column(String)
+    priority = Column(Integer, nullable=False, default=1)
+    review_comment = Column(String)
+    warning_cleared = Column(Boolean)
+    # Date of first interpretation (alleles), or date requested/deposited (analyses)
+    date_created = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["genepanel_name", "genepanel_version"], ["genepanel.name", "genepanel.version"]
+        ),
+        CheckConstraint("(allele_id IS NULL) != (analysis_id IS NULL)"),
+        Index("ix_worklist_genepanel_category", "genepanel_name", "genepanel_version", "category"),
+    )
+
+    def __repr__(self):
+        return "<WorklistEntry('{}', '{}', '{}')>".format(
+            self.allele_id, self.analysis_id, self.category
+        )
+
+
+class OpenWorkflowAllele(Base):
+    """
+    Alleles in open allele and analysis workflows, i.e. workflows that may contain work that is
+    not committed. Used for detecting collisions between workflows.
+
+    One row for each allele of each open workflow (analysis_id is null for allele workflows),
+    with the user and workflow status of the workflow's latest interpretation.
+
+    The table is derived data, kept up to date on commit whenever interpretations change.
+    See datalayer/openworkflows.py.
+    """
+
+    __tablename__ = "open_workflow_allele"
+
+    id = Column(Integer, primary_key=True)
+    allele_id = Column(Integer, ForeignKey("allele.id", ondelete="CASCADE"), nullable=False)
+    analysis_id = Column(Integer, ForeignKey("analysis.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("user.id"))
+    workflow_status = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("analysis_id", "allele_id"),
+        Index("ix_open_workflow_allele_allele_id", "allele_id"),
+    )
+
+    def __repr__(self):
+        return "<OpenWorkflowAllele('{}', '{}', '{}')>".format(
+            self.allele_id, self.analysis_id, self.workflow_status
+        )
+
+
+# The unique constraint on (analysis_id, allele_id) does not apply to allele workflows,
+# as null analysis_ids never conflict
+Index(
+    "ix_open_workflow_allele_allele_workflow_unique",
+    OpenWorkflowAllele.allele_id,
+    postgresql_where=(OpenWorkflowAllele.analysis_id.is_(None)),
+    unique=True,
+)
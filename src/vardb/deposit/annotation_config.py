@@ -1,9 +1,9 @@
 from typing import Any, List, Mapping, Sequence
-import jsonschema
 from dataclasses import dataclass, field
 from sqlalchemy.orm import scoped_session
-from vardb.datamodel.jsonschemas.load_schema import load_schema
+from vardb.datamodel.jsonschemas.load_schema import schema_path
 from vardb.datamodel import annotation
+from vardb.util import jsonschemavalidator
 
 
 @dataclass
@@ -36,8 +36,7 @@ class AnnotationConfig:
 def deposit_annotationconfig(
     session: scoped_session, annotationconfig: Mapping[str, Any]
 ) -> annotation.AnnotationConfig:
-    schema = load_schema("annotationconfig.json")
-    jsonschema.validate(annotationconfig, schema)
+    jsonschemavalidator.validate(schema_path("annotationconfig.json"), annotationconfig)
 
     active_annotationconfig = (
         session.query(annotation.AnnotationConfig)
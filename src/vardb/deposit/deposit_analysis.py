@@ -12,10 +12,11 @@ import logging
 
 
 from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
 from datalayer import queries
 from vardb.util import vcfiterator
 
-from vardb.datamodel import sample, user, gene, assessment, allele
+from vardb.datamodel import sample, user, gene, assessment, allele, genotype
 
 from .deposit_from_vcf import DepositFromVCF
 
@@ -398,6 +399,25 @@ class DepositAnalysis(DepositFromVCF):
                         f"Invalid postprocess method {method} in {pattern} of user group {deposit_usergroup_id}"
                     )
 
+    def insert_analysis_alleles(self, db_analysis):
+        """
+        Registers the alleles of the analysis' genotypes in analysis_allele.
+        Existing entries are kept, so this can be run again when appending to an analysis.
+        """
+        for allele_id_column in [genotype.Genotype.allele_id, genotype.Genotype.secondallele_id]:
+            genotype_alleles = (
+                self.session.query(
+                    sample.Sample.analysis_id, allele_id_column, genotype.Genotype.sample_id
+                )
+                .join(genotype.Genotype.sample)
+                .filter(sample.Sample.analysis_id == db_analysis.id, allele_id_column.isnot(None))
+            )
+            self.session.execute(
+                insert(sample.analysis_allele)
+                .from_select(["analysis_id", "allele_id", "sample_id"], genotype_alleles.statement)
+                .on_conflict_do_nothing()
+            )
+
     def import_vcf(self, analysis_config_data, append=False):
         """
         Deposit related configs can be defined in the usergroup configs.
@@ -544,6 +564,8 @@ class DepositAnalysis(DepositFromVCF):
             # Run asserts on block data
             block_iterator.finish_check()
 
+        self.insert_analysis_alleles(db_analysis)
+
         if not append:
             self.postprocess(
                 deposit_usergroup_id,
@@ -149,7 +149,7 @@ def main(argv=None):
 
     args = parser.parse_args(argv)
 
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     da = DepositAssessments(db.session)
     try:
@@ -49,6 +49,6 @@ if __name__ == "__main__":
 
     filename = os.path.abspath(args.json_file)
     # Import argparse, add CLI for getting path to JSON file.
-    db = DB()
+    db = DB(role="cli")
     db.connect()
     import_custom_annotations(db.session, filename)
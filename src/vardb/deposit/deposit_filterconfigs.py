@@ -1,11 +1,11 @@
 import datetime
-import jsonschema
 import logging
 import pytz
 
 from api.config import config
-from vardb.datamodel.jsonschemas import load_schema
+from vardb.datamodel.jsonschemas import schema_path
 from vardb.datamodel import sample, user, annotationshadow
+from vardb.util import jsonschemavalidator
 
 
 log = logging.getLogger(__name__)
@@ -13,9 +13,9 @@ log = logging.getLogger(__name__)
 
 def deposit_filterconfigs(session, fc_configs):
     result = {"fc_updated": [], "fc_created": [], "ugfc_created": [], "ugfc_updated": []}
-    filter_config_schema = load_schema("filterconfig_base.json")
+    # Validate all before depositing any
+    jsonschemavalidator.validate_many(schema_path("filterconfig_base.json"), fc_configs)
     for fc_config in fc_configs:
-        jsonschema.validate(fc_config, filter_config_schema)
         filterconfig = fc_config["filterconfig"]
         name = fc_config["name"]
         requirements = fc_config["requirements"]
@@ -4,278 +4,358 @@ Code for adding or modifying gene panels in varDB.
 """
 
 import argparse
+import io
 import logging
 import sys
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, Field, validator
-from sqlalchemy import and_
+from sqlalchemy import text
 
+from datalayer.genepanelsimilarity import update_genepanel_signature
 from vardb.datamodel import DB
 from vardb.datamodel import gene as gm
-from vardb.deposit.importers import bulk_insert_nonexisting
 
 log = logging.getLogger(__name__)
 
-
-class TranscriptRecord(BaseModel):
-    chromosome: str = Field(alias="chromosome")
-    start: int = Field(alias="read start")
-    end: int = Field(alias="read end")
-    name: str = Field(alias="name")
-    # score: float = Field(default=0.0, alias="score")
-    strand: str = Field(default="+", alias="strand")
-    tags: Optional[List[str]] = Field(default=None, alias="tags")
-    hgnc_id: int = Field(alias="HGNC id")
-    gene_symbol: str = Field(alias="HGNC symbol")
-    inheritance: str = Field(alias="inheritance")
-    coding_start: Optional[int] = Field(default=None, alias="coding start")
-    coding_end: Optional[int] = Field(default=None, alias="coding end")
-    exon_starts: List[int] = Field(alias="exon starts")
-    exon_ends: List[int] = Field(alias="exon ends")
-    # metadata: Optional[str] = Field(default=None, alias="metadata")
-
-    @validator("coding_start", "coding_end", pre=True)
-    def validate_coding_start_end(cls, v):
-        if v:
-            return v
-        return None
-
-    @validator("exon_starts", "exon_ends", pre=True)
-    def validate_exon_starts_ends(cls, v):
-        if v is None:
-            return None
-        return [int(x) for x in v.split(",") if x]
-
-    @validator("tags", pre=True)
-    def validate_tags(cls, v):
-        if v == "" or v is None:
-            return None
-        return [x.strip() for x in v.split(",")]
-
-    def as_row(self, genome_ref: str):
-        return {
-            "gene_id": self.hgnc_id,  # foreign key to gene
-            "transcript_name": self.name,
-            "type": "RefSeq",
-            "chromosome": self.chromosome,
-            "tx_start": self.start,
-            "tx_end": self.end,
-            "strand": self.strand,
-            "tags": self.tags,
-            "cds_start": self.coding_start,
-            "cds_end": self.coding_end,
-            "exon_starts": self.exon_starts,
-            "exon_ends": self.exon_ends,
-            "genome_reference": genome_ref,
-        }
-
-    class Config:
-        extra = "ignore"
-
-
-class PhenotypeRecord(BaseModel):
-    hgnc_id: int = Field(alias="HGNC id")
-    hgnc_symbol: str = Field(alias="HGNC symbol")
-    inheritance: str = Field(default="N/A")
-    omim_id: Optional[int] = Field(alias="phenotype MIM number")
-    description: str = Field(alias="phenotype")
-
-    @validator("omim_id", pre=True)
-    def empty_str_to_none(cls, v):
-        if v == "":
-            return None
-        return v
-
-    @validator("inheritance", pre=True)
-    def empty_inheritance_to_n_a(cls, v):
-        if v == "":
-            return "N/A"
-        return v
-
-    def as_row(self):
-        return {
-            "gene_id": self.hgnc_id,
-            "description": self.description,
-            "inheritance": self.inheritance,
-            "omim_id": self.omim_id,
-        }
-
-
-def load_phenotypes(phenotypes_path: Path):
-    header = None
-    phenotypes = []
-    with phenotypes_path.open() as f:
+# Columns read from the input files into the staging tables:
+# (header in file, staging column, staging type, required)
+# Empty values are staged as NULL, except for required text columns.
+TRANSCRIPT_COLUMNS = [
+    ("chromosome", "chromosome", "text", True),
+    ("read start", "tx_start", "integer", True),
+    ("read end", "tx_end", "integer", True),
+    ("name", "transcript_name", "text", True),
+    ("strand", "strand", "text", False),
+    ("tags", "tags", "text", False),  # Comma separated
+    ("HGNC id", "hgnc_id", "integer", True),
+    ("HGNC symbol", "hgnc_symbol", "text", True),
+    ("inheritance", "inheritance", "text", True),
+    ("coding start", "cds_start", "integer", False),
+    ("coding end", "cds_end", "integer", False),
+    ("exon starts", "exon_starts", "text", True),  # Comma separated
+    ("exon ends", "exon_ends", "text", True),  # Comma separated
+]
+
+PHENOTYPE_COLUMNS = [
+    ("HGNC id", "hgnc_id", "integer", True),
+    ("HGNC symbol", "hgnc_symbol", "text", True),
+    ("inheritance", "inheritance", "text", False),
+    ("phenotype MIM number", "omim_id", "integer", False),
+    ("phenotype", "description", "text", True),
+]
+
+TRANSCRIPT_STAGING = "genepanel_transcript_staging"
+PHENOTYPE_STAGING = "genepanel_phenotype_staging"
+
+
+def _staged_rows(path: Path, header_prefix: str, columns: List[Tuple[str, str, str, bool]]):
+    """
+    Reads a tab separated file with a header line starting with header_prefix (other lines
+    starting with '#' are comments), and yields the given columns of each line in COPY text format.
+    """
+    indices = None
+    with path.open() as f:
         for line in f:
-            if line.startswith("#"):
+            if line.startswith(header_prefix):
+                header = [h.strip() for h in line.lstrip("#").split("\t")]
+                missing = [c[0] for c in columns if c[3] and c[0] not in header]
+                if missing:
+                    raise RuntimeError(f"Missing columns in {path}: {', '.join(missing)}")
+                indices = [header.index(c[0]) if c[0] in header else None for c in columns]
                 continue
-            if line.startswith("HGNC id"):
-                header = line.strip().split("\t")
+            if line.startswith("#") or not line.strip():
                 continue
-            if not header:
+            if indices is None:
                 raise RuntimeError(
-                    f"No valid header found in {phenotypes_path}. "
-                    "Make sure the file header starts with 'HGNC id'."
+                    f"No valid header found in {path}. "
+                    f"Make sure the file header starts with '{header_prefix}'."
                 )
 
-            data = dict(list(zip(header, [l.strip() for l in line.split("\t")])))
-            ph_record = PhenotypeRecord(**data)
-            phenotypes.append(ph_record)
+            values = [v.strip() for v in line.split("\t")]
+            staged = []
+            for (_, _, column_type, required), i in zip(columns, indices):
+                value = values[i] if i is not None and i < len(values) else ""
+                if value == "" and not (required and column_type == "text"):
+                    staged.append("\\N")
+                else:
+                    staged.append(value.replace("\\", "\\\\"))
+            yield "\t".join(staged) + "\n"
+
 
-    return phenotypes
+def _stage(session, table: str, path: Path, header_prefix: str, columns) -> int:
+    """
+    Copies the given columns of the file into a new temporary table, dropped on commit.
+    Values are converted to the staging column types by COPY, which reports the offending line
+    on invalid input. Returns the number of staged lines.
+    """
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE {} (line serial PRIMARY KEY, {}) ON COMMIT DROP".format(
+                table,
+                ", ".join(
+                    f"{name} {column_type}" + (" NOT NULL" if required else "")
+                    for _, name, column_type, required in columns
+                ),
+            )
+        )
+    )
+    data = io.StringIO("".join(_staged_rows(path, header_prefix, columns)))
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(
+        "COPY {} ({}) FROM STDIN".format(table, ", ".join(c[1] for c in columns)), data
+    )
+    return session.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+
+
+# The upserts below only write rows that are new or changed, so that depositing a panel
+# version sharing most of its transcripts with existing versions leaves those rows untouched.
+# If a key occurs more than once in a file, the last line wins. Inserted rows are told from
+# updated rows by xmax, which is 0 for rows inserted by the statement.
+
+UPSERT_GENES_SQL = f"""
+WITH upserted AS (
+    INSERT INTO gene (hgnc_id, hgnc_symbol)
+    SELECT DISTINCT ON (hgnc_id) hgnc_id, hgnc_symbol
+    FROM {TRANSCRIPT_STAGING}
+    ORDER BY hgnc_id, line DESC
+    ON CONFLICT (hgnc_id) DO UPDATE SET hgnc_symbol = EXCLUDED.hgnc_symbol
+    WHERE gene.hgnc_symbol IS DISTINCT FROM EXCLUDED.hgnc_symbol
+    RETURNING xmax = 0 AS created
+)
+SELECT
+    (SELECT count(*) FROM upserted WHERE created),
+    (SELECT count(DISTINCT hgnc_id) FROM {TRANSCRIPT_STAGING})
+"""
 
+TRANSCRIPT_VALUE_COLUMNS = [
+    "gene_id",
+    "type",
+    "tags",
+    "genome_reference",
+    "chromosome",
+    "tx_start",
+    "tx_end",
+    "strand",
+    "cds_start",
+    "cds_end",
+    "exon_starts",
+    "exon_ends",
+]
+
+UPSERT_TRANSCRIPTS_SQL = """
+WITH upserted AS (
+    INSERT INTO transcript (transcript_name, {columns})
+    SELECT DISTINCT ON (transcript_name)
+        transcript_name,
+        hgnc_id,
+        'RefSeq'::transcript_type,
+        regexp_split_to_array(btrim(tags), '\\s*,\\s*'),
+        :genome_reference,
+        chromosome,
+        tx_start,
+        tx_end,
+        coalesce(strand, '+'),
+        cds_start,
+        cds_end,
+        array_remove(string_to_array(exon_starts, ','), '')::integer[],
+        array_remove(string_to_array(exon_ends, ','), '')::integer[]
+    FROM {staging}
+    ORDER BY transcript_name, line DESC
+    ON CONFLICT (transcript_name) DO {on_conflict}
+    RETURNING xmax = 0 AS created
+)
+SELECT
+    (SELECT count(*) FROM upserted WHERE created),
+    (SELECT count(DISTINCT transcript_name) FROM {staging})
+"""
 
-def load_transcripts(transcripts_path: Path):
-    header = None
-    transcripts = []
-    with transcripts_path.open() as f:
-        for l in f:
-            if l.startswith("#chromosome"):
-                header = l.strip().split("\t")
-                header[0] = header[0][1:]  # strip leading '#'
-            if l.startswith("#"):
-                continue
-            if not header:
-                raise RuntimeError(
-                    f"No valid header found in {transcripts_path}. "
-                    "Make sure the file header starts with '#chromosome'."
-                )
+UPSERT_PHENOTYPES_SQL = """
+WITH upserted AS (
+    INSERT INTO phenotype (gene_id, description, inheritance, omim_id)
+    SELECT DISTINCT ON (hgnc_id, description, coalesce(inheritance, 'N/A'))
+        hgnc_id, description, coalesce(inheritance, 'N/A'), omim_id
+    FROM {staging}
+    ORDER BY hgnc_id, description, coalesce(inheritance, 'N/A'), line DESC
+    ON CONFLICT (gene_id, description, inheritance) DO {on_conflict}
+    RETURNING xmax = 0 AS created
+)
+SELECT
+    (SELECT count(*) FROM upserted WHERE created),
+    (SELECT count(*) FROM (
+        SELECT DISTINCT hgnc_id, description, coalesce(inheritance, 'N/A') FROM {staging}
+    ) AS distinct_phenotypes)
+"""
 
-            data = dict(zip(header, [l.strip() for l in l.split("\t")]))
-            tx_record = TranscriptRecord(**data)
-            transcripts.append(tx_record)
-    return transcripts
+# Sets the junction rows of the genepanel to those wanted, by deleting the rows no longer
+# wanted and inserting the missing ones. Both see the junction table as it was before the
+# statement, so existing rows that are still wanted are left as they are.
+SYNC_JUNCTION_SQL = """
+WITH wanted AS (
+    {wanted}
+),
+deleted AS (
+    DELETE FROM {junction} AS existing
+    WHERE existing.genepanel_name = :name
+    AND existing.genepanel_version = :version
+    AND NOT EXISTS (
+        SELECT 1 FROM wanted WHERE {match}
+    )
+    RETURNING 1
+),
+inserted AS (
+    INSERT INTO {junction} (genepanel_name, genepanel_version, {columns})
+    SELECT :name, :version, {columns}
+    FROM wanted
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {junction} AS existing
+        WHERE existing.genepanel_name = :name
+        AND existing.genepanel_version = :version
+        AND {match}
+    )
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM inserted), (SELECT count(*) FROM deleted)
+"""
+
+SYNC_TRANSCRIPTS_SQL = SYNC_JUNCTION_SQL.format(
+    wanted=f"""
+    SELECT DISTINCT ON (transcript.id) transcript.id AS transcript_id, staged.inheritance
+    FROM {TRANSCRIPT_STAGING} AS staged
+    JOIN transcript ON transcript.transcript_name = staged.transcript_name
+    ORDER BY transcript.id, staged.line DESC
+    """,
+    junction=gm.genepanel_transcript.name,
+    columns="transcript_id, inheritance",
+    match="wanted.transcript_id = existing.transcript_id "
+    "AND wanted.inheritance = existing.inheritance",
+)
+
+SYNC_PHENOTYPES_SQL = SYNC_JUNCTION_SQL.format(
+    wanted=f"""
+    SELECT DISTINCT phenotype.id AS phenotype_id
+    FROM {PHENOTYPE_STAGING} AS staged
+    JOIN phenotype ON phenotype.gene_id = staged.hgnc_id
+    AND phenotype.description = staged.description
+    AND phenotype.inheritance = coalesce(staged.inheritance, 'N/A')
+    """,
+    junction=gm.genepanel_phenotype.name,
+    columns="phenotype_id",
+    match="wanted.phenotype_id = existing.phenotype_id",
+)
+
+# Differences in transcripts and phenotypes between two genepanel versions
+DIFF_SQL = """
+SELECT
+    count(*) FILTER (WHERE previous.{key} IS NULL),
+    count(*) FILTER (WHERE this.{key} IS NULL)
+FROM (
+    SELECT DISTINCT {key} FROM {junction}
+    WHERE genepanel_name = :name AND genepanel_version = :version
+) AS this
+FULL JOIN (
+    SELECT DISTINCT {key} FROM {junction}
+    WHERE genepanel_name = :name AND genepanel_version = :previous_version
+) AS previous USING ({key})
+"""
 
 
 class DepositGenepanel(object):
-    def __init__(self, session):
-        self.session = session
+    """
+    Deposits a genepanel from a transcripts and a phenotypes file.
 
-    def insert_genes(self, transcript_data: List[TranscriptRecord]):
-        # Avoid duplicate genes
-        distinct_genes = set()
-        for t in transcript_data:
-            distinct_genes.add((t.hgnc_id, t.gene_symbol))
+    The files are copied into temporary staging tables, from which genes, transcripts and
+    phenotypes are upserted, and the genepanel's junction rows are set, with one statement each.
+    """
 
-        gene_rows = list()
-        for d in list(distinct_genes):
-            gene_rows.append({"hgnc_id": d[0], "hgnc_symbol": d[1]})
+    def __init__(self, session):
+        self.session = session
 
-        gene_inserted_count = 0
-        gene_reused_count = 0
-        for existing, created in bulk_insert_nonexisting(
-            self.session,
-            gm.Gene,
-            gene_rows,
-            include_pk="hgnc_id",
-            compare_keys=["hgnc_id"],
-            replace=True,
-        ):
-            gene_inserted_count += len(created)
-            gene_reused_count += len(existing)
-        return gene_inserted_count, gene_reused_count
+    def insert_genes(self) -> Tuple[int, int]:
+        created, total = self.session.execute(text(UPSERT_GENES_SQL)).fetchone()
+        return created, total - created
 
     def insert_transcripts(
-        self,
-        transcript_data: List[TranscriptRecord],
-        genepanel_name: str,
-        genepanel_version: str,
-        genome_ref: str,
-        replace: bool = False,
-    ):
-        transcript_rows = [t.as_row(genome_ref) for t in transcript_data]
-        inheritances = {t.name: t.inheritance for t in transcript_data}
-
-        transcript_inserted_count = 0
-        transcript_reused_count = 0
-
-        # If replacing, delete old connections in junction table
+        self, genepanel_name: str, genepanel_version: str, genome_ref: str, replace: bool = False
+    ) -> Tuple[int, int]:
         if replace:
-            log.debug("Replacing transcripts connected to genepanel.")
-            self.session.execute(
-                gm.genepanel_transcript.delete().where(
-                    and_(
-                        gm.genepanel_transcript.columns.genepanel_name == genepanel_name,
-                        gm.genepanel_transcript.columns.genepanel_version == genepanel_version,
-                    )
-                )
+            # Update existing transcripts, only where they differ
+            on_conflict = "UPDATE SET {} WHERE ({}) IS DISTINCT FROM ({})".format(
+                ", ".join(f"{c} = EXCLUDED.{c}" for c in TRANSCRIPT_VALUE_COLUMNS),
+                ", ".join(f"transcript.{c}" for c in TRANSCRIPT_VALUE_COLUMNS),
+                ", ".join(f"EXCLUDED.{c}" for c in TRANSCRIPT_VALUE_COLUMNS),
             )
-
-        for existing, created in bulk_insert_nonexisting(
-            self.session,
-            gm.Transcript,
-            transcript_rows,
-            include_pk="id",
-            compare_keys=["transcript_name"],
-            replace=replace,
-        ):
-            transcript_inserted_count += len(created)
-            transcript_reused_count += len(existing)
-
-            # Connect to genepanel by inserting into the junction table
-            junction_values = list()
-            for tx in existing + created:
-                junction_values.append(
-                    {
-                        "genepanel_name": genepanel_name,
-                        "genepanel_version": genepanel_version,
-                        "transcript_id": tx["id"],
-                        "inheritance": inheritances[tx["transcript_name"]],
-                    }
+        else:
+            on_conflict = "NOTHING"
+        created, total = self.session.execute(
+            text(
+                UPSERT_TRANSCRIPTS_SQL.format(
+                    columns=", ".join(TRANSCRIPT_VALUE_COLUMNS),
+                    staging=TRANSCRIPT_STAGING,
+                    on_conflict=on_conflict,
                 )
-            self.session.execute(gm.genepanel_transcript.insert(), junction_values)
+            ),
+            {"genome_reference": genome_ref},
+        ).fetchone()
 
-        return transcript_inserted_count, transcript_reused_count
+        linked, unlinked = self.session.execute(
+            text(SYNC_TRANSCRIPTS_SQL), {"name": genepanel_name, "version": genepanel_version}
+        ).fetchone()
+        log.debug(f"Transcripts linked to genepanel: {linked} added, {unlinked} removed")
+        return created, total - created
 
     def insert_phenotypes(
-        self,
-        phenotype_data: List[PhenotypeRecord],
-        genepanel_name,
-        genepanel_version,
-        replace=False,
-    ):
-        phenotype_rows = [ph.as_row() for ph in phenotype_data]
-
-        phenotype_inserted_count = 0
-        phenotype_reused_count = 0
-
-        # If replacing, delete old connections in junction table
+        self, genepanel_name: str, genepanel_version: str, replace: bool = False
+    ) -> Tuple[int, int]:
         if replace:
-            log.debug("Replacing transcripts connected to genepanel.")
-            self.session.execute(
-                gm.genepanel_phenotype.delete().where(
-                    and_(
-                        gm.genepanel_phenotype.columns.genepanel_name == genepanel_name,
-                        gm.genepanel_phenotype.columns.genepanel_version == genepanel_version,
-                    )
-                )
+            on_conflict = (
+                "UPDATE SET omim_id = EXCLUDED.omim_id "
+                "WHERE phenotype.omim_id IS DISTINCT FROM EXCLUDED.omim_id"
             )
-
-        for existing, created in bulk_insert_nonexisting(
-            self.session,
-            gm.Phenotype,
-            phenotype_rows,
-            include_pk="id",
-            compare_keys=["gene_id", "description", "inheritance"],
-            replace=replace,
-        ):
-            phenotype_inserted_count += len(created)
-            phenotype_reused_count += len(existing)
-            # Connect to genepanel by inserting into the junction table
-            junction_values = list()
-            pks = [i["id"] for i in existing + created]
-            for pk in pks:
-                junction_values.append(
+        else:
+            on_conflict = "NOTHING"
+        created, total = self.session.execute(
+            text(UPSERT_PHENOTYPES_SQL.format(staging=PHENOTYPE_STAGING, on_conflict=on_conflict))
+        ).fetchone()
+
+        linked, unlinked = self.session.execute(
+            text(SYNC_PHENOTYPES_SQL), {"name": genepanel_name, "version": genepanel_version}
+        ).fetchone()
+        log.debug(f"Phenotypes linked to genepanel: {linked} added, {unlinked} removed")
+        return created, total - created
+
+    def diff_genepanel(
+        self, genepanel_name: str, genepanel_version: str, previous_version: str
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        Number of transcripts and phenotypes added and removed in genepanel_version,
+        compared to previous_version.
+        """
+        diff = {}
+        for key, junction in [
+            ("transcript_id", gm.genepanel_transcript.name),
+            ("phenotype_id", gm.genepanel_phenotype.name),
+        ]:
+            diff[junction] = tuple(
+                self.session.execute(
+                    text(DIFF_SQL.format(key=key, junction=junction)),
                     {
-                        "genepanel_name": genepanel_name,
-                        "genepanel_version": genepanel_version,
-                        "phenotype_id": pk,
-                    }
-                )
-            self.session.execute(gm.genepanel_phenotype.insert(), junction_values)
-
-        return phenotype_inserted_count, phenotype_reused_count
+                        "name": genepanel_name,
+                        "version": genepanel_version,
+                        "previous_version": previous_version,
+                    },
+                ).fetchone()
+            )
+        return diff
+
+    def _previous_version(self, genepanel_name: str, genepanel_version: str) -> Optional[str]:
+        previous = (
+            self.session.query(gm.Genepanel.version)
+            .filter(gm.Genepanel.name == genepanel_name, gm.Genepanel.version != genepanel_version)
+            .order_by(gm.Genepanel.date_created.desc())
+            .first()
+        )
+        return previous[0] if previous else None
 
     def add_genepanel(
         self,
@@ -324,27 +404,27 @@ class DepositGenepanel(object):
                 )
                 return
 
-        transcript_data = load_transcripts(transcripts_path)
-        if not transcript_data:
-            raise RuntimeError("Found no transcripts in file")
-        phenotype_data = load_phenotypes(phenotypes_path)
-        if not phenotypes_path:
-            raise RuntimeError("Found no phenotypes in file")
+        # The junction rows reference the genepanel
+        self.session.flush()
 
-        gene_inserted_count = 0
-        gene_reused_count = 0
-        transcript_inserted_count = 0
-        transcript_reused_count = 0
-        phenotype_inserted_count = 0
-        phenotype_reused_count = 0
+        num_transcript_lines = _stage(
+            self.session,
+            TRANSCRIPT_STAGING,
+            Path(transcripts_path),
+            "#chromosome",
+            TRANSCRIPT_COLUMNS,
+        )
+        if not num_transcript_lines:
+            raise RuntimeError("Found no transcripts in file")
+        _stage(self.session, PHENOTYPE_STAGING, Path(phenotypes_path), "HGNC id", PHENOTYPE_COLUMNS)
 
         # Genes
-        gene_inserted_count, gene_reused_count = self.insert_genes(transcript_data)
+        gene_inserted_count, gene_reused_count = self.insert_genes()
         log.info("GENES: Created {}, reused {}".format(gene_inserted_count, gene_reused_count))
 
         # Transcripts
         transcript_inserted_count, transcript_reused_count = self.insert_transcripts(
-            transcript_data, genepanel_name, genepanel_version, genomeRef, replace=replace
+            genepanel_name, genepanel_version, genomeRef, replace=replace
         )
 
         log.info(
@@ -355,7 +435,7 @@ class DepositGenepanel(object):
 
         # Phenotypes
         phenotype_inserted_count, phenotype_reused_count = self.insert_phenotypes(
-            phenotype_data, genepanel_name, genepanel_version, replace=replace
+            genepanel_name, genepanel_version, replace=replace
         )
 
         log.info(
@@ -364,6 +444,21 @@ class DepositGenepanel(object):
             )
         )
 
+        previous_version = self._previous_version(genepanel_name, genepanel_version)
+        if previous_version:
+            diff = self.diff_genepanel(genepanel_name, genepanel_version, previous_version)
+            log.info(
+                "Compared to {} {}: {} transcripts added, {} removed; "
+                "{} phenotypes added, {} removed".format(
+                    genepanel_name,
+                    previous_version,
+                    *diff[gm.genepanel_transcript.name],
+                    *diff[gm.genepanel_phenotype.name],
+                )
+            )
+
+        update_genepanel_signature(self.session, genepanel_name, genepanel_version)
+
         self.session.commit()
         log.info(
             "Added {} {} with {} genes, {} transcripts and {} phenotypes to database".format(
@@ -445,7 +540,7 @@ def main(argv=None):
     genepanel_version = args.genepanelVersion
     assert genepanel_version.startswith("v")
 
-    db = DB()
+    db = DB(role="cli")
     db.connect()
 
     dg = DepositGenepanel(db.session)
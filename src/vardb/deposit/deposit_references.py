@@ -2,6 +2,10 @@ import os
 import logging
 import argparse
 import json
+from typing import Tuple
+
+from sqlalchemy import text
+
 from vardb.datamodel import DB, assessment
 
 """
@@ -11,6 +15,7 @@ updating old references.
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 BATCH_SIZE = 200  # Determine number of references to query at a time
+BULK_CHUNK_SIZE = 50000  # Number of staged references to upsert per statement
 log = logging.getLogger(__name__)
 
 
@@ -34,11 +39,12 @@ def get_reference_batches(f):
         yield reference_batch
 
 
-def import_references(session, filename):
+def import_references(session, filename) -> Tuple[int, int]:
     """
     :param session: an sqlalchemy 'session' of E||A database
     :param filename: a file with one json-formatted reference per line
-    :return : update E||A database with references from 'filename'
+    :return : number of created and updated references, after updating E||A database with
+        references from 'filename'
     """
     log.info("Importing references from %s" % filename)
     created = 0
@@ -73,6 +79,107 @@ def import_references(session, filename):
             created=created, updated=updated
         )
     )
+    return created, updated
+
+
+# Columns set from the reference json, the search vector is maintained by a trigger
+REFERENCE_COLUMNS = [
+    c.name for c in assessment.Reference.__table__.columns if c.name not in ["id", "search"]
+]
+
+# Upserts one chunk of staged lines. If a pubmed_id occurs more than once, the last line wins.
+# Like import_references, keys missing from the json leave existing values untouched: the json
+# is merged into the existing row (if any) with jsonb_populate_record. Inserted rows are told
+# from updated rows by xmax, which is 0 for rows inserted by the statement.
+UPSERT_CHUNK_SQL = """
+WITH chunk AS (
+    SELECT DISTINCT ON (pubmed_id, CASE WHEN pubmed_id IS NULL THEN line END) pubmed_id, data
+    FROM (
+        SELECT line, (data->>'pubmed_id')::integer AS pubmed_id, data
+        FROM reference_staging
+        WHERE line > :start AND line <= :end AND data IS NOT NULL
+    ) AS lines
+    ORDER BY pubmed_id, CASE WHEN pubmed_id IS NULL THEN line END, line DESC
+),
+merged AS (
+    SELECT {merged_columns}
+    FROM chunk
+    LEFT JOIN reference AS existing ON existing.pubmed_id = chunk.pubmed_id
+    CROSS JOIN LATERAL jsonb_populate_record(existing, chunk.data) AS merged
+),
+upserted AS (
+    INSERT INTO reference ({columns})
+    SELECT * FROM merged
+    ON CONFLICT (pubmed_id) DO UPDATE SET {update_columns}
+    RETURNING xmax = 0 AS created
+)
+SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM upserted
+""".format(
+    columns=", ".join(REFERENCE_COLUMNS),
+    merged_columns=", ".join(
+        "COALESCE(merged.published, true)" if c == "published" else f"merged.{c}"
+        for c in REFERENCE_COLUMNS
+    ),
+    update_columns=", ".join(f"{c} = EXCLUDED.{c}" for c in REFERENCE_COLUMNS if c != "pubmed_id"),
+)
+
+
+def import_references_bulk(session, filename, chunk_size=BULK_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Bulk version of import_references, for large reference files.
+
+    The file is streamed into a temporary staging table with COPY, and upserted into the
+    reference table chunk by chunk with INSERT ... ON CONFLICT (pubmed_id) DO UPDATE.
+    Everything happens in one transaction, which is committed at the end.
+
+    :param session: an sqlalchemy 'session' of E||A database
+    :param filename: a file with one json-formatted reference per line
+    :return : number of created and updated references
+    """
+    log.info("Bulk importing references from %s" % filename)
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE reference_staging (line bigserial PRIMARY KEY, data jsonb) "
+            "ON COMMIT DROP"
+        )
+    )
+
+    # CSV format with quote and delimiter characters that never occur in json (control
+    # characters are escaped in json strings), so that each line is read verbatim.
+    # Empty lines are read as NULL.
+    cursor = session.connection().connection.cursor()
+    with open(filename) as f:
+        cursor.copy_expert(
+            "COPY reference_staging (data) FROM STDIN "
+            "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')",
+            f,
+        )
+    num_lines = session.execute(
+        text("SELECT coalesce(max(line), 0) FROM reference_staging")
+    ).scalar()
+    log.info("Staged {} lines".format(num_lines))
+
+    created = 0
+    updated = 0
+    for start in range(0, num_lines, chunk_size):
+        chunk_created, chunk_updated = session.execute(
+            text(UPSERT_CHUNK_SQL), {"start": start, "end": start + chunk_size}
+        ).fetchone()
+        created += chunk_created
+        updated += chunk_updated
+        log.info(
+            "Upserted {} of {} lines (created: {}, updated: {})".format(
+                min(start + chunk_size, num_lines), num_lines, created, updated
+            )
+        )
+    session.commit()
+
+    log.info(
+        "References successfully imported (created: {created}, updated: {updated})!".format(
+            created=created, updated=updated
+        )
+    )
+    return created, updated
 
 
 if __name__ == "__main__":
@@ -80,6 +187,9 @@ if __name__ == "__main__":
     parser.add_argument(
         "json_file", type=str, help="relative path to file containing list of references"
     )
+    parser.add_argument(
+        "--bulk", action="store_true", help="stage file with COPY and upsert (for large files)"
+    )
     args = parser.parse_args()
 
     from applogger import setup_logger
@@ -88,6 +198,9 @@ if __name__ == "__main__":
 
     filename = os.path.abspath(args.json_file)
     # Import argparse, add CLI for getting path to JSON file.
-    db = DB()
+    db = DB(role="cli")
     db.connect()
-    import_references(db.session, filename)
+    if args.bulk:
+        import_references_bulk(db.session, filename)
+    else:
+        import_references(db.session, filename)
@@ -169,7 +169,7 @@ if __name__ == "__main__":
         with open(args.groups) as fd:
             groups = json.load(fd)
 
-    db = DB()
+    db = DB(role="cli")
     db.connect()
 
     # User can reference group, so we need to import groups first
@@ -31,7 +31,10 @@ from typing import (
 import pytz
 from api.util.util import dict_merge
 from api.config.config import feature_is_enabled, FeatureNotEnabledError
+from datalayer.assessmentvalidity import valid_until
+import psycopg2
 from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import scoped_session
 from vardb.datamodel import allele as am
 from vardb.datamodel import annotation as annm
@@ -151,37 +154,56 @@ def bulk_insert_nonexisting(
         q_filter = or_(*filters)
         return q_fields, q_filter
 
+    def split_existing(batch_rows, q_fields, q_filter):
+        "Returns (rows to create, rows existing in db)"
+        db_existing = session.query(*q_fields).filter(q_filter).all()
+        db_existing = [r._asdict() for r in db_existing]
+        if not db_existing:
+            return batch_rows, []
+        created = list()
+        input_existing = list()
+        # Filter our batch_rows based on existing in db to see which objects we need to insert
+        for row in batch_rows:
+            should_create = True
+            for e in db_existing:
+                if all(e[k] == row[k] for k in compare_keys):
+                    if include_pk:  # Copy over primary key if applicable
+                        row[include_pk] = e[include_pk]
+                    input_existing.append(row)
+                    should_create = False
+            if should_create:
+                created.append(row)
+        return created, input_existing
+
     for batch_rows in batch(rows, batch_size):
         q_fields, q_filter = get_fields_filter(model, batch_rows, compare_keys)
         if include_pk:
             q_fields.append(getattr(model, include_pk))
-        db_existing = []
-        if not all_new:
-            db_existing = session.query(*q_fields).filter(q_filter).all()
-            db_existing = [r._asdict() for r in db_existing]
-        created = list()
-        input_existing = list()
-
-        if db_existing:
-            # Filter our batch_rows based on existing in db to see which objects we need to insert
-            for row in batch_rows:
-                should_create = True
-                for e in db_existing:
-                    if all(e[k] == row[k] for k in compare_keys):
-                        if include_pk:  # Copy over primary key if applicable
-                            row[include_pk] = e[include_pk]
-                        input_existing.append(row)
-                        should_create = False
-                if should_create:
-                    created.append(row)
+        if all_new:
+            created, input_existing = batch_rows, []
         else:
-            created = batch_rows
+            created, input_existing = split_existing(batch_rows, q_fields, q_filter)
         if replace and input_existing:
             # Reinsert all existing data
             log.debug("Replacing {} objects on {}".format(len(input_existing), str(model)))
             session.bulk_update_mappings(model, input_existing)
 
-        session.bulk_insert_mappings(model, created)
+        if all_new:
+            session.bulk_insert_mappings(model, created)
+        else:
+            try:
+                with session.begin_nested():
+                    session.bulk_insert_mappings(model, created)
+            except (IntegrityError, psycopg2.IntegrityError):
+                # A concurrent deposit (e.g. the analysis watcher importing in parallel) inserted
+                # some of the rows after they were looked up. The insert waited for it to commit,
+                # so they are found now. Other conflicts fail again.
+                log.info("Retrying insert of {} objects on {}".format(len(created), str(model)))
+                created, concurrent_existing = split_existing(created, q_fields, q_filter)
+                if replace and concurrent_existing:
+                    session.bulk_update_mappings(model, concurrent_existing)
+                input_existing.extend(concurrent_existing)
+                session.bulk_insert_mappings(model, created)
         session.flush()
         if include_pk:
             # We need to retrieve all data back in order to match input correct with primary key
@@ -687,6 +709,8 @@ class AssessmentImporter(object):
         for item in self.batch_items:
             username = item.pop("username")
             item["user_id"] = self.session.query(User.id).filter(User.username == username).scalar()
+            # Inserted without the ORM, so valid_until is not set on flush
+            item["valid_until"] = valid_until(item["classification"], item["date_created"])
 
         for existing, created in bulk_insert_nonexisting(
             self.session,
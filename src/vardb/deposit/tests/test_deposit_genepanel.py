@@ -0,0 +1,177 @@
+import logging
+import os
+import time
+
+from sqlalchemy import func
+
+from vardb.datamodel import gene as gm
+from vardb.deposit.deposit_genepanel import DepositGenepanel
+
+log = logging.getLogger(__name__)
+
+HGNC_ID_OFFSET = 10000000  # Avoid clashing with genes in the test database
+
+# Genes in the generated whole exome panel (two transcripts each)
+EXOME_GENES = int(os.environ.get("GENEPANEL_BENCHMARK_GENES", 20000))
+
+TRANSCRIPTS_HEADER = [
+    "#chromosome",
+    "read start",
+    "read end",
+    "name",
+    "score",
+    "strand",
+    "HGNC symbol",
+    "HGNC id",
+    "transcript source",
+    "inheritance",
+    "coding start",
+    "coding end",
+    "exon starts",
+    "exon ends",
+    "metadata",
+]
+PHENOTYPES_HEADER = ["HGNC id", "HGNC symbol", "phenotype", "inheritance", "phenotype MIM number"]
+
+
+def _write_panel(path, genes, inheritance="AD", updated_genes=()):
+    """
+    Writes transcripts and phenotypes files with two transcripts and one phenotype for each gene
+    in genes. Transcripts of updated_genes get a new version.
+    """
+    transcripts_path = path / "transcripts.tsv"
+    phenotypes_path = path / "phenotypes.tsv"
+    with transcripts_path.open("w") as tf, phenotypes_path.open("w") as pf:
+        tf.write("# Generated panel\n" + "\t".join(TRANSCRIPTS_HEADER) + "\n")
+        pf.write("\t".join(PHENOTYPES_HEADER) + "\n")
+        for i in genes:
+            hgnc_id = HGNC_ID_OFFSET + i
+            start = 1000 * i
+            transcript_version = 2 if i in updated_genes else 1
+            for j in range(2):
+                tf.write(
+                    "\t".join(
+                        [
+                            str(1 + i % 22),
+                            str(start),
+                            str(start + 500),
+                            f"NM_{hgnc_id}{j}.{transcript_version}",
+                            "0",
+                            "+-"[j],
+                            f"TESTGENE{i}",
+                            str(hgnc_id),
+                            "RefSeq",
+                            inheritance,
+                            str(start + 100) if j == 0 else "",
+                            str(start + 400) if j == 0 else "",
+                            f"{start},{start + 300},",
+                            f"{start + 200},{start + 500},",
+                            "",
+                        ]
+                    )
+                    + "\n"
+                )
+            pf.write(f"{hgnc_id}\tTESTGENE{i}\tSyndrome {i}\t{inheritance}\t{600000 + i}\n")
+    return transcripts_path, phenotypes_path
+
+
+def _links(session, junction, version):
+    return (
+        session.query(junction)
+        .filter(junction.c.genepanel_name == "Exome", junction.c.genepanel_version == version)
+        .all()
+    )
+
+
+def test_add_genepanel(test_database, session, tmp_path):
+    test_database.refresh()
+    dg = DepositGenepanel(session)
+
+    dg.add_genepanel(*_write_panel(tmp_path, range(10)), "Exome", "v01")
+    transcripts = _links(session, gm.genepanel_transcript, "v01")
+    assert len(transcripts) == 20
+    assert {t.inheritance for t in transcripts} == {"AD"}
+    assert len(_links(session, gm.genepanel_phenotype, "v01")) == 10
+
+    tx = (
+        session.query(gm.Transcript)
+        .filter(gm.Transcript.transcript_name == f"NM_{HGNC_ID_OFFSET + 3}0.1")
+        .one()
+    )
+    assert (tx.gene_id, tx.gene.hgnc_symbol) == (HGNC_ID_OFFSET + 3, "TESTGENE3")
+    assert (tx.tx_start, tx.tx_end, tx.strand) == (3000, 3500, "+")
+    assert (tx.cds_start, tx.cds_end) == (3100, 3400)
+    assert (tx.exon_starts, tx.exon_ends) == ([3000, 3300], [3200, 3500])
+    assert tx.tags is None
+    noncoding = (
+        session.query(gm.Transcript)
+        .filter(gm.Transcript.transcript_name == f"NM_{HGNC_ID_OFFSET + 3}1.1")
+        .one()
+    )
+    assert (noncoding.cds_start, noncoding.cds_end, noncoding.strand) == (None, None, "-")
+
+    ph = session.query(gm.Phenotype).filter(gm.Phenotype.gene_id == HGNC_ID_OFFSET + 3).one()
+    assert (ph.description, ph.inheritance, ph.omim_id) == ("Syndrome 3", "AD", 600003)
+
+    # New version sharing most genes: existing transcripts and phenotypes are reused
+    num_transcripts = session.query(gm.Transcript).count()
+    dg.add_genepanel(*_write_panel(tmp_path, range(2, 12)), "Exome", "v02")
+    assert session.query(gm.Transcript).count() == num_transcripts + 4
+    assert len(_links(session, gm.genepanel_transcript, "v02")) == 20
+    assert dg.diff_genepanel("Exome", "v02", "v01") == {
+        "genepanel_transcript": (4, 4),
+        "genepanel_phenotype": (2, 2),
+    }
+
+    # Replacing a version only changes the differing links
+    dg.add_genepanel(
+        *_write_panel(tmp_path, range(5), inheritance="AR"), "Exome", "v01", replace=True
+    )
+    transcripts = _links(session, gm.genepanel_transcript, "v01")
+    assert len(transcripts) == 10
+    assert {t.inheritance for t in transcripts} == {"AR"}
+    assert len(_links(session, gm.genepanel_phenotype, "v01")) == 5
+
+    # Without replace, an existing version is left as is
+    dg.add_genepanel(*_write_panel(tmp_path, range(20)), "Exome", "v01")
+    assert len(_links(session, gm.genepanel_transcript, "v01")) == 10
+
+    signature = (
+        session.query(gm.GenepanelSignature)
+        .filter(
+            gm.GenepanelSignature.genepanel_name == "Exome",
+            gm.GenepanelSignature.genepanel_version == "v01",
+        )
+        .one()
+    )
+    assert signature.gene_ids == [HGNC_ID_OFFSET + i for i in range(5)]
+
+
+def test_add_genepanel_exome_benchmark(test_database, session, tmp_path):
+    test_database.refresh()
+    dg = DepositGenepanel(session)
+
+    elapsed = {}
+    # A new panel, a new version with one in a hundred genes' transcripts updated, and a replace
+    genes = range(EXOME_GENES)
+    for version, updated_genes, replace in [
+        ("v01", (), False),
+        ("v02", set(range(0, EXOME_GENES, 100)), False),
+        ("v02", (), True),
+    ]:
+        paths = _write_panel(tmp_path, genes, updated_genes=updated_genes)
+        start = time.time()
+        dg.add_genepanel(*paths, "Exome", version, replace=replace)
+        elapsed[(version, replace)] = time.time() - start
+
+    num_links = (
+        session.query(func.count())
+        .select_from(gm.genepanel_transcript)
+        .filter(gm.genepanel_transcript.c.genepanel_name == "Exome")
+        .scalar()
+    )
+    assert num_links == 2 * 2 * EXOME_GENES
+    log.info(
+        f"Deposited panel with {EXOME_GENES} genes: "
+        + ", ".join(f"{v}{' replaced' if r else ''} in {e:.1f}s" for (v, r), e in elapsed.items())
+    )
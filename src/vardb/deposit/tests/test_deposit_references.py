@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import time
+
+from vardb.datamodel import assessment
+from vardb.deposit.deposit_references import import_references, import_references_bulk
+
+log = logging.getLogger(__name__)
+
+PUBMED_ID_OFFSET = 900000000  # Avoid clashing with references in the test database
+
+# Lines in the generated file for the benchmark, e.g. 1000000 for a full reference dump
+BENCHMARK_LINES = int(os.environ.get("REFERENCE_BENCHMARK_LINES", 100000))
+
+
+def _reference(i, **kwargs):
+    reference = {
+        "pubmed_id": PUBMED_ID_OFFSET + i,
+        "authors": f"Author {i}",
+        "title": f"Title {i}",
+        "journal": "Journal",
+        "abstract": f"Abstract {i}",
+        "year": "2020",
+    }
+    reference.update(kwargs)
+    return reference
+
+
+def _write_references(path, references):
+    with open(path, "w") as f:
+        for reference in references:
+            f.write(json.dumps(reference) + "\n")
+    return str(path)
+
+
+def _stored(session):
+    return {
+        r.pubmed_id: (r.authors, r.title, r.journal, r.abstract, r.year, r.published)
+        for r in session.query(assessment.Reference).filter(
+            assessment.Reference.pubmed_id >= PUBMED_ID_OFFSET
+        )
+    }
+
+
+def test_import_references_bulk(test_database, session, tmp_path):
+    test_database.refresh()
+
+    initial = _write_references(tmp_path / "initial.json", [_reference(i) for i in range(10)])
+    assert import_references_bulk(session, initial, chunk_size=3) == (10, 0)
+
+    # Update some, with keys left out, escapes and a duplicate line, and create some
+    updates = [
+        _reference(0, title='Updated "title" \\ with æøå\ttab'),
+        {"pubmed_id": PUBMED_ID_OFFSET + 1, "abstract": None},
+        _reference(2, published=False),
+        _reference(10),
+        _reference(11, title="First"),
+        _reference(11, title="Last"),
+    ]
+    path = _write_references(tmp_path / "updates.json", updates)
+    assert import_references_bulk(session, path, chunk_size=100) == (2, 3)
+
+    bulk_imported = _stored(session)
+    assert len(bulk_imported) == 12
+    assert bulk_imported[PUBMED_ID_OFFSET + 0][1] == updates[0]["title"]
+    assert bulk_imported[PUBMED_ID_OFFSET + 1] == (
+        "Author 1",
+        "Title 1",
+        "Journal",
+        None,
+        "2020",
+        True,
+    )
+    assert bulk_imported[PUBMED_ID_OFFSET + 2][5] is False
+    assert bulk_imported[PUBMED_ID_OFFSET + 11][1] == "Last"
+
+    # Same result as the row by row import (apart from the duplicate, which it can't handle)
+    session.query(assessment.Reference).filter(
+        assessment.Reference.pubmed_id >= PUBMED_ID_OFFSET
+    ).delete()
+    session.commit()
+    import_references(session, initial)
+    import_references(session, _write_references(tmp_path / "no_duplicates.json", updates[:-1]))
+    imported = _stored(session)
+    imported[PUBMED_ID_OFFSET + 11] = bulk_imported[PUBMED_ID_OFFSET + 11]
+    assert imported == bulk_imported
+
+    # Search vector is kept up to date by trigger
+    assert (
+        session.query(assessment.Reference)
+        .filter(assessment.Reference.pubmed_id == PUBMED_ID_OFFSET + 0)
+        .one()
+        .search
+    )
+
+
+def test_import_references_bulk_benchmark(test_database, session, tmp_path):
+    test_database.refresh()
+
+    path = _write_references(
+        tmp_path / "references.json", (_reference(i) for i in range(BENCHMARK_LINES))
+    )
+
+    start = time.time()
+    assert import_references_bulk(session, path) == (BENCHMARK_LINES, 0)
+    created_elapsed = time.time() - start
+
+    start = time.time()
+    assert import_references_bulk(session, path) == (0, BENCHMARK_LINES)
+    updated_elapsed = time.time() - start
+
+    log.info(
+        f"Bulk imported {BENCHMARK_LINES} references: "
+        f"{BENCHMARK_LINES / created_elapsed:.0f}/s created, "
+        f"{BENCHMARK_LINES / updated_elapsed:.0f}/s updated"
+    )
@@ -1,13 +1,19 @@
 import base64
 import json
+import threading
+import time
 from os.path import commonprefix
 from typing import Tuple
 
 import hypothesis as ht
 import hypothesis.strategies as st
+import psycopg2
+import pytest
 import vardb.deposit.importers as deposit
 from conftest import mock_record
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import scoped_session
+from vardb.datamodel import DB, allele, annotation
 
 
 @st.composite
@@ -302,3 +308,60 @@ def test_annotationimport_target_mode(session: scoped_session):
     )
     data = annotation_importer.add(record, None)
     assert data["annotations"] == {"key": {"foobar": {"a": 2, "b": 1, "c": 2}}}
+
+
+def _allele_row(pos):
+    record = mock_record({"CHROM": "1", "POS": pos, "REF": "A", "ALT": "T"})
+    return dict(record.allele)
+
+
+def test_bulk_insert_nonexisting_concurrent(session):
+    "Rows inserted by a concurrent transaction after the lookup are returned as existing"
+    row = _allele_row(123456789)
+    ((_, created),) = deposit.bulk_insert_nonexisting(
+        session, allele.Allele, [dict(row)], include_pk="id"
+    )
+
+    db = DB()
+    db.connect()
+    other_session = db.session()
+    result = {}
+
+    def insert_concurrently():
+        # Does not see the uncommitted row, and waits for the commit on inserting it
+        result["existing"], result["created"] = next(
+            deposit.bulk_insert_nonexisting(
+                other_session, allele.Allele, [dict(row)], include_pk="id"
+            )
+        )
+
+    try:
+        thread = threading.Thread(target=insert_concurrently)
+        thread.start()
+        time.sleep(1)
+        session.commit()
+        thread.join()
+    finally:
+        other_session.rollback()
+        other_session.close()
+        db.disconnect()
+
+    assert result["created"] == []
+    assert [e["id"] for e in result["existing"]] == [created[0]["id"]]
+    session.query(allele.Allele).filter(allele.Allele.id == created[0]["id"]).delete()
+    session.commit()
+
+
+def test_bulk_insert_nonexisting_conflict(session):
+    "Rows conflicting with existing rows that don't match on compare_keys are not skipped"
+    ((_, (al,)),) = deposit.bulk_insert_nonexisting(
+        session, allele.Allele, [_allele_row(123456790)], include_pk="id"
+    )
+    rows = [
+        {"allele_id": al["id"], "annotations": {"version": v}, "annotation_config_id": 1}
+        for v in [1, 2]
+    ]
+    list(deposit.bulk_insert_nonexisting(session, annotation.Annotation, rows[:1]))
+    # Another current annotation for the same allele
+    with pytest.raises((IntegrityError, psycopg2.IntegrityError)):
+        list(deposit.bulk_insert_nonexisting(session, annotation.Annotation, rows[1:]))
@@ -1,34 +1,219 @@
 import os
 import re
 import json
+import logging
+import threading
+import time
+from typing import Any, Dict
 from sqlalchemy.orm import scoped_session
 from .extended_query import ExtendedQuery
 
+log = logging.getLogger(__name__)
+
+# Connection settings per process role. Timeouts are in milliseconds, 0 disables the timeout.
+# Each setting can be overridden with environment variables DB_<ROLE>_<SETTING> (for one role)
+# or DB_<SETTING> (for all roles), e.g. DB_API_POOL_SIZE=10 or DB_STATEMENT_TIMEOUT=0.
+_DEFAULT_SETTINGS: Dict[str, Any] = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    # Recycle connections after an hour, and test them on checkout, so that connections closed by
+    # the server or a proxy are replaced instead of failing the next query
+    "pool_recycle": 3600,
+    "pool_pre_ping": True,
+    "statement_timeout": 0,
+    "idle_in_transaction_session_timeout": 0,
+    # Log a warning when waiting longer than this for a connection from the pool
+    "slow_checkout_warning": 1000,
+}
+
+ROLE_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    # Keep statement timeout below the gunicorn worker timeout (GUNICORN_TIMEOUT, 500s),
+    # so that queries do not keep running after the worker is killed
+    "api": {"statement_timeout": 450000, "idle_in_transaction_session_timeout": 60000},
+    # Polling and thumbnail workers share the session between their worker threads
+    "polling": {"pool_size": 10, "max_overflow": 5},
+    "watcher": {"pool_size": 2, "max_overflow": 2},
+    "cli": {"pool_size": 1, "max_overflow": 2},
+}
+
+# Settings passed on to create_engine, only valid for queue pools
+_POOL_SETTINGS = ["pool_size", "max_overflow", "pool_timeout"]
+
+
+def role_settings(role: str) -> Dict[str, Any]:
+    assert role in ROLE_SETTINGS, f"Unknown database role: {role}"
+    settings = {**_DEFAULT_SETTINGS, **ROLE_SETTINGS[role]}
+    for key, default in settings.items():
+        for env_var in [f"DB_{role.upper()}_{key.upper()}", f"DB_{key.upper()}"]:
+            value = os.environ.get(env_var)
+            if value is not None:
+                if isinstance(default, bool):
+                    settings[key] = value.lower() in ["true", "1"]
+                else:
+                    settings[key] = int(value)
+                break
+    return settings
+
+
+class PoolCheckoutStats(object):
+    """
+    Time spent waiting for connections from the pool, in total and for the current thread.
+    The thread's wait is reset by reset_thread_wait() (e.g. at the start of each API request).
+    """
+
+    def __init__(self, slow_checkout_warning: int):
+        self.slow_checkout_warning = slow_checkout_warning / 1000.0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, wait: float, pool):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self._local.wait = self.thread_wait() + wait
+        if self.slow_checkout_warning and wait > self.slow_checkout_warning:
+            log.warning(f"Waited {wait * 1000:.0f}ms for database connection. {pool.status()}")
+
+    def thread_wait(self) -> float:
+        return getattr(self._local, "wait", 0.0)
+
+    def reset_thread_wait(self):
+        self._local.wait = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "total_wait": self.total_wait,
+                "max_wait": self.max_wait,
+                "mean_wait": self.total_wait / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+def _timed_poolclass(poolclass, checkout_stats: PoolCheckoutStats):
+    """
+    Subclass of poolclass recording the time spent getting connections from the pool.
+    The stats are a class attribute, as the pool is recreated from its class on dispose.
+    """
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return poolclass._do_get(self)
+        finally:
+            self.checkout_stats.record(time.monotonic() - start, self)
+
+    return type(
+        "Timed" + poolclass.__name__,
+        (poolclass,),
+        {"_do_get": _do_get, "checkout_stats": checkout_stats},
+    )
+
 
 class DB(object):
-    def __init__(self):
+    def __init__(self, role="default"):
+        assert role in ROLE_SETTINGS, f"Unknown database role: {role}"
+        self.role = role
         self.engine = None
         self.session = None
+        self.checkout_stats = None
 
     def connect(self, host=None, engine_kwargs=None):
         # Lazy load dependencies to avoid problems in code not actually using DB, but uses modules from which this module is referenced.
         from sqlalchemy import create_engine, event
         from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import QueuePool
 
         # Disconnect in case we're already connected
         self.disconnect()
         self.host = host or os.environ.get("DB_URL")
 
-        if not engine_kwargs:
-            engine_kwargs = dict()
+        settings = role_settings(self.role)
+        engine_kwargs = {
+            "pool_recycle": settings["pool_recycle"],
+            "pool_pre_ping": settings["pool_pre_ping"],
+            **(engine_kwargs or {}),
+        }
+        poolclass = engine_kwargs.pop("poolclass", QueuePool)
+        if issubclass(poolclass, QueuePool):
+            for key in _POOL_SETTINGS:
+                engine_kwargs.setdefault(key, settings[key])
+        self.checkout_stats = PoolCheckoutStats(settings["slow_checkout_warning"])
+        engine_kwargs["poolclass"] = _timed_poolclass(poolclass, self.checkout_stats)
+
+        # Timeouts are set per connection, as session defaults
+        options = " ".join(
+            f"-c {key}={settings[key]}"
+            for key in ["statement_timeout", "idle_in_transaction_session_timeout"]
+        )
+        connect_args = {"options": options, **engine_kwargs.pop("connect_args", {})}
 
-        self.engine = create_engine(self.host, client_encoding="utf8", **engine_kwargs)
+        self.engine = create_engine(
+            self.host, client_encoding="utf8", connect_args=connect_args, **engine_kwargs
+        )
 
         self.sessionmaker = sessionmaker(  # Class for creating session instances
             bind=self.engine, query_cls=ExtendedQuery
         )
         self.session = scoped_session(self.sessionmaker)
 
+        # Keep derived columns and workflow tables in sync with changes.
+        # datalayer is imported lazily, as it depends on modules importing this one.
+        @event.listens_for(self.sessionmaker, "before_flush")
+        def set_alleleassessment_valid_until(session, flush_context, instances):
+            from datalayer.assessmentvalidity import set_valid_until
+
+            set_valid_until(session)
+
+        @event.listens_for(self.sessionmaker, "after_flush")
+        def refresh_latest_interpretations(session, flush_context):
+            from datalayer.latestinterpretation import refresh_flushed
+
+            refresh_flushed(session)
+
+        @event.listens_for(self.sessionmaker, "after_flush")
+        def track_worklist_changes(session, flush_context):
+            from datalayer.worklist import track_changes
+
+            track_changes(session)
+
+        @event.listens_for(self.sessionmaker, "before_commit")
+        def refresh_worklist(session):
+            from datalayer.worklist import refresh_pending
+
+            refresh_pending(session)
+
+        @event.listens_for(self.sessionmaker, "after_rollback")
+        def discard_worklist_changes(session):
+            from datalayer.worklist import discard_pending
+
+            discard_pending(session)
+
+        # Alleles of open workflows, used for collision detection
+        @event.listens_for(self.sessionmaker, "after_flush")
+        def track_open_workflow_changes(session, flush_context):
+            from datalayer.openworkflows import track_changes
+
+            track_changes(session)
+
+        @event.listens_for(self.sessionmaker, "before_commit")
+        def refresh_open_workflows(session):
+            from datalayer.openworkflows import refresh_pending
+
+            refresh_pending(session)
+
+        @event.listens_for(self.sessionmaker, "after_rollback")
+        def discard_open_workflow_changes(session):
+            from datalayer.openworkflows import discard_pending
+
+            discard_pending(session)
+
         # Error handling. Extend if required.
         @event.listens_for(self.engine, "handle_error")
         def handle_exception(context):
@@ -57,6 +242,14 @@ class DB(object):
                     error_message = concatenate_json_validation_errors(session, data, schema_name)
                     raise JSONValidationError(error_message)
 
+    def pool_status(self) -> Dict[str, Any]:
+        "Pool checkout statistics, with wait times in seconds"
+        return {
+            "role": self.role,
+            "status": self.engine.pool.status(),
+            **self.checkout_stats.as_dict(),
+        }
+
     def disconnect(self):
         if self.session:
             self.session.close()
@@ -0,0 +1,43 @@
+"""
+Support for PostgreSQL generated columns (GENERATED ALWAYS AS (...) STORED), which the SQLAlchemy
+version in use does not provide.
+
+Create them using GeneratedColumn(name, type, expression), where expression is a SQL expression
+on the other columns of the table (use literal_column() to refer to them). The column is excluded
+from INSERT/UPDATE statements, and its value is fetched from the database by the ORM.
+
+Note that alembic does not use the CREATE TABLE compilation below when adding columns, so
+migrations must add generated columns using plain SQL.
+"""
+from sqlalchemy import Column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn, FetchedValue
+
+GENERATED_KEY = "generated_always_as"
+
+
+def GeneratedColumn(*args, expression, **kwargs):
+    info = kwargs.pop("info", {})
+    info[GENERATED_KEY] = expression
+    return Column(
+        *args, server_default=FetchedValue(), server_onupdate=FetchedValue(), info=info, **kwargs
+    )
+
+
+def generated_expression_sql(expression) -> str:
+    "Compile expression to SQL, as used in the column definition"
+    return str(
+        expression.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    )
+
+
+@compiles(CreateColumn, "postgresql")
+def _create_generated_column(element, compiler, **kw):
+    column = element.element
+    text = compiler.visit_create_column(element, **kw)
+    if GENERATED_KEY in column.info:
+        text += " GENERATED ALWAYS AS ({}) STORED".format(
+            generated_expression_sql(column.info[GENERATED_KEY])
+        )
+    return text
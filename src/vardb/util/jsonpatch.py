@@ -0,0 +1,79 @@
+"""
+Minimal JSON patch (RFC 6902) support, used for storing deltas between JSON documents.
+
+Only the operations "add", "remove" and "replace" are generated and applied. Objects are diffed
+recursively, lists are diffed element-wise when their lengths are equal and replaced otherwise.
+"""
+import json
+from typing import Any, Dict, List
+
+JSONPatch = List[Dict[str, Any]]
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _diff(src: Any, dst: Any, path: str, patch: JSONPatch):
+    if type(src) is type(dst) and isinstance(src, dict):
+        for key in src:
+            if key not in dst:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in dst.items():
+            if key not in src:
+                patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                _diff(src[key], value, f"{path}/{_escape(key)}", patch)
+    elif type(src) is type(dst) and isinstance(src, list) and len(src) == len(dst):
+        for idx, (s, d) in enumerate(zip(src, dst)):
+            _diff(s, d, f"{path}/{idx}", patch)
+    elif type(src) is not type(dst) or src != dst:
+        patch.append({"op": "replace", "path": path, "value": dst})
+
+
+def make_patch(src: Any, dst: Any) -> JSONPatch:
+    "Create patch that transforms src into dst"
+    patch: JSONPatch = []
+    _diff(src, dst, "", patch)
+    return patch
+
+
+def apply_patch(doc: Any, patch: JSONPatch) -> Any:
+    "Apply patch to a copy of doc, and return the result"
+    doc = json.loads(json.dumps(doc))
+    for operation in patch:
+        op = operation["op"]
+        path = operation["path"]
+        # Copy value, so that the returned document doesn't share objects with the patch
+        value = json.loads(json.dumps(operation.get("value")))
+        if path == "":
+            assert op == "replace", f"Unsupported operation on document root: {op}"
+            doc = value
+            continue
+
+        tokens = [_unescape(t) for t in path.split("/")[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            if op == "add":
+                parent.insert(len(parent) if last == "-" else int(last), value)
+            elif op == "remove":
+                del parent[int(last)]
+            elif op == "replace":
+                parent[int(last)] = value
+            else:
+                raise ValueError(f"Unsupported JSON patch operation: {op}")
+        else:
+            if op in ("add", "replace"):
+                parent[last] = value
+            elif op == "remove":
+                del parent[last]
+            else:
+                raise ValueError(f"Unsupported JSON patch operation: {op}")
+    return doc
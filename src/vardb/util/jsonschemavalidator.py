@@ -0,0 +1,117 @@
+"""
+Registry of compiled JSON schema validators.
+
+Validators are created once per schema file, and recreated when the file's mtime changes. Each
+validator keeps its own RefResolver, so that referenced schemas are loaded once per validator.
+Note that only the mtime of the main schema file is checked, not of the schemas it references.
+
+The RefResolver keeps state while resolving, so validators are not shared between threads.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import jsonref
+from jsonschema import Draft7Validator, RefResolver
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+_local = threading.local()
+
+
+def load_schema_file(schema_path: str):
+    """
+    Loads schema, with references ({ "$ref": "anotherSchema.json" }) relative to the schema file
+    replaced by the referenced schemas.
+    """
+    loader = jsonref.JsonLoader(cache_results=False)
+    with open(schema_path) as f:
+        return jsonref.load(
+            f,
+            loader=loader,
+            jsonschema=True,
+            base_uri="file:{}/".format(os.path.dirname(schema_path)),
+            load_on_repr=True,
+        )
+
+
+def _create_validator(schema_path: str, base_schema_path: Optional[str]) -> Draft7Validator:
+    if base_schema_path:
+        with open(schema_path) as f:
+            schema = json.load(f)
+
+        def jsonschema_handler(uri):
+            """
+            Handles resolving relative file:// paths, prepending
+            the local base_schema_path
+            """
+            resolve_schema_path = Path(uri.replace("file://", ""))
+            if resolve_schema_path.is_absolute():
+                return json.loads(resolve_schema_path.read_text())
+            else:
+                local_path = Path(base_schema_path) / resolve_schema_path
+                return json.loads(local_path.read_text())
+
+        resolver = RefResolver.from_schema(schema, handlers={"file": jsonschema_handler})
+        validator_cls = Draft7Validator
+    else:
+        schema = load_schema_file(schema_path)
+        resolver = RefResolver.from_schema(schema)
+        validator_cls = validator_for(schema, default=Draft7Validator)
+
+    validator_cls.check_schema(schema)
+    return validator_cls(schema, resolver=resolver)
+
+
+def get_validator(schema_path: str, base_schema_path: Optional[str] = None) -> Draft7Validator:
+    """
+    Returns compiled validator for schema file at schema_path.
+
+    If base_schema_path is provided, it supports referencing relative schemas
+    by using { "$ref": "file://anotherSchema.json" }
+    which will be relative to base_schema_path.
+    Otherwise, references are relative to the schema file (see load_schema_file).
+    """
+    # (schema path, base schema path) -> (mtime, validator)
+    validators: Dict[Tuple[str, Optional[str]], Tuple[float, Draft7Validator]] = getattr(
+        _local, "validators", None
+    )
+    if validators is None:
+        validators = _local.validators = {}
+
+    schema_path = os.path.abspath(schema_path)
+    key = (schema_path, base_schema_path)
+    mtime = os.stat(schema_path).st_mtime
+    cached = validators.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    validator = _create_validator(schema_path, base_schema_path)
+    validators[key] = (mtime, validator)
+    return validator
+
+
+def validate(schema_path: str, data, base_schema_path: Optional[str] = None):
+    """
+    Validates data according to schema file. Raises jsonschema.ValidationError if invalid.
+    """
+    error = best_match(get_validator(schema_path, base_schema_path).iter_errors(data))
+    if error is not None:
+        raise error
+
+
+def validate_many(schema_path: str, documents: Iterable, base_schema_path: Optional[str] = None):
+    """
+    Validates all documents against the same compiled validator.
+
+    Raises jsonschema.ValidationError for the first invalid document, with the document's index
+    prepended to the error path.
+    """
+    validator = get_validator(schema_path, base_schema_path)
+    for index, document in enumerate(documents):
+        error = best_match(validator.iter_errors(document))
+        if error is not None:
+            error.path.appendleft(index)
+            raise error
@@ -0,0 +1,40 @@
+import hypothesis as ht
+import hypothesis.strategies as st
+
+from vardb.util.jsonpatch import apply_patch, make_patch
+
+json_values = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.text(max_size=5),
+    lambda children: st.lists(children, max_size=4)
+    | st.dictionaries(st.text(alphabet="ab~/", max_size=3), children, max_size=4),
+    max_leaves=20,
+)
+
+
+@ht.given(json_values, json_values)
+def test_patch_roundtrip(src, dst):
+    patch = make_patch(src, dst)
+    assert apply_patch(src, patch) == dst
+    # Source document is not modified
+    assert apply_patch(src, make_patch(src, src)) == src
+
+
+def test_patch_is_minimal():
+    src = {"allele": {"1": {"comment": "a", "verified": False}, "2": {"comment": "b"}}, "x": [1, 2]}
+    dst = {"allele": {"1": {"comment": "a", "verified": True}, "2": {"comment": "b"}}, "x": [1, 3]}
+    assert make_patch(src, dst) == [
+        {"op": "replace", "path": "/allele/1/verified", "value": True},
+        {"op": "replace", "path": "/x/1", "value": 3},
+    ]
+    assert make_patch(src, src) == []
+
+
+def test_patch_escaping():
+    src = {"a/b": {"c~d": 1}}
+    dst = {"a/b": {"c~d": 2, "e": None}}
+    patch = make_patch(src, dst)
+    assert patch == [
+        {"op": "replace", "path": "/a~1b/c~0d", "value": 2},
+        {"op": "add", "path": "/a~1b/e", "value": None},
+    ]
+    assert apply_patch(src, patch) == dst
@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+import jsonschema
+import pytest
+
+from vardb.datamodel.jsonschemas.load_schema import load_schema, schema_path
+from vardb.util import jsonschemavalidator
+
+FILTERCONFIGS = "/ella/ella-testdata/testdata/fixtures/filterconfigs.json"
+
+
+def _write_schemas(tmp_path, max_value):
+    (tmp_path / "value.json").write_text(json.dumps({"type": "integer", "maximum": max_value}))
+    main = tmp_path / "main.json"
+    main.write_text(
+        json.dumps(
+            {
+                "type": "object",
+                "properties": {"value": {"$ref": "value.json"}},
+                "required": ["value"],
+            }
+        )
+    )
+    return str(main)
+
+
+def test_validator_cached_by_mtime(tmp_path):
+    main = _write_schemas(tmp_path, 10)
+
+    validator = jsonschemavalidator.get_validator(main)
+    assert jsonschemavalidator.get_validator(main) is validator
+    jsonschemavalidator.validate(main, {"value": 10})
+    with pytest.raises(jsonschema.ValidationError):
+        jsonschemavalidator.validate(main, {"value": 11})
+
+    # Unchanged mtime -> cached validator is used
+    mtime = os.stat(main).st_mtime
+    _write_schemas(tmp_path, 20)
+    os.utime(main, (mtime, mtime))
+    assert jsonschemavalidator.get_validator(main) is validator
+
+    # Changed mtime -> validator is recreated
+    os.utime(main, (mtime + 1, mtime + 1))
+    assert jsonschemavalidator.get_validator(main) is not validator
+    jsonschemavalidator.validate(main, {"value": 11})
+
+
+def test_validate_many(tmp_path):
+    main = _write_schemas(tmp_path, 10)
+    jsonschemavalidator.validate_many(main, [{"value": 1}, {"value": 2}])
+
+    with pytest.raises(jsonschema.ValidationError) as excinfo:
+        jsonschemavalidator.validate_many(main, [{"value": 1}, {"value": 2}, {"value": 11}])
+    assert list(excinfo.value.path) == [2, "value"]
+
+
+def test_validate_filterconfigs_cached_faster():
+    with open(FILTERCONFIGS) as f:
+        filterconfigs = json.load(f) * 50
+
+    start = time.time()
+    for fc in filterconfigs:
+        jsonschema.validate(fc, load_schema("filterconfig_base.json"))
+    uncached_elapsed = time.time() - start
+
+    # Raises on invalid filterconfigs
+    start = time.time()
+    jsonschemavalidator.validate_many(schema_path("filterconfig_base.json"), filterconfigs)
+    cached_elapsed = time.time() - start
+
+    # Loading and checking the schema once, instead of for every filterconfig
+    assert cached_elapsed < uncached_elapsed
@@ -24,10 +24,19 @@ It expects the path structure to look like the following:
 The name of the root directory must match the name of the analysis file.
 Furthermore, the name must also match the 'name' key within the .analysis json file.
 
+Changes to the watch path are detected with inotify when available, with polling every
+POLL_INTERVAL seconds as a fallback (e.g. for network file systems).
 
+With more than one worker, analyses are imported in a pool of processes, each analysis in its
+own transaction, so that a large (or failing) analysis does not hold up the others.
+Analyses that fail to import (e.g. on a conflict with a concurrent import) are retried with
+exponential backoff, up to MAX_IMPORT_ATTEMPTS times in total. After that they are skipped.
 """
-from typing import Set, List, Pattern
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional, Set, List, Pattern, Tuple
+import errno
 import logging
+import multiprocessing
 import shutil
 import argparse
 import time
@@ -37,14 +46,78 @@ from pathlib import Path
 from vardb.datamodel import DB
 from vardb.deposit.deposit_analysis import DepositAnalysis
 from vardb.deposit.analysis_config import AnalysisConfigData
+from vardb.watcher.inotify import DirectoryWatch
 
 log = logging.getLogger(__name__)
 POLL_INTERVAL = 30
+# How often to check for finished imports while imports are in progress
+IN_PROGRESS_INTERVAL = 1
+# Import attempts for an analysis before it is skipped, to prevent log spamming
+MAX_IMPORT_ATTEMPTS = 3
 
 WATCH_PATH_ERROR = "Couldn't read from watch path {}, aborting..."
 DEST_PATH_ERROR = "Couldn't write to destination path {}, aborting..."
 
 
+def move_analysis(analysis_path: Path, dest_path: Path):
+    """
+    Move analysis folder into dest_path.
+
+    Uses an atomic rename when source and destination are on the same file system,
+    and falls back to copying (shutil.move) otherwise.
+    """
+    try:
+        os.rename(analysis_path, dest_path / analysis_path.name)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(analysis_path), str(dest_path))
+
+
+def import_and_move(session, analysis_config_data, analysis_path: Path, dest_path: Path):
+    """
+    Import analysis, and move it to dest_path. Commits on success, rolls back on failure.
+    """
+    try:
+        da = DepositAnalysis(session)
+        da.import_vcf(analysis_config_data)
+
+        # Flushing to check for errors in data, before moving files
+        session.flush()
+
+        # Move analysis dir to destination path.
+        move_analysis(analysis_path, dest_path)
+
+        # All is apparantly good, let's commit!
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+_worker_db: Optional[DB] = None
+
+
+def _init_import_worker():
+    "Each import process uses its own database connection"
+    global _worker_db
+    _worker_db = DB(role="watcher")
+    _worker_db.connect()
+
+
+def _import_in_worker(analysis_path: str, dest_path: str) -> Tuple[str, float]:
+    assert _worker_db is not None
+    start = time.time()
+    try:
+        analysis_config_data = AnalysisConfigData(Path(analysis_path))
+        import_and_move(
+            _worker_db.session, analysis_config_data, Path(analysis_path), Path(dest_path)
+        )
+        return analysis_config_data["name"], time.time() - start
+    finally:
+        _worker_db.session.remove()
+
+
 class AnalysisWatcher(object):
     def __init__(
         self,
@@ -55,6 +128,7 @@ class AnalysisWatcher(object):
         blacklist=None,
         whitelistfile=None,
         blacklistfile=None,
+        num_workers=1,
     ):
         self.session = session
         self.watch_path = Path(watch_path)
@@ -73,6 +147,8 @@ class AnalysisWatcher(object):
         self.processed: Set[
             str
         ] = set()  # Keeping tracked of failed or ignored analyses to prevent log spamming
+        # Failed analyses, with number of attempts and when to retry
+        self.failed: Dict[Path, Tuple[int, float]] = {}
 
         if not self._check_watch_path_readable():
             raise RuntimeError(WATCH_PATH_ERROR.format(self.watch_path))
@@ -80,6 +156,23 @@ class AnalysisWatcher(object):
         if not self._check_dest_path_writable():
             raise RuntimeError(DEST_PATH_ERROR.format(self.dest_path))
 
+        self.num_workers = num_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if self.num_workers > 1:
+            # Use spawn, as forked processes would share the parent's database connections
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_import_worker,
+            )
+        self.in_progress: Dict[Path, Future] = {}
+
+        # Throughput metrics
+        self.started = time.time()
+        self.num_imported = 0
+        self.num_failed = 0
+        self.import_time = 0.0
+
     def _update_whitelist(self):
         if self._whitelist and not self.compiled_whitelist:
             for pttrn in self._whitelist:
@@ -141,81 +234,157 @@ class AnalysisWatcher(object):
         else:
             return True
 
+    def _get_analysis_to_import(self, analysis_dir) -> Optional[AnalysisConfigData]:
+        """
+        Check if analysis_dir is ready and should be imported.
+
+        Analyses that should never be imported are added to self.processed.
+        """
+        analysis_path = self.watch_path / analysis_dir
+        if not analysis_path.is_dir():
+            return None
+
+        if not self.is_ready(analysis_path):
+            return None
+
+        analysis_config_data = AnalysisConfigData(analysis_path)
+
+        if self.compiled_whitelist:
+            if not any(i.match(analysis_config_data["name"]) for i in self.compiled_whitelist):
+                log.warning(
+                    f"{analysis_config_data['name']} does not match any of the provided whitelists, ignoring..."
+                )
+                self.processed.add(analysis_dir)
+                return None
+
+        if self.compiled_blacklist:
+            matching_patterns = [
+                i.pattern for i in self.compiled_blacklist if i.match(analysis_config_data["name"])
+            ]
+            if matching_patterns:
+                log.warning(
+                    f"{analysis_config_data['name']} matches blacklist ({matching_patterns}), ignoring..."
+                )
+                self.processed.add(analysis_dir)
+                return None
+
+        if (self.dest_path / analysis_dir.name).exists():
+            log.warning(f"{analysis_dir.name} already exists in {self.dest_path}. Skipping.")
+            self.processed.add(analysis_dir)
+            return None
+
+        return analysis_config_data
+
+    def _collect_finished(self) -> Tuple[int, int]:
+        "Collect imports finished in the process pool. Returns number of imported and failed."
+        imported = failed = 0
+        for analysis_dir, future in list(self.in_progress.items()):
+            if not future.done():
+                continue
+            del self.in_progress[analysis_dir]
+            e = future.exception()
+            if e is None:
+                self.failed.pop(analysis_dir, None)
+                name, duration = future.result()
+                log.info(f"Analysis {name} successfully imported in {duration:.1f} seconds!")
+                self.import_time += duration
+                imported += 1
+            else:
+                self._register_failed(analysis_dir, e)
+                failed += 1
+        return imported, failed
+
+    def _register_failed(self, analysis_dir: Path, e: BaseException):
+        attempts = self.failed.pop(analysis_dir, (0, 0.0))[0] + 1
+        if attempts >= MAX_IMPORT_ATTEMPTS:
+            log.error(
+                f"An exception occured while importing {analysis_dir.name} (attempt {attempts}). "
+                "Skipping...",
+                exc_info=e,
+            )
+            self.processed.add(analysis_dir)
+            return
+        delay = POLL_INTERVAL * 2**attempts
+        self.failed[analysis_dir] = (attempts, time.time() + delay)
+        log.error(
+            f"An exception occured while importing {analysis_dir.name} (attempt {attempts}). "
+            f"Retrying in {delay} seconds...",
+            exc_info=e,
+        )
+
+    def _in_backoff(self, analysis_dir: Path, now: float) -> bool:
+        return analysis_dir in self.failed and self.failed[analysis_dir][1] > now
+
+    def _log_metrics(self, cycle_start: float, imported: int, failed: int):
+        self.num_imported += imported
+        self.num_failed += failed
+        if not (imported or failed or self.in_progress):
+            return
+        hours = (time.time() - self.started) / 3600
+        mean_import_time = self.import_time / self.num_imported if self.num_imported else 0
+        log.info(
+            f"Watcher cycle: {imported} imported, {failed} failed, {len(self.in_progress)} in progress "
+            f"({time.time() - cycle_start:.1f}s). Total: {self.num_imported} imported, "
+            f"{self.num_failed} failed, {self.num_imported / hours:.1f} analyses/hour, "
+            f"mean import time {mean_import_time:.1f}s"
+        )
+
     def check_and_import(self):
         """
         Poll for new samples to process.
+
+        With a process pool, new analyses are submitted to the pool and this returns immediately.
+        Finished imports are collected on the next call.
         """
+        cycle_start = time.time()
 
         self._update_whitelist()
         self._update_blacklist()
 
+        imported, failed = self._collect_finished()
+
         # The path to the root folder is the analysis folder, i.e. for our testdata
         # src/vardb/watcher/testdata/analyses, the target folder for analysis will be
         # the analysis folder
+        now = time.time()
         for analysis_dir in sorted(self.watch_path.iterdir()):
-            if analysis_dir in self.processed:
+            if (
+                analysis_dir in self.processed
+                or analysis_dir in self.in_progress
+                or self._in_backoff(analysis_dir, now)
+            ):
                 continue
 
             try:
-                analysis_path = self.watch_path / analysis_dir
-                if not analysis_path.is_dir():
-                    continue
-
-                if not self.is_ready(analysis_path):
+                analysis_config_data = self._get_analysis_to_import(analysis_dir)
+                if analysis_config_data is None:
                     continue
 
-                analysis_config_data = AnalysisConfigData(analysis_path)
-
-                if self.compiled_whitelist:
-                    if not any(
-                        i.match(analysis_config_data["name"]) for i in self.compiled_whitelist
-                    ):
-                        log.warning(
-                            f"{analysis_config_data['name']} does not match any of the provided whitelists, ignoring..."
-                        )
-                        self.processed.add(analysis_dir)
-                        continue
-
-                if self.compiled_blacklist:
-                    matching_patterns = [
-                        i.pattern
-                        for i in self.compiled_blacklist
-                        if i.match(analysis_config_data["name"])
-                    ]
-                    if matching_patterns:
-                        log.warning(
-                            f"{analysis_config_data['name']} matches blacklist ({matching_patterns}), ignoring..."
-                        )
-                        self.processed.add(analysis_dir)
-                        continue
-
-                if (self.dest_path / analysis_dir.name).exists():
-                    log.warning(
-                        f"{analysis_dir.name} already exists in {self.dest_path}. Skipping."
+                analysis_path = self.watch_path / analysis_dir
+                if self.executor is not None:
+                    self.in_progress[analysis_dir] = self.executor.submit(
+                        _import_in_worker, str(analysis_path), str(self.dest_path)
                     )
-                    self.processed.add(analysis_dir)
                     continue
 
-                # Import analysis
-                self.import_analysis(analysis_config_data)
-
-                # Flushing to check for errors in data, before moving files
-                self.session.flush()
-
-                # Move analysis dir to destination path.
-                shutil.move(str(analysis_path), str(self.dest_path))
-
-                # All is apparantly good, let's commit!
-                self.session.commit()
+                start = time.time()
+                import_and_move(self.session, analysis_config_data, analysis_path, self.dest_path)
+                self.import_time += time.time() - start
+                self.failed.pop(analysis_dir, None)
+                imported += 1
                 log.info("Analysis {} successfully imported!".format(analysis_config_data["name"]))
 
             # Catch all exceptions and carry on, otherwise one bad analysis can block all of them
-            except Exception:
-                log.exception(
-                    f"An exception occured while importing {analysis_dir.name}. Skipping..."
-                )
+            except Exception as e:
                 self.session.rollback()
-                self.processed.add(analysis_dir)
+                self._register_failed(analysis_dir, e)
+                failed += 1
+
+        self._log_metrics(cycle_start, imported, failed)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
 
 
 def start_polling(
@@ -226,6 +395,8 @@ def start_polling(
     blacklist=None,
     whitelistfile=None,
     blacklistfile=None,
+    num_workers=1,
+    use_inotify=True,
 ):
     aw = AnalysisWatcher(
         session,
@@ -235,10 +406,31 @@ def start_polling(
         blacklist=blacklist,
         whitelistfile=whitelistfile,
         blacklistfile=blacklistfile,
+        num_workers=num_workers,
     )
-    while True:
-        aw.check_and_import()
-        time.sleep(POLL_INTERVAL)
+
+    watch = None
+    if use_inotify:
+        try:
+            watch = DirectoryWatch(analyses_path)
+            log.info(f"Watching {analyses_path} for changes using inotify")
+        except OSError as e:
+            log.warning(f"Unable to use inotify ({e}), falling back to polling")
+
+    try:
+        while True:
+            aw.check_and_import()
+            timeout = IN_PROGRESS_INTERVAL if aw.in_progress else POLL_INTERVAL
+            if watch is not None:
+                # Returns early on changes, otherwise we do a full scan every POLL_INTERVAL
+                if watch.wait(timeout):
+                    watch.update_subdirectories()
+            else:
+                time.sleep(timeout)
+    finally:
+        if watch is not None:
+            watch.close()
+        aw.shutdown()
 
 
 if __name__ == "__main__":
@@ -292,6 +484,21 @@ if __name__ == "__main__":
         help="Regex expressions for blacklist of analysis names to import (multiple expressions supported)",
     )
 
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=int(os.environ.get("ELLA_WATCHER_WORKERS", 1)),
+        help="Number of analyses to import in parallel (default: $ELLA_WATCHER_WORKERS or 1)",
+    )
+
+    parser.add_argument(
+        "--no-inotify",
+        dest="use_inotify",
+        action="store_false",
+        help="Only poll for changes, don't use inotify (e.g. for network file systems)",
+    )
+
     args = parser.parse_args()
 
     if args.blacklist and args.blacklistfile:
@@ -309,8 +516,9 @@ if __name__ == "__main__":
         assert os.path.isfile(args.whitelistfile), f"Whitelist file {args.whitelistfile} not found"
 
     log.info("Polling for new analyses every: {} seconds".format(POLL_INTERVAL))
+    log.info("Importing up to {} analyses in parallel".format(args.workers))
 
-    db = DB()
+    db = DB(role="watcher")
     db.connect()
     start_polling(
         db.session,
@@ -320,4 +528,6 @@ if __name__ == "__main__":
         blacklist=args.blacklist,
         whitelistfile=args.whitelistfile,
         blacklistfile=args.blacklistfile,
+        num_workers=args.workers,
+        use_inotify=args.use_inotify,
     )
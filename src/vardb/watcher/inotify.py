@@ -0,0 +1,102 @@
+"""
+Minimal inotify bindings (Linux only), used by the analysis watcher to react to new analyses
+without waiting for the next poll.
+
+Only the watch path and its immediate subdirectories are watched (the READY file is created inside
+the analysis folder). Events are not interpreted: any event means "something changed, rescan".
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+from pathlib import Path
+from typing import Dict
+
+log = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE
+
+
+class DirectoryWatch(object):
+    """
+    Watch a directory and its immediate subdirectories for changes.
+
+    Raises OSError if inotify is not available, in which case the caller should fall back to
+    polling.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify not supported on this platform")
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches: Dict[Path, int] = {}
+        self._add_watch(self.path)
+        self.update_subdirectories()
+
+    def _add_watch(self, path: Path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        self._watches[path] = wd
+
+    def update_subdirectories(self):
+        "Watch new subdirectories, and forget subdirectories that are gone"
+        for path in list(self._watches):
+            if path != self.path and not path.is_dir():
+                # The kernel removes the watch itself when the directory is moved or deleted
+                del self._watches[path]
+
+        for subdir in self.path.iterdir():
+            if subdir in self._watches or not subdir.is_dir():
+                continue
+            try:
+                self._add_watch(subdir)
+            except OSError as e:
+                # Directory could have been moved away since iterdir
+                log.debug(f"Unable to watch {subdir}: {e}")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait up to `timeout` seconds for changes.
+
+        Returns True if any change was detected.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # Drain all pending events
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
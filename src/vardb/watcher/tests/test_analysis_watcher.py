@@ -4,9 +4,16 @@ from pathlib import Path
 import pytest
 import shutil
 import tempfile
+import time
 from vardb.deposit.analysis_config import AnalysisConfigData
 from vardb.datamodel import sample as sm
-from vardb.watcher.analysis_watcher import AnalysisWatcher, WATCH_PATH_ERROR, DEST_PATH_ERROR
+from vardb.watcher.analysis_watcher import (
+    AnalysisWatcher,
+    WATCH_PATH_ERROR,
+    DEST_PATH_ERROR,
+    MAX_IMPORT_ATTEMPTS,
+)
+from vardb.watcher.inotify import DirectoryWatch
 
 READY_DATA_SOURCE_PATH = "/ella/src/vardb/watcher/testdata/analyses/TestAnalysis-001"
 MISCONFIGURED_DATA_SOURCE_PATH = (
@@ -123,6 +130,88 @@ def test_check_and_import(session, test_database, watch_path, dest_path):
     assert "Warning" in str(analysis_stored[0].warnings)
 
 
+def test_check_and_import_parallel(session, test_database, watch_path, dest_path):
+    test_database.refresh()
+    aw = AnalysisWatcher(session, watch_path, dest_path, num_workers=2)
+
+    analysis_config_data = AnalysisConfigData(ready_path(watch_path))
+
+    try:
+        # Imports are submitted to the process pool, and collected on later calls
+        aw.check_and_import()
+        assert ready_path(watch_path) in aw.in_progress
+        start = time.time()
+        while aw.in_progress:
+            assert time.time() - start < 120
+            time.sleep(0.5)
+            aw.check_and_import()
+    finally:
+        aw.shutdown()
+
+    assert aw.num_imported == 1
+    assert aw.num_failed == 0
+
+    analysis_stored = (
+        session.query(sm.Analysis)
+        .filter(
+            sm.Analysis.name == analysis_config_data["name"],
+            tuple_(sm.Analysis.genepanel_name, sm.Analysis.genepanel_version)
+            == (analysis_config_data["genepanel_name"], analysis_config_data["genepanel_version"]),
+        )
+        .all()
+    )
+    assert len(analysis_stored) == 1
+    assert_ready_moved_to_dest(watch_path, dest_path)
+
+
+def test_check_and_import_retry_failed(session, test_database, watch_path, dest_path):
+    test_database.refresh()
+    aw = AnalysisWatcher(session, watch_path, dest_path)
+
+    aw.check_and_import()
+    misconfigured = misconfigured_data_path(watch_path)
+    assert misconfigured not in aw.processed
+    attempts, retry_at = aw.failed[misconfigured]
+    assert attempts == 1
+    assert retry_at > time.time()
+
+    # Not retried until the backoff has passed
+    aw.check_and_import()
+    assert aw.failed[misconfigured] == (attempts, retry_at)
+
+    aw.failed[misconfigured] = (attempts, time.time())
+    aw.check_and_import()
+    assert aw.failed[misconfigured][0] == 2
+    assert aw.num_failed == 2
+
+    # Skipped after the last attempt
+    aw.failed[misconfigured] = (aw.failed[misconfigured][0], time.time())
+    aw.check_and_import()
+    assert misconfigured not in aw.failed
+    assert misconfigured in aw.processed
+    aw.check_and_import()
+    assert aw.num_failed == MAX_IMPORT_ATTEMPTS
+
+
+def test_directory_watch(watch_path):
+    watch = DirectoryWatch(watch_path)
+    try:
+        assert watch.wait(0.1) is False
+
+        # New analysis folder
+        new_analysis = watch_path / "TestAnalysis-004"
+        os.mkdir(new_analysis)
+        assert watch.wait(1) is True
+        watch.update_subdirectories()
+        assert watch.wait(0.1) is False
+
+        # READY file created within analysis folder
+        (new_analysis / "READY").touch()
+        assert watch.wait(1) is True
+    finally:
+        watch.close()
+
+
 def test_check_and_import_whitelist_include(session, test_database, watch_path, dest_path):
     test_database.refresh()
     analysis_config_data = AnalysisConfigData(ready_path(watch_path))